@@ -180,12 +180,16 @@ class MasterConfig(util.ComparableMixin):
         self.logCompressionLimit = 4 * 1024
         self.logCompressionMethod = 'gz'
         self.logEncoding = 'utf-8'
+        self.logFlushLatency = 0
+        self.logStorage = None
+        self.logSearchIndex = False
         self.logMaxSize = None
         self.logMaxTailSize = None
         self.properties = properties.Properties()
         self.collapseRequests = None
         self.codebaseGenerator = None
         self.prioritizeBuilders = None
+        self.builderStartConcurrency = 1
         self.multiMaster = False
         self.manhole = None
         self.protocols = {}
@@ -232,6 +236,7 @@ class MasterConfig(util.ComparableMixin):
         "buildbotURL",
         "buildCacheSize",
         "builders",
+        "builderStartConcurrency",
         "buildHorizon",
         "caches",
         "change_source",
@@ -245,9 +250,12 @@ class MasterConfig(util.ComparableMixin):
         "logCompressionLimit",
         "logCompressionMethod",
         "logEncoding",
+        "logFlushLatency",
         "logHorizon",
         "logMaxSize",
         "logMaxTailSize",
+        "logSearchIndex",
+        "logStorage",
         "manhole",
         "machines",
         "collapseRequests",
@@ -421,9 +429,9 @@ class MasterConfig(util.ComparableMixin):
 
         self.logCompressionMethod = config_dict.get(
             'logCompressionMethod', 'gz')
-        if self.logCompressionMethod not in ('raw', 'bz2', 'gz', 'lz4'):
+        if self.logCompressionMethod not in ('raw', 'bz2', 'gz', 'lz4', 'zstd'):
             error(
-                "c['logCompressionMethod'] must be 'raw', 'bz2', 'gz' or 'lz4'")
+                "c['logCompressionMethod'] must be 'raw', 'bz2', 'gz', 'lz4' or 'zstd'")
 
         if self.logCompressionMethod == "lz4":
             try:
@@ -433,10 +441,35 @@ class MasterConfig(util.ComparableMixin):
                 error("To set c['logCompressionMethod'] to 'lz4' "
                       "you must install the lz4 library ('pip install lz4')")
 
+        if self.logCompressionMethod == "zstd":
+            try:
+                import zstandard  # pylint: disable=import-outside-toplevel
+                [zstandard]
+            except ImportError:
+                error("To set c['logCompressionMethod'] to 'zstd' "
+                      "you must install the zstandard library ('pip install zstandard')")
+
         copy_int_param('logMaxSize')
         copy_int_param('logMaxTailSize')
         copy_param('logEncoding')
 
+        logFlushLatency = config_dict.get('logFlushLatency', 0)
+        if not isinstance(logFlushLatency, (int, float)) or logFlushLatency < 0:
+            error("c['logFlushLatency'] must be a positive number of seconds, or 0")
+        else:
+            self.logFlushLatency = logFlushLatency
+
+        copy_param('logSearchIndex', check_type=bool, check_type_name='a boolean')
+
+        logStorage = config_dict.get('logStorage')
+        if logStorage is not None:
+            from buildbot.db.logstorage import LogStorage  # pylint: disable=import-outside-toplevel
+            if not isinstance(logStorage, LogStorage):
+                error("c['logStorage'] must be a LogStorage instance, "
+                      "such as util.FilesystemLogStorage")
+            else:
+                self.logStorage = logStorage
+
         properties = config_dict.get('properties', {})
         if not isinstance(properties, dict):
             error("c['properties'] must be a dictionary")
@@ -464,6 +497,12 @@ class MasterConfig(util.ComparableMixin):
         else:
             self.prioritizeBuilders = prioritizeBuilders
 
+        builderStartConcurrency = config_dict.get('builderStartConcurrency', 1)
+        if not isinstance(builderStartConcurrency, int) or builderStartConcurrency < 1:
+            error("c['builderStartConcurrency'] must be a positive integer")
+        else:
+            self.builderStartConcurrency = builderStartConcurrency
+
         protocols = config_dict.get('protocols', {})
         if isinstance(protocols, dict):
             for proto, options in protocols.items():
@@ -516,7 +555,8 @@ class MasterConfig(util.ComparableMixin):
 
         if 'db' in config_dict:
             db = config_dict['db']
-            if set(db.keys()) - set(['db_url', 'db_poll_interval']) and throwErrors:
+            if set(db.keys()) - set(['db_url', 'db_poll_interval', 'db_read_url',
+                                     'db_read_max_lag']) and throwErrors:
                 error("unrecognized keys in c['db']")
             config_dict = db
 
@@ -534,6 +574,16 @@ class MasterConfig(util.ComparableMixin):
     def load_db(self, filename, config_dict):
         self.db = dict(db_url=self.getDbUrlFromConfig(config_dict))
 
+        db = config_dict.get('db', {})
+        if 'db_read_url' in db:
+            self.db['db_read_url'] = db['db_read_url']
+            max_lag = db.get('db_read_max_lag', 10)
+            if not isinstance(max_lag, (int, float)) or max_lag <= 0:
+                error("c['db']['db_read_max_lag'] must be a positive number")
+            self.db['db_read_max_lag'] = max_lag
+        elif 'db_read_max_lag' in db:
+            error("c['db']['db_read_max_lag'] requires c['db']['db_read_url']")
+
     def load_mq(self, filename, config_dict):
         from buildbot.mq import connector  # avoid circular imports
         if 'mq' in config_dict:
@@ -746,7 +796,7 @@ class MasterConfig(util.ComparableMixin):
                    'change_hook_dialects', 'change_hook_auth',
                    'default_page',
                    'custom_templates_dir', 'cookie_expiration_time',
-                   'ui_default_config'}
+                   'ui_default_config', 'ws_max_queue_bytes', 'rest_cache_bytes'}
         unknown = set(list(www_cfg)) - allowed
 
         if unknown:
@@ -772,6 +822,18 @@ class MasterConfig(util.ComparableMixin):
                 error('Invalid www["cookie_expiration_time"] configuration should '
                       'be a datetime.timedelta')
 
+        ws_max_queue_bytes = www_cfg.get('ws_max_queue_bytes')
+        if ws_max_queue_bytes is not None:
+            if not isinstance(ws_max_queue_bytes, int) or ws_max_queue_bytes <= 0:
+                error('Invalid www["ws_max_queue_bytes"] configuration should '
+                      'be a positive integer')
+
+        rest_cache_bytes = www_cfg.get('rest_cache_bytes')
+        if rest_cache_bytes is not None:
+            if not isinstance(rest_cache_bytes, int) or rest_cache_bytes < 0:
+                error('Invalid www["rest_cache_bytes"] configuration should '
+                      'be a non-negative integer')
+
         self.www.update(www_cfg)
 
     def load_services(self, filename, config_dict):
@@ -29,6 +29,10 @@ class ResourceType:
     keyFields = []
     eventPathPatterns = ""
     entityType = None
+    # true if every change to the resources of this type produces an event
+    # matching eventPathPatterns, so that the REST responses about them can be
+    # cached until the next event
+    cacheable = False
 
     def __init__(self, master):
         self.master = master
@@ -74,6 +78,12 @@ class Endpoint:
     rootLinkName = None
     isCollection = False
     isRaw = False
+    # the unique field of the collection items, which can be paginated with a
+    # cursor if set
+    cursorField = None
+    # if True, the results of this collection read without a cursor come in
+    # the reverse of the requested order, which its streamed responses keep
+    reversedWithoutCursor = False
 
     def __init__(self, rtype, master):
         self.rtype = rtype
@@ -82,6 +92,11 @@ class Endpoint:
     def get(self, resultSpec, kwargs):
         raise NotImplementedError
 
+    def stream(self, resultSpec, kwargs):
+        # raw endpoints can override this to return a 'stream' instead of the
+        # whole 'raw' content; see buildbot.www.rest.RawStreamProducer
+        return self.get(resultSpec, kwargs)
+
     def control(self, action, args, kwargs):
         # we convert the action into a mixedCase method name
         action_method = getattr(self, "action" + action.capitalize(), None)
@@ -142,10 +157,10 @@ class BuildNestingMixin:
 
 class ListResult(UserList):
 
-    __slots__ = ['offset', 'total', 'limit']
+    __slots__ = ['offset', 'total', 'limit', 'nextCursor']
 
     def __init__(self, values,
-                 offset=None, total=None, limit=None):
+                 offset=None, total=None, limit=None, nextCursor=None):
         super().__init__(values)
 
         # if set, this is the index in the overall results of the first element of
@@ -158,6 +173,10 @@ class ListResult(UserList):
         # if set, this is the limit, either from the user or the implementation
         self.limit = limit
 
+        # if set, this is the cursor of the next page, when paginating with a
+        # cursor
+        self.nextCursor = nextCursor
+
     def __repr__(self):
         return "ListResult(%r, offset=%r, total=%r, limit=%r)" % \
             (self.data, self.offset, self.total, self.limit)
@@ -78,6 +78,7 @@ class Builder(base.ResourceType):
     eventPathPatterns = """
         /builders/:builderid
     """
+    cacheable = True
 
     class EntityType(types.Entity):
         builderid = types.Integer()
@@ -186,6 +186,7 @@ class BuildRequest(base.ResourceType):
         /buildrequests/:buildrequestid
         /builders/:builderid/buildrequests/:buildrequestid
     """
+    cacheable = True
 
     class EntityType(types.Entity):
         buildrequestid = types.Integer()
@@ -288,5 +289,6 @@ class BuildRequest(base.ResourceType):
                 builderids=[buildrequest['builderid']],
                 external_idstring=buildset['external_idstring'],
                 parent_buildid=buildset['parent_buildid'],
-                parent_relationship=buildset['parent_relationship'])
+                parent_relationship=buildset['parent_relationship'],
+                priority=buildrequest['priority'])
         return res
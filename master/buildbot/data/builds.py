@@ -16,6 +16,7 @@
 from twisted.internet import defer
 
 from buildbot.data import base
+from buildbot.data import exceptions
 from buildbot.data import types
 from buildbot.data.resultspec import ResultSpec
 
@@ -142,11 +143,15 @@ class BuildsEndpoint(Db2DataMixin, base.BuildNestingMixin, base.Endpoint):
         /workers/n:workerid/builds
     """
     rootLinkName = 'builds'
+    cursorField = 'buildid'
 
     @defer.inlineCallbacks
     def get(self, resultSpec, kwargs):
         changeid = kwargs.get('changeid')
         if changeid is not None:
+            if resultSpec.cursor is not None:
+                raise exceptions.InvalidQueryError(
+                    "cannot paginate the builds of a change with a cursor")
             builds = yield self.master.db.builds.getBuildsForChange(changeid)
         else:
             # following returns None if no filter
@@ -195,6 +200,7 @@ class Build(base.ResourceType):
         /builds/:buildid
         /workers/:workerid/builds/:buildid
     """
+    cacheable = True
 
     class EntityType(types.Entity):
         buildid = types.Integer()
@@ -90,6 +90,7 @@ class BuildsetsEndpoint(Db2DataMixin, base.Endpoint):
         /buildsets
     """
     rootLinkName = 'buildsets'
+    cursorField = 'bsid'
 
     def get(self, resultSpec, kwargs):
         complete = resultSpec.popBooleanFilter('complete')
@@ -118,6 +119,7 @@ class Buildset(base.ResourceType):
     eventPathPatterns = """
         /buildsets/:bsid
     """
+    cacheable = True
 
     class EntityType(types.Entity):
         bsid = types.Integer()
@@ -137,7 +139,7 @@ class Buildset(base.ResourceType):
     @defer.inlineCallbacks
     def addBuildset(self, waited_for, scheduler=None, sourcestamps=None, reason='',
                     properties=None, builderids=None, external_idstring=None,
-                    parent_buildid=None, parent_relationship=None):
+                    parent_buildid=None, parent_relationship=None, priority=0):
         if sourcestamps is None:
             sourcestamps = []
         if properties is None:
@@ -150,7 +152,8 @@ class Buildset(base.ResourceType):
             properties=properties, builderids=builderids,
             waited_for=waited_for, external_idstring=external_idstring,
             submitted_at=epoch2datetime(submitted_at),
-            parent_buildid=parent_buildid, parent_relationship=parent_relationship)
+            parent_buildid=parent_buildid, parent_relationship=parent_relationship,
+            priority=priority)
 
         yield BuildRequestCollapser(self.master, list(brids.values())).collapse()
 
@@ -19,6 +19,8 @@ from twisted.internet import defer
 from twisted.python import log
 
 from buildbot.data import base
+from buildbot.data import exceptions
+from buildbot.data import resultspec
 from buildbot.data import sourcestamps
 from buildbot.data import types
 from buildbot.process import metrics
@@ -42,6 +44,19 @@ class FixerMixin:
         return change
     fieldMapping = {
         'changeid': 'changes.changeid',
+        'author': 'changes.author',
+        'committer': 'changes.committer',
+        'comments': 'changes.comments',
+        'revision': 'changes.revision',
+        'when_timestamp': 'changes.when_timestamp',
+        'branch': 'changes.branch',
+        'category': 'changes.category',
+        'revlink': 'changes.revlink',
+        'repository': 'changes.repository',
+        'project': 'changes.project',
+        'codebase': 'changes.codebase',
+        'files': resultspec.RelatedField('change_files', 'filename', 'changeid',
+                                         'changes.changeid'),
     }
 
 
@@ -68,9 +83,15 @@ class ChangesEndpoint(FixerMixin, base.BuildNestingMixin, base.Endpoint):
         /sourcestamps/n:ssid/changes
     """
     rootLinkName = 'changes'
+    cursorField = 'changeid'
+    # the changes read without a cursor come newest first
+    reversedWithoutCursor = True
 
     @defer.inlineCallbacks
     def get(self, resultSpec, kwargs):
+        if resultSpec is not None and resultSpec.cursor is not None and kwargs:
+            # only the whole collection is read with a query
+            raise exceptions.InvalidQueryError("cannot paginate these changes with a cursor")
         buildid = kwargs.get('buildid')
         if 'build_number' in kwargs:
             buildid = yield self.getBuildid(kwargs)
@@ -101,6 +122,7 @@ class Change(base.ResourceType):
     eventPathPatterns = """
         /changes/:changeid
     """
+    cacheable = True
 
     class EntityType(types.Entity):
         changeid = types.Integer()
@@ -45,9 +45,11 @@ class DataConnector(service.AsyncService):
         'buildbot.data.steps',
         'buildbot.data.logs',
         'buildbot.data.logchunks',
+        'buildbot.data.logmatches',
         'buildbot.data.buildsets',
         'buildbot.data.changes',
         'buildbot.data.changesources',
+        'buildbot.data.dbqueries',
         'buildbot.data.masters',
         'buildbot.data.sourcestamps',
         'buildbot.data.schedulers',
@@ -118,10 +120,15 @@ class DataConnector(service.AsyncService):
 
     @defer.inlineCallbacks
     def get(self, path, filters=None, fields=None, order=None,
-            limit=None, offset=None):
+            limit=None, offset=None, cursor=None):
         resultSpec = resultspec.ResultSpec(filters=filters, fields=fields,
                                            order=order, limit=limit, offset=offset)
         endpoint, kwargs = self.getEndpoint(path)
+        if cursor is not None:
+            if endpoint.cursorField is None:
+                raise exceptions.InvalidQueryError(
+                    "{} cannot be paginated with a cursor".format(endpoint))
+            resultSpec.paginateWithCursor(cursor, endpoint.cursorField)
         rv = yield endpoint.get(resultSpec, kwargs)
         if resultSpec:
             rv = resultSpec.apply(rv)
@@ -0,0 +1,85 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+from twisted.internet import defer
+
+from buildbot.data import base
+from buildbot.data import types
+
+
+def _us(seconds):
+    return int(round(seconds * 1000000))
+
+
+def histogram2Data(histogram):
+    return dict(total_us=_us(histogram.total),
+                max_us=_us(histogram.max),
+                p50_us=_us(histogram.percentile(0.5)),
+                p95_us=_us(histogram.percentile(0.95)),
+                p99_us=_us(histogram.percentile(0.99)),
+                histogram=list(histogram.buckets))
+
+
+def queryStats2Data(stats, pool):
+    return dict(name=stats.name,
+                pool=pool,
+                count=stats.duration.count,
+                failures=stats.failures,
+                saturated=stats.saturated,
+                duration=histogram2Data(stats.duration),
+                wait=histogram2Data(stats.wait))
+
+
+class DbQueriesEndpoint(base.Endpoint):
+
+    isCollection = True
+    pathPatterns = """
+        /dbqueries
+    """
+    rootLinkName = 'dbqueries'
+
+    def get(self, resultSpec, kwargs):
+        # these are the statistics of this master's own database thread pools
+        dbpool = self.master.db.pool
+        queries = [queryStats2Data(stats, 'primary')
+                   for stats in dbpool.stats.sites.values()]
+        if dbpool.replica is not None:
+            queries.extend(queryStats2Data(stats, 'replica')
+                           for stats in dbpool.replica.stats.sites.values())
+        return defer.succeed(queries)
+
+
+class DbQuery(base.ResourceType):
+
+    name = "dbquery"
+    plural = "dbqueries"
+    endpoints = [DbQueriesEndpoint]
+    keyFields = ['pool', 'name']
+
+    class EntityType(types.Entity):
+        name = types.String()
+        pool = types.String()
+        count = types.Integer()
+        failures = types.Integer()
+        saturated = types.Integer()
+        duration = types.Dict(total_us=types.Integer(), max_us=types.Integer(),
+                              p50_us=types.Integer(), p95_us=types.Integer(),
+                              p99_us=types.Integer(),
+                              histogram=types.List(of=types.Integer()))
+        wait = types.Dict(total_us=types.Integer(), max_us=types.Integer(),
+                          p50_us=types.Integer(), p95_us=types.Integer(),
+                          p99_us=types.Integer(),
+                          histogram=types.List(of=types.Integer()))
+    entityType = EntityType(name)
@@ -21,6 +21,7 @@ __all__ = [
     'SchedulerAlreadyClaimedError',
     'InvalidPathError',
     'InvalidControlException',
+    'InvalidQueryError',
 ]
 
 
@@ -34,3 +35,7 @@ class InvalidPathError(DataException):
 
 class InvalidControlException(DataException):
     "Action is not supported"
+
+
+class InvalidQueryError(DataException):
+    "A query argument was missing or invalid"
@@ -121,6 +121,62 @@ class RawLogChunkEndpoint(LogChunkEndpointBase):
                 'mime-type': 'text/html' if dbdict['type'] == 'h' else 'text/plain',
                 'filename': dbdict['slug']}
 
+    @defer.inlineCallbacks
+    def stream(self, resultSpec, kwargs):
+        logid, dbdict = yield self.getLogIdAndDbDictFromKwargs(kwargs)
+        if logid is None:
+            return None
+
+        if not dbdict:
+            dbdict = yield self.master.db.logs.getLog(logid)
+            if not dbdict:
+                return None
+
+        return {'stream': RawLogStream(self.master, logid, dbdict['type'],
+                                       dbdict['num_lines']),
+                'mime-type': 'text/html' if dbdict['type'] == 'h' else 'text/plain',
+                'filename': dbdict['slug']}
+
+
+class RawLogStream:
+
+    """
+    Read the content of a log a few chunks at a time, so that the whole log
+    never has to be held in memory.  Each call to C{read} returns a Deferred
+    firing with the next piece of the raw content, or None at the end of the log.
+    """
+
+    # number of chunks fetched from the database for each piece
+    chunksPerRead = 4
+
+    def __init__(self, master, logid, type, num_lines):
+        self.master = master
+        self.logid = logid
+        self.type = type
+        self.next_line = 0
+        self.last_line = num_lines - 1
+
+    @defer.inlineCallbacks
+    def read(self):
+        if self.next_line > self.last_line:
+            return None
+
+        content, read_last_line = yield self.master.db.logs.getLogLinesBatch(
+            self.logid, self.next_line, self.last_line, self.chunksPerRead)
+        if read_last_line is None:
+            # no more chunks, even though num_lines said otherwise
+            self.next_line = self.last_line + 1
+            return None
+
+        first = self.next_line == 0
+        self.next_line = read_last_line + 1
+        if self.type == 's':
+            # strip the stream prefix; like get(), omit the final newline
+            content = "\n".join([line[1:] for line in content.splitlines()])
+            if not first:
+                content = "\n" + content
+        return content
+
 
 class LogChunk(base.ResourceType):
 
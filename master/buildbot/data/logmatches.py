@@ -0,0 +1,84 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+from twisted.internet import defer
+
+from buildbot.data import base
+from buildbot.data import exceptions
+from buildbot.data import types
+
+
+class LogMatchesEndpoint(base.Endpoint):
+
+    isCollection = True
+    pathPatterns = """
+        /logs/search
+    """
+    maxResults = 1000
+
+    def _popStartedAt(self, resultSpec):
+        # the database filters on an inclusive range of step start times
+        min_started_at = max_started_at = None
+        for op, adjust in (('ge', 0), ('gt', 1)):
+            value = resultSpec.popOneFilter('started_at', op)
+            if value is not None:
+                min_started_at = max(min_started_at or 0, value + adjust)
+        for op, adjust in (('le', 0), ('lt', -1)):
+            value = resultSpec.popOneFilter('started_at', op)
+            if value is not None:
+                if max_started_at is None:
+                    max_started_at = value + adjust
+                else:
+                    max_started_at = min(max_started_at, value + adjust)
+        return min_started_at, max_started_at
+
+    @defer.inlineCallbacks
+    def get(self, resultSpec, kwargs):
+        query = resultSpec.popOneFilter('content', 'contains')
+        if not query:
+            raise exceptions.InvalidQueryError(
+                "searching logs requires a content__contains filter")
+        builderid = resultSpec.popIntegerFilter('builderid')
+        min_started_at, max_started_at = self._popStartedAt(resultSpec)
+
+        limit = self.maxResults
+        if not resultSpec.filters and resultSpec.limit is not None:
+            limit = min(limit, resultSpec.limit + (resultSpec.offset or 0))
+
+        try:
+            matches = yield self.master.db.logs.searchLogs(
+                query, builderid=builderid, min_started_at=min_started_at,
+                max_started_at=max_started_at, limit=limit)
+        except ValueError as e:
+            raise exceptions.InvalidQueryError(str(e)) from e
+        return matches
+
+
+class LogMatch(base.ResourceType):
+
+    name = "logmatch"
+    plural = "logmatches"
+    endpoints = [LogMatchesEndpoint]
+    keyFields = ['logid', 'line']
+
+    class EntityType(types.Entity):
+        logid = types.Integer()
+        stepid = types.Integer()
+        buildid = types.Integer()
+        builderid = types.Integer()
+        started_at = types.NoneOk(types.DateTime())
+        line = types.Integer()
+        content = types.String()
+    entityType = EntityType(name)
@@ -100,6 +100,7 @@ class Log(base.ResourceType):
         /logs/:logid
         /steps/:stepid/logs/:slug
     """
+    cacheable = True
 
     class EntityType(types.Entity):
         logid = types.Integer()
@@ -18,6 +18,8 @@ import sqlalchemy as sa
 from twisted.python import log
 
 from buildbot.data import base
+from buildbot.data import exceptions
+from buildbot.process import metrics
 
 
 class FieldBase:
@@ -120,6 +122,32 @@ class Filter(FieldBase):
     """
 
 
+class RelatedField:
+
+    """
+    Map a list field whose values are the C{column} of the rows of another
+    C{table}, like the files of the changes, for the C{fieldMapping} of
+    L{ResultSpec}.  These rows are the ones whose C{foreignKey} column is
+    equal to the C{key} column of the query.
+
+    The C{contains} filters on such a field are done with an EXISTS
+    subquery; the field cannot be ordered on in SQL.
+    """
+
+    __slots__ = ['table', 'column', 'foreignKey', 'key']
+
+    def __init__(self, table, column, foreignKey, key):
+        self.table = table
+        self.column = column
+        self.foreignKey = foreignKey
+        self.key = key
+
+    def getFilterClause(self, key, values):
+        tbl = key.table.metadata.tables[self.table]
+        return sa.exists().where(sa.and_(tbl.c[self.foreignKey] == key,
+                                         tbl.c[self.column].in_(values)))
+
+
 class NoneComparator:
     """
     Object which wraps 'None' when doing comparisons in sorted().
@@ -180,26 +208,30 @@ class ReverseComparator:
 class ResultSpec:
 
     __slots__ = ['filters', 'fields', 'properties',
-                 'order', 'limit', 'offset', 'fieldMapping']
+                 'order', 'limit', 'offset', 'cursor', 'nextCursor', 'fieldMapping']
 
     def __init__(self, filters=None, fields=None, properties=None, order=None,
-                 limit=None, offset=None):
+                 limit=None, offset=None, cursor=None):
         self.filters = filters or []
         self.properties = properties or []
         self.fields = fields
         self.order = order
         self.limit = limit
         self.offset = offset
+        # the values of the order fields of the last item of the previous page,
+        # or an empty list for the first page, when paginating with a cursor
+        self.cursor = cursor
+        self.nextCursor = None
         self.fieldMapping = {}
 
     def __repr__(self):
         return ("ResultSpec(**{{'filters': {}, 'fields': {}, 'properties': {}, "
-                "'order': {}, 'limit': {}, 'offset': {}").format(
+                "'order': {}, 'limit': {}, 'offset': {}, 'cursor': {}").format(
                     self.filters, self.fields, self.properties, self.order,
-                    self.limit, self.offset) + "})"
+                    self.limit, self.offset, self.cursor) + "})"
 
     def __eq__(self, b):
-        for i in ['filters', 'fields', 'properties', 'order', 'limit', 'offset']:
+        for i in ['filters', 'fields', 'properties', 'order', 'limit', 'offset', 'cursor']:
             if getattr(self, i) != getattr(b, i):
                 return False
         return True
@@ -255,6 +287,26 @@ class ResultSpec:
     def removePagination(self):
         self.limit = self.offset = None
 
+    def paginateWithCursor(self, cursor, keyField):
+        """
+        Return the page after C{cursor}, or the first page if it is an empty
+        list.  C{keyField} is appended to the order, if needed, to make it
+        total.
+        """
+        order = list(self.order or ())
+        if keyField not in [o.lstrip('-') for o in order]:
+            reverse = bool(order) and order[0].startswith('-')
+            order.append(('-' if reverse else '') + keyField)
+        self.order = tuple(order)
+        self.cursor = cursor
+
+    def reverseOrder(self, keyField):
+        """
+        Reverse the order, which is C{keyField} if it is not set.
+        """
+        self.order = tuple(o[1:] if o.startswith('-') else '-' + o
+                           for o in self.order or (keyField,))
+
     def removeOrder(self):
         self.order = None
 
@@ -266,31 +318,66 @@ class ResultSpec:
         del self.fields[i]
         return True
 
-    def findColumn(self, query, field):
-        # will throw key error if field not in mapping
-        mapped = self.fieldMapping[field]
+    def findMappedColumn(self, query, mapped):
         for col in query.inner_columns:
             if str(col) == mapped:
                 return col
-        raise KeyError("unable to find field {} in query".format(field))
+        # the columns of the tables the query selects from can be filtered and
+        # ordered on, even if they are not selected
+        for from_obj in query.froms:
+            for col in from_obj.columns:
+                if str(col) == mapped:
+                    return col
+        return None
+
+    def findColumn(self, query, field):
+        # will throw key error if field not in mapping
+        mapped = self.fieldMapping[field]
+        col = None
+        if isinstance(mapped, str):
+            col = self.findMappedColumn(query, mapped)
+        if col is None:
+            raise KeyError("unable to find field {} in query".format(field))
+        return col
 
     def applyFilterToSQLQuery(self, query, f):
         field = f.field
+        mapped = self.fieldMapping[field]
+        if isinstance(mapped, RelatedField):
+            key = self.findMappedColumn(query, mapped.key)
+            if key is None or f.op != 'contains':
+                raise KeyError("unable to filter on field {} in query".format(field))
+            return query.where(mapped.getFilterClause(key, f.values))
         col = self.findColumn(query, field)
         # as sqlalchemy is overriding python operators, we can just use the same
         # python code generated by the filter
         return query.where(f.getOperator(sqlMode=True)(col, f.values))
 
-    def applyOrderToSQLQuery(self, query, o):
+    def findOrderColumn(self, query, o):
         reverse = False
         if o.startswith('-'):
             reverse = True
             o = o[1:]
-        col = self.findColumn(query, o)
+        return self.findColumn(query, o), reverse
+
+    def applyOrderToSQLQuery(self, query, o):
+        col, reverse = self.findOrderColumn(query, o)
         if reverse:
             col = col.desc()
         return query.order_by(col)
 
+    def applyCursorToSQLQuery(self, query, columns):
+        if len(self.cursor) != len(columns):
+            raise exceptions.InvalidQueryError("invalid cursor for this order")
+        # select the rows which come after the cursor: the ones which are
+        # after it in the first order column, or equal in that one and after it
+        # in the second order column, and so on
+        after = []
+        for i, ((col, reverse), value) in enumerate(zip(columns, self.cursor)):
+            equal = [c == v for (c, _), v in zip(columns[:i], self.cursor)]
+            after.append(sa.and_(*(equal + [col < value if reverse else col > value])))
+        return query.where(sa.or_(*after))
+
     def applyToSQLQuery(self, query):
         filters = self.filters
         order = self.order
@@ -318,14 +405,42 @@ class ResultSpec:
 
         # we cannot limit in sql if there is missing filtering or ordering
         if unmatched_filters or unmatched_order:
+            if self.cursor is not None:
+                raise exceptions.InvalidQueryError(
+                    "cannot paginate with a cursor when filtering or ordering on {}".format(
+                        ', '.join([f.field for f in unmatched_filters] + unmatched_order)))
+            metrics.MetricCountEvent.log('ResultSpec.unbacked_queries', 1)
+            for field in set([f.field for f in unmatched_filters] +
+                             [o.lstrip('-') for o in unmatched_order]):
+                metrics.MetricCountEvent.log('ResultSpec.unbacked_field.' + field, 1)
             if self.offset is not None or self.limit is not None:
+                metrics.MetricCountEvent.log('ResultSpec.unbacked_limited_queries', 1)
                 log.msg("Warning: limited data api query is not backed by db "
                         "because of following filters",
                         unmatched_filters, unmatched_order)
             self.filters = unmatched_filters
             self.order = tuple(unmatched_order)
             return query, None
-        count_query = sa.select([sa.func.count()]).select_from(query.alias('query'))
+
+        if self.cursor is not None:
+            if not order:
+                raise exceptions.InvalidQueryError(
+                    "cannot paginate with a cursor without an order")
+            # the position of the rows is given by their order columns, which
+            # must have a value and be selected
+            columns = [self.findOrderColumn(query, o) for o in order]
+            selected = {str(col) for col in query.inner_columns}
+            for col, _ in columns:
+                if getattr(col, 'nullable', True) or str(col) not in selected:
+                    raise exceptions.InvalidQueryError(
+                        "cannot paginate with a cursor when ordering on {}".format(col.name))
+            if self.cursor:
+                query = self.applyCursorToSQLQuery(query, columns)
+            # the rows are not counted: the next cursor tells whether there
+            # are more
+            count_query = None
+        else:
+            count_query = sa.select([sa.func.count()]).select_from(query.alias('query'))
         self.order = None
         self.filters = []
         # finally, slice out the limit/offset
@@ -340,12 +455,19 @@ class ResultSpec:
         return query, count_query
 
     def thd_execute(self, conn, q, dictFromRow):
-        offset, limit = self.offset, self.limit
+        offset, limit, order = self.offset, self.limit, self.order
+        cursor = self.cursor
         q, qc = self.applyToSQLQuery(q)
         res = conn.execute(q)
-        rv = [dictFromRow(row) for row in res.fetchall()]
-
-        if qc is not None and (offset or limit):
+        rows = res.fetchall()
+        rv = [dictFromRow(row) for row in rows]
+
+        if cursor is not None:
+            self.cursor = None
+            # a full page may not be the last one
+            if limit is not None and rows and len(rows) == limit:
+                self.nextCursor = [rows[-1][self.findOrderColumn(q, o)[0]] for o in order]
+        elif qc is not None and (offset or limit):
             total = conn.execute(qc).scalar()
             rv = base.ListResult(rv)
             rv.offset, rv.total, rv.limit = offset, total, limit
@@ -365,6 +487,10 @@ class ResultSpec:
         else:
             fields = None
 
+        if self.cursor is not None and not isinstance(data, dict):
+            raise exceptions.InvalidQueryError(
+                "cannot paginate this collection with a cursor")
+
         if isinstance(data, dict):
             # item details
             if fields:
@@ -441,6 +567,7 @@ class ResultSpec:
             rv = base.ListResult(data)
             rv.offset, rv.total = offset, total
             rv.limit = limit
+            rv.nextCursor = self.nextCursor
             return rv
 
 
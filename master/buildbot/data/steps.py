@@ -101,6 +101,7 @@ class Step(base.ResourceType):
         /builds/:buildid/steps/:stepid
         /steps/:stepid
     """
+    cacheable = True
 
     class EntityType(types.Entity):
         stepid = types.Integer()
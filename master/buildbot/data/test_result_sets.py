@@ -47,11 +47,23 @@ class TestResultSetsEndpoint(Db2DataMixin, base.BuildNestingMixin, base.Endpoint
         /builds/n:buildid/test_result_sets
         /steps/n:stepid/test_result_sets
         """
+    fieldMapping = {
+        'test_result_setid': 'test_result_sets.id',
+        'builderid': 'test_result_sets.builderid',
+        'buildid': 'test_result_sets.buildid',
+        'stepid': 'test_result_sets.stepid',
+        'description': 'test_result_sets.description',
+        'category': 'test_result_sets.category',
+        'value_unit': 'test_result_sets.value_unit',
+        'tests_passed': 'test_result_sets.tests_passed',
+        'tests_failed': 'test_result_sets.tests_failed',
+    }
 
     @defer.inlineCallbacks
     def get(self, resultSpec, kwargs):
 
         complete = resultSpec.popBooleanFilter('complete')
+        resultSpec.fieldMapping = self.fieldMapping
         if 'stepid' in kwargs:
             step_dbdict = yield self.master.db.steps.getStep(kwargs['stepid'])
             build_dbdict = yield self.master.db.builds.getBuild(step_dbdict['buildid'])
@@ -105,6 +117,7 @@ class TestResultSet(base.ResourceType):
     eventPathPatterns = """
         /test_result_sets/:test_result_setid
     """
+    cacheable = True
 
     class EntityType(types.Entity):
         test_result_setid = types.Integer()
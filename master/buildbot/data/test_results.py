@@ -42,6 +42,17 @@ class TestResultsEndpoint(Db2DataMixin, base.Endpoint):
     pathPatterns = """
         /test_result_sets/n:test_result_setid/results
         """
+    cursorField = 'test_resultid'
+    fieldMapping = {
+        'test_resultid': 'test_results.id',
+        'builderid': 'test_results.builderid',
+        'test_result_setid': 'test_results.test_result_setid',
+        'test_name': 'test_names.name',
+        'test_code_path': 'test_code_paths.path',
+        'line': 'test_results.line',
+        'duration_ns': 'test_results.duration_ns',
+        'value': 'test_results.value',
+    }
 
     @defer.inlineCallbacks
     def get(self, resultSpec, kwargs):
@@ -51,6 +62,7 @@ class TestResultsEndpoint(Db2DataMixin, base.Endpoint):
         if set_dbdict is None:
             return []
 
+        resultSpec.fieldMapping = self.fieldMapping
         result_dbdicts = \
             yield self.master.db.test_results.getTestResults(set_dbdict['builderid'],
                                                              kwargs['test_result_setid'],
@@ -21,6 +21,11 @@ import re
 from buildbot import util
 from buildbot.util import bytes2unicode
 
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
 
 class Type:
 
@@ -397,3 +402,17 @@ class Entity(Type):
                 'properties': {
                     maybeNoneOrList(k, v): {'type': v.ramlname, 'description': ''}
                     for k, v in self.fields.items()}}
+
+
+# The values described by these types are sent to the clients as JSON, or as
+# MessagePack when the clients ask for it and msgpack is installed.  Both
+# formats encode the values they have no native type for with util.toJson, so
+# that a DateTime is an epoch in both; MessagePack keeps the bytes of a Binary
+# value, which JSON cannot represent.
+
+def dumpsMsgpack(data):
+    return msgpack.packb(data, default=util.toJson, use_bin_type=True)
+
+
+def loadsMsgpack(data):
+    return msgpack.unpackb(data, raw=False)
@@ -158,3 +158,19 @@ class CachedMethod:
 
 def cached(cache_name):
     return lambda method: CachedMethod(cache_name, method)
+
+
+# qualified names of the connector component methods whose queries may run on
+# the read replica
+replica_reads = set()
+
+
+def replica_read(method):
+    """
+    Mark a connector component method as a read which can tolerate some
+    staleness, so that its queries run on the read replica when one is
+    configured.  Methods used on read-after-write paths, such as those of the
+    build request distributor, must not be marked.
+    """
+    replica_reads.add(method.__qualname__)
+    return method
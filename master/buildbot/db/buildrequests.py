@@ -133,6 +133,38 @@ class BuildRequestsConnectorComponent(base.DBConnectorComponent):
         res = yield self.db.pool.do(thd)
         return res
 
+    # returns a Deferred that returns a value
+    def getOldestRequestTimes(self, builderids):
+        d = self.getPrioritiesAndOldestRequestTimes(builderids)
+
+        @d.addCallback
+        def onlyTimes(rv):
+            return {builderid: submitted_at
+                    for builderid, (_, submitted_at) in rv.items()}
+        return d
+
+    # returns a Deferred that returns a value
+    def getPrioritiesAndOldestRequestTimes(self, builderids):
+        def thd(conn):
+            reqs_tbl = self.db.model.buildrequests
+            claims_tbl = self.db.model.buildrequest_claims
+            from_clause = reqs_tbl.outerjoin(claims_tbl,
+                                             reqs_tbl.c.id == claims_tbl.c.brid)
+            rv = {}
+            for batch in self.doBatch(builderids, 100):
+                q = sa.select([reqs_tbl.c.builderid,
+                               sa.func.max(reqs_tbl.c.priority),
+                               sa.func.min(reqs_tbl.c.submitted_at)])
+                q = q.select_from(from_clause)
+                q = q.where(reqs_tbl.c.builderid.in_(batch))
+                q = q.where((claims_tbl.c.claimed_at == NULL) &
+                            (reqs_tbl.c.complete == 0))
+                q = q.group_by(reqs_tbl.c.builderid)
+                for builderid, priority, submitted_at in conn.execute(q).fetchall():
+                    rv[builderid] = (priority, epoch2datetime(submitted_at))
+            return rv
+        return self.db.pool.do(thd)
+
     @defer.inlineCallbacks
     def claimBuildRequests(self, brids, claimed_at=None):
         if claimed_at is not None:
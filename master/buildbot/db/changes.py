@@ -229,6 +229,18 @@ class ChangesConnectorComponent(base.DBConnectorComponent):
             return self._chdict_from_change_row_thd(conn, row)
         return self.db.pool.do(thd)
 
+    # returns a Deferred that returns a value
+    def getSourceStampIdsWithChanges(self, sourcestampids):
+        def thd(conn):
+            changes_tbl = self.db.model.changes
+            rv = set()
+            for batch in self.doBatch(sourcestampids, 100):
+                q = sa.select([changes_tbl.c.sourcestampid]).distinct()
+                q = q.where(changes_tbl.c.sourcestampid.in_(batch))
+                rv.update(row.sourcestampid for row in conn.execute(q).fetchall())
+            return rv
+        return self.db.pool.do(thd)
+
     # returns a Deferred that returns a value
     def getChangeUids(self, changeid):
         assert changeid >= 0
@@ -245,6 +257,7 @@ class ChangesConnectorComponent(base.DBConnectorComponent):
     def _getDataFromRow(self, row):
         return row.changeid
 
+    @base.replica_read
     def getChanges(self, resultSpec=None):
         def thd(conn):
             # get the changeids from the 'changes' table
@@ -252,7 +265,11 @@ class ChangesConnectorComponent(base.DBConnectorComponent):
             q = sa.select([changes_tbl.c.changeid])
 
             if resultSpec is not None:
-                return reversed(resultSpec.thd_execute(conn, q, self._getDataFromRow))
+                paginated = resultSpec.cursor is not None
+                changeids = resultSpec.thd_execute(conn, q, self._getDataFromRow)
+                # the pages read with a cursor follow each other in the order
+                # of the query
+                return changeids if paginated else reversed(changeids)
 
             rp = conn.execute(q)
             changeids = [self._getDataFromRow(row) for row in rp]
@@ -302,30 +319,14 @@ class ChangesConnectorComponent(base.DBConnectorComponent):
         if not changeHorizon:
             return None
 
-        def thd(conn):
-            changes_tbl = self.db.model.changes
-
-            # First, get the list of changes to delete.  This could be written
-            # as a subquery but then that subquery would be run for every
-            # table, which is very inefficient; also, MySQL's subquery support
-            # leaves much to be desired, and doesn't support this particular
-            # form.
-            q = sa.select([changes_tbl.c.changeid],
-                          order_by=[sa.desc(changes_tbl.c.changeid)],
-                          offset=changeHorizon)
-            res = conn.execute(q)
-            ids_to_delete = [r.changeid for r in res]
-
-            # and delete from all relevant tables, in dependency order
-            for table_name in ('scheduler_changes', 'change_files',
-                               'change_properties', 'changes', 'change_users'):
-                remaining = ids_to_delete[:]
-                while remaining:
-                    batch, remaining = remaining[:100], remaining[100:]
-                    table = self.db.model.metadata.tables[table_name]
-                    conn.execute(
-                        table.delete(table.c.changeid.in_(batch)))
-        yield self.db.pool.do(thd)
+        # the changes are deleted in small batches, so that the tables are
+        # not locked for long
+        after_changeid = 0
+        while True:
+            res = yield self.db.retention.pruneChanges(changeHorizon, after_changeid)
+            if res['last_id'] is None:
+                return None
+            after_changeid = res['last_id']
 
     def _chdict_from_change_row_thd(self, conn, ch_row):
         # This method must be run in a db.pool thread, and returns a chdict
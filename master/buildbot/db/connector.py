@@ -34,6 +34,7 @@ from buildbot.db import logs
 from buildbot.db import masters
 from buildbot.db import model
 from buildbot.db import pool
+from buildbot.db import retention
 from buildbot.db import schedulers
 from buildbot.db import sourcestamps
 from buildbot.db import state
@@ -82,6 +83,10 @@ class DBConnector(service.ReconfigurableServiceMixin,
         # set up components
         self._engine = None  # set up in reconfigService
         self.pool = None  # set up in reconfigService
+        self._read_engine = None  # set up in reconfigService, if there is a replica
+        self.read_pool = None
+        self.replica_timer = None
+        self._replica_objectid = None
 
     @defer.inlineCallbacks
     def setServiceParent(self, p):
@@ -105,6 +110,7 @@ class DBConnector(service.ReconfigurableServiceMixin,
         self.steps = steps.StepsConnectorComponent(self)
         self.tags = tags.TagsConnectorComponent(self)
         self.logs = logs.LogsConnectorComponent(self)
+        self.retention = retention.RetentionConnectorComponent(self)
         self.test_results = test_results.TestResultsConnectorComponent(self)
         self.test_result_sets = test_result_sets.TestResultSetsConnectorComponent(self)
 
@@ -126,6 +132,23 @@ class DBConnector(service.ReconfigurableServiceMixin,
         self.pool = pool.DBThreadPool(
             self._engine, reactor=self.master.reactor, verbose=verbose)
 
+        read_url = self.master.config.db.get('db_read_url')
+        if read_url is not None:
+            log.msg("Setting up database replica with URL %r"
+                    % util.stripUrlPassword(read_url))
+            self._read_engine = enginestrategy.create_engine(read_url,
+                                                             basedir=self.basedir)
+            self.read_pool = pool.DBThreadPool(
+                self._read_engine, reactor=self.master.reactor, verbose=verbose)
+            self.pool.replica = self.read_pool
+
+            # the lag is measured with a precision of the check period
+            self.replica_max_lag = self.master.config.db['db_read_max_lag']
+            self.replica_timer = internet.TimerService(self.replica_max_lag / 2,
+                                                       self._checkReplicaLag)
+            self.replica_timer.clock = self.master.reactor
+            yield self.replica_timer.setServiceParent(self)
+
         # make sure the db is up to date, unless specifically asked not to
         if check_version:
             if db_url == 'sqlite://':
@@ -139,12 +162,52 @@ class DBConnector(service.ReconfigurableServiceMixin,
                     log.msg(l)
                 raise exceptions.DatabaseNotReadyError()
 
+    @defer.inlineCallbacks
+    def stopService(self):
+        # write the log content which is still buffered
+        if self.pool is not None:
+            yield self.logs.flushAppendBuffers()
+        yield super().stopService()
+
     def reconfigServiceWithBuildbotConfig(self, new_config):
         # double-check -- the master ensures this in config checks
         assert self.configured_url == new_config.db['db_url']
 
         return super().reconfigServiceWithBuildbotConfig(new_config)
 
+    @defer.inlineCallbacks
+    def _checkReplicaLag(self):
+        """
+        Write a heartbeat to the database and read back the last one which
+        reached the replica: the reads are only routed to the replica while
+        that heartbeat is less than C{db_read_max_lag} seconds old.
+
+        @returns: Deferred
+        """
+        try:
+            if self._replica_objectid is None:
+                self._replica_objectid = yield self.state.getObjectId(
+                    self.master.name, 'buildbot.db.connector.DBConnector')
+            objectid = self._replica_objectid
+
+            now = self.master.reactor.seconds()
+            yield self.state.setState(objectid, 'replica_heartbeat', now)
+
+            def thd(conn):
+                return self.state.thdGetState(conn, objectid, 'replica_heartbeat',
+                                              default=None)
+            heartbeat = yield self.read_pool.do(thd)
+            usable = heartbeat is not None and now - heartbeat < self.replica_max_lag
+        except Exception as e:
+            log.err(e, 'while checking the lag of the database replica')
+            usable = False
+
+        if usable != self.pool.replica_usable:
+            log.msg("Database replica is {}".format(
+                "up to date, reading from it" if usable else
+                "lagging behind, reading from the primary database"))
+            self.pool.replica_usable = usable
+
     def _doCleanup(self):
         """
         Perform any periodic database cleanup tasks.
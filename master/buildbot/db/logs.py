@@ -14,6 +14,9 @@
 # Copyright Buildbot Team Members
 
 import bz2
+import hashlib
+import re
+import struct
 import zlib
 
 import sqlalchemy as sa
@@ -22,6 +25,7 @@ from twisted.internet import defer
 from twisted.python import log
 
 from buildbot.db import base
+from buildbot.util import epoch2datetime
 
 try:
     # lz4 > 0.9.0
@@ -40,6 +44,14 @@ except ImportError:
         def read_lz4(data):
             return data
 
+try:
+    import zstandard as zstd
+except ImportError:  # pragma: no cover
+    # config.py actually forbid this code path
+    zstd = None
+
+ZSTD_LEVEL = 9
+
 
 def dumps_gzip(data):
     return zlib.compress(data, 9)
@@ -57,6 +69,61 @@ def read_bz2(data):
     return bz2.decompress(data)
 
 
+def dumps_zstd(data, dictionary=None):
+    return zstd.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dictionary).compress(data)
+
+
+def read_zstd(data, dictionary=None):
+    return zstd.ZstdDecompressor(dict_data=dictionary).decompress(data)
+
+
+def dumps_line_offsets(chunk):
+    # index the byte offsets at which the lines of the chunk, but the first
+    # one, begin; a chunk of a single line needs no index
+    offsets = []
+    i = chunk.find(b'\n')
+    while i != -1:
+        offsets.append(i + 1)
+        i = chunk.find(b'\n', i + 1)
+    if not offsets:
+        return None
+    return struct.pack('<%dI' % len(offsets), *offsets)
+
+
+def read_line_offsets(data):
+    return struct.unpack('<%dI' % (len(data) // 4), data)
+
+
+# the search terms of a log are its lowercased words of at least 3 letters,
+# digits or underscores, stored as a 31-bit hash
+_search_term_re = re.compile(rb'[a-z0-9_]{3,}')
+_stdio_prefix_re = re.compile(rb'^.', re.MULTILINE)
+MAX_SEARCH_TERM_LENGTH = 64
+
+
+def search_terms(data, limit=None):
+    # return the set of the (at most limit) search terms in data, as bytes
+    terms = set()
+    for mo in _search_term_re.finditer(data.lower()):
+        terms.add(zlib.crc32(mo.group()[:MAX_SEARCH_TERM_LENGTH]) & 0x7fffffff)
+        if limit is not None and len(terms) >= limit:
+            break
+    return terms
+
+
+class _AppendBuffer:
+    # the appends to a log which are not written to the database yet
+
+    def __init__(self, num_lines):
+        self.num_lines = num_lines  # including the buffered lines
+        self.flushed_lines = num_lines
+        self.contents = []
+        self.size = 0
+        self.timer = None
+        self.failure = None
+        self.lock = defer.DeferredLock()
+
+
 class LogsConnectorComponent(base.DBConnectorComponent):
 
     # Postgres and MySQL will both allow bigger sizes than this.  The limit
@@ -67,11 +134,42 @@ class LogsConnectorComponent(base.DBConnectorComponent):
     COMPRESSION_MODE = {"raw": {"id": 0, "dumps": lambda x: x, "read": lambda x: x},
                         "gz": {"id": 1, "dumps": dumps_gzip, "read": read_gzip},
                         "bz2": {"id": 2, "dumps": dumps_bz2, "read": read_bz2},
-                        "lz4": {"id": 3, "dumps": dumps_lz4, "read": read_lz4}}
+                        "lz4": {"id": 3, "dumps": dumps_lz4, "read": read_lz4},
+                        "zstd": {"id": 4, "dumps": dumps_zstd, "read": read_zstd}}
     COMPRESSION_BYID = dict((x["id"], x) for x in COMPRESSION_MODE.values())
     total_raw_bytes = 0
     total_compressed_bytes = 0
 
+    # zstd chunks are compressed with a dictionary trained from the recent
+    # chunks of the builder's logs.  The ID of the dictionary is recorded in
+    # the zstd frame header, and is the ID of its row in logchunk_dictionaries.
+    ZSTD_DICTIONARY_SIZE = 64 * 1024
+    ZSTD_DICTIONARY_SAMPLES = 2000  # number of recent chunks to train from
+    ZSTD_DICTIONARY_MAX_AGE = 24 * 3600  # train a new dictionary after this
+    ZSTD_DICTIONARY_CHECK_INTERVAL = 600  # look for newer dictionaries this often
+    ZSTD_DICTIONARY_RETRY = 3600  # minimum time between two trainings
+    MAX_CACHED_LOG_BUILDERIDS = 1000
+
+    # when c['logSearchIndex'] is set, the distinct terms of each chunk are
+    # indexed in log_search_terms, up to this many so that indexing a chunk
+    # has a bounded cost.  A chunk with more terms is indexed with the single
+    # TRUNCATED_SEARCH_TERMS term instead, which cannot be the hash of a word,
+    # and is scanned by every search.
+    MAX_SEARCH_TERMS_PER_CHUNK = 1000
+    TRUNCATED_SEARCH_TERMS = -1
+    MAX_SEARCH_QUERY_TERMS = 8  # at most this many terms are looked up
+    MAX_SEARCH_CANDIDATES = 1000  # at most this many chunks are read per search
+
+    def __init__(self, connector):
+        super().__init__(connector)
+        self._zstd_dictionaries = {}  # { dictionaryid : ZstdCompressionDict }
+        # { builderid : (dictionaryid, created_at, checked_at) }
+        self._builder_dictionaries = {}
+        self._zstd_trainings = {}  # { builderid : time of last training }
+        self._log_builderids = {}  # { logid : builderid }
+        self._log_types = {}  # { logid : type }
+        self._append_buffers = {}  # { logid : _AppendBuffer }
+
     # returns a Deferred that returns a value
     def _getLog(self, whereclause):
         def thd_getLog(conn):
@@ -105,40 +203,129 @@ class LogsConnectorComponent(base.DBConnectorComponent):
             return [self._logdictFromRow(row) for row in res.fetchall()]
         return self.db.pool.do(thdGetLogs)
 
-    # returns a Deferred that returns a value
-    def getLogLines(self, logid, first_line, last_line):
-        def thdGetLogLines(conn):
-            # get a set of chunks that completely cover the requested range
-            tbl = self.db.model.logchunks
+    def _thdGetLogLines(self, conn, logid, first_line, last_line, max_chunks=None):
+        while True:
+            try:
+                rv = self._thdTryGetLogLines(conn, logid, first_line, last_line, max_chunks)
+            except KeyError:
+                # the content of a chunk in the log storage may have been
+                # deleted after the chunk was gathered with others: try again
+                # once, so that content which is really missing still fails
+                rv = self._thdTryGetLogLines(conn, logid, first_line, last_line, max_chunks)
+            if rv is not None:
+                return rv
+
+    def _thdTryGetLogLines(self, conn, logid, first_line, last_line, max_chunks):
+        # get a set of chunks that completely cover the requested range,
+        # without their content
+        tbl = self.db.model.logchunks
+        q = sa.select([tbl.c.first_line, tbl.c.last_line, tbl.c.compressed,
+                       tbl.c.line_offsets, tbl.c.content_key,
+                       self._contentLength(tbl).label('length')])
+        q = q.where(tbl.c.logid == logid)
+        q = q.where(tbl.c.first_line <= last_line)
+        q = q.where(tbl.c.last_line >= first_line)
+        q = q.order_by(tbl.c.first_line)
+        if max_chunks is not None:
+            q = q.limit(max_chunks)
+        chunks = conn.execute(q).fetchall()
+        if not chunks:
+            return '', None
+
+        # then fetch their content.  Thanks to the line index, only the
+        # requested bytes of the uncompressed chunks are read, be they in the
+        # database or in the log storage.
+        contents = {}
+        whole_chunks = {}
+        for chunk in chunks:
+            skip_head = max(0, first_line - chunk.first_line)
+            skip_tail = max(0, chunk.last_line - last_line)
+            if ((skip_head or skip_tail) and chunk.line_offsets is not None and
+                    chunk.compressed == self.COMPRESSION_MODE["raw"]["id"]):
+                start, end = self._lineOffsetsRange(chunk.line_offsets, chunk.length,
+                                                    skip_head, skip_tail)
+                if chunk.content_key is not None:
+                    contents[chunk.first_line] = self._getLogStorage().thdGet(
+                        chunk.content_key, start, end)
+                    continue
+                q = sa.select([sa.func.substr(tbl.c.content, start + 1, end - start)])
+                q = q.where(tbl.c.logid == logid)
+                q = q.where(tbl.c.first_line == chunk.first_line)
+                q = q.where(tbl.c.last_line == chunk.last_line)
+                res = conn.execute(q)
+                row = res.fetchone()
+                res.close()
+                if row is None:
+                    # the chunk was gathered with others meanwhile
+                    return None
+                contents[chunk.first_line] = row[0]
+            else:
+                whole_chunks[chunk.first_line] = (chunk, skip_head, skip_tail)
+
+        if whole_chunks:
             q = sa.select([tbl.c.first_line, tbl.c.last_line,
-                           tbl.c.content, tbl.c.compressed])
+                           tbl.c.content, tbl.c.content_key, tbl.c.compressed])
             q = q.where(tbl.c.logid == logid)
-            q = q.where(tbl.c.first_line <= last_line)
-            q = q.where(tbl.c.last_line >= first_line)
-            q = q.order_by(tbl.c.first_line)
-            rv = []
-            for row in conn.execute(q):
+            q = q.where(tbl.c.first_line.in_(list(whole_chunks)))
+            for row in conn.execute(q).fetchall():
+                chunk, skip_head, skip_tail = whole_chunks[row.first_line]
+                if row.last_line != chunk.last_line:
+                    return None
                 # Retrieve associated "reader" and extract the data
-                # Note that row.content is stored as bytes, and our caller expects unicode
-                data = self.COMPRESSION_BYID[
-                    row.compressed]["read"](row.content)
-                content = data.decode('utf-8')
-
-                if row.first_line < first_line:
-                    idx = -1
-                    count = first_line - row.first_line
-                    for _ in range(count):
-                        idx = content.index('\n', idx + 1)
-                    content = content[idx + 1:]
-                if row.last_line > last_line:
-                    idx = len(content) + 1
-                    count = row.last_line - last_line
-                    for _ in range(count):
-                        idx = content.rindex('\n', 0, idx)
-                    content = content[:idx]
-                rv.append(content)
-            return '\n'.join(rv) + '\n' if rv else ''
-        return self.db.pool.do(thdGetLogLines)
+                data = self.thdReadChunk(conn, row)
+                if skip_head or skip_tail:
+                    data = self._thdSliceChunk(chunk.line_offsets, data, skip_head, skip_tail)
+                contents[row.first_line] = data
+            if len(contents) != len(chunks):
+                return None
+
+        # Note that the content is stored as bytes, and our caller expects unicode
+        rv = [contents[chunk.first_line].decode('utf-8') for chunk in chunks]
+        read_last_line = min(chunks[-1].last_line, last_line)
+        return '\n'.join(rv) + '\n', read_last_line
+
+    @staticmethod
+    def _lineOffsetsRange(line_offsets, length, skip_head, skip_tail):
+        # return the byte range of a chunk without its first skip_head lines
+        # and last skip_tail lines, omitting the newline which ends it
+        offsets = read_line_offsets(line_offsets)
+        start = offsets[skip_head - 1] if skip_head else 0
+        end = offsets[-skip_tail] - 1 if skip_tail else length
+        return start, end
+
+    def _thdSliceChunk(self, line_offsets, data, skip_head, skip_tail):
+        if line_offsets is not None:
+            start, end = self._lineOffsetsRange(line_offsets, len(data), skip_head, skip_tail)
+            return data[start:end]
+        # chunks written before the line index existed must be scanned
+        idx = -1
+        for _ in range(skip_head):
+            idx = data.index(b'\n', idx + 1)
+        data = data[idx + 1:]
+        idx = len(data) + 1
+        for _ in range(skip_tail):
+            idx = data.rindex(b'\n', 0, idx)
+        return data[:idx]
+
+    # not a replica read: the lines just flushed from the append buffer must
+    # be read back, to tail the logs being written
+    @defer.inlineCallbacks
+    def getLogLines(self, logid, first_line, last_line):
+        def thdGetLogLines(conn):
+            content, _ = self._thdGetLogLines(conn, logid, first_line, last_line)
+            return content
+        yield self._flushAppendBuffer(logid)
+        res = yield self.db.pool.do(thdGetLogLines)
+        return res
+
+    @defer.inlineCallbacks
+    def getLogLinesBatch(self, logid, first_line, last_line, max_chunks):
+        def thdGetLogLinesBatch(conn):
+            return self._thdGetLogLines(conn, logid, first_line, last_line,
+                                        max_chunks=max_chunks)
+        yield self._flushAppendBuffer(logid)
+        res = yield self.db.pool.do(thdGetLogLinesBatch)
+        return res
 
     # returns a Deferred that returns a value
     def addLog(self, stepid, name, slug, type):
@@ -155,7 +342,147 @@ class LogsConnectorComponent(base.DBConnectorComponent):
                     "log with slug '%r' already exists in this step" % (slug,)) from e
         return self.db.pool.do(thdAddLog)
 
-    def thdCompressChunk(self, chunk):
+    def _thdGetLogBuilderid(self, conn, logid):
+        builderid = self._log_builderids.get(logid)
+        if builderid is None:
+            model = self.db.model
+            q = sa.select([model.builds.c.builderid])
+            q = q.select_from(model.logs.join(model.steps).join(model.builds))
+            q = q.where(model.logs.c.id == logid)
+            res = conn.execute(q)
+            row = res.fetchone()
+            res.close()
+            if not row:
+                return None
+            builderid = row.builderid
+            if len(self._log_builderids) >= self.MAX_CACHED_LOG_BUILDERIDS:
+                self._log_builderids.clear()
+            self._log_builderids[logid] = builderid
+        return builderid
+
+    def _thdLoadZstdDictionary(self, conn, dictionaryid):
+        dictionary = self._zstd_dictionaries.get(dictionaryid)
+        if dictionary is None:
+            tbl = self.db.model.logchunk_dictionaries
+            res = conn.execute(sa.select([tbl.c.content]).where(tbl.c.id == dictionaryid))
+            row = res.fetchone()
+            res.close()
+            if not row:
+                raise KeyError("no logchunk dictionary with id {}".format(dictionaryid))
+            dictionary = zstd.ZstdCompressionDict(row.content)
+            dictionary.precompute_compress(level=ZSTD_LEVEL)
+            self._zstd_dictionaries[dictionaryid] = dictionary
+        return dictionary
+
+    def _thdTrainZstdDictionary(self, conn, builderid):
+        model = self.db.model
+        q = sa.select([model.logchunks.c.content, model.logchunks.c.content_key,
+                       model.logchunks.c.compressed])
+        q = q.select_from(
+            model.logchunks.join(model.logs).join(model.steps).join(model.builds))
+        q = q.where(model.builds.c.builderid == builderid)
+        q = q.order_by(model.logchunks.c.logid.desc())
+        q = q.limit(self.ZSTD_DICTIONARY_SAMPLES)
+        rows = conn.execute(q).fetchall()
+        samples = [self.thdReadChunk(conn, row) for row in rows]
+
+        # the dictionary ID is written in each frame, so insert the row first
+        # to get its id, and train the dictionary with it.
+        tbl = model.logchunk_dictionaries
+        transaction = conn.begin()
+        r = conn.execute(tbl.insert(),
+                         dict(builderid=builderid, content=b'',
+                              created_at=int(self.master.reactor.seconds())))
+        dictionaryid = r.inserted_primary_key[0]
+        try:
+            dictionary = zstd.train_dictionary(self.ZSTD_DICTIONARY_SIZE, samples,
+                                               dict_id=dictionaryid)
+        except zstd.ZstdError as e:
+            transaction.rollback()
+            log.msg("not enough log data to train a zstd dictionary for "
+                    "builder {}: {}".format(builderid, e))
+            return None
+        conn.execute(tbl.update(whereclause=(tbl.c.id == dictionaryid)),
+                     content=dictionary.as_bytes()).close()
+        transaction.commit()
+        return dictionaryid
+
+    def _thdGetZstdDictionary(self, conn, logid, train=False):
+        # return the dictionary to compress chunks of this log with, or None.
+        # If train is true, a new dictionary is trained when the builder's
+        # dictionary is missing or too old.
+        builderid = self._thdGetLogBuilderid(conn, logid)
+        if builderid is None:
+            return None
+        now = self.master.reactor.seconds()
+        dictionaryid, created_at, checked_at = self._builder_dictionaries.get(
+            builderid, (None, None, None))
+        if checked_at is None or now - checked_at > self.ZSTD_DICTIONARY_CHECK_INTERVAL:
+            # look for a newer dictionary, possibly trained by another master
+            tbl = self.db.model.logchunk_dictionaries
+            q = sa.select([tbl.c.id, tbl.c.created_at])
+            q = q.where(tbl.c.builderid == builderid)
+            q = q.order_by(tbl.c.id.desc()).limit(1)
+            res = conn.execute(q)
+            row = res.fetchone()
+            res.close()
+            if row:
+                dictionaryid, created_at = row.id, row.created_at
+            checked_at = now
+
+        last_training = self._zstd_trainings.get(builderid)
+        if (train and (created_at is None or now - created_at > self.ZSTD_DICTIONARY_MAX_AGE) and
+                (last_training is None or now - last_training > self.ZSTD_DICTIONARY_RETRY)):
+            self._zstd_trainings[builderid] = now
+            trainedid = self._thdTrainZstdDictionary(conn, builderid)
+            if trainedid is not None:
+                dictionaryid, created_at = trainedid, now
+        self._builder_dictionaries[builderid] = (dictionaryid, created_at, checked_at)
+
+        if dictionaryid is None:
+            return None
+        return self._thdLoadZstdDictionary(conn, dictionaryid)
+
+    @staticmethod
+    def _contentLength(tbl):
+        # the (compressed) size of the chunks, wherever they are stored
+        return sa.func.coalesce(tbl.c.content_length, sa.func.length(tbl.c.content))
+
+    def _getLogStorage(self):
+        storage = self.master.config.logStorage
+        if storage is None:
+            raise RuntimeError("some log chunks are in a log storage, "
+                               "but c['logStorage'] is not set")
+        return storage
+
+    def _thdStoreChunk(self, row):
+        # move the content of a new chunk row to the log storage, if any
+        storage = self.master.config.logStorage
+        if storage is None:
+            return row
+        content = row['content']
+        key = '{}-{}-{}'.format(row['logid'], row['first_line'],
+                                hashlib.sha1(content).hexdigest())
+        storage.thdPut(key, content)
+        row.update(content=None, content_key=key, content_length=len(content))
+        return row
+
+    def thdReadChunk(self, conn, row):
+        # return the uncompressed content of a chunk row, which must have the
+        # content, content_key and compressed columns
+        content = row.content
+        if row.content_key is not None:
+            content = self._getLogStorage().thdGet(row.content_key)
+        return self.thdDecompressChunk(conn, row.compressed, content)
+
+    def thdDecompressChunk(self, conn, compressed_id, content):
+        if compressed_id == self.COMPRESSION_MODE["zstd"]["id"]:
+            dictionaryid = zstd.get_frame_parameters(content).dict_id
+            if dictionaryid:
+                return read_zstd(content, self._thdLoadZstdDictionary(conn, dictionaryid))
+        return self.COMPRESSION_BYID[compressed_id]["read"](content)
+
+    def thdCompressChunk(self, chunk, conn=None, logid=None, train=False):
         # Set the default compressed mode to "raw" id
         compressed_id = self.COMPRESSION_MODE["raw"]["id"]
         self.total_raw_bytes += len(chunk)
@@ -163,7 +490,13 @@ class LogsConnectorComponent(base.DBConnectorComponent):
         if self.master.config.logCompressionMethod != "raw":
             compressed_mode = self.COMPRESSION_MODE[
                 self.master.config.logCompressionMethod]
-            compressed_chunk = compressed_mode["dumps"](chunk)
+            dictionary = None
+            if compressed_mode["id"] == self.COMPRESSION_MODE["zstd"]["id"] and conn is not None:
+                dictionary = self._thdGetZstdDictionary(conn, logid, train=train)
+            if dictionary is not None:
+                compressed_chunk = dumps_zstd(chunk, dictionary)
+            else:
+                compressed_chunk = compressed_mode["dumps"](chunk)
             # Is it useful to compress the chunk?
             if len(chunk) > len(compressed_chunk):
                 compressed_id = compressed_mode["id"]
@@ -171,21 +504,59 @@ class LogsConnectorComponent(base.DBConnectorComponent):
         self.total_compressed_bytes += len(chunk)
         return chunk, compressed_id
 
+    def _thdGetLogType(self, conn, logid):
+        log_type = self._log_types.get(logid)
+        if log_type is None:
+            q = sa.select([self.db.model.logs.c.type])
+            q = q.where(self.db.model.logs.c.id == logid)
+            res = conn.execute(q)
+            row = res.fetchone()
+            res.close()
+            if not row:
+                return None
+            log_type = row.type
+            if len(self._log_types) >= self.MAX_CACHED_LOG_BUILDERIDS:
+                self._log_types.clear()
+            self._log_types[logid] = log_type
+        return log_type
+
+    def _thdSearchTermRows(self, conn, logid, chunk, first_line, last_line):
+        if self._thdGetLogType(conn, logid) == 's':
+            # strip the stream of each line, so that it does not stick to
+            # the first word
+            chunk = _stdio_prefix_re.sub(b'', chunk)
+        terms = search_terms(chunk, self.MAX_SEARCH_TERMS_PER_CHUNK + 1)
+        if len(terms) > self.MAX_SEARCH_TERMS_PER_CHUNK:
+            terms = [self.TRUNCATED_SEARCH_TERMS]
+        return [dict(logid=logid, first_line=first_line, last_line=last_line, term=term)
+                for term in terms]
+
     def thdSplitAndAppendChunk(self, conn, logid, content, first_line):
         # Break the content up into chunks.  This takes advantage of the
         # fact that no character but u'\n' maps to b'\n' in UTF-8.
         remaining = content
         chunk_first_line = last_line = first_line
+        rows = []
+        term_rows = []
         while remaining:
             chunk, remaining = self._splitBigChunk(remaining, logid)
             last_line = chunk_first_line + chunk.count(b'\n')
 
-            chunk, compressed_id = self.thdCompressChunk(chunk)
-            conn.execute(self.db.model.logchunks.insert(),
-                         dict(logid=logid, first_line=chunk_first_line,
-                              last_line=last_line, content=chunk,
-                              compressed=compressed_id)).close()
+            if self.master.config.logSearchIndex:
+                term_rows.extend(self._thdSearchTermRows(conn, logid, chunk,
+                                                         chunk_first_line, last_line))
+            line_offsets = dumps_line_offsets(chunk)
+            chunk, compressed_id = self.thdCompressChunk(chunk, conn=conn, logid=logid)
+            rows.append(self._thdStoreChunk(
+                dict(logid=logid, first_line=chunk_first_line,
+                     last_line=last_line, content=chunk,
+                     compressed=compressed_id,
+                     line_offsets=line_offsets)))
             chunk_first_line = last_line + 1
+        if rows:
+            conn.execute(self.db.model.logchunks.insert(), rows).close()
+        if term_rows:
+            conn.execute(self.db.model.log_search_terms.insert(), term_rows).close()
         conn.execute(self.db.model.logs.update(whereclause=(self.db.model.logs.c.id == logid)),
                      num_lines=last_line + 1).close()
         return first_line, last_line
@@ -209,12 +580,108 @@ class LogsConnectorComponent(base.DBConnectorComponent):
                                            content=content,
                                            first_line=num_lines[0])
 
-    # returns a Deferred that returns a value
+    @defer.inlineCallbacks
     def appendLog(self, logid, content):
         def thdappendLog(conn):
             return self.thdAppendLog(conn, logid, content)
 
-        return self.db.pool.do(thdappendLog)
+        def thdGetNumLines(conn):
+            q = sa.select([self.db.model.logs.c.num_lines])
+            q = q.where(self.db.model.logs.c.id == logid)
+            res = conn.execute(q)
+            row = res.fetchone()
+            res.close()
+            return row.num_lines if row else None
+
+        latency = self.master.config.logFlushLatency
+        if not latency and logid not in self._append_buffers:
+            res = yield self.db.pool.do(thdappendLog)
+            return res
+
+        # write-behind: the content is buffered, and written along with the
+        # next appends to the same log after at most `latency` seconds, or
+        # as soon as a chunk worth of content is buffered.
+        assert content[-1] == '\n'
+        buf = self._append_buffers.get(logid)
+        if buf is None:
+            num_lines = yield self.db.pool.do(thdGetNumLines)
+            if num_lines is None:
+                return None  # ignore a missing log
+            # another append may have created the buffer meanwhile
+            buf = self._append_buffers.setdefault(logid, _AppendBuffer(num_lines))
+        if buf.failure is not None:
+            failure, buf.failure = buf.failure, None
+            failure.raiseException()
+
+        first_line = buf.num_lines
+        buf.num_lines += content.count('\n')
+        # chunks omit the trailing newline
+        data = content[:-1].encode('utf-8')
+        buf.contents.append(data)
+        buf.size += len(data) + 1
+        if buf.size >= self.MAX_CHUNK_SIZE:
+            # make chatty writers wait for the database
+            yield self._flushAppendBuffer(logid)
+        elif buf.timer is None:
+            buf.timer = self.master.reactor.callLater(
+                latency, self._flushAppendBufferLater, logid)
+        return first_line, buf.num_lines - 1
+
+    def _flushAppendBufferLater(self, logid):
+        buf = self._append_buffers.get(logid)
+        if buf is None:
+            return
+        buf.timer = None
+
+        @self._flushAppendBuffer(logid).addErrback
+        def keepFailure(failure):
+            log.err(failure, "while writing appends to log %d" % logid)
+            # report it to the next caller
+            buf.failure = failure
+
+    def _flushAppendBuffer(self, logid):
+        buf = self._append_buffers.get(logid)
+        if buf is None:
+            return defer.succeed(None)
+        if buf.timer is not None:
+            buf.timer.cancel()
+            buf.timer = None
+
+        def thdFlush(conn, content, first_line):
+            # all or nothing, as the content is written again after a failure
+            transaction = conn.begin()
+            try:
+                rv = self.thdSplitAndAppendChunk(conn=conn,
+                                                 logid=logid,
+                                                 content=content,
+                                                 first_line=first_line)
+            except Exception:
+                transaction.rollback()
+                raise
+            transaction.commit()
+            return rv
+
+        @defer.inlineCallbacks
+        def flush():
+            if not buf.contents:
+                return
+            # the appends made meanwhile stay in the buffer, and so does this
+            # content until it is written: the line numbers returned for it
+            # are already known to the callers
+            count = len(buf.contents)
+            content = b'\n'.join(buf.contents[:count])
+            first_line = buf.flushed_lines
+            _, last_line = yield self.db.pool.do(thdFlush, content, first_line)
+            del buf.contents[:count]
+            buf.size -= len(content) + 1
+            buf.flushed_lines = last_line + 1
+            buf.failure = None
+        return buf.lock.run(flush)
+
+    @defer.inlineCallbacks
+    def flushAppendBuffers(self):
+        for logid in list(self._append_buffers):
+            yield self._flushAppendBuffer(logid)
 
     def _splitBigChunk(self, content, logid):
         """
@@ -247,167 +714,279 @@ class LogsConnectorComponent(base.DBConnectorComponent):
             return truncline, None
         return truncline, content[i + 1:]
 
-    # returns a Deferred that returns None
+    @defer.inlineCallbacks
     def finishLog(self, logid):
         def thdfinishLog(conn):
             tbl = self.db.model.logs
             q = tbl.update(whereclause=(tbl.c.id == logid))
             conn.execute(q, complete=1)
-        return self.db.pool.do(thdfinishLog)
-
-    @defer.inlineCallbacks
-    def compressLog(self, logid, force=False):
-        def thdcompressLog(conn):
-            tbl = self.db.model.logchunks
-            q = sa.select([tbl.c.first_line, tbl.c.last_line, sa.func.length(tbl.c.content),
-                           tbl.c.compressed])
+        buf = self._append_buffers.get(logid)
+        if buf is not None:
+            yield self._flushAppendBuffer(logid)
+            del self._append_buffers[logid]
+            if buf.failure is not None:
+                buf.failure.raiseException()
+        yield self.db.pool.do(thdfinishLog)
+
+    def thdCompressLog(self, conn, logid, force=False, recompress=False):
+        # Gather the small chunks of a log into bigger ones, and compress them.
+        # If force is true, all chunks are rewritten; if recompress is true, so
+        # are the chunks not compressed with the configured method.  Returns
+        # the number of bytes rewritten and the number of bytes saved.
+        tbl = self.db.model.logchunks
+        q = sa.select([tbl.c.first_line, tbl.c.last_line,
+                       self._contentLength(tbl).label('length'), tbl.c.compressed])
+        q = q.where(tbl.c.logid == logid)
+        q = q.order_by(tbl.c.first_line)
+
+        wanted_id = self.COMPRESSION_MODE[self.master.config.logCompressionMethod]["id"]
+        rows = conn.execute(q)
+        todo_gather_list = []
+        numchunks = 0
+        totlength = 0
+        rewritten = 0
+        todo_numchunks = 0
+        todo_first_line = 0
+        todo_last_line = 0
+        todo_length = 0
+        todo_stale = False
+
+        def worthRewriting():
+            return (todo_numchunks > 1 or
+                    ((force or (recompress and todo_stale)) and todo_numchunks))
+
+        # first pass, we fetch the full list of chunks (without content) and find out
+        # the chunk groups which could use some gathering.
+        for row in rows:
+            if (todo_length + row.length > self.MAX_CHUNK_SIZE or
+                    (row.last_line - todo_first_line) > self.MAX_CHUNK_LINES):
+                if worthRewriting():
+                    # this group is worth re-compressing
+                    todo_gather_list.append((todo_first_line, todo_last_line))
+                    rewritten += todo_length
+                todo_first_line = row.first_line
+                todo_length = 0
+                todo_numchunks = 0
+                todo_stale = False
+
+            todo_last_line = row.last_line
+            # note that we count the compressed size for efficiency reason
+            # unlike to the on-the-flow chunk splitter
+            todo_length += row.length
+            totlength += row.length
+            todo_numchunks += 1
+            numchunks += 1
+            # raw chunks are stored raw when compressing does not help
+            if row.compressed not in (wanted_id, self.COMPRESSION_MODE["raw"]["id"]):
+                todo_stale = True
+        rows.close()
+
+        if totlength == 0:
+            # empty log
+            return 0, 0
+
+        if worthRewriting():
+            # last chunk group
+            todo_gather_list.append((todo_first_line, todo_last_line))
+            rewritten += todo_length
+        if not todo_gather_list:
+            return 0, 0
+
+        for todo_first_line, todo_last_line in todo_gather_list:
+            # decompress this group of chunks. Note that the content is binary bytes.
+            # no need to decode anything as we are going to put in back stored as bytes anyway
+            q = sa.select([tbl.c.first_line, tbl.c.last_line, tbl.c.content,
+                           tbl.c.content_key, tbl.c.compressed])
             q = q.where(tbl.c.logid == logid)
+            q = q.where(tbl.c.first_line >= todo_first_line)
+            q = q.where(tbl.c.last_line <= todo_last_line)
             q = q.order_by(tbl.c.first_line)
-
             rows = conn.execute(q)
-            todo_gather_list = []
-            numchunks = 0
-            totlength = 0
-            todo_numchunks = 0
-            todo_first_line = 0
-            todo_last_line = 0
-            todo_length = 0
-            # first pass, we fetch the full list of chunks (without content) and find out
-            # the chunk groups which could use some gathering.
+            chunk = b""
+            old_keys = set()
             for row in rows:
-                if (todo_length + row.length_1 > self.MAX_CHUNK_SIZE or
-                        (row.last_line - todo_first_line) > self.MAX_CHUNK_LINES):
-                    if todo_numchunks > 1 or (force and todo_numchunks):
-                        # this group is worth re-compressing
-                        todo_gather_list.append((todo_first_line, todo_last_line))
-                    todo_first_line = row.first_line
-                    todo_length = 0
-                    todo_numchunks = 0
-
-                todo_last_line = row.last_line
-                # note that we count the compressed size for efficiency reason
-                # unlike to the on-the-flow chunk splitter
-                todo_length += row.length_1
-                totlength += row.length_1
-                todo_numchunks += 1
-                numchunks += 1
+                if chunk:
+                    chunk += b"\n"
+                chunk += self.thdReadChunk(conn, row)
+                if row.content_key is not None:
+                    old_keys.add(row.content_key)
             rows.close()
 
-            if totlength == 0:
-                # empty log
-                return 0
-
-            if todo_numchunks > 1 or (force and todo_numchunks):
-                # last chunk group
-                todo_gather_list.append((todo_first_line, todo_last_line))
-            for todo_first_line, todo_last_line in todo_gather_list:
-                # decompress this group of chunks. Note that the content is binary bytes.
-                # no need to decode anything as we are going to put in back stored as bytes anyway
-                q = sa.select(
-                    [tbl.c.first_line, tbl.c.last_line, tbl.c.content, tbl.c.compressed])
-                q = q.where(tbl.c.logid == logid)
-                q = q.where(tbl.c.first_line >= todo_first_line)
-                q = q.where(tbl.c.last_line <= todo_last_line)
-                q = q.order_by(tbl.c.first_line)
-                rows = conn.execute(q)
-                chunk = b""
-                for row in rows:
-                    if chunk:
-                        chunk += b"\n"
-                    chunk += self.COMPRESSION_BYID[row.compressed][
-                        "read"](row.content)
-                rows.close()
-
-                # Transaction is necessary so that readers don't see disappeared chunks
-                transaction = conn.begin()
-
-                # we remove the chunks that we are compressing
-                d = tbl.delete()
-                d = d.where(tbl.c.logid == logid)
-                d = d.where(tbl.c.first_line >= todo_first_line)
-                d = d.where(tbl.c.last_line <= todo_last_line)
-                conn.execute(d).close()
-
-                # and we recompress them in one big chunk
-                chunk, compressed_id = self.thdCompressChunk(chunk)
-                conn.execute(tbl.insert(),
-                             dict(logid=logid, first_line=todo_first_line,
-                                  last_line=todo_last_line, content=chunk,
-                                  compressed=compressed_id)).close()
-                transaction.commit()
-
-            # calculate how many bytes we saved
-            q = sa.select([sa.func.sum(sa.func.length(tbl.c.content))])
-            q = q.where(tbl.c.logid == logid)
-            newsize = conn.execute(q).fetchone()[0]
-            return totlength - newsize
+            # we recompress them in one big chunk; this is done outside of
+            # the transaction as it may train a new compression dictionary
+            line_offsets = dumps_line_offsets(chunk)
+            chunk, compressed_id = self.thdCompressChunk(chunk, conn=conn, logid=logid,
+                                                         train=True)
+            newrow = self._thdStoreChunk(
+                dict(logid=logid, first_line=todo_first_line,
+                     last_line=todo_last_line, content=chunk,
+                     compressed=compressed_id,
+                     line_offsets=line_offsets))
+
+            # Transaction is necessary so that readers don't see disappeared chunks
+            transaction = conn.begin()
+
+            # we remove the chunks that we are compressing
+            d = tbl.delete()
+            d = d.where(tbl.c.logid == logid)
+            d = d.where(tbl.c.first_line >= todo_first_line)
+            d = d.where(tbl.c.last_line <= todo_last_line)
+            conn.execute(d).close()
+
+            # and insert the big chunk
+            conn.execute(tbl.insert(), newrow).close()
+            transaction.commit()
+
+            # the old content may only go once the transaction is committed
+            old_keys.discard(newrow.get('content_key'))
+            if old_keys:
+                self._getLogStorage().thdDelete(old_keys)
+
+        # calculate how many bytes we saved
+        q = sa.select([sa.func.sum(self._contentLength(tbl))])
+        q = q.where(tbl.c.logid == logid)
+        newsize = conn.execute(q).fetchone()[0]
+        return rewritten, totlength - newsize
 
+    @defer.inlineCallbacks
+    def compressLog(self, logid, force=False):
+        def thdcompressLog(conn):
+            _, saved = self.thdCompressLog(conn, logid, force=force)
+            return saved
         saved = yield self.db.pool.do(thdcompressLog)
         return saved
 
     # returns a Deferred that returns a value
-    def deleteOldLogChunks(self, older_than_timestamp):
-        def thddeleteOldLogs(conn):
-            model = self.db.model
-            res = conn.execute(sa.select([sa.func.count(model.logchunks.c.logid)]))
-            count1 = res.fetchone()[0]
-            res.close()
+    def compactLog(self, logid):
+        def thdcompactLog(conn):
+            return self.thdCompressLog(conn, logid, recompress=True)
+        return self.db.pool.do(thdcompactLog)
 
-            # update log types older than timestamps
-            # we do it first to avoid having UI discrepancy
-
-            # N.B.: we utilize the fact that steps.id is auto-increment, thus steps.started_at
-            # times are effectively sorted and we only need to find the steps.id at the upper
-            # bound of steps to update.
-
-            # SELECT steps.id from steps WHERE steps.started_at < older_than_timestamp ORDER BY
-            # steps.id DESC LIMIT 1;
-            res = conn.execute(
-                sa.select([model.steps.c.id])
-                .where(model.steps.c.started_at < older_than_timestamp)
-                .order_by(model.steps.c.id.desc())
-                .limit(1)
-            )
-            res_list = res.fetchone()
-            stepid_max = None
-            if res_list:
-                stepid_max = res_list[0]
-            res.close()
+    # returns a Deferred that returns a value
+    def getLogIdsToCompact(self, after_logid, limit):
+        def thdGetLogIdsToCompact(conn):
+            tbl = self.db.model.logs
+            q = sa.select([tbl.c.id, tbl.c.complete])
+            q = q.where(tbl.c.id > after_logid)
+            q = q.where(tbl.c.type != 'd')
+            q = q.order_by(tbl.c.id)
+            q = q.limit(limit)
+            return [(row.id, bool(row.complete)) for row in conn.execute(q).fetchall()]
+        return self.db.pool.do(thdGetLogIdsToCompact)
 
-            # UPDATE logs SET logs.type = 'd' WHERE logs.stepid <= stepid_max AND type != 'd';
-            if stepid_max:
-                res = conn.execute(
-                    model.logs.update()
-                    .where(sa.and_(model.logs.c.stepid <= stepid_max,
-                                   model.logs.c.type != 'd'))
-                    .values(type='d')
-                )
-                res.close()
+    # returns a Deferred that returns a value
+    def getLogsCompletion(self, logids):
+        logids = list(logids)
 
-            # query all logs with type 'd' and delete their chunks.
-            if self.db._engine.dialect.name == 'sqlite':
-                # sqlite does not support delete with a join, so for this case we use a subquery,
-                # which is much slower
-                q = sa.select([model.logs.c.id])
-                q = q.select_from(model.logs)
-                q = q.where(model.logs.c.type == 'd')
+        def thdGetLogsCompletion(conn):
+            tbl = self.db.model.logs
+            rv = {}
+            # batch the logids into groups of 100, so that the parameter lists
+            # supported by the DBAPI aren't exhausted
+            for batch in self.doBatch(logids, 100):
+                q = sa.select([tbl.c.id, tbl.c.complete])
+                q = q.where(tbl.c.id.in_(batch))
+                q = q.where(tbl.c.type != 'd')
+                rv.update((row.id, bool(row.complete)) for row in conn.execute(q).fetchall())
+            return rv
+        return self.db.pool.do(thdGetLogsCompletion)
 
-                # delete their logchunks
-                q = model.logchunks.delete().where(model.logchunks.c.logid.in_(q))
-            else:
-                q = model.logchunks.delete()
-                q = q.where(model.logs.c.id == model.logchunks.c.logid)
-                q = q.where(model.logs.c.type == 'd')
+    # returns a Deferred that returns a value
+    @base.replica_read
+    def searchLogs(self, query, builderid=None, min_started_at=None, max_started_at=None,
+                   limit=100):
+        terms = search_terms(query.encode('utf-8'))
+        if not terms:
+            raise ValueError("a search query needs a word of at least 3 letters or digits")
+        terms = sorted(terms)[:self.MAX_SEARCH_QUERY_TERMS]
+        needle = query.lower()
+
+        def thdSearchLogs(conn):
+            model = self.db.model
+            tbl = model.log_search_terms
+            columns = [tbl.c.logid, tbl.c.first_line, tbl.c.last_line,
+                       model.logs.c.type, model.logs.c.stepid, model.steps.c.buildid,
+                       model.builds.c.builderid, model.steps.c.started_at]
+            q = sa.select(columns)
+            q = q.select_from(tbl.join(model.logs).join(model.steps).join(model.builds))
+            q = q.where(tbl.c.term.in_(terms + [self.TRUNCATED_SEARCH_TERMS]))
+            q = q.where(model.logs.c.type != 'd')
+            if builderid is not None:
+                q = q.where(model.builds.c.builderid == builderid)
+            if min_started_at is not None:
+                q = q.where(model.steps.c.started_at >= min_started_at)
+            if max_started_at is not None:
+                q = q.where(model.steps.c.started_at <= max_started_at)
+            # the chunks which contain all the terms are candidates, as well as
+            # the chunks whose terms were not indexed
+            q = q.group_by(*columns)
+            q = q.having((sa.func.count(sa.distinct(tbl.c.term)) == len(terms)) |
+                         (sa.func.min(tbl.c.term) == self.TRUNCATED_SEARCH_TERMS))
+            q = q.order_by(tbl.c.logid.desc(), tbl.c.first_line)
+            q = q.limit(self.MAX_SEARCH_CANDIDATES)
 
-            res = conn.execute(q)
-            res.close()
-            res = conn.execute(sa.select([sa.func.count(model.logchunks.c.logid)]))
-            count2 = res.fetchone()[0]
+            rv = []
+            for row in conn.execute(q).fetchall():
+                content, _ = self._thdGetLogLines(conn, row.logid, row.first_line,
+                                                  row.last_line)
+                for i, line in enumerate(content.split('\n')[:-1]):
+                    text = line[1:] if row.type == 's' else line
+                    if needle not in text.lower():
+                        continue
+                    rv.append(dict(logid=row.logid, stepid=row.stepid, buildid=row.buildid,
+                                   builderid=row.builderid,
+                                   started_at=epoch2datetime(row.started_at),
+                                   line=row.first_line + i, content=line))
+                    if len(rv) >= limit:
+                        return rv
+            return rv
+        return self.db.pool.do(thdSearchLogs)
+
+    def thdDeleteLogChunks(self, conn, logids):
+        """
+        Delete the chunks and search terms of the given logs.  Returns a dict
+        of the number of deleted rows per table, the size of the deleted
+        content, and the log storage keys to pass to L{thdDeleteStoredChunks}
+        once the transaction is committed.
+        """
+        model = self.db.model
+        tbl = model.logchunks
+        q = sa.select([tbl.c.content_key, self._contentLength(tbl).label('length')])
+        q = q.where(tbl.c.logid.in_(logids))
+        chunks = conn.execute(q).fetchall()
+        stored_keys = [row.content_key for row in chunks if row.content_key is not None]
+        size = sum(row.length or 0 for row in chunks)
+
+        rows = {}
+        for table in (model.logchunks, model.log_search_terms):
+            res = conn.execute(table.delete().where(table.c.logid.in_(logids)))
+            rows[table.name] = res.rowcount
             res.close()
-            return count1 - count2
-        return self.db.pool.do(thddeleteOldLogs)
+        return rows, size, stored_keys
+
+    def thdDeleteStoredChunks(self, stored_keys):
+        if stored_keys:
+            self._getLogStorage().thdDelete(stored_keys)
+
+    # returns a Deferred that returns a value
+    @defer.inlineCallbacks
+    def deleteOldLogChunks(self, older_than_timestamp):
+        # the logs are pruned in small batches, so that the tables are not
+        # locked for long
+        deleted = 0
+        after_logid = 0
+        while True:
+            res = yield self.db.retention.pruneLogChunks(older_than_timestamp, after_logid)
+            if res['last_id'] is None:
+                return deleted
+            deleted += res['rows'].get('logchunks', 0)
+            after_logid = res['last_id']
 
     def _logdictFromRow(self, row):
         rv = dict(row)
         rv['complete'] = bool(rv['complete'])
+        buf = self._append_buffers.get(rv['id'])
+        if buf is not None:
+            # count the lines which are not written yet
+            rv['num_lines'] = buf.num_lines
         return rv
@@ -0,0 +1,163 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import hashlib
+import os
+import tempfile
+
+from buildbot import config
+
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+except ImportError:
+    boto3 = None
+
+
+class LogStorage:
+
+    """
+    Base class for the stores of log chunk contents, set with
+    C{c['logStorage']}.  The chunks metadata stays in the database, and their
+    content is stored with L{thdPut} under a key chosen by the logs connector
+    component.
+
+    The methods are called from the database thread pool, and are blocking.
+    """
+
+    def thdPut(self, key, content):
+        """Store C{content} (bytes) under C{key}."""
+        raise NotImplementedError
+
+    def thdGet(self, key, start=0, end=None):
+        """Return the content stored under C{key}, from byte C{start} to byte
+        C{end} (excluded), or up to its end if C{end} is None.  Raise
+        C{KeyError} if there is no such key."""
+        raise NotImplementedError
+
+    def thdDelete(self, keys):
+        """Delete the content stored under each of C{keys}; missing keys are
+        ignored."""
+        raise NotImplementedError
+
+
+class FilesystemLogStorage(LogStorage):
+
+    """
+    Store log chunk contents as files under C{basedir}, sharded in
+    subdirectories by a hash of their key so that no directory gets too big.
+    """
+
+    def __init__(self, basedir, shardLevels=2):
+        if not isinstance(shardLevels, int) or not 0 <= shardLevels <= 8:
+            config.error("FilesystemLogStorage: shardLevels must be an int between 0 and 8")
+        self.basedir = basedir
+        self.shardLevels = shardLevels
+
+    def _path(self, key):
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        shards = [digest[i * 2:i * 2 + 2] for i in range(self.shardLevels)]
+        return os.path.join(self.basedir, *shards, key)
+
+    def thdPut(self, key, content):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write to a temporary file first, so readers never see partial content
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+    def thdGet(self, key, start=0, end=None):
+        try:
+            f = open(self._path(key), 'rb')
+        except FileNotFoundError as e:
+            raise KeyError(key) from e
+        with f:
+            f.seek(start)
+            if end is None:
+                return f.read()
+            return f.read(end - start)
+
+    def thdDelete(self, keys):
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+
+class S3LogStorage(LogStorage):
+
+    """
+    Store log chunk contents as objects of an S3 bucket, or of any storage
+    with an S3-compatible API if C{endpoint_url} is given.
+    """
+
+    # maximum number of keys per DeleteObjects request
+    MAX_DELETE_KEYS = 1000
+
+    def __init__(self, bucket, prefix='', endpoint_url=None, region=None,
+                 identifier=None, secret_identifier=None):
+        if not boto3:
+            config.error("The python module 'boto3' is needed to use a S3LogStorage")
+        if not bucket:
+            config.error("S3LogStorage: 'bucket' parameter must be specified")
+        self.bucket = bucket
+        self.prefix = prefix
+        self.endpoint_url = endpoint_url
+        self.region = region
+        self.identifier = identifier
+        self.secret_identifier = secret_identifier
+        self._client = None
+
+    @property
+    def client(self):
+        # boto3 clients are thread-safe, so one is shared by the thread pool
+        if self._client is None:
+            self._client = boto3.client(
+                's3', endpoint_url=self.endpoint_url, region_name=self.region,
+                aws_access_key_id=self.identifier,
+                aws_secret_access_key=self.secret_identifier)
+        return self._client
+
+    def thdPut(self, key, content):
+        self.client.put_object(Bucket=self.bucket, Key=self.prefix + key, Body=content)
+
+    def thdGet(self, key, start=0, end=None):
+        if end is not None and end <= start:
+            return b''
+        kwargs = {}
+        if start or end is not None:
+            kwargs['Range'] = 'bytes={}-{}'.format(start, '' if end is None else end - 1)
+        try:
+            res = self.client.get_object(Bucket=self.bucket, Key=self.prefix + key, **kwargs)
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'NoSuchKey':
+                raise KeyError(key) from e
+            raise
+        return res['Body'].read()
+
+    def thdDelete(self, keys):
+        keys = list(keys)
+        for i in range(0, len(keys), self.MAX_DELETE_KEYS):
+            objects = [{'Key': self.prefix + key}
+                       for key in keys[i:i + self.MAX_DELETE_KEYS]]
+            self.client.delete_objects(Bucket=self.bucket,
+                                       Delete={'Objects': objects, 'Quiet': True})
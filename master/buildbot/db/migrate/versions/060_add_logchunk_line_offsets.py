@@ -0,0 +1,30 @@
+# This file is part of Buildbot. Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import sqlalchemy as sa
+
+from buildbot.util import sautils
+
+
+def upgrade(migrate_engine):
+    # existing chunks are left without an index; they are read as before
+    metadata = sa.MetaData()
+    metadata.bind = migrate_engine
+    logchunks_table = sautils.Table('logchunks', metadata, autoload=True)
+    line_offsets_column = sa.Column(
+        'line_offsets',
+        sa.LargeBinary().with_variant(sa.dialects.mysql.LONGBLOB, "mysql"),
+        nullable=True)
+    line_offsets_column.create(logchunks_table)
@@ -0,0 +1,29 @@
+# This file is part of Buildbot. Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import sqlalchemy as sa
+
+from buildbot.util import sautils
+
+
+def upgrade(migrate_engine):
+    # existing chunks stay in the database
+    metadata = sa.MetaData()
+    metadata.bind = migrate_engine
+    logchunks_table = sautils.Table('logchunks', metadata, autoload=True)
+    content_key_column = sa.Column('content_key', sa.String(128), nullable=True)
+    content_key_column.create(logchunks_table)
+    content_length_column = sa.Column('content_length', sa.Integer, nullable=True)
+    content_length_column.create(logchunks_table)
@@ -0,0 +1,48 @@
+# This file is part of Buildbot. Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import sqlalchemy as sa
+
+from buildbot.util import sautils
+
+
+def upgrade(migrate_engine):
+    metadata = sa.MetaData()
+    metadata.bind = migrate_engine
+
+    sautils.Table(
+        'logs', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        # ...
+    )
+
+    log_search_terms = sautils.Table(
+        'log_search_terms', metadata,
+        sa.Column('logid', sa.Integer,
+                  sa.ForeignKey('logs.id', ondelete='CASCADE'),
+                  nullable=False),
+        sa.Column('first_line', sa.Integer, nullable=False),
+        sa.Column('last_line', sa.Integer, nullable=False),
+        sa.Column('term', sa.Integer, nullable=False),
+    )
+
+    # create the table
+    log_search_terms.create()
+
+    # create indexes
+    idx = sa.Index('log_search_terms_term', log_search_terms.c.term, log_search_terms.c.logid)
+    idx.create()
+    idx = sa.Index('log_search_terms_logid', log_search_terms.c.logid)
+    idx.create()
@@ -228,6 +228,41 @@ class Model(base.DBConnectorComponent):
         # if 'compressed' is not 0, compressed with gzip, bzip2 or lz4
         sa.Column('content', sa.LargeBinary(65536)),
         sa.Column('compressed', sa.SmallInteger, nullable=False),
+        # byte offsets of the lines of the uncompressed content, after the
+        # first one, as little-endian 32-bit integers; NULL for chunks of a
+        # single line, or written before this index existed; a chunk of
+        # short lines needs up to four times its size
+        sa.Column('line_offsets',
+                  sa.LargeBinary().with_variant(sa.dialects.mysql.LONGBLOB, "mysql")),
+        # if not NULL, the content is not in the 'content' column, but in the
+        # configured logStorage under this key, and has this length
+        sa.Column('content_key', sa.String(128)),
+        sa.Column('content_length', sa.Integer),
+    )
+
+    # zstd compression dictionaries, trained from the recent logs of a builder.
+    # The id of a dictionary is stored in the header of the compressed chunks.
+    logchunk_dictionaries = sautils.Table(
+        'logchunk_dictionaries', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('builderid', sa.Integer,
+                  sa.ForeignKey('builders.id', ondelete='CASCADE'),
+                  nullable=False),
+        sa.Column('created_at', sa.Integer, nullable=False),
+        sa.Column('content', sa.LargeBinary().with_variant(sa.dialects.mysql.LONGBLOB, "mysql"),
+                  nullable=False),
+    )
+
+    # search index of the logs: the (hashed) terms found in each range of lines
+    # of a log, as written by appendLog
+    log_search_terms = sautils.Table(
+        'log_search_terms', metadata,
+        sa.Column('logid', sa.Integer,
+                  sa.ForeignKey('logs.id', ondelete='CASCADE'),
+                  nullable=False),
+        sa.Column('first_line', sa.Integer, nullable=False),
+        sa.Column('last_line', sa.Integer, nullable=False),
+        sa.Column('term', sa.Integer, nullable=False),
     )
 
     # Tables related to buildsets
@@ -915,6 +950,9 @@ class Model(base.DBConnectorComponent):
     sa.Index('logs_slug', logs.c.stepid, logs.c.slug, unique=True)
     sa.Index('logchunks_firstline', logchunks.c.logid, logchunks.c.first_line)
     sa.Index('logchunks_lastline', logchunks.c.logid, logchunks.c.last_line)
+    sa.Index('logchunk_dictionaries_builderid', logchunk_dictionaries.c.builderid)
+    sa.Index('log_search_terms_term', log_search_terms.c.term, log_search_terms.c.logid)
+    sa.Index('log_search_terms_logid', log_search_terms.c.logid)
     sa.Index('test_names_name', test_names.c.builderid, test_names.c.name,
              mysql_length={'name': 255})
     sa.Index('test_code_paths_path', test_code_paths.c.builderid, test_code_paths.c.path,
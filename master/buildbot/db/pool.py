@@ -14,6 +14,7 @@
 # Copyright Buildbot Team Members
 
 
+import bisect
 import inspect
 import sqlite3
 import time
@@ -26,6 +27,8 @@ from twisted.internet import threads
 from twisted.python import log
 from twisted.python import threadpool
 
+from buildbot.data.exceptions import InvalidQueryError
+from buildbot.db.base import replica_reads
 from buildbot.db.buildrequests import AlreadyClaimedError
 from buildbot.db.buildsets import AlreadyCompleteError
 from buildbot.db.changesources import ChangeSourceAlreadyClaimedError
@@ -74,6 +77,8 @@ def timed_do_fn(f):
                 return callable(*args, **kwargs)
             finally:
                 log.msg("{} - thd end".format(descr))
+        # keep the statistics under the name of the wrapped function
+        callable_wrap.__qualname__ = call_site(callable)
         d = f(callable_wrap, *args, **kwargs)
 
         @d.addBoth
@@ -88,10 +93,135 @@ def timed_do_fn(f):
     return wrap
 
 
+def call_site(callable):
+    """Return the name of the connector component method which submitted a
+    thread function: 'LogsConnectorComponent.getLogLines' for its local
+    function 'LogsConnectorComponent.getLogLines.<locals>.thd'."""
+    name = getattr(callable, '__qualname__', None) or repr(callable)
+    return name.split('.<locals>', 1)[0]
+
+
+class Histogram:
+
+    # upper bounds of the buckets, in seconds; the last bucket is unbounded
+    BOUNDS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10)
+
+    def __init__(self):
+        self.buckets = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.buckets[bisect.bisect_left(self.BOUNDS, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, fraction):
+        # the upper bound of the bucket containing the given fraction of the
+        # values, which is the max for the last bucket
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.BOUNDS, self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class QueryStats:
+
+    """
+    Latency statistics of the calls to a L{DBThreadPool}, per call site.
+
+    The statistics are always collected, so this is kept cheap: the times are
+    taken in the pool thread, but the statistics are only updated in the
+    reactor thread, so no lock is needed.
+    """
+
+    def __init__(self, pool_size):
+        self.pool_size = pool_size
+        self.in_flight = 0  # submitted calls which are not finished
+        self.peak_in_flight = 0
+        self.saturated_calls = 0  # calls submitted while all threads were busy
+        self.sites = {}  # { call site : QueryStatsSite }
+
+    def submit(self):
+        # returns the timings of the call, to be filled by the pool thread
+        if self.in_flight >= self.pool_size:
+            self.saturated_calls += 1
+            saturated = True
+        else:
+            saturated = False
+        self.in_flight += 1
+        if self.in_flight > self.peak_in_flight:
+            self.peak_in_flight = self.in_flight
+        return [time.perf_counter(), None, None, saturated]
+
+    def record(self, callable, timings, failed):
+        self.in_flight -= 1
+        submitted, started, finished, saturated = timings
+        if started is None:
+            # the call never reached a thread
+            return
+        site = call_site(callable)
+        stats = self.sites.get(site)
+        if stats is None:
+            stats = self.sites[site] = QueryStatsSite(site)
+        stats.wait.add(started - submitted)
+        stats.duration.add(finished - started)
+        if failed:
+            stats.failures += 1
+        if saturated:
+            stats.saturated += 1
+
+    def logMetrics(self):
+        # log the mean times of each call site since the last call
+        count = wait = 0
+        for stats in self.sites.values():
+            calls = stats.duration.count - stats.logged_count
+            if not calls:
+                continue
+            metrics.MetricTimeEvent.log(
+                'DBThreadPool.' + stats.name,
+                (stats.duration.total - stats.logged_duration) / calls)
+            count += calls
+            wait += stats.wait.total - stats.logged_wait
+            stats.logged_count = stats.duration.count
+            stats.logged_duration = stats.duration.total
+            stats.logged_wait = stats.wait.total
+        if count:
+            metrics.MetricTimeEvent.log('DBThreadPool.queue_wait', wait / count)
+        metrics.MetricCountEvent.log('DBThreadPool.queries', count)
+        metrics.MetricCountEvent.log('DBThreadPool.saturated_calls', self.saturated_calls,
+                                     absolute=True)
+        metrics.MetricCountEvent.log('DBThreadPool.peak_in_flight', self.peak_in_flight,
+                                     absolute=True)
+
+
+class QueryStatsSite:
+
+    def __init__(self, name):
+        self.name = name
+        self.duration = Histogram()  # time spent running in the thread
+        self.wait = Histogram()  # time spent waiting for a thread
+        self.failures = 0
+        self.saturated = 0
+        # the totals when the metrics were last logged
+        self.logged_count = 0
+        self.logged_duration = 0.0
+        self.logged_wait = 0.0
+
+
 class DBThreadPool:
 
     running = False
 
+    # minimum time between two logs of the query statistics to the metrics
+    METRICS_INTERVAL = 60
+
     def __init__(self, engine, reactor, verbose=False):
         # verbose is used by upgrade scripts, and if it is set we should print
         # messages about versions and other warnings
@@ -115,6 +245,14 @@ class DBThreadPool:
         self._pool = threadpool.ThreadPool(minthreads=1,
                                            maxthreads=pool_size,
                                            name='DBThreadPool')
+        self.stats = QueryStats(pool_size)
+        self._metrics_logged_at = reactor.seconds()
+
+        # the pool of a read replica, to which the methods marked with
+        # L{buildbot.db.base.replica_read} are routed while it is usable, that
+        # is, while it does not lag too much behind this database
+        self.replica = None
+        self.replica_usable = False
 
         self.engine = engine
         if engine.dialect.name == 'sqlite':
@@ -174,7 +312,14 @@ class DBThreadPool:
     BACKOFF_MULT = 1.05
     MAX_OPERATIONALERROR_TIME = 3600 * 24  # one day
 
-    def __thd(self, with_engine, callable, args, kwargs):
+    def __thd(self, with_engine, callable, args, kwargs, timings):
+        timings[1] = time.perf_counter()
+        try:
+            return self.__thd_retry(with_engine, callable, args, kwargs)
+        finally:
+            timings[2] = time.perf_counter()
+
+    def __thd_retry(self, with_engine, callable, args, kwargs):
         # try to call callable(arg, *args, **kwargs) repeatedly until no
         # OperationalErrors occur, where arg is either the engine (with_engine)
         # or a connection (not with_engine)
@@ -210,10 +355,12 @@ class DBThreadPool:
                     continue
                 except Exception as e:
                     # AlreadyClaimedError are normal especially in a multimaster
-                    # configuration
+                    # configuration; InvalidQueryError are reported to the
+                    # caller, which may fall back to another query
                     if not isinstance(e,
                         (AlreadyClaimedError, ChangeSourceAlreadyClaimedError,
-                         SchedulerAlreadyClaimedError, AlreadyCompleteError)):
+                         SchedulerAlreadyClaimedError, AlreadyCompleteError,
+                         InvalidQueryError)):
                         log.err(e, 'Got fatal Exception on DB')
                     raise
             finally:
@@ -222,19 +369,34 @@ class DBThreadPool:
             break
         return rv
 
+    def _do(self, with_engine, callable, args, kwargs):
+        if (self.replica is not None and self.replica_usable and
+                call_site(callable) in replica_reads):
+            return self.replica._do(with_engine, callable, args, kwargs)
+        return self._doInThread(with_engine, callable, args, kwargs)
+
     @defer.inlineCallbacks
-    def do(self, callable, *args, **kwargs):
-        ret = yield threads.deferToThreadPool(self.reactor, self._pool,
-                                              self.__thd, False, callable,
-                                              args, kwargs)
+    def _doInThread(self, with_engine, callable, args, kwargs):
+        timings = self.stats.submit()
+        failed = True
+        try:
+            ret = yield threads.deferToThreadPool(self.reactor, self._pool,
+                                                  self.__thd, with_engine, callable,
+                                                  args, kwargs, timings)
+            failed = False
+        finally:
+            self.stats.record(callable, timings, failed)
+            now = self.reactor.seconds()
+            if now - self._metrics_logged_at >= self.METRICS_INTERVAL:
+                self._metrics_logged_at = now
+                self.stats.logMetrics()
         return ret
 
-    @defer.inlineCallbacks
+    def do(self, callable, *args, **kwargs):
+        return self._do(False, callable, args, kwargs)
+
     def do_with_engine(self, callable, *args, **kwargs):
-        ret = yield threads.deferToThreadPool(self.reactor, self._pool,
-                                              self.__thd, True, callable,
-                                              args, kwargs)
-        return ret
+        return self._do(True, callable, args, kwargs)
 
     def get_sqlite_version(self):
         return sqlite3.sqlite_version_info
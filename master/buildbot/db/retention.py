@@ -0,0 +1,214 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import sqlalchemy as sa
+
+from buildbot.db import base
+from buildbot.util import subscription
+
+
+class RetentionConnectorComponent(base.DBConnectorComponent):
+
+    """
+    Delete the old rows of the big tables in small batches.
+
+    Each method prunes at most C{limit} items whose id is above C{after_id},
+    in id order, in a single short transaction, and returns a dictionary with
+    keys C{last_id} (the id to pass as C{after_id} to the next call, or None
+    if there was nothing left to prune), C{rows} (the number of deleted or
+    updated rows, per table) and C{bytes} (the size of the deleted log content
+    and build data).
+    """
+
+    def __init__(self, connector):
+        super().__init__(connector)
+        self._pruneSubs = subscription.SubscriptionPoint("data prunes")
+
+    def subscribeToPrunes(self, callback):
+        """
+        Call C{callback(rows)} after each batch which deleted or updated rows,
+        with the number of rows per table.  The pruned data has no MQ events.
+        """
+        return self._pruneSubs.subscribe(callback)
+
+    def _doPrune(self, thd):
+        d = self.db.pool.do(thd)
+
+        @d.addCallback
+        def notify(res):
+            if res['rows']:
+                self._pruneSubs.deliver(res['rows'])
+            return res
+        return d
+
+    def _result(self, ids, rows, size=0):
+        return dict(last_id=ids[-1] if ids else None,
+                    rows={table: count for table, count in rows.items() if count},
+                    bytes=size)
+
+    def _thdDelete(self, conn, rows, table, whereclause):
+        res = conn.execute(table.delete().where(whereclause))
+        rows[table.name] = rows.get(table.name, 0) + res.rowcount
+        res.close()
+
+    def _thdSelectIds(self, conn, column, after_id, limit, *whereclauses):
+        q = sa.select([column]).where(column > after_id)
+        for whereclause in whereclauses:
+            q = q.where(whereclause)
+        q = q.order_by(column).limit(limit)
+        return [row[0] for row in conn.execute(q).fetchall()]
+
+    # returns a Deferred that returns a value
+    def pruneChanges(self, changeHorizon, after_id=0, limit=100):
+        def thd(conn):
+            changes = self.db.model.changes
+
+            # the changes to delete are those up to the newest one past the
+            # horizon; only one row of the index is read to find it
+            q = sa.select([changes.c.changeid])
+            q = q.order_by(changes.c.changeid.desc())
+            q = q.offset(changeHorizon).limit(1)
+            row = conn.execute(q).fetchone()
+            if row is None:
+                return self._result([], {})
+
+            ids = self._thdSelectIds(conn, changes.c.changeid, after_id, limit,
+                                     changes.c.changeid <= row.changeid)
+            rows = {}
+            if ids:
+                transaction = conn.begin()
+                # delete from all relevant tables, in dependency order
+                for table_name in ('scheduler_changes', 'change_files',
+                                   'change_properties', 'changes', 'change_users'):
+                    table = self.db.model.metadata.tables[table_name]
+                    self._thdDelete(conn, rows, table, table.c.changeid.in_(ids))
+                transaction.commit()
+            return self._result(ids, rows)
+        return self._doPrune(thd)
+
+    # returns a Deferred that returns a value
+    def pruneLogChunks(self, older_than_timestamp, after_id=0, limit=100):
+        def thd(conn):
+            model = self.db.model
+            q = sa.select([model.logs.c.id])
+            q = q.select_from(model.logs.join(model.steps))
+            q = q.where(model.logs.c.id > after_id)
+            q = q.where(model.logs.c.type != 'd')
+            q = q.where(model.steps.c.started_at < older_than_timestamp)
+            q = q.order_by(model.logs.c.id).limit(limit)
+            ids = [row.id for row in conn.execute(q).fetchall()]
+            if not ids:
+                return self._result([], {})
+
+            transaction = conn.begin()
+            # the type is updated first, so that the UI does not try to
+            # read the chunks
+            res = conn.execute(model.logs.update()
+                               .where(model.logs.c.id.in_(ids))
+                               .values(type='d'))
+            rows = {'logs': res.rowcount}
+            res.close()
+            chunk_rows, size, stored_keys = self.db.logs.thdDeleteLogChunks(conn, ids)
+            rows.update(chunk_rows)
+            transaction.commit()
+
+            self.db.logs.thdDeleteStoredChunks(stored_keys)
+            return self._result(ids, rows, size)
+        return self._doPrune(thd)
+
+    # returns a Deferred that returns a value
+    def pruneBuilds(self, older_than_timestamp, after_id=0, limit=100):
+        def thd(conn):
+            model = self.db.model
+            ids = self._thdSelectIds(conn, model.builds.c.id, after_id, limit,
+                                     model.builds.c.complete_at < older_than_timestamp)
+            if not ids:
+                return self._result([], {})
+
+            q = sa.select([model.steps.c.id]).where(model.steps.c.buildid.in_(ids))
+            stepids = [row.id for row in conn.execute(q).fetchall()]
+            logids = []
+            if stepids:
+                q = sa.select([model.logs.c.id]).where(model.logs.c.stepid.in_(stepids))
+                logids = [row.id for row in conn.execute(q).fetchall()]
+            q = sa.select([sa.func.sum(model.build_data.c.length)])
+            q = q.where(model.build_data.c.buildid.in_(ids))
+            size = conn.execute(q).scalar() or 0
+
+            transaction = conn.begin()
+            rows = {}
+            stored_keys = []
+            if logids:
+                chunk_rows, chunk_size, stored_keys = self.db.logs.thdDeleteLogChunks(
+                    conn, logids)
+                rows.update(chunk_rows)
+                size += chunk_size
+                self._thdDelete(conn, rows, model.logs, model.logs.c.id.in_(logids))
+
+            result_sets = sa.select([model.test_result_sets.c.id])
+            result_sets = result_sets.where(model.test_result_sets.c.buildid.in_(ids))
+            self._thdDelete(conn, rows, model.test_results,
+                            model.test_results.c.test_result_setid.in_(result_sets))
+            self._thdDelete(conn, rows, model.test_result_sets,
+                            model.test_result_sets.c.buildid.in_(ids))
+            self._thdDelete(conn, rows, model.steps, model.steps.c.buildid.in_(ids))
+            self._thdDelete(conn, rows, model.build_properties,
+                            model.build_properties.c.buildid.in_(ids))
+            self._thdDelete(conn, rows, model.build_data, model.build_data.c.buildid.in_(ids))
+
+            # the buildsets triggered by these builds lose their parent
+            conn.execute(model.buildsets.update()
+                         .where(model.buildsets.c.parent_buildid.in_(ids))
+                         .values(parent_buildid=None)).close()
+            self._thdDelete(conn, rows, model.builds, model.builds.c.id.in_(ids))
+            transaction.commit()
+
+            self.db.logs.thdDeleteStoredChunks(stored_keys)
+            return self._result(ids, rows, size)
+        return self._doPrune(thd)
+
+    # returns a Deferred that returns a value
+    def pruneBuildsets(self, older_than_timestamp, after_id=0, limit=100):
+        def thd(conn):
+            model = self.db.model
+            # the buildsets whose builds are still there are kept, so the
+            # builds have to be pruned first
+            builds = sa.select([model.builds.c.id])
+            builds = builds.select_from(model.builds.join(model.buildrequests))
+            builds = builds.where(model.buildrequests.c.buildsetid == model.buildsets.c.id)
+            ids = self._thdSelectIds(conn, model.buildsets.c.id, after_id, limit,
+                                     model.buildsets.c.complete != 0,
+                                     model.buildsets.c.complete_at < older_than_timestamp,
+                                     ~sa.exists(builds))
+            if not ids:
+                return self._result([], {})
+
+            q = sa.select([model.buildrequests.c.id])
+            q = q.where(model.buildrequests.c.buildsetid.in_(ids))
+            brids = [row.id for row in conn.execute(q).fetchall()]
+
+            transaction = conn.begin()
+            rows = {}
+            if brids:
+                self._thdDelete(conn, rows, model.buildrequest_claims,
+                                model.buildrequest_claims.c.brid.in_(brids))
+                self._thdDelete(conn, rows, model.buildrequests,
+                                model.buildrequests.c.id.in_(brids))
+            for table in (model.buildset_properties, model.buildset_sourcestamps):
+                self._thdDelete(conn, rows, table, table.c.buildsetid.in_(ids))
+            self._thdDelete(conn, rows, model.buildsets, model.buildsets.c.id.in_(ids))
+            transaction.commit()
+            return self._result(ids, rows)
+        return self._doPrune(thd)
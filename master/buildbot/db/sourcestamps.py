@@ -141,6 +141,26 @@ class SourceStampsConnectorComponent(base.DBConnectorComponent):
 
         return self.db.pool.do(thd)
 
+    # returns a Deferred that returns a value
+    def getSourceStampsForBuildsets(self, bsids):
+        def thd(conn):
+            bsss_tbl = self.db.model.buildset_sourcestamps
+            sstamps_tbl = self.db.model.sourcestamps
+
+            from_clause = bsss_tbl.join(sstamps_tbl,
+                                        bsss_tbl.c.sourcestampid == sstamps_tbl.c.id)
+            rv = {}
+            for batch in self.doBatch(bsids, 100):
+                q = sa.select([sstamps_tbl, bsss_tbl.c.buildsetid]).select_from(
+                    from_clause).where(bsss_tbl.c.buildsetid.in_(batch))
+                res = conn.execute(q)
+                for row in res.fetchall():
+                    rv.setdefault(row.buildsetid, []).append(
+                        self._rowToSsdict_thd(conn, row))
+            return rv
+
+        return self.db.pool.do(thd)
+
     # returns a Deferred that returns a value
     def getSourceStamps(self):
         def thd(conn):
@@ -0,0 +1 @@
+The new :bb:cfg:`builderStartConcurrency` setting lets the master start the builds of several builders at once, except for those which share workers or locks.
@@ -0,0 +1,2 @@
+Schedulers, including :bb:sched:`ForceScheduler`, accept a ``priority`` argument, an integer or a renderable, which is set on the build requests they create.
+The build requests of a builder with the highest priority are started first.
@@ -0,0 +1,2 @@
+Build request collapsing now fetches the sourcestamps of all the pending requests of a builder at once, and groups them by codebase, branch, repository, project and revision instead of comparing every pair of requests with the database.
+Custom ``collapseRequests`` functions are only called for requests with the same codebases.
@@ -0,0 +1 @@
+The ``builds``, ``buildsets`` and ``changes`` collections of the data API and of the REST API can be paginated with a ``cursor`` instead of an ``offset``, which keeps deep pages as fast as the first one and does not count the whole collection.
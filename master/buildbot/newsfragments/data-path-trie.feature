@@ -0,0 +1 @@
+The paths of the data API are matched against a trie of the patterns of the endpoints, compiled once, instead of against each pattern in turn.
@@ -0,0 +1,2 @@
+The filters and orders on most fields of the changes, test result sets and test results collections, including the ``files__contains`` filter of the changes, are now done by the database, so that these collections can be paginated without loading them in memory.
+The queries which still cannot be are counted by the ``ResultSpec.unbacked_queries`` metric.
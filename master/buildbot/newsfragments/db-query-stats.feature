@@ -0,0 +1 @@
+The database thread pool now always collects per-method latency histograms, queue wait times and saturation counts, which are available in the metrics and through the new ``/dbqueries`` data API endpoint.
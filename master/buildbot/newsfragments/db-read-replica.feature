@@ -0,0 +1 @@
+The reads of the list of changes and of the log search can now be routed to a read-only replica of the database configured with ``c['db']['db_read_url']``, as long as it does not lag more than ``c['db']['db_read_max_lag']`` seconds behind the main database.
@@ -0,0 +1 @@
+Added a :bb:cfg:`LogCompactor` service which compacts and recompresses finished logs in the background, at a bounded rate, instead of compressing each log when its step finishes.
@@ -0,0 +1 @@
+Added the :bb:cfg:`logFlushLatency` option, which buffers the log output of each step for a short time and writes it to the database at once, instead of writing every piece of output separately.
@@ -0,0 +1 @@
+Added the :bb:cfg:`logSearchIndex` option and the ``/logs/search`` data API endpoint, to find the lines of the build logs containing a given text.
@@ -0,0 +1 @@
+Added the :bb:cfg:`logStorage` option, to store the content of logs in a sharded directory (``util.FilesystemLogStorage``) or in an S3-compatible bucket (``util.S3LogStorage``) instead of the database.
@@ -0,0 +1 @@
+Log chunks are now stored with an index of their line offsets, so that reading a range of lines, such as the tail of a big log, only reads the bytes it needs.
@@ -0,0 +1 @@
+The ``simple`` MQ implementation now dispatches each message through an index of the consumer filters, so its cost no longer grows with the number of consumers which do not match it.
@@ -0,0 +1,2 @@
+The default builder prioritization now ranks the builders by the highest priority of their unclaimed build requests, then by the age of their oldest request, fetching both for all the pending builders in a single database query.
+:py:func:`buildbot.process.builder.getOldestRequestTimes` and :py:func:`buildbot.process.builder.getPrioritiesAndOldestRequestTimes` make the same available to custom ``prioritizeBuilders`` functions.
@@ -0,0 +1 @@
+The REST API can fetch several resources in one request, with a POST of their paths to ``/api/v2/batch``.
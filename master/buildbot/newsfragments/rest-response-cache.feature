@@ -0,0 +1 @@
+The REST API now caches its responses until an event tells that the underlying data changed, up to ``c['www']['rest_cache_bytes']``, and its responses carry an ``ETag`` header honoured by ``If-None-Match`` requests.
@@ -0,0 +1 @@
+The REST API streams the big ``builds``, ``buildsets``, ``changes`` and test results collections, one page at a time read from the database, instead of building the whole response in memory.
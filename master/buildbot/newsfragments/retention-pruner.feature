@@ -0,0 +1 @@
+Added a :bb:cfg:`RetentionPruner` service which deletes old changes, builds, log content and buildsets in small resumable batches, at a bounded rate, and reports the rows and bytes it reclaimed. Pruning changes with :bb:cfg:`changeHorizon` and deleting old log chunks now also happen in small batches.
@@ -0,0 +1 @@
+Raw log downloads from the REST API are now streamed a few chunks at a time, instead of loading the whole log in memory.
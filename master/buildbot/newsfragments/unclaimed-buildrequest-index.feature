@@ -0,0 +1 @@
+The masters keep the unclaimed build requests of their builders in memory, kept current by the messages about the build requests, rather than querying them each time they try to start builds.
@@ -0,0 +1 @@
+The websocket server now queues the messages of clients which do not read them fast enough, coalesces the superseded ones, and disconnects the clients whose queue grows beyond ``c['www']['ws_max_queue_bytes']``.
@@ -0,0 +1 @@
+The REST API and the websocket can send MessagePack rather than JSON to the clients which ask for it with the ``Accept`` header or the ``msgpack`` subprotocol, if the ``msgpack`` package is installed.
@@ -0,0 +1 @@
+The websocket and server-sent events endpoints now share a single message queue consumer per subscribed path, and encode each message once for all the clients listening to it.
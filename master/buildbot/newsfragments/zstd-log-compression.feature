@@ -0,0 +1 @@
+Add a 'zstd' :bb:cfg:`logCompressionMethod`, which compresses log chunks with dictionaries trained from the recent logs of each builder (requires the ``zstandard`` package).
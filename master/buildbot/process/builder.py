@@ -43,6 +43,40 @@ def enforceChosenWorker(bldr, workerforbuilder, breq):
     return True
 
 
+@defer.inlineCallbacks
+def getOldestRequestTimes(master, builders):
+    """Returns the submitted_at of the oldest unclaimed build request of each
+    of the given builders, fetched in a single query.  This is meant for
+    C{prioritizeBuilders} functions, which would otherwise call
+    L{Builder.getOldestRequestTime} for each builder.
+
+    @returns: dictionary mapping builder name to datetime instance or None,
+    via Deferred
+    """
+    builderids = yield defer.gatherResults(
+        [defer.maybeDeferred(bldr.getBuilderId) for bldr in builders])
+    times = yield master.db.buildrequests.getOldestRequestTimes(builderids)
+    return {bldr.name: times.get(builderid)
+            for bldr, builderid in zip(builders, builderids)}
+
+
+@defer.inlineCallbacks
+def getPrioritiesAndOldestRequestTimes(master, builders):
+    """Returns the highest priority and the submitted_at of the oldest
+    unclaimed build request of each of the given builders, fetched in a single
+    query.
+
+    @returns: dictionary mapping builder name to a (priority, datetime) tuple,
+    or (None, None) for the builders without unclaimed build requests, via
+    Deferred
+    """
+    builderids = yield defer.gatherResults(
+        [defer.maybeDeferred(bldr.getBuilderId) for bldr in builders])
+    rv = yield master.db.buildrequests.getPrioritiesAndOldestRequestTimes(builderids)
+    return {bldr.name: rv.get(builderid, (None, None))
+            for bldr, builderid in zip(builders, builderids)}
+
+
 class Builder(util_service.ReconfigurableServiceMixin,
               service.MultiService):
 
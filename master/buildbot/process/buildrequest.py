@@ -54,15 +54,43 @@ class BuildRequestCollapser:
         unclaim_brs.sort(key=lambda brd: brd['submitted_at'])
         return unclaim_brs
 
+    @defer.inlineCallbacks
+    def _getCollapseKeys(self, bsids, full):
+        # Compute the collapse key of each buildset, fetching the sourcestamps
+        # of all the buildsets at once.  With C{full}, the key is the one of
+        # L{BuildRequest.collapseKey}, otherwise it is the set of codebases,
+        # which requests must share to be candidates for a collapse.
+        sourcestamps = yield self.master.db.sourcestamps.getSourceStampsForBuildsets(bsids)
+        if not full:
+            return {bsid: frozenset(ss['codebase'] for ss in sourcestamps.get(bsid, []))
+                    for bsid in bsids}
+
+        ssids = {ss['ssid'] for sslist in sourcestamps.values() for ss in sslist}
+        ssidsWithChanges = yield self.master.db.changes.getSourceStampIdsWithChanges(ssids)
+        keys = {}
+        for bsid in bsids:
+            key = BuildRequest.collapseKey(sourcestamps.get(bsid, []), ssidsWithChanges)
+            # the requests of a same buildset are always collapsed together
+            keys[bsid] = key if key is not None else ('buildset', bsid)
+        return keys
+
     @defer.inlineCallbacks
     def collapse(self):
+        # avoid a circular import
+        from buildbot.process.builder import Builder
+
         brids = set()
 
+        # group the new requests by builder, so that the unclaimed requests of
+        # each builder are only fetched once
+        new_brs = {}
         for brid in self.brids:
             # Get the BuildRequest object
             br = yield self.master.data.get(('buildrequests', brid))
+            new_brs.setdefault(br['builderid'], {})[brid] = br
+
+        for builderid, brs in new_brs.items():
             # Retrieve the buildername
-            builderid = br['builderid']
             bldrdict = yield self.master.data.get(('builders', builderid))
             # Get the builder object
             bldr = self.master.botmaster.builders.get(bldrdict['name'])
@@ -74,15 +102,30 @@ class BuildRequestCollapser:
             if not collapseRequestsFn or not unclaim_brs:
                 continue
 
+            # group the candidates by collapse key.  The default collapse
+            # function collapses exactly the requests with the same full key,
+            # so it does not need to be called.
+            isDefault = collapseRequestsFn is Builder._defaultCollapseRequestFn
+            bsids = {unclaim_br['buildsetid'] for unclaim_br in unclaim_brs}
+            bsids.update(br['buildsetid'] for br in brs.values())
+            keys = yield self._getCollapseKeys(bsids, full=isDefault)
+            groups = {}
             for unclaim_br in unclaim_brs:
-                if unclaim_br['buildrequestid'] == br['buildrequestid']:
-                    continue
+                groups.setdefault(keys[unclaim_br['buildsetid']], []).append(unclaim_br)
+
+            for br in brs.values():
+                for unclaim_br in groups.get(keys[br['buildsetid']], []):
+                    if unclaim_br['buildrequestid'] == br['buildrequestid']:
+                        continue
 
-                canCollapse = yield collapseRequestsFn(self.master, bldr, br, unclaim_br)
-                if canCollapse is True:
-                    brids.add(unclaim_br['buildrequestid'])
+                    if isDefault:
+                        canCollapse = True
+                    else:
+                        canCollapse = yield collapseRequestsFn(self.master, bldr, br, unclaim_br)
+                    if canCollapse is True:
+                        brids.add(unclaim_br['buildrequestid'])
 
-        brids = list(brids)
+        brids = sorted(brids)
         if brids:
             # Claim the buildrequests
             yield self.master.data.updates.claimBuildRequests(brids)
@@ -309,6 +352,30 @@ class BuildRequest:
 
         return True
 
+    @staticmethod
+    def collapseKey(sourcestamps, ssidsWithChanges):
+        """
+        Returns the key under which the requests for the given sourcestamps
+        are collapsed by L{canBeCollapsed}: two requests for different
+        buildsets can be collapsed if and only if they have the same key.
+        None means that the requests cannot be collapsed with those of any
+        other buildset.
+
+        @param sourcestamps: the sourcestamp dictionaries of the buildset, as
+        returned by the db API
+        @param ssidsWithChanges: the IDs of the sourcestamps having changes
+        """
+        key = []
+        for ss in sorted(sourcestamps, key=lambda ss: ss['codebase']):
+            # anything with a patch won't be collapsed
+            if ss['patchid'] is not None:
+                return None
+            # if both have changes, the revisions are not compared
+            hasChanges = ss['ssid'] in ssidsWithChanges
+            key.append((ss['codebase'], ss['repository'], ss['branch'], ss['project'],
+                        hasChanges, None if hasChanges else ss['revision']))
+        return tuple(key)
+
     def mergeSourceStampsWith(self, others):
         """ Returns one merged sourcestamp for every codebase """
         # get all codebases from all requests
@@ -25,8 +25,14 @@ from twisted.python import log
 from twisted.python.failure import Failure
 
 from buildbot.data import resultspec
+from buildbot.interfaces import IRenderable
+from buildbot.locks import LockAccess
 from buildbot.process import metrics
+from buildbot.process.builder import getPrioritiesAndOldestRequestTimes
 from buildbot.process.buildrequest import BuildRequest
+from buildbot.process.buildrequestindex import UnclaimedBuildRequestIndex
+from buildbot.process.buildrequestindex import brdictSortKey
+from buildbot.util import Notifier
 from buildbot.util import epoch2datetime
 from buildbot.util import service
 
@@ -54,6 +60,9 @@ class BuildChooserBase:
         self.master = master
         self.breqCache = {}
         self.unclaimedBrdicts = None
+        self.unclaimedBrdictsById = None
+        # the UnclaimedBuildRequestIndex to get the requests from, if any
+        self.unclaimedIndex = None
 
     @defer.inlineCallbacks
     def chooseNextBuild(self):
@@ -75,20 +84,24 @@ class BuildChooserBase:
     @defer.inlineCallbacks
     def _fetchUnclaimedBrdicts(self):
         # Sets up a cache of all the unclaimed brdicts. The cache is
-        # saved at self.unclaimedBrdicts cache. If the cache already
-        # exists, this function does nothing. If a refetch is desired, set
-        # the self.unclaimedBrdicts to None before calling."""
+        # saved at self.unclaimedBrdicts cache, and indexed by id at
+        # self.unclaimedBrdictsById. If the cache already exists, this
+        # function does nothing. If a refetch is desired, set
+        # the self.unclaimedBrdicts to None before calling.
         if self.unclaimedBrdicts is None:
-            # TODO: use order of the DATA API
-            brdicts = yield self.master.data.get(('builders',
-                                                  (yield self.bldr.getBuilderId()),
-                                                  'buildrequests'),
-                                                 [resultspec.Filter('claimed',
-                                                                    'eq',
-                                                                    [False])])
-            # sort by submitted_at, so the first is the oldest
-            brdicts.sort(key=lambda brd: brd['submitted_at'])
-            self.unclaimedBrdicts = brdicts
+            builderid = yield self.bldr.getBuilderId()
+            if self.unclaimedIndex is not None and self.unclaimedIndex.running:
+                brdicts = yield self.unclaimedIndex.getUnclaimedBrdicts(builderid)
+            else:
+                brdicts = yield self.master.data.get(('builders', builderid, 'buildrequests'),
+                                                     [resultspec.Filter('claimed',
+                                                                        'eq',
+                                                                        [False])])
+            # sort by priority, then submitted_at, so the first is the oldest
+            # of the most urgent requests
+            self.unclaimedBrdicts = sorted(brdicts, key=brdictSortKey)
+            self.unclaimedBrdictsById = {brdict['buildrequestid']: brdict
+                                         for brdict in brdicts}
         return self.unclaimedBrdicts
 
     @defer.inlineCallbacks
@@ -110,11 +123,7 @@ class BuildChooserBase:
         if breq is None:
             return None
 
-        brid = breq.id
-        for brdict in self.unclaimedBrdicts:
-            if brid == brdict['buildrequestid']:
-                return brdict
-        return None
+        return self.unclaimedBrdictsById.get(breq.id)
 
     def _removeBuildRequest(self, breq):
         # Remove a BuildrRequest object (and its brdict)
@@ -123,7 +132,7 @@ class BuildChooserBase:
         if breq is None:
             return
 
-        brdict = self._getBrdictForBuildRequest(breq)
+        brdict = self.unclaimedBrdictsById.pop(breq.id, None)
         if brdict is not None:
             self.unclaimedBrdicts.remove(brdict)
 
@@ -131,7 +140,8 @@ class BuildChooserBase:
             del self.breqCache[breq.id]
 
     def _getUnclaimedBuildRequests(self):
-        # Retrieve the list of BuildRequest objects for all unclaimed builds
+        # Retrieve the list of BuildRequest objects for all unclaimed builds,
+        # the ones to start first coming first
         return defer.gatherResults([
             self._getBuildRequestForBrdict(brdict)
             for brdict in self.unclaimedBrdicts])
@@ -286,6 +296,11 @@ class BuildRequestDistributor(service.AsyncMultiService):
         super().__init__()
         self.botmaster = botmaster
 
+        # the unclaimed build requests of the builders, read by the build
+        # choosers
+        self.unclaimedIndex = UnclaimedBuildRequestIndex()
+        self.unclaimedIndex.setServiceParent(self)
+
         # lock to ensure builders are only sorted once at any time
         self.pending_builders_lock = defer.DeferredLock()
 
@@ -298,6 +313,13 @@ class BuildRequestDistributor(service.AsyncMultiService):
         self._pendingMSBOCalls = []
         self._activity_loop_deferred = None
 
+        # the builders on which the activity loop is starting builds, mapped
+        # to their Deferred and the resources they compete for with the other
+        # builders (see _getBuilderResources)
+        self._active_builders = {}
+        # notified when a builder is done or new builders are pending
+        self._activity_changed = Notifier()
+
     @defer.inlineCallbacks
     def stopService(self):
         # Lots of stuff happens asynchronously here, so we need to let it all
@@ -306,6 +328,11 @@ class BuildRequestDistributor(service.AsyncMultiService):
         # self.running is false.
         yield self.activity_lock.run(service.AsyncService.stopService, self)
 
+        # the builders being run concurrently with the current one, if any,
+        # are let to finish as well
+        if self._active_builders:
+            yield defer.DeferredList([d for d, _ in self._active_builders.values()])
+
         # now let any outstanding calls to maybeStartBuildsOn to finish, so
         # they don't get interrupted in mid-stride.  This tends to be
         # particularly painful because it can occur when a generator is gc'd.
@@ -357,6 +384,7 @@ class BuildRequestDistributor(service.AsyncMultiService):
                 self._pending_builders = \
                     yield self._sortBuilders(
                         list(existing_pending | new_builders))
+                self._activity_changed.notify(None)
 
                 # start the activity loop, if we aren't already
                 # working on that.
@@ -374,16 +402,11 @@ class BuildRequestDistributor(service.AsyncMultiService):
     def _defaultSorter(self, master, builders):
         timer = metrics.Timer("BuildRequestDistributor._defaultSorter()")
         timer.start()
-        # perform an asynchronous schwarzian transform, transforming None
-        # into sys.maxint so that it sorts to the end
-
-        def xform(bldr):
-            d = defer.maybeDeferred(bldr.getOldestRequestTime)
-            d.addCallback(lambda time:
-                          (((time is None) and None or time), bldr))
-            return d
-        xformed = yield defer.gatherResults(
-            [xform(bldr) for bldr in builders])
+        # perform a schwarzian transform, fetching the highest request
+        # priorities and the oldest request times of all the builders in a
+        # single query
+        stats = yield getPrioritiesAndOldestRequestTimes(master, builders)
+        xformed = [(stats[bldr.name], bldr) for bldr in builders]
 
         # sort the transformed list synchronously, comparing None to the end of
         # the list
@@ -391,11 +414,11 @@ class BuildRequestDistributor(service.AsyncMultiService):
             """
             Key function can be used to sort a list
             where each list element is a tuple:
-                (datetime.datetime, Builder)
+                ((priority, datetime.datetime), Builder)
 
-            @return: a tuple of (date, builder name)
+            @return: a tuple of (no request, -priority, date, builder name)
             """
-            (date, builder) = a
+            ((priority, date), builder) = a
             if date is None:
                 # Choose a really big date, so that any
                 # date set to 'None' will appear at the
@@ -405,7 +428,8 @@ class BuildRequestDistributor(service.AsyncMultiService):
                 # to perform comparisons with other dates which
                 # have the time zone set.
                 date = date.replace(tzinfo=tzutc())
-            return (date, builder.name)
+            # the builders with the most urgent requests come first
+            return (priority is None, -(priority or 0), date, builder.name)
         xformed.sort(key=xformedKey)
 
         # and reverse the transform
@@ -454,6 +478,13 @@ class BuildRequestDistributor(service.AsyncMultiService):
                 self.activity_lock.release()
                 break
 
+            # wait for a free slot before taking more pending builders, so
+            # that they get sorted with the ones which come meanwhile
+            if len(self._active_builders) >= self.master.config.builderStartConcurrency:
+                yield self._activity_changed.wait()
+                self.activity_lock.release()
+                continue
+
             if not pending_builders:
                 # lock pending_builders, pop an element from it, and release
                 yield self.pending_builders_lock.acquire()
@@ -461,6 +492,10 @@ class BuildRequestDistributor(service.AsyncMultiService):
                 # bail out if we shouldn't keep looping
                 if not self._pending_builders:
                     self.pending_builders_lock.release()
+                    if self._active_builders:
+                        yield self._activity_changed.wait()
+                        self.activity_lock.release()
+                        continue
                     self.activity_lock.release()
                     break
                 # take that builder list, and run it until the end
@@ -469,27 +504,91 @@ class BuildRequestDistributor(service.AsyncMultiService):
                 self._pending_builders = []
                 self.pending_builders_lock.release()
 
-            bldr_name = pending_builders.pop(0)
+            bldr = self._popStartableBuilder(pending_builders)
+            if bldr is not None:
+                self._startBuilder(bldr)
 
-            # get the actual builder object
-            bldr = self.botmaster.builders.get(bldr_name)
-            try:
-                if bldr:
-                    yield self._maybeStartBuildsOnBuilder(bldr)
-            except Exception:
-                log.err(Failure(), "from maybeStartBuild for builder '{}'".format(bldr_name))
+            metrics.MetricCountEvent.log('BuildRequestDistributor.pending_builders',
+                                         len(pending_builders) + len(self._pending_builders),
+                                         absolute=True)
+            metrics.MetricCountEvent.log('BuildRequestDistributor.active_builders',
+                                         len(self._active_builders), absolute=True)
+
+            if bldr is None and self._active_builders:
+                # all the pending builders compete with the active ones
+                yield self._activity_changed.wait()
 
             self.activity_lock.release()
 
+        if self._active_builders:
+            yield defer.DeferredList([d for d, _ in self._active_builders.values()])
+
         timer.stop()
 
         self.active = False
 
+    def _popStartableBuilder(self, pending_builders):
+        # pop the first pending builder which does not compete with the
+        # active ones, keeping the priority order of the others
+        i = 0
+        while i < len(pending_builders):
+            # get the actual builder object
+            bldr = self.botmaster.builders.get(pending_builders[i])
+            if bldr is None:
+                del pending_builders[i]
+            elif self._isCompeting(bldr):
+                i += 1
+            else:
+                del pending_builders[i]
+                return bldr
+        return None
+
+    def _getBuilderResources(self, bldr):
+        # the builders which share workers or locks cannot decide
+        # concurrently whether their builds can start; None stands for the
+        # resources which are only known when the build starts
+        resources = {('worker', name) for name in bldr.config.workernames}
+        if IRenderable.providedBy(bldr.config.locks):
+            return None
+        for lock in bldr.config.locks:
+            if isinstance(lock, LockAccess):
+                lock = lock.lockid
+            resources.add(('lock', lock.name))
+        return resources
+
+    def _isCompeting(self, bldr):
+        if not self._active_builders:
+            return False
+        if bldr.name in self._active_builders:
+            return True
+        resources = self._getBuilderResources(bldr)
+        for _, active_resources in self._active_builders.values():
+            if resources is None or active_resources is None or resources & active_resources:
+                return True
+        return False
+
+    def _startBuilder(self, bldr):
+        resources = None
+        if self.master.config.builderStartConcurrency > 1:
+            resources = self._getBuilderResources(bldr)
+
+        d = self._maybeStartBuildsOnBuilder(bldr)
+        self._active_builders[bldr.name] = (d, resources)
+
+        @d.addBoth
+        def done(res):
+            if isinstance(res, Failure):
+                log.err(res, "from maybeStartBuild for builder '{}'".format(bldr.name))
+            del self._active_builders[bldr.name]
+            metrics.MetricCountEvent.log('BuildRequestDistributor.processed_builders', 1)
+            self._activity_changed.notify(None)
+
     @defer.inlineCallbacks
     def _maybeStartBuildsOnBuilder(self, bldr):
         # create a chooser to give us our next builds
         # this object is temporary and will go away when we're done
         bc = self.createBuildChooser(bldr, self.master)
+        builderid = yield bldr.getBuilderId()
 
         while True:
             worker, breqs = yield bc.chooseNextBuild()
@@ -502,20 +601,28 @@ class BuildRequestDistributor(service.AsyncMultiService):
             claimed_at = epoch2datetime(claimed_at_epoch)
             if not (yield self.master.data.updates.claimBuildRequests(
                     brids, claimed_at=claimed_at)):
-                # some brids were already claimed, so start over
+                # some brids were already claimed, so start over, with the
+                # requests as the database has them
+                self.unclaimedIndex.invalidate(builderid)
                 bc = self.createBuildChooser(bldr, self.master)
                 continue
+            self.unclaimedIndex.removeBuildRequests(builderid, brids)
 
             buildStarted = yield bldr.maybeStartBuild(worker, breqs)
-            if not buildStarted:
+            if buildStarted:
+                metrics.MetricCountEvent.log('BuildRequestDistributor.started_builds', 1)
+            else:
                 yield self.master.data.updates.unclaimBuildRequests(brids)
+                self.unclaimedIndex.invalidate(builderid)
                 # try starting builds again.  If we still have a working worker,
                 # then this may re-claim the same buildrequests
                 self.botmaster.maybeStartBuildsForBuilder(self.name)
 
     def createBuildChooser(self, bldr, master):
         # just instantiate the build chooser requested
-        return self.BuildChooser(bldr, master)
+        bc = self.BuildChooser(bldr, master)
+        bc.unclaimedIndex = self.unclaimedIndex
+        return bc
 
     @defer.inlineCallbacks
     def _waitForFinish(self):
@@ -0,0 +1,171 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import bisect
+
+from twisted.internet import defer
+
+from buildbot.data import resultspec
+from buildbot.process import metrics
+from buildbot.util import epoch2datetime
+from buildbot.util import service
+
+
+def brdictSortKey(brdict):
+    # the requests with the highest priority first, then the oldest
+    return (-brdict['priority'], brdict['submitted_at'], brdict['buildrequestid'])
+
+
+class BuilderQueue:
+
+    """
+    The unclaimed build requests of a builder, kept sorted by
+    L{brdictSortKey}.
+    """
+
+    __slots__ = ['brdicts', 'keys', 'loadedAt']
+
+    def __init__(self, brdicts, loadedAt):
+        self.brdicts = {brdict['buildrequestid']: brdict for brdict in brdicts}
+        self.keys = sorted(brdictSortKey(brdict) for brdict in self.brdicts.values())
+        self.loadedAt = loadedAt
+
+    def add(self, brdict):
+        self.remove(brdict['buildrequestid'])
+        self.brdicts[brdict['buildrequestid']] = brdict
+        bisect.insort(self.keys, brdictSortKey(brdict))
+
+    def remove(self, brid):
+        brdict = self.brdicts.pop(brid, None)
+        if brdict is not None:
+            del self.keys[bisect.bisect_left(self.keys, brdictSortKey(brdict))]
+
+    def getBrdicts(self):
+        return [self.brdicts[key[-1]] for key in self.keys]
+
+
+class UnclaimedBuildRequestIndex(service.AsyncService):
+
+    """
+    Keep the unclaimed build requests of the builders in memory, so that the
+    build choosers do not query them each time.
+
+    The requests of a builder are loaded from the database the first time
+    they are asked for, then kept current from the C{buildrequests} events.
+    They are reloaded when they were loaded more than C{RECONCILE_INTERVAL}
+    seconds ago, to make up for any missed event, and when a claim shows that
+    they are not current.
+    """
+
+    RECONCILE_INTERVAL = 5 * 60
+
+    def __init__(self):
+        super().__init__()
+        self.queues = {}  # builderid : BuilderQueue
+        # builderid : lists of the events received while loading the queue
+        self.loading = {}
+        self.qref = None
+
+    @defer.inlineCallbacks
+    def startService(self):
+        self.qref = yield self.master.mq.startConsuming(self.onEvent,
+                                                        ('buildrequests', None, None))
+        yield super().startService()
+
+    def stopService(self):
+        if self.qref is not None:
+            self.qref.stopConsuming()
+            self.qref = None
+        self.queues.clear()
+        return super().stopService()
+
+    def onEvent(self, key, msg):
+        builderid = msg['builderid']
+        for events in self.loading.get(builderid, []):
+            events.append(msg)
+        queue = self.queues.get(builderid)
+        if queue is not None:
+            self._apply(queue, msg)
+
+    def _apply(self, queue, msg):
+        # whatever the event, the message tells the current state
+        if msg['claimed'] or msg['complete']:
+            queue.remove(msg['buildrequestid'])
+        else:
+            queue.add(self._brdictFromMessage(msg))
+
+    @staticmethod
+    def _brdictFromMessage(msg):
+        # the messages which went through JSON (e.g. with the wamp mq) carry
+        # the times as epochs, while the loaded build requests carry datetimes
+        brdict = dict(msg)
+        for field in ('submitted_at', 'claimed_at', 'complete_at'):
+            if isinstance(brdict.get(field), (int, float)):
+                brdict[field] = epoch2datetime(brdict[field])
+        return brdict
+
+    @defer.inlineCallbacks
+    def _load(self, builderid):
+        events = []
+        self.loading.setdefault(builderid, []).append(events)
+        try:
+            brdicts = yield self.master.data.get(
+                ('builders', builderid, 'buildrequests'),
+                [resultspec.Filter('claimed', 'eq', [False])])
+        finally:
+            self.loading[builderid].remove(events)
+            if not self.loading[builderid]:
+                del self.loading[builderid]
+        metrics.MetricCountEvent.log('UnclaimedBuildRequestIndex.loads', 1)
+
+        queue = BuilderQueue(brdicts, self.master.reactor.seconds())
+        # the events which came during the query may or may not be reflected
+        # in its results
+        for msg in events:
+            self._apply(queue, msg)
+        if self.running:
+            self.queues[builderid] = queue
+        return queue
+
+    @defer.inlineCallbacks
+    def getUnclaimedBrdicts(self, builderid):
+        """
+        Get the unclaimed build requests of a builder, the ones to start
+        first coming first.
+
+        @returns: a new list of build request dictionaries, via Deferred
+        """
+        queue = self.queues.get(builderid)
+        if (queue is None or
+                self.master.reactor.seconds() - queue.loadedAt > self.RECONCILE_INTERVAL):
+            queue = yield self._load(builderid)
+        return queue.getBrdicts()
+
+    def removeBuildRequests(self, builderid, brids):
+        """
+        Drop build requests which this master has just claimed, without
+        waiting for their events.
+        """
+        queue = self.queues.get(builderid)
+        if queue is not None:
+            for brid in brids:
+                queue.remove(brid)
+
+    def invalidate(self, builderid):
+        """
+        Forget the build requests of a builder, which are loaded again the
+        next time they are asked for.
+        """
+        self.queues.pop(builderid, None)
@@ -19,6 +19,7 @@ from twisted.internet import defer
 from twisted.python import log
 
 from buildbot import util
+from buildbot.process.logcompactor import isLogCompactorConfigured
 from buildbot.util import lineboundaries
 
 
@@ -114,6 +115,10 @@ class Log:
 
         self._had_errors = len(self.subPoint.pop_exceptions()) > 0
 
+        # a LogCompactor service will get to this log in the background
+        if isLogCompactorConfigured(self.master.config):
+            return
+
         # start a compressLog call but don't make our caller wait for
         # it to complete
         d = self.master.data.updates.compressLog(self.logid)
@@ -0,0 +1,156 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+from twisted.internet import defer
+from twisted.python import log
+
+from buildbot import config
+from buildbot.process import metrics
+from buildbot.util import service
+from buildbot.util.state import StateMixin
+
+
+class LogCompactor(service.BuildbotService, StateMixin):
+
+    """
+    Walk the finished logs in the background, gather their small chunks into
+    bigger ones and recompress them with the configured compression method.
+
+    The logs are walked in order of their id, and the position is saved in the
+    database so that the walk resumes where it stopped after a restart.  Logs
+    which are not finished yet are remembered, and compacted once finished; at
+    most C{maxPending} of them are remembered, the oldest ones being forgotten
+    (e.g. logs left unfinished by a crashed master would never complete).
+    The database work is throttled to about C{bytesPerSecond} bytes per second.
+    """
+
+    name = "LogCompactor"
+
+    def checkConfig(self, bytesPerSecond=1024 * 1024, batchSize=100, pollInterval=10 * 60,
+                    maxPending=1000):
+        if not isinstance(bytesPerSecond, int) or bytesPerSecond <= 0:
+            config.error("LogCompactor: bytesPerSecond must be a positive integer")
+        if not isinstance(batchSize, int) or batchSize <= 0:
+            config.error("LogCompactor: batchSize must be a positive integer")
+        if not isinstance(pollInterval, (int, float)) or pollInterval <= 0:
+            config.error("LogCompactor: pollInterval must be a positive number")
+        if not isinstance(maxPending, int) or maxPending < 0:
+            config.error("LogCompactor: maxPending must be a non-negative integer")
+
+    def reconfigService(self, bytesPerSecond=1024 * 1024, batchSize=100, pollInterval=10 * 60,
+                        maxPending=1000):
+        self.bytesPerSecond = bytesPerSecond
+        self.batchSize = batchSize
+        self.pollInterval = pollInterval
+        self.maxPending = maxPending
+        return defer.succeed(None)
+
+    @defer.inlineCallbacks
+    def startService(self):
+        yield super().startService()
+        self._stopping = False
+        self._sleepCall = None
+        self._sleepDeferred = None
+        self._lastLogid = None
+        self._pendingLogids = []
+        self._runDeferred = self._run()
+
+    @defer.inlineCallbacks
+    def stopService(self):
+        self._stopping = True
+        self._wakeUp()
+        yield self._runDeferred
+        yield super().stopService()
+
+    def _sleep(self, seconds):
+        self._sleepDeferred = defer.Deferred()
+        self._sleepCall = self.master.reactor.callLater(
+            seconds, self._sleepDeferred.callback, None)
+        return self._sleepDeferred
+
+    def _wakeUp(self):
+        if self._sleepCall is not None and self._sleepCall.active():
+            self._sleepCall.cancel()
+            self._sleepDeferred.callback(None)
+
+    @defer.inlineCallbacks
+    def _run(self):
+        while not self._stopping:
+            try:
+                more = yield self.compactBatch()
+            except Exception as e:
+                log.err(e, 'while compacting logs')
+                more = False
+            if not more and not self._stopping:
+                yield self._sleep(self.pollInterval)
+
+    @defer.inlineCallbacks
+    def _compact(self, logid):
+        rewritten, saved = yield self.master.db.logs.compactLog(logid)
+        metrics.MetricCountEvent.log('LogCompactor.logs_compacted', 1)
+        metrics.MetricCountEvent.log('LogCompactor.bytes_rewritten', rewritten)
+        metrics.MetricCountEvent.log('LogCompactor.bytes_saved', saved)
+        if rewritten and not self._stopping:
+            # stay within our budget
+            yield self._sleep(rewritten / self.bytesPerSecond)
+
+    @defer.inlineCallbacks
+    def compactBatch(self):
+        """
+        Compact the next batch of logs, and return true if there might be more
+        work to do right away.
+        """
+        if self._lastLogid is None:
+            self._lastLogid = yield self.getState('last_logid', 0)
+            self._pendingLogids = yield self.getState('pending_logids', [])
+
+        # first, the logs that were not finished when we walked past them;
+        # those which are gone are forgotten
+        completion = yield self.master.db.logs.getLogsCompletion(self._pendingLogids)
+        for logid in list(self._pendingLogids):
+            if self._stopping:
+                break
+            complete = completion.get(logid)
+            if complete is False:
+                continue
+            if complete:
+                yield self._compact(logid)
+            self._pendingLogids.remove(logid)
+
+        logs = yield self.master.db.logs.getLogIdsToCompact(self._lastLogid, self.batchSize)
+        for logid, complete in logs:
+            if self._stopping:
+                break
+            if complete:
+                yield self._compact(logid)
+            else:
+                self._pendingLogids.append(logid)
+            self._lastLogid = logid
+            metrics.MetricCountEvent.log('LogCompactor.last_logid', logid, absolute=True)
+
+        # forget the oldest unfinished logs rather than re-checking them forever
+        dropped = len(self._pendingLogids) - self.maxPending
+        if dropped > 0:
+            log.msg("LogCompactor: giving up on {} unfinished logs, up to log {}".format(
+                dropped, self._pendingLogids[dropped - 1]))
+            del self._pendingLogids[:dropped]
+
+        yield self.setState('last_logid', self._lastLogid)
+        yield self.setState('pending_logids', self._pendingLogids)
+        return len(logs) == self.batchSize
+
+
+def isLogCompactorConfigured(master_config):
+    return any(isinstance(svc, LogCompactor) for svc in master_config.services.values())
@@ -0,0 +1,171 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import datetime
+
+from twisted.internet import defer
+from twisted.python import log
+
+from buildbot import config
+from buildbot.process import metrics
+from buildbot.util import service
+from buildbot.util.state import StateMixin
+
+
+class RetentionPruner(service.BuildbotService, StateMixin):
+
+    """
+    Delete the old changes, builds (with their steps and logs), log content
+    and buildsets (with their build requests) in the background.
+
+    Each kind of data is walked by id in small batches, each deleted in its own
+    short transaction, and the position of the walks is saved in the database
+    so that they resume where they stopped after a restart.  The deletions are
+    throttled to about C{rowsPerSecond} rows per second.  The number of rows
+    and bytes reclaimed are logged after each pass, and reported as metrics.
+    """
+
+    name = "RetentionPruner"
+
+    # in dependency order: builds are deleted before their buildsets
+    KINDS = ('logs', 'builds', 'buildsets', 'changes')
+
+    def checkConfig(self, changeHorizon=None, buildHorizon=None, logHorizon=None,
+                    buildsetHorizon=None, batchSize=100, rowsPerSecond=1000,
+                    pollInterval=60 * 60):
+        if changeHorizon is not None and (not isinstance(changeHorizon, int) or
+                                          changeHorizon <= 0):
+            config.error("RetentionPruner: changeHorizon must be a positive integer")
+        for name, horizon in (('buildHorizon', buildHorizon), ('logHorizon', logHorizon),
+                              ('buildsetHorizon', buildsetHorizon)):
+            if horizon is not None and not isinstance(horizon, datetime.timedelta):
+                config.error("RetentionPruner: {} must be a timedelta".format(name))
+        if (changeHorizon, buildHorizon, logHorizon, buildsetHorizon) == (None,) * 4:
+            config.error("RetentionPruner: at least one horizon must be set")
+        if not isinstance(batchSize, int) or batchSize <= 0:
+            config.error("RetentionPruner: batchSize must be a positive integer")
+        if not isinstance(rowsPerSecond, int) or rowsPerSecond <= 0:
+            config.error("RetentionPruner: rowsPerSecond must be a positive integer")
+        if not isinstance(pollInterval, (int, float)) or pollInterval <= 0:
+            config.error("RetentionPruner: pollInterval must be a positive number")
+
+    def reconfigService(self, changeHorizon=None, buildHorizon=None, logHorizon=None,
+                        buildsetHorizon=None, batchSize=100, rowsPerSecond=1000,
+                        pollInterval=60 * 60):
+        self.horizons = dict(changes=changeHorizon, builds=buildHorizon,
+                             logs=logHorizon, buildsets=buildsetHorizon)
+        self.batchSize = batchSize
+        self.rowsPerSecond = rowsPerSecond
+        self.pollInterval = pollInterval
+        return defer.succeed(None)
+
+    @defer.inlineCallbacks
+    def startService(self):
+        yield super().startService()
+        self._stopping = False
+        self._sleepCall = None
+        self._sleepDeferred = None
+        self._cursors = None
+        self._done = set()
+        self._resetReport()
+        self._runDeferred = self._run()
+
+    @defer.inlineCallbacks
+    def stopService(self):
+        self._stopping = True
+        self._wakeUp()
+        yield self._runDeferred
+        yield super().stopService()
+
+    def _sleep(self, seconds):
+        self._sleepDeferred = defer.Deferred()
+        self._sleepCall = self.master.reactor.callLater(
+            seconds, self._sleepDeferred.callback, None)
+        return self._sleepDeferred
+
+    def _wakeUp(self):
+        if self._sleepCall is not None and self._sleepCall.active():
+            self._sleepCall.cancel()
+            self._sleepDeferred.callback(None)
+
+    def _resetReport(self):
+        self.rowsDeleted = {}
+        self.bytesReclaimed = 0
+
+    def _report(self):
+        if self.rowsDeleted:
+            rows = ', '.join('{} {}'.format(count, table)
+                             for table, count in sorted(self.rowsDeleted.items()))
+            log.msg("RetentionPruner: deleted {} rows ({}), reclaiming {} bytes".format(
+                sum(self.rowsDeleted.values()), rows, self.bytesReclaimed))
+        self._resetReport()
+
+    @defer.inlineCallbacks
+    def _run(self):
+        while not self._stopping:
+            try:
+                more = yield self.pruneBatch()
+            except Exception as e:
+                log.err(e, 'while pruning old data')
+                more = False
+            if not more and not self._stopping:
+                self._report()
+                self._done.clear()
+                yield self._sleep(self.pollInterval)
+
+    def _pruneFunction(self, kind):
+        retention = self.master.db.retention
+        horizon = self.horizons[kind]
+        if kind == 'changes':
+            return retention.pruneChanges, horizon
+        older_than_timestamp = self.master.reactor.seconds() - horizon.total_seconds()
+        prune = dict(logs=retention.pruneLogChunks, builds=retention.pruneBuilds,
+                     buildsets=retention.pruneBuildsets)[kind]
+        return prune, older_than_timestamp
+
+    @defer.inlineCallbacks
+    def pruneBatch(self):
+        """
+        Prune the next batch of each kind of data, and return true if there
+        might be more work to do right away.
+        """
+        if self._cursors is None:
+            self._cursors = yield self.getState('cursors', {})
+
+        more = False
+        for kind in self.KINDS:
+            if self._stopping or self.horizons[kind] is None or kind in self._done:
+                continue
+            prune, horizon = self._pruneFunction(kind)
+            res = yield prune(horizon, self._cursors.get(kind, 0), self.batchSize)
+            if res['last_id'] is None:
+                # this walk is over, the next one starts from the beginning
+                self._done.add(kind)
+                self._cursors.pop(kind, None)
+            else:
+                more = True
+                self._cursors[kind] = res['last_id']
+            yield self.setState('cursors', self._cursors)
+
+            rows = sum(res['rows'].values())
+            for table, count in res['rows'].items():
+                self.rowsDeleted[table] = self.rowsDeleted.get(table, 0) + count
+            self.bytesReclaimed += res['bytes']
+            metrics.MetricCountEvent.log('RetentionPruner.rows_deleted', rows)
+            metrics.MetricCountEvent.log('RetentionPruner.bytes_reclaimed', res['bytes'])
+            if rows and not self._stopping:
+                # stay within our budget
+                yield self._sleep(rows / self.rowsPerSecond)
+        return more
@@ -32,10 +32,10 @@ class BaseScheduler(ClusteredBuildbotService, StateMixin):
     DEFAULT_CODEBASES = {'': {}}
 
     compare_attrs = ClusteredBuildbotService.compare_attrs + \
-        ('builderNames', 'properties', 'codebases')
+        ('builderNames', 'properties', 'codebases', 'priority')
 
     def __init__(self, name, builderNames, properties=None,
-                 codebases=DEFAULT_CODEBASES):
+                 codebases=DEFAULT_CODEBASES, priority=0):
         super().__init__(name=name)
 
         ok = True
@@ -86,6 +86,13 @@ class BaseScheduler(ClusteredBuildbotService, StateMixin):
 
         self.codebases = codebases
 
+        if not isinstance(priority, int) and \
+                not interfaces.IRenderable.providedBy(priority):
+            config.error(
+                "The priority argument to a scheduler must be an integer "
+                "or an IRenderable object that will render to an integer.")
+        self.priority = priority
+
         # internal variables
         self._change_consumer = None
         self._enable_consumer = None
@@ -341,7 +348,7 @@ class BaseScheduler(ClusteredBuildbotService, StateMixin):
     @defer.inlineCallbacks
     def addBuildsetForSourceStamps(self, waited_for=False, sourcestamps=None,
                                    reason='', external_idstring=None, properties=None,
-                                   builderNames=None, **kw):
+                                   builderNames=None, priority=None, **kw):
         if sourcestamps is None:
             sourcestamps = []
         # combine properties
@@ -392,8 +399,18 @@ class BaseScheduler(ClusteredBuildbotService, StateMixin):
         # addBuildset method
         properties_dict = yield properties.render(properties.asDict())
 
+        # the priority given by the caller takes precedence over the one of
+        # the scheduler
+        if priority is None:
+            priority = yield properties.render(self.priority)
+        try:
+            priority = int(priority)
+        except (TypeError, ValueError):
+            raise ValueError("The priority of the builds of scheduler {} must be an "
+                             "integer, not {!r}".format(self.name, priority))
+
         bsid, brids = yield self.master.data.updates.addBuildset(
             scheduler=self.name, sourcestamps=sourcestamps, reason=reason,
             waited_for=waited_for, properties=properties_dict, builderids=builderids,
-            external_idstring=external_idstring, **kw)
+            external_idstring=external_idstring, priority=priority, **kw)
         return (bsid, brids)
@@ -629,7 +629,8 @@ class ForceScheduler(base.BaseScheduler):
                  buttonName=None,
                  codebases=None,
                  label=None,
-                 properties=None):
+                 properties=None,
+                 priority=0):
         """
         Initialize a ForceScheduler.
 
@@ -662,6 +663,10 @@ class ForceScheduler(base.BaseScheduler):
 
         @param properties: extra properties to configure the build
         @type properties: list of BaseParameter's
+
+        @param priority: the priority of the build requests; may render
+                         one of the forced properties
+        @type priority: integer or IRenderable
         """
 
         if not self.checkIfType(name, str):
@@ -727,7 +732,8 @@ class ForceScheduler(base.BaseScheduler):
         super().__init__(name=name,
                          builderNames=builderNames,
                          properties={},
-                         codebases=codebase_dict)
+                         codebases=codebase_dict,
+                         priority=priority)
 
         if properties:
             self.forcedProperties.extend(properties)
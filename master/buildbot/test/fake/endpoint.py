@@ -18,6 +18,7 @@
 from twisted.internet import defer
 
 from buildbot.data import base
+from buildbot.data import exceptions
 from buildbot.data import types
 
 testData = {
@@ -54,6 +55,37 @@ class RawTestsEndpoint(base.Endpoint):
         })
 
 
+class FakeRawStream:
+
+    def __init__(self, pieces):
+        self.pieces = list(pieces)
+
+    def read(self):
+        if not self.pieces:
+            return defer.succeed(None)
+        return defer.succeed(self.pieces.pop(0))
+
+
+class RawStreamTestsEndpoint(base.Endpoint):
+    isCollection = False
+    isRaw = True
+    pathPatterns = "/rawstreamtest"
+
+    def get(self, resultSpec, kwargs):
+        return defer.succeed({
+            "filename": "test.txt",
+            "mime-type": "text/test",
+            'raw': 'value\nvalue2\n'
+        })
+
+    def stream(self, resultSpec, kwargs):
+        return defer.succeed({
+            "filename": "test.txt",
+            "mime-type": "text/test",
+            'stream': FakeRawStream(['value\n', 'value2\n'])
+        })
+
+
 class FailEndpoint(base.Endpoint):
     isCollection = False
     pathPatterns = "/test/fail"
@@ -62,6 +94,14 @@ class FailEndpoint(base.Endpoint):
         return defer.fail(RuntimeError('oh noes'))
 
 
+class BadQueryEndpoint(base.Endpoint):
+    isCollection = True
+    pathPatterns = "/test/badquery"
+
+    def get(self, resultSpec, kwargs):
+        return defer.fail(exceptions.InvalidQueryError('bad query'))
+
+
 class TestEndpoint(base.Endpoint):
     isCollection = False
     pathPatterns = "/test/n:testid"
@@ -80,7 +120,12 @@ class TestEndpoint(base.Endpoint):
 class Test(base.ResourceType):
     name = "test"
     plural = "tests"
-    endpoints = [TestsEndpoint, TestEndpoint, FailEndpoint, RawTestsEndpoint]
+    endpoints = [TestsEndpoint, TestEndpoint, FailEndpoint, BadQueryEndpoint,
+                 RawTestsEndpoint, RawStreamTestsEndpoint]
+    eventPathPatterns = """
+        /test/:id
+    """
+    cacheable = True
 
     class EntityType(types.Entity):
         id = types.Integer()
@@ -137,7 +137,7 @@ class FakeUpdates(service.AsyncService):
     @defer.inlineCallbacks
     def addBuildset(self, waited_for, scheduler=None, sourcestamps=None, reason='',
                     properties=None, builderids=None, external_idstring=None,
-                    parent_buildid=None, parent_relationship=None):
+                    parent_buildid=None, parent_relationship=None, priority=0):
         if sourcestamps is None:
             sourcestamps = []
         if properties is None:
@@ -156,6 +156,7 @@ class FakeUpdates(service.AsyncService):
         self.testcase.assertIsInstance(builderids, list)
         self.testcase.assertIsInstance(external_idstring,
                                        (type(None), str))
+        self.testcase.assertIsInstance(priority, int)
 
         self.buildsetsAdded.append(locals())
         self.buildsetsAdded[-1].pop('self')
@@ -166,7 +167,8 @@ class FakeUpdates(service.AsyncService):
             sourcestamps=sourcestamps, reason=reason,
             properties=properties, builderids=builderids,
             waited_for=waited_for, external_idstring=external_idstring,
-            parent_buildid=parent_buildid, parent_relationship=parent_relationship)
+            parent_buildid=parent_buildid, parent_relationship=parent_relationship,
+            priority=priority)
         return (bsid, brids)
 
     def maybeBuildsetComplete(self, bsid):
@@ -498,11 +500,12 @@ class FakeDataConnector(service.AsyncMultiService):
         return getattr(self.rtypes, name)
 
     def get(self, path, filters=None, fields=None,
-            order=None, limit=None, offset=None):
+            order=None, limit=None, offset=None, cursor=None):
         if not isinstance(path, tuple):
             raise TypeError('path must be a tuple')
         return self.realConnector.get(path, filters=filters, fields=fields,
-                                      order=order, limit=limit, offset=offset)
+                                      order=order, limit=limit, offset=offset,
+                                      cursor=cursor)
 
     def control(self, action, args, path):
         if not isinstance(path, tuple):
@@ -50,6 +50,7 @@ from .logs import Log
 from .logs import LogChunk
 from .masters import FakeMastersComponent
 from .masters import Master
+from .retention import FakeRetentionComponent
 from .schedulers import FakeSchedulersComponent
 from .schedulers import Scheduler
 from .schedulers import SchedulerChange
@@ -109,6 +110,7 @@ __all__ = [
     'FakeDBConnector',
     'FakeLogsComponent',
     'FakeMastersComponent',
+    'FakeRetentionComponent',
     'FakeSchedulersComponent',
     'FakeSourceStampsComponent',
     'FakeStateComponent',
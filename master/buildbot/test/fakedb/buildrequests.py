@@ -20,6 +20,7 @@ from buildbot.db import buildrequests
 from buildbot.test.fakedb.base import FakeDBComponent
 from buildbot.test.fakedb.row import Row
 from buildbot.util import datetime2epoch
+from buildbot.util import epoch2datetime
 
 
 class BuildRequest(Row):
@@ -144,6 +145,23 @@ class FakeBuildRequestsComponent(FakeDBComponent):
             rv = self.applyResultSpec(rv, resultSpec)
         return rv
 
+    def getOldestRequestTimes(self, builderids):
+        d = self.getPrioritiesAndOldestRequestTimes(builderids)
+        d.addCallback(lambda rv: {builderid: submitted_at
+                                  for builderid, (_, submitted_at) in rv.items()})
+        return d
+
+    def getPrioritiesAndOldestRequestTimes(self, builderids):
+        rv = {}
+        for br in self.reqs.values():
+            if br.builderid not in builderids or br.complete or br.id in self.claims:
+                continue
+            priority, submitted_at = rv.get(br.builderid, (br.priority, br.submitted_at))
+            rv[br.builderid] = (max(priority, br.priority),
+                                min(submitted_at, br.submitted_at))
+        return defer.succeed({builderid: (priority, epoch2datetime(submitted_at))
+                              for builderid, (priority, submitted_at) in rv.items()})
+
     def claimBuildRequests(self, brids, claimed_at=None):
         for brid in brids:
             if brid not in self.reqs or brid in self.claims:
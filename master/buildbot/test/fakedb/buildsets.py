@@ -107,7 +107,7 @@ class FakeBuildsetsComponent(FakeDBComponent):
     @defer.inlineCallbacks
     def addBuildset(self, sourcestamps, reason, properties, builderids, waited_for,
                     external_idstring=None, submitted_at=None,
-                    parent_buildid=None, parent_relationship=None):
+                    parent_buildid=None, parent_relationship=None, priority=0):
         # We've gotten this wrong a couple times.
         assert isinstance(
             waited_for, bool), 'waited_for should be boolean: %r' % waited_for
@@ -123,7 +123,7 @@ class FakeBuildsetsComponent(FakeDBComponent):
         for builderid in builderids:
             br_rows.append(
                 BuildRequest(buildsetid=bsid, builderid=builderid, waited_for=waited_for,
-                             submitted_at=submitted_at))
+                             submitted_at=submitted_at, priority=priority))
 
         self.db.buildrequests.insertTestData(br_rows)
 
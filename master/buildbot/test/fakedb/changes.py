@@ -213,6 +213,10 @@ class FakeChangesComponent(FakeDBComponent):
             return defer.succeed(chdicts[0])
         return defer.succeed(None)
 
+    def getSourceStampIdsWithChanges(self, sourcestampids):
+        return defer.succeed({v['sourcestampid'] for v in self.changes.values()
+                              if v['sourcestampid'] in sourcestampids})
+
     def _chdict(self, row):
         chdict = row.copy()
         del chdict['uids']
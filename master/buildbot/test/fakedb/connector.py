@@ -24,6 +24,7 @@ from buildbot.test.fakedb.changes import FakeChangesComponent
 from buildbot.test.fakedb.changesources import FakeChangeSourcesComponent
 from buildbot.test.fakedb.logs import FakeLogsComponent
 from buildbot.test.fakedb.masters import FakeMastersComponent
+from buildbot.test.fakedb.retention import FakeRetentionComponent
 from buildbot.test.fakedb.row import Row
 from buildbot.test.fakedb.schedulers import FakeSchedulersComponent
 from buildbot.test.fakedb.sourcestamps import FakeSourceStampsComponent
@@ -87,6 +88,8 @@ class FakeDBConnector(service.AsyncMultiService):
         self._components.append(comp)
         self.tags = comp = FakeTagsComponent(self, testcase)
         self._components.append(comp)
+        self.retention = comp = FakeRetentionComponent(self, testcase)
+        self._components.append(comp)
         self.test_results = comp = FakeTestResultsComponent(self, testcase)
         self._components.append(comp)
         self.test_result_sets = comp = FakeTestResultSetsComponent(self, testcase)
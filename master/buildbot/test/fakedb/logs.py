@@ -16,9 +16,11 @@
 
 from twisted.internet import defer
 
+from buildbot.db.logs import search_terms
 from buildbot.test.fakedb.base import FakeDBComponent
 from buildbot.test.fakedb.row import Row
 from buildbot.test.util import validation
+from buildbot.util import epoch2datetime
 
 
 class Log(Row):
@@ -45,11 +47,14 @@ class LogChunk(Row):
         first_line=0,
         last_line=0,
         content='',
-        compressed=0)
+        compressed=0,
+        line_offsets=None,
+        content_key=None,
+        content_length=None)
 
     required_columns = ('logid', )
-    # 'content' column is sa.LargeBinary, it's bytestring.
-    binary_columns = ('content',)
+    # 'content' and 'line_offsets' columns are sa.LargeBinary, they're bytestrings.
+    binary_columns = ('content', 'line_offsets')
 
 
 class FakeLogsComponent(FakeDBComponent):
@@ -117,6 +122,17 @@ class FakeLogsComponent(FakeDBComponent):
         rv = lines[first_line:last_line + 1]
         return defer.succeed('\n'.join(rv) + '\n' if rv else '')
 
+    def getLogLinesBatch(self, logid, first_line, last_line, max_chunks):
+        # the fake does not keep track of chunks, so each line counts as one
+        if logid not in self.logs or first_line > last_line:
+            return defer.succeed(('', None))
+        lines = self.log_lines.get(logid, [])
+        last_line = min(last_line, first_line + max_chunks - 1, len(lines) - 1)
+        rv = lines[first_line:last_line + 1]
+        if not rv:
+            return defer.succeed(('', None))
+        return defer.succeed(('\n'.join(rv) + '\n', last_line))
+
     def addLog(self, stepid, name, slug, type):
         id = self._newId()
         self.logs[id] = dict(id=id, stepid=stepid,
@@ -145,6 +161,53 @@ class FakeLogsComponent(FakeDBComponent):
     def compressLog(self, logid, force=False):
         return defer.succeed(None)
 
+    def compactLog(self, logid):
+        return defer.succeed((0, 0))
+
+    def getLogIdsToCompact(self, after_logid, limit):
+        logids = sorted(logid for logid, row in self.logs.items()
+                        if logid > after_logid and row['type'] != 'd')
+        return defer.succeed([(logid, bool(self.logs[logid]['complete']))
+                              for logid in logids[:limit]])
+
+    def getLogsCompletion(self, logids):
+        return defer.succeed({logid: bool(self.logs[logid]['complete'])
+                              for logid in logids
+                              if logid in self.logs and self.logs[logid]['type'] != 'd'})
+
+    def searchLogs(self, query, builderid=None, min_started_at=None, max_started_at=None,
+                   limit=100):
+        if not search_terms(query.encode('utf-8')):
+            raise ValueError("a search query needs a word of at least 3 letters or digits")
+        needle = query.lower()
+        rv = []
+        for logid in sorted(self.logs, reverse=True):
+            row = self.logs[logid]
+            if row['type'] == 'd':
+                continue
+            step = self.db.steps.steps[row['stepid']]
+            build = self.db.builds.builds[step['buildid']]
+            started_at = step['started_at']
+            if builderid is not None and build['builderid'] != builderid:
+                continue
+            if min_started_at is not None and (started_at is None or
+                                               started_at < min_started_at):
+                continue
+            if max_started_at is not None and (started_at is None or
+                                               started_at > max_started_at):
+                continue
+            for i, line in enumerate(self.log_lines.get(logid, [])):
+                text = line[1:] if row['type'] == 's' else line
+                if needle not in text.lower():
+                    continue
+                rv.append(dict(logid=logid, stepid=row['stepid'], buildid=step['buildid'],
+                               builderid=build['builderid'],
+                               started_at=epoch2datetime(started_at),
+                               line=i, content=line))
+                if len(rv) >= limit:
+                    return defer.succeed(rv)
+        return defer.succeed(rv)
+
     def deleteOldLogChunks(self, older_than_timestamp):
         # not implemented
         self._deleted = older_than_timestamp
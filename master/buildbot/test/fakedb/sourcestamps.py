@@ -169,3 +169,11 @@ class FakeSourceStampsComponent(FakeDBComponent):
         for ssid in bset['sourcestamps']:
             results.append((yield self.getSourceStamp(ssid)))
         return results
+
+    def getSourceStampsForBuildsets(self, bsids):
+        rv = {}
+        for bsid in bsids:
+            ssids = self.db.buildsets.buildset_sourcestamps.get(bsid)
+            if ssids:
+                rv[bsid] = [self._getSourceStamp_sync(ssid) for ssid in ssids]
+        return defer.succeed(rv)
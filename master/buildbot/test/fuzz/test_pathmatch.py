@@ -0,0 +1,97 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import random
+import time
+
+from twisted.internet import defer
+from twisted.python import log
+
+from buildbot.data import connector
+from buildbot.test.util import fuzz
+from buildbot.util import pathmatch
+
+
+def randomPath(pattern):
+    # a path matching the pattern, or not, mostly
+    path = []
+    for pattern_elt in pattern:
+        mo = pathmatch.Matcher.path_elt_re.match(pattern_elt)
+        if random.uniform(0, 1.0) < 0.02:
+            path.append(random.choice(['nosuch', '-1', '']))
+        elif not mo:
+            path.append(pattern_elt)
+        elif mo.group(1) == 'n' or random.uniform(0, 1.0) < 0.5:
+            path.append(str(random.randint(0, 10000)))
+        else:
+            path.append('name-{}'.format(random.randint(0, 10000)))
+    return tuple(path)
+
+
+def linearMatch(patterns, path):
+    # the matching of each pattern in turn, to check the Matcher against
+    for pattern, value in patterns:
+        if len(pattern) != len(path):
+            continue
+        kwargs = {}
+        for pattern_elt, path_elt in zip(pattern, path):
+            mo = pathmatch.Matcher.path_elt_re.match(pattern_elt)
+            if mo:
+                type_flag, arg_name = mo.groups()
+                if type_flag:
+                    try:
+                        path_elt = pathmatch.Matcher.type_fns[type_flag](path_elt)
+                    except Exception:
+                        break
+                kwargs[arg_name] = path_elt
+            elif pattern_elt != path_elt:
+                break
+        else:
+            return value, kwargs
+    return None
+
+
+class MatcherFuzzer(fuzz.FuzzTestCase):
+
+    PATHS = 10000
+
+    def do_fuzz(self, endTime):
+        # look up paths like those of all the data API endpoints, and compare
+        # the speed of the Matcher with a match of each pattern in turn
+        data = connector.DataConnector()
+        data._setup()
+        patterns = data.matcher.iterPatterns()
+        paths = [randomPath(random.choice(patterns)[0]) for _ in range(self.PATHS)]
+
+        start = time.perf_counter()
+        expected = [linearMatch(patterns, path) for path in paths]
+        linear = time.perf_counter() - start
+
+        def match(path):
+            try:
+                return data.matcher[path]
+            except KeyError:
+                return None
+        match(())
+        start = time.perf_counter()
+        got = [match(path) for path in paths]
+        compiled = time.perf_counter() - start
+
+        self.assertEqual(got, expected)
+        log.msg("{} patterns, {} paths: {:.1f}us per path with a linear match, "
+                "{:.1f}us per path with Matcher".format(
+                    len(patterns), self.PATHS, linear / self.PATHS * 1e6,
+                    compiled / self.PATHS * 1e6))
+        return defer.succeed(None)
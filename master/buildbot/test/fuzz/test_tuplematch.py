@@ -0,0 +1,78 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import random
+import time
+
+from twisted.internet import defer
+from twisted.python import log
+
+from buildbot.test.util import fuzz
+from buildbot.util import tuplematch
+
+# filters shaped like those of the consumers of a busy master: most of them
+# are websocket subscriptions to one build, step or log
+
+
+def randomFilter():
+    kind = random.choice(['builds', 'steps', 'logs', 'buildrequests', 'changes'])
+    event = random.choice([None, 'new', 'finished', 'append'])
+    if random.uniform(0, 1.0) < 0.1:
+        return (kind, None, event)
+    return (kind, str(random.randint(0, 2000)), event)
+
+
+def randomKey():
+    kind = random.choice(['builds', 'steps', 'logs', 'buildrequests', 'changes'])
+    event = random.choice(['new', 'finished', 'append'])
+    return (kind, str(random.randint(0, 2000)), event)
+
+
+class TupleIndexFuzzer(fuzz.FuzzTestCase):
+
+    FILTERS = 10000
+    KEYS = 1000
+
+    def do_fuzz(self, endTime):
+        # check the index against matchTuple, and compare their speed
+        filters = [randomFilter() for _ in range(self.FILTERS)]
+        index = tuplematch.TupleIndex()
+        for i, filter in enumerate(filters):
+            index.add(filter, i)
+        keys = [randomKey() for _ in range(self.KEYS)]
+
+        start = time.perf_counter()
+        expected = [[i for i, filter in enumerate(filters)
+                     if tuplematch.matchTuple(key, filter)]
+                    for key in keys]
+        linear = time.perf_counter() - start
+
+        start = time.perf_counter()
+        got = [index.match(key) for key in keys]
+        indexed = time.perf_counter() - start
+
+        self.assertEqual(got, expected)
+        log.msg("{} filters, {} keys: {:.1f}us per key with matchTuple, "
+                "{:.1f}us per key with TupleIndex".format(
+                    self.FILTERS, self.KEYS, linear / self.KEYS * 1e6,
+                    indexed / self.KEYS * 1e6))
+
+        # remove half of the filters, which must leave the other half intact
+        for i in range(0, self.FILTERS, 2):
+            self.assertTrue(index.remove(filters[i], i))
+        self.assertEqual(len(index), self.FILTERS // 2)
+        for key, values in zip(keys, expected):
+            self.assertEqual(index.match(key), [i for i in values if i % 2])
+        return defer.succeed(None)
@@ -520,7 +520,7 @@ class TestBuildRequest(interfaces.InterfaceTests, TestReactorMixin,
             fakedb.Buildset(id=8822),
             fakedb.SourceStamp(id=234),
             fakedb.BuildsetSourceStamp(buildsetid=8822, sourcestampid=234),
-            fakedb.BuildRequest(id=82, buildsetid=8822, builderid=77),
+            fakedb.BuildRequest(id=82, buildsetid=8822, builderid=77, priority=5),
             fakedb.BuildsetProperty(buildsetid=8822, property_name='prop1',
                                     property_value='["one", "fake1"]'),
             fakedb.BuildsetProperty(buildsetid=8822, property_name='prop2',
@@ -536,7 +536,7 @@ class TestBuildRequest(interfaces.InterfaceTests, TestReactorMixin,
                                         'waited_for': False, 'claimed_at': None, 'results': -1,
                                         'claimed': False, 'buildsetid': 200, 'complete_at': None,
                                         'submitted_at': epoch2datetime(0),
-                                        'builderid': 77, 'claimed_by_masterid': None, 'priority': 0,
+                                        'builderid': 77, 'claimed_by_masterid': None, 'priority': 5,
                                         'properties': None})
         buildset = yield self.master.data.get(('buildsets', new_bsid))
         oldbuildset = yield self.master.data.get(('buildsets', 8822))
@@ -38,7 +38,7 @@ class Tests(interfaces.InterfaceTests):
     def test_signature_get(self):
         @self.assertArgSpecMatches(self.data.get)
         def get(self, path, filters=None, fields=None,
-                order=None, limit=None, offset=None):
+                order=None, limit=None, offset=None, cursor=None):
             pass
 
     def test_signature_getEndpoint(self):
@@ -74,7 +74,7 @@ class Tests(interfaces.InterfaceTests):
         def addBuildset(self, waited_for, scheduler=None, sourcestamps=None,
                         reason='', properties=None, builderids=None,
                         external_idstring=None,
-                        parent_buildid=None, parent_relationship=None):
+                        parent_buildid=None, parent_relationship=None, priority=0):
             pass
 
     def test_signature_updates_maybeBuildsetComplete(self):
@@ -0,0 +1,100 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import mock
+
+from twisted.internet import defer
+from twisted.trial import unittest
+
+from buildbot.data import dbqueries
+from buildbot.db import pool
+from buildbot.test.util import endpoint
+
+
+class DbQueriesEndpoint(endpoint.EndpointMixin, unittest.TestCase):
+
+    endpointClass = dbqueries.DbQueriesEndpoint
+    resourceTypeClass = dbqueries.DbQuery
+
+    def setUp(self):
+        self.setUpEndpoint()
+        self.stats = pool.QueryStats(pool_size=1)
+        self.master.db.pool = mock.Mock(stats=self.stats, replica=None)
+
+    def tearDown(self):
+        self.tearDownEndpoint()
+
+    def getLogLines(self):
+        def thd(conn):
+            pass
+        return thd
+
+    @defer.inlineCallbacks
+    def test_get(self):
+        thd = self.getLogLines()
+        for wait, duration in [(0, 0.0015), (0.004, 0.003)]:
+            timings = self.stats.submit()
+            timings[0:3] = 10, 10 + wait, 10 + wait + duration
+            self.stats.record(thd, timings, failed=False)
+
+        queries = yield self.callGet(('dbqueries',))
+        for query in queries:
+            self.validateData(query)
+        self.assertEqual(queries, [{
+            'name': 'DbQueriesEndpoint.getLogLines',
+            'pool': 'primary',
+            'count': 2,
+            'failures': 0,
+            'saturated': 0,
+            'duration': {
+                'total_us': 4500,
+                'max_us': 3000,
+                'p50_us': 2000,
+                'p95_us': 3000,
+                'p99_us': 3000,
+                'histogram': [0, 1, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+            },
+            'wait': {
+                'total_us': 4000,
+                'max_us': 4000,
+                'p50_us': 1000,
+                'p95_us': 4000,
+                'p99_us': 4000,
+                'histogram': [1, 0, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+            },
+        }])
+
+    @defer.inlineCallbacks
+    def test_get_replica(self):
+        thd = self.getLogLines()
+        replicaStats = pool.QueryStats(pool_size=1)
+        self.master.db.pool.replica = mock.Mock(stats=replicaStats)
+        for stats in self.stats, replicaStats, replicaStats:
+            timings = stats.submit()
+            timings[0:3] = 10, 10, 10.001
+            stats.record(thd, timings, failed=False)
+
+        queries = yield self.callGet(('dbqueries',))
+        for query in queries:
+            self.validateData(query)
+        self.assertEqual([(q['pool'], q['name'], q['count']) for q in queries], [
+            ('primary', 'DbQueriesEndpoint.getLogLines', 1),
+            ('replica', 'DbQueriesEndpoint.getLogLines', 2),
+        ])
+
+    @defer.inlineCallbacks
+    def test_get_empty(self):
+        queries = yield self.callGet(('dbqueries',))
+        self.assertEqual(queries, [])
@@ -196,3 +196,18 @@ class RawLogChunkEndpoint(LogChunkEndpointBase):
 
         self.assertEqual(logchunk,
                          {'filename': expFilename, 'mime-type': "text/plain", 'raw': expContent})
+
+        # the streamed content is the same, whatever the size of the pieces
+        for chunksPerRead in (1, 3, 1000):
+            self.patch(logchunks.RawLogStream, 'chunksPerRead', chunksPerRead)
+            _, kwargs = self.matcher[path]
+            data = yield self.ep.stream(resultspec.ResultSpec(), kwargs)
+            self.assertEqual(data['filename'], expFilename)
+            self.assertEqual(data['mime-type'], "text/plain")
+            pieces = []
+            while True:
+                piece = yield data['stream'].read()
+                if piece is None:
+                    break
+                pieces.append(piece)
+            self.assertEqual(''.join(pieces), expContent)
@@ -0,0 +1,121 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import mock
+
+from twisted.internet import defer
+from twisted.trial import unittest
+
+from buildbot.data import exceptions
+from buildbot.data import logmatches
+from buildbot.data import resultspec
+from buildbot.test import fakedb
+from buildbot.test.util import endpoint
+from buildbot.util import epoch2datetime
+
+
+class LogMatchesEndpoint(endpoint.EndpointMixin, unittest.TestCase):
+
+    endpointClass = logmatches.LogMatchesEndpoint
+    resourceTypeClass = logmatches.LogMatch
+
+    def setUp(self):
+        self.setUpEndpoint()
+        self.db.insertTestData([
+            fakedb.Builder(id=77, name='builder77'),
+            fakedb.Builder(id=78, name='builder78'),
+            fakedb.Master(id=88),
+            fakedb.Worker(id=13, name='wrk'),
+            fakedb.Buildset(id=8822),
+            fakedb.BuildRequest(id=82, buildsetid=8822),
+            fakedb.Build(id=13, builderid=77, masterid=88, workerid=13,
+                         buildrequestid=82, number=3),
+            fakedb.Build(id=14, builderid=78, masterid=88, workerid=13,
+                         buildrequestid=82, number=1),
+            fakedb.Step(id=50, buildid=13, number=5, name='make', started_at=1000),
+            fakedb.Step(id=51, buildid=14, number=1, name='make', started_at=2000),
+            fakedb.Log(id=60, stepid=50, name='stdio', slug='stdio', type='s'),
+            fakedb.Log(id=61, stepid=51, name='stdio', slug='stdio', type='s'),
+            fakedb.LogChunk(logid=60, first_line=0, last_line=1,
+                            content='ocompiling\neerror: no such file'),
+            fakedb.LogChunk(logid=61, first_line=0, last_line=0,
+                            content='eError: No such file'),
+        ])
+
+    def tearDown(self):
+        self.tearDownEndpoint()
+
+    def search(self, filters, limit=None):
+        resultSpec = resultspec.ResultSpec(filters=filters, limit=limit)
+        return self.callGet(('logs', 'search'), resultSpec=resultSpec)
+
+    @defer.inlineCallbacks
+    def test_get(self):
+        matches = yield self.search([
+            resultspec.Filter('content', 'contains', ['no such file'])])
+        for match in matches:
+            self.validateData(match)
+        self.assertEqual(matches, [{
+            'logid': 61,
+            'stepid': 51,
+            'buildid': 14,
+            'builderid': 78,
+            'started_at': epoch2datetime(2000),
+            'line': 0,
+            'content': 'eError: No such file',
+        }, {
+            'logid': 60,
+            'stepid': 50,
+            'buildid': 13,
+            'builderid': 77,
+            'started_at': epoch2datetime(1000),
+            'line': 1,
+            'content': 'eerror: no such file',
+        }])
+
+    @defer.inlineCallbacks
+    def test_get_builderid(self):
+        matches = yield self.search([
+            resultspec.Filter('content', 'contains', ['no such file']),
+            resultspec.Filter('builderid', 'eq', [77])])
+        self.assertEqual([m['logid'] for m in matches], [60])
+
+    @defer.inlineCallbacks
+    def test_get_started_at(self):
+        self.db.logs.searchLogs = mock.Mock(return_value=defer.succeed([]))
+        yield self.search([
+            resultspec.Filter('content', 'contains', ['no such file']),
+            resultspec.Filter('started_at', 'gt', [1000]),
+            resultspec.Filter('started_at', 'le', [3000])], limit=10)
+        self.db.logs.searchLogs.assert_called_with(
+            'no such file', builderid=None, min_started_at=1001, max_started_at=3000,
+            limit=10)
+
+    @defer.inlineCallbacks
+    def test_get_started_at_range(self):
+        matches = yield self.search([
+            resultspec.Filter('content', 'contains', ['no such file']),
+            resultspec.Filter('started_at', 'lt', [2000])])
+        self.assertEqual([m['logid'] for m in matches], [60])
+
+    @defer.inlineCallbacks
+    def test_get_no_query(self):
+        with self.assertRaises(exceptions.InvalidQueryError):
+            yield self.search([])
+
+    @defer.inlineCallbacks
+    def test_get_short_query(self):
+        with self.assertRaises(exceptions.InvalidQueryError):
+            yield self.search([resultspec.Filter('content', 'contains', ['e:'])])
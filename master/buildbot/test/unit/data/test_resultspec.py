@@ -19,9 +19,11 @@ import random
 from twisted.trial import unittest
 
 from buildbot.data import base
+from buildbot.data import exceptions
 from buildbot.data import resultspec
 from buildbot.data.resultspec import NoneComparator
 from buildbot.data.resultspec import ReverseComparator
+from buildbot.process import metrics
 
 
 def mklist(fld, *values):
@@ -314,6 +316,55 @@ class ResultSpec(unittest.TestCase):
         self.assertFalse(rs.popField('nosuch'))
         self.assertEqual(rs.fields, ['foo', 'bar'])
 
+    def test_paginateWithCursor(self):
+        rs = resultspec.ResultSpec(order=['-started_at'])
+        rs.paginateWithCursor([10, 3], 'buildid')
+        self.assertEqual(rs.order, ('-started_at', '-buildid'))
+        self.assertEqual(rs.cursor, [10, 3])
+
+    def test_paginateWithCursor_no_order(self):
+        rs = resultspec.ResultSpec()
+        rs.paginateWithCursor([], 'buildid')
+        self.assertEqual(rs.order, ('buildid',))
+
+    def test_paginateWithCursor_ordered_on_key(self):
+        rs = resultspec.ResultSpec(order=['results', '-buildid'])
+        rs.paginateWithCursor([], 'buildid')
+        self.assertEqual(rs.order, ('results', '-buildid'))
+
+    def test_reverseOrder(self):
+        rs = resultspec.ResultSpec(order=['-started_at', 'buildid'])
+        rs.reverseOrder('buildid')
+        self.assertEqual(rs.order, ('started_at', '-buildid'))
+
+    def test_reverseOrder_no_order(self):
+        rs = resultspec.ResultSpec()
+        rs.reverseOrder('buildid')
+        self.assertEqual(rs.order, ('-buildid',))
+
+    def test_apply_cursor_not_handled(self):
+        rs = resultspec.ResultSpec(order=['id'], cursor=[])
+        with self.assertRaises(exceptions.InvalidQueryError):
+            rs.apply(mklist('id', 1, 2))
+
+    def test_applyToSQLQuery_unbacked_metrics(self):
+        counts = []
+        self.patch(metrics.MetricCountEvent, 'log',
+                   lambda counter, count: counts.append((counter, count)))
+        rs = resultspec.ResultSpec(filters=[resultspec.Filter('foo', 'eq', [1])],
+                                   order=['-foo', 'bar'], limit=5)
+        query = object()
+        self.assertEqual(rs.applyToSQLQuery(query), (query, None))
+        self.assertEqual(sorted(counts), [
+            ('ResultSpec.unbacked_field.bar', 1),
+            ('ResultSpec.unbacked_field.foo', 1),
+            ('ResultSpec.unbacked_limited_queries', 1),
+            ('ResultSpec.unbacked_queries', 1),
+        ])
+        # the filters, order and limit are left to be done in python
+        self.assertEqual(rs.order, ('-foo', 'bar'))
+        self.assertEqual(rs.limit, 5)
+
 
 class Comparator(unittest.TestCase):
     def test_noneComparator(self):
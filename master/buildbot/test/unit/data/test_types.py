@@ -18,6 +18,7 @@ from datetime import datetime
 from twisted.trial import unittest
 
 from buildbot.data import types
+from buildbot.util import datetime2epoch
 
 
 class TypeMixin:
@@ -202,3 +203,21 @@ class Entity(TypeMixin, unittest.TestCase):
         {'field1': 1, 'field2': 'f2', 'field3': 10},
         {'field1': 'one', 'field2': 'f2'},
     ]
+
+
+class Msgpack(unittest.TestCase):
+
+    if types.msgpack is None:
+        skip = "msgpack not installed, skip the test"
+
+    def test_round_trip(self):
+        value = {'started_at': datetime(2020, 11, 15, 18, 40, 1),
+                 'content': b'\x01\x80\xfe', 'name': '\N{SNOWMAN}',
+                 'ids': [1, None]}
+        decoded = types.loadsMsgpack(types.dumpsMsgpack(value))
+        # datetimes are sent as epochs, as in JSON, and the binary values
+        # keep their bytes
+        self.assertEqual(decoded['started_at'], datetime2epoch(value['started_at']))
+        self.assertEqual(decoded['content'], b'\x01\x80\xfe')
+        self.assertEqual(decoded['name'], '\N{SNOWMAN}')
+        self.assertEqual(decoded['ids'], [1, None])
@@ -328,6 +328,72 @@ class Tests(interfaces.InterfaceTests):
     def test_getBuildRequests_no_repository_nor_branch(self):
         return self.do_test_getBuildRequests_branch_arg(expected=[70, 80, 90])
 
+    @defer.inlineCallbacks
+    def test_getOldestRequestTimes(self):
+        yield self.insertTestData([
+            # claimed
+            fakedb.BuildRequest(id=50, buildsetid=self.BSID, builderid=self.BLDRID1,
+                                submitted_at=self.SUBMITTED_AT_EPOCH - 30),
+            fakedb.BuildRequestClaim(brid=50, masterid=self.MASTER_ID,
+                                     claimed_at=self.CLAIMED_AT_EPOCH),
+            # complete
+            fakedb.BuildRequest(id=51, buildsetid=self.BSID, builderid=self.BLDRID1,
+                                complete=1, submitted_at=self.SUBMITTED_AT_EPOCH - 20),
+            fakedb.BuildRequest(id=52, buildsetid=self.BSID, builderid=self.BLDRID1,
+                                submitted_at=self.SUBMITTED_AT_EPOCH + 10),
+            fakedb.BuildRequest(id=53, buildsetid=self.BSID, builderid=self.BLDRID1,
+                                submitted_at=self.SUBMITTED_AT_EPOCH),
+            fakedb.BuildRequest(id=54, buildsetid=self.BSID, builderid=self.BLDRID2,
+                                submitted_at=self.SUBMITTED_AT_EPOCH + 5),
+            # not asked for
+            fakedb.BuildRequest(id=55, buildsetid=self.BSID, builderid=self.BLDRID3,
+                                submitted_at=self.SUBMITTED_AT_EPOCH),
+        ])
+        times = yield self.db.buildrequests.getOldestRequestTimes(
+            [self.BLDRID1, self.BLDRID2])
+
+        self.assertEqual(times, {
+            self.BLDRID1: self.SUBMITTED_AT,
+            self.BLDRID2: epoch2datetime(self.SUBMITTED_AT_EPOCH + 5),
+        })
+
+    @defer.inlineCallbacks
+    def test_getOldestRequestTimes_none(self):
+        yield self.insertTestData([
+            fakedb.BuildRequest(id=50, buildsetid=self.BSID, builderid=self.BLDRID1,
+                                complete=1),
+        ])
+        times = yield self.db.buildrequests.getOldestRequestTimes([self.BLDRID1])
+
+        self.assertEqual(times, {})
+
+    @defer.inlineCallbacks
+    def test_getPrioritiesAndOldestRequestTimes(self):
+        yield self.insertTestData([
+            # claimed
+            fakedb.BuildRequest(id=50, buildsetid=self.BSID, builderid=self.BLDRID1,
+                                priority=100, submitted_at=self.SUBMITTED_AT_EPOCH - 30),
+            fakedb.BuildRequestClaim(brid=50, masterid=self.MASTER_ID,
+                                     claimed_at=self.CLAIMED_AT_EPOCH),
+            # complete
+            fakedb.BuildRequest(id=51, buildsetid=self.BSID, builderid=self.BLDRID1,
+                                complete=1, priority=100,
+                                submitted_at=self.SUBMITTED_AT_EPOCH - 20),
+            fakedb.BuildRequest(id=52, buildsetid=self.BSID, builderid=self.BLDRID1,
+                                priority=10, submitted_at=self.SUBMITTED_AT_EPOCH + 10),
+            fakedb.BuildRequest(id=53, buildsetid=self.BSID, builderid=self.BLDRID1,
+                                priority=5, submitted_at=self.SUBMITTED_AT_EPOCH),
+            fakedb.BuildRequest(id=54, buildsetid=self.BSID, builderid=self.BLDRID2,
+                                submitted_at=self.SUBMITTED_AT_EPOCH + 5),
+        ])
+        rv = yield self.db.buildrequests.getPrioritiesAndOldestRequestTimes(
+            [self.BLDRID1, self.BLDRID2, self.BLDRID3])
+
+        self.assertEqual(rv, {
+            self.BLDRID1: (10, self.SUBMITTED_AT),
+            self.BLDRID2: (0, epoch2datetime(self.SUBMITTED_AT_EPOCH + 5)),
+        })
+
     def failWithExpFailure(self, exc, expfailure=None):
         if not expfailure:
             raise exc
@@ -16,7 +16,9 @@
 from twisted.internet import defer
 from twisted.trial import unittest
 
+from buildbot.data import exceptions
 from buildbot.data import resultspec
+from buildbot.db import base
 from buildbot.db import builds
 from buildbot.test import fakedb
 from buildbot.test.util import connector_component
@@ -337,6 +339,10 @@ class Tests(interfaces.InterfaceTests):
 
 class RealTests(Tests):
 
+    def test_getBuilds_not_replica_read(self):
+        # Trigger and the reporters read the builds they just made happen
+        self.assertNotIn('BuildsConnectorComponent.getBuilds', base.replica_reads)
+
     @defer.inlineCallbacks
     def test_addBuild_existing_race(self):
         self.reactor.advance(TIME1)
@@ -467,6 +473,47 @@ class RealTests(Tests):
         self.assertEqual(sorted(bdicts, key=lambda bd: bd['id']),
                          [self.threeBdicts[50], self.threeBdicts[51]])
 
+    @defer.inlineCallbacks
+    def test_getBuilds_cursor(self):
+        fieldMapping = {'started_at': 'builds.started_at', 'buildid': 'builds.id'}
+        yield self.insertTestData(self.backgroundData + self.threeBuilds)
+
+        rs = resultspec.ResultSpec(order=['-started_at'], limit=2)
+        rs.paginateWithCursor([], 'buildid')
+        rs.fieldMapping = fieldMapping
+        bdicts = yield self.db.builds.getBuilds(resultSpec=rs)
+        self.assertEqual([bd['id'] for bd in bdicts], [52, 51])
+        self.assertEqual(rs.nextCursor, [TIME2, 51])
+        self.assertEqual((rs.cursor, rs.order, rs.limit), (None, None, None))
+
+        rs = resultspec.ResultSpec(order=['-started_at'], limit=2)
+        rs.paginateWithCursor([TIME2, 51], 'buildid')
+        rs.fieldMapping = fieldMapping
+        bdicts = yield self.db.builds.getBuilds(resultSpec=rs)
+        self.assertEqual([bd['id'] for bd in bdicts], [50])
+        self.assertEqual(rs.nextCursor, None)
+
+    @defer.inlineCallbacks
+    def test_getBuilds_cursor_tie(self):
+        yield self.insertTestData(self.backgroundData + self.threeBuilds)
+        # builds 50 and 52 have the same builderid, and are ordered by id
+        rs = resultspec.ResultSpec(order=['builderid'], limit=1)
+        rs.paginateWithCursor([77, 50], 'buildid')
+        rs.fieldMapping = {'builderid': 'builds.builderid', 'buildid': 'builds.id'}
+        bdicts = yield self.db.builds.getBuilds(resultSpec=rs)
+        self.assertEqual([bd['id'] for bd in bdicts], [52])
+        self.assertEqual(rs.nextCursor, [77, 52])
+
+    @defer.inlineCallbacks
+    def test_getBuilds_cursor_nullable_order(self):
+        rs = resultspec.ResultSpec(order=['complete_at'])
+        rs.paginateWithCursor([], 'buildid')
+        rs.fieldMapping = {'complete_at': 'builds.complete_at', 'buildid': 'builds.id'}
+        with self.assertRaises(exceptions.InvalidQueryError):
+            yield self.db.builds.getBuilds(resultSpec=rs)
+        # the REST API falls back to a query without cursor, this is no DB error
+        self.assertEqual(self.flushLoggedErrors(exceptions.InvalidQueryError), [])
+
 
 class TestFakeDB(unittest.TestCase, connector_component.FakeConnectorComponentMixin, Tests):
 
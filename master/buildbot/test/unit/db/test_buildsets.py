@@ -17,6 +17,8 @@
 import datetime
 import json
 
+import sqlalchemy as sa
+
 import mock
 
 from twisted.internet import defer
@@ -50,7 +52,7 @@ class Tests(interfaces.InterfaceTests):
         @self.assertArgSpecMatches(self.db.buildsets.addBuildset)
         def addBuildset(self, sourcestamps, reason, properties,
                         builderids, waited_for, external_idstring=None, submitted_at=None,
-                        parent_buildid=None, parent_relationship=None):
+                        parent_buildid=None, parent_relationship=None, priority=0):
             pass
 
     def test_signature_completeBuildset(self):
@@ -432,6 +434,18 @@ class RealTests(Tests):
             self.assertEqual(r.fetchall(), [(1, bsid, 234)])
         yield self.db.pool.do(thd)
 
+    @defer.inlineCallbacks
+    def test_addBuildset_priority(self):
+        (bsid, brids) = yield self.db.buildsets.addBuildset(
+                sourcestamps=[234], reason='because', properties={},
+                builderids=[1, 2], waited_for=False, priority=10)
+
+        def thd(conn):
+            tbl = self.db.model.buildrequests
+            r = conn.execute(sa.select([tbl.c.builderid, tbl.c.priority]))
+            self.assertEqual(sorted(r.fetchall()), [(1, 10), (2, 10)])
+        yield self.db.pool.do(thd)
+
     @defer.inlineCallbacks
     def test_addBuildset_bigger(self):
         props = dict(prop=(['list'], 'test'))
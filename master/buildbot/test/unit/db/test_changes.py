@@ -22,6 +22,7 @@ from buildbot.data import resultspec
 from buildbot.data.changes import FixerMixin
 from buildbot.db import builds
 from buildbot.db import changes
+from buildbot.db import retention
 from buildbot.db import sourcestamps
 from buildbot.test import fakedb
 from buildbot.test.util import connector_component
@@ -259,6 +260,21 @@ class Tests(interfaces.InterfaceTests):
 
         self.assertEqual(sorted(res), [1, 2])
 
+    def test_signature_getSourceStampIdsWithChanges(self):
+        @self.assertArgSpecMatches(self.db.changes.getSourceStampIdsWithChanges)
+        def getSourceStampIdsWithChanges(self, sourcestampids):
+            pass
+
+    @defer.inlineCallbacks
+    def test_getSourceStampIdsWithChanges(self):
+        yield self.insertTestData(self.change14_rows + self.change13_rows + [
+            fakedb.SourceStamp(id=234),
+            fakedb.Change(changeid=15, sourcestampid=233),
+        ])
+        res = yield self.db.changes.getSourceStampIdsWithChanges({233, 234, 235})
+
+        self.assertEqual(res, {233})
+
     def test_signature_getChanges(self):
         @self.assertArgSpecMatches(self.db.changes.getChanges)
         def getChanges(self, resultSpec=None):
@@ -374,6 +390,57 @@ class RealTests(Tests):
 
     # tests that only "real" implementations will pass
 
+    @defer.inlineCallbacks
+    def test_getChanges_order(self):
+        yield self.insert7Changes()
+
+        def getChangeids(**kwargs):
+            rs = resultspec.ResultSpec(**kwargs)
+            rs.fieldMapping = FixerMixin.fieldMapping
+            d = self.db.changes.getChanges(resultSpec=rs)
+            d.addCallback(lambda changes: [c['changeid'] for c in changes])
+            return d
+
+        # without a cursor, the changes come in the reverse of the order
+        changeids = yield getChangeids(order=['changeid'])
+        self.assertEqual(changeids, [14, 13, 12, 11, 10, 9, 8])
+        changeids = yield getChangeids(order=['-changeid'])
+        self.assertEqual(changeids, [8, 9, 10, 11, 12, 13, 14])
+        # with a cursor, the pages follow each other in the order
+        changeids = yield getChangeids(order=['-changeid'], limit=3, cursor=[])
+        self.assertEqual(changeids, [14, 13, 12])
+
+    @defer.inlineCallbacks
+    def test_getChanges_filter_column(self):
+        yield self.insertTestData(self.change13_rows + self.change14_rows)
+        rs = resultspec.ResultSpec(filters=[resultspec.Filter('branch', 'eq', ['warnerdb'])],
+                                   order=['-when_timestamp'], limit=5)
+        rs.fieldMapping = FixerMixin.fieldMapping
+        changes = yield self.db.changes.getChanges(resultSpec=rs)
+        self.assertEqual([c['changeid'] for c in changes], [14])
+        # the filter and the order were done in SQL
+        self.assertEqual((rs.filters, rs.order, rs.limit), ([], None, None))
+
+    @defer.inlineCallbacks
+    def test_getChanges_filter_related(self):
+        yield self.insertTestData(self.change13_rows + self.change14_rows)
+        rs = resultspec.ResultSpec(
+            filters=[resultspec.Filter('files', 'contains', ['worker/README.txt'])], limit=5)
+        rs.fieldMapping = FixerMixin.fieldMapping
+        changes = yield self.db.changes.getChanges(resultSpec=rs)
+        self.assertEqual([c['changeid'] for c in changes], [13])
+        self.assertEqual((rs.filters, rs.limit), ([], None))
+
+    @defer.inlineCallbacks
+    def test_getChanges_filter_related_unsupported_op(self):
+        yield self.insertTestData(self.change13_rows + self.change14_rows)
+        f = resultspec.Filter('files', 'eq', ['worker/README.txt'])
+        rs = resultspec.ResultSpec(filters=[f], limit=5)
+        rs.fieldMapping = FixerMixin.fieldMapping
+        yield self.db.changes.getChanges(resultSpec=rs)
+        # left to be done in python, without the limit
+        self.assertEqual((rs.filters, rs.limit), ([f], 5))
+
     @defer.inlineCallbacks
     def test_addChange(self):
         self.reactor.advance(SOMETIME)
@@ -770,6 +837,7 @@ class TestRealDB(unittest.TestCase,
                          'workers'])
 
         self.db.changes = changes.ChangesConnectorComponent(self.db)
+        self.db.retention = retention.RetentionConnectorComponent(self.db)
         self.db.builds = builds.BuildsConnectorComponent(self.db)
         self.db.sourcestamps = \
             sourcestamps.SourceStampsConnectorComponent(self.db)
@@ -42,7 +42,7 @@ class TestDBConnector(TestReactorMixin, db.RealDatabaseMixin,
             'changes', 'change_properties', 'change_files', 'patches',
             'sourcestamps', 'buildset_properties', 'buildsets',
             'sourcestampsets', 'builds', 'builders', 'masters',
-            'buildrequests', 'workers'])
+            'buildrequests', 'workers', 'objects', 'object_state'])
 
         self.master = fakemaster.make_master(self)
         self.master.config = config.MasterConfig()
@@ -95,3 +95,37 @@ class TestDBConnector(TestReactorMixin, db.RealDatabaseMixin,
     def test_setup_check_version_good(self):
         self.db.model.is_current = lambda: defer.succeed(True)
         return self.startService(check_version=True)
+
+    @defer.inlineCallbacks
+    def test_setup_replica(self):
+        self.master.config.db['db_read_url'] = self.db_url
+        self.master.config.db['db_read_max_lag'] = 10
+        self.patch(self.db, '_checkReplicaLag', mock.Mock(return_value=defer.succeed(None)))
+        yield self.startService()
+        self.addCleanup(self.db.read_pool.shutdown)
+
+        self.assertIs(self.db.pool.replica, self.db.read_pool)
+        self.assertFalse(self.db.pool.replica_usable)
+        self.assertEqual(self.db.replica_timer.step, 5)
+        self.assertTrue(self.db._checkReplicaLag.called)
+
+    @defer.inlineCallbacks
+    def test_checkReplicaLag(self):
+        yield self.startService()
+
+        # the connector opens its own database, which is a new one for sqlite://
+        def thd(conn):
+            for tbl in (self.db.model.objects, self.db.model.object_state):
+                tbl.create(bind=conn, checkfirst=True)
+        yield self.db.pool.do(thd)
+        # the replica is the database itself here
+        self.db.read_pool = self.db.pool
+        self.db.replica_max_lag = 10
+        yield self.db._checkReplicaLag()
+        self.assertTrue(self.db.pool.replica_usable)
+
+        # the heartbeats do not reach a lagging replica
+        self.db.read_pool = mock.Mock()
+        self.db.read_pool.do.return_value = defer.succeed(self.master.reactor.seconds() - 10)
+        yield self.db._checkReplicaLag()
+        self.assertFalse(self.db.pool.replica_usable)
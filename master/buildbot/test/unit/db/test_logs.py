@@ -16,6 +16,9 @@
 
 import base64
 import bz2
+import hashlib
+import os
+import struct
 import textwrap
 import zlib
 
@@ -24,12 +27,16 @@ import sqlalchemy as sa
 from twisted.internet import defer
 from twisted.trial import unittest
 
+from buildbot.db import base
 from buildbot.db import logs
+from buildbot.db import logstorage
+from buildbot.db import retention
 from buildbot.test import fakedb
 from buildbot.test.util import connector_component
 from buildbot.test.util import interfaces
 from buildbot.test.util import validation
 from buildbot.util import bytes2unicode
+from buildbot.util import epoch2datetime
 from buildbot.util import unicode2bytes
 
 
@@ -119,6 +126,11 @@ class Tests(interfaces.InterfaceTests):
         def getLogLines(self, logid, first_line, last_line):
             pass
 
+    def test_signature_getLogLinesBatch(self):
+        @self.assertArgSpecMatches(self.db.logs.getLogLinesBatch)
+        def getLogLinesBatch(self, logid, first_line, last_line, max_chunks):
+            pass
+
     def test_signature_addLog(self):
         @self.assertArgSpecMatches(self.db.logs.addLog)
         def addLog(self, stepid, name, slug, type):
@@ -139,6 +151,27 @@ class Tests(interfaces.InterfaceTests):
         def compressLog(self, logid, force=False):
             pass
 
+    def test_signature_compactLog(self):
+        @self.assertArgSpecMatches(self.db.logs.compactLog)
+        def compactLog(self, logid):
+            pass
+
+    def test_signature_getLogIdsToCompact(self):
+        @self.assertArgSpecMatches(self.db.logs.getLogIdsToCompact)
+        def getLogIdsToCompact(self, after_logid, limit):
+            pass
+
+    def test_signature_getLogsCompletion(self):
+        @self.assertArgSpecMatches(self.db.logs.getLogsCompletion)
+        def getLogsCompletion(self, logids):
+            pass
+
+    def test_signature_searchLogs(self):
+        @self.assertArgSpecMatches(self.db.logs.searchLogs)
+        def searchLogs(self, query, builderid=None, min_started_at=None, max_started_at=None,
+                       limit=100):
+            pass
+
     def test_signature_deleteOldLogChunks(self):
         @self.assertArgSpecMatches(self.db.logs.deleteOldLogChunks)
         def deleteOldLogChunks(self, older_than_timestamp):
@@ -289,6 +322,32 @@ class Tests(interfaces.InterfaceTests):
         # test log lines should still be readable just the same
         yield self.checkTestLogLines()
 
+    @defer.inlineCallbacks
+    def test_getLogIdsToCompact(self):
+        yield self.insertTestData(self.backgroundData + [
+            fakedb.Log(id=201, slug='l201', stepid=101, complete=0, type='s'),
+            fakedb.Log(id=202, slug='l202', stepid=101, complete=1, type='s'),
+            fakedb.Log(id=203, slug='l203', stepid=102, complete=1, type='d'),
+            fakedb.Log(id=204, slug='l204', stepid=102, complete=1, type='t'),
+        ])
+        self.assertEqual((yield self.db.logs.getLogIdsToCompact(0, 10)),
+                         [(201, False), (202, True), (204, True)])
+        self.assertEqual((yield self.db.logs.getLogIdsToCompact(201, 1)),
+                         [(202, True)])
+        self.assertEqual((yield self.db.logs.getLogIdsToCompact(204, 10)), [])
+
+    @defer.inlineCallbacks
+    def test_getLogsCompletion(self):
+        yield self.insertTestData(self.backgroundData + [
+            fakedb.Log(id=201, slug='l201', stepid=101, complete=0, type='s'),
+            fakedb.Log(id=202, slug='l202', stepid=101, complete=1, type='s'),
+            fakedb.Log(id=203, slug='l203', stepid=102, complete=1, type='d'),
+        ])
+        # logs which are gone, or whose chunks were deleted, are left out
+        self.assertEqual((yield self.db.logs.getLogsCompletion([201, 202, 203, 299])),
+                         {201: False, 202: True})
+        self.assertEqual((yield self.db.logs.getLogsCompletion([])), {})
+
     @defer.inlineCallbacks
     def test_addLogLines_big_chunk(self):
         yield self.insertTestData(self.backgroundData + self.testLogLines)
@@ -312,6 +371,10 @@ class Tests(interfaces.InterfaceTests):
 
 class RealTests(Tests):
 
+    def test_getLogLines_not_replica_read(self):
+        # the lines flushed from the append buffer must be read back at once
+        self.assertNotIn('LogsConnectorComponent.getLogLines', base.replica_reads)
+
     @defer.inlineCallbacks
     def test_addLogLines_db(self):
         yield self.insertTestData(self.backgroundData + self.testLogLines)
@@ -331,7 +394,10 @@ class RealTests(Tests):
             'first_line': 7,
             'last_line': 10,
             'content': b'abc\ndef\nghi\njkl',
-            'compressed': 0})
+            'compressed': 0,
+            'line_offsets': struct.pack('<3I', 4, 8, 12),
+            'content_key': None,
+            'content_length': None})
 
     @defer.inlineCallbacks
     def test_addLogLines_huge_lines(self):
@@ -342,6 +408,19 @@ class RealTests(Tests):
             line = yield self.db.logs.getLogLines(201, lineno, lineno)
             self.assertEqual(len(line), 65537)
 
+    @defer.inlineCallbacks
+    def test_getLogLinesBatch(self):
+        yield self.insertTestData(self.backgroundData + self.testLogLines)
+        self.assertEqual((yield self.db.logs.getLogLinesBatch(201, 0, 6, 2)),
+                         ('line zero\nline 1' + 'x' * 200 + '\nline TWO\n\nline 2**2\n', 4))
+        self.assertEqual((yield self.db.logs.getLogLinesBatch(201, 5, 6, 2)),
+                         ('another line\nyet another line\n', 6))
+        # a batch starting or ending in the middle of a chunk
+        self.assertEqual((yield self.db.logs.getLogLinesBatch(201, 3, 3, 2)),
+                         ('\n', 3))
+        self.assertEqual((yield self.db.logs.getLogLinesBatch(201, 7, 10, 2)),
+                         ('', None))
+
     def test_splitBigChunk_unicode_misalignment(self):
         unaligned = ('a ' + '\N{SNOWMAN}' * 30000 + '\n').encode('utf-8')
         # the first 65536 bytes of that line are not valid utf-8
@@ -373,7 +452,45 @@ class RealTests(Tests):
             'first_line': 7,
             'last_line': 7,
             'content': b'abc',
-            'compressed': 0})
+            'compressed': 0,
+            'line_offsets': None,
+            'content_key': None,
+            'content_length': None})
+
+    @defer.inlineCallbacks
+    def do_test_getLogLines_line_offsets(self, method):
+        yield self.insertTestData(self.backgroundData + self.testLogLines)
+        self.db.master.config.logCompressionMethod = method
+        lines = ['line %d %s' % (i, 'x' * (i % 7) * 10) for i in range(500)]
+        yield self.db.logs.appendLog(201, '\n'.join(lines) + '\n')
+        lines = ['line zero', 'line 1' + 'x' * 200, 'line TWO', '', 'line 2**2',
+                 'another line', 'yet another line'] + lines
+
+        for first_line, last_line in [(7, 7), (8, 12), (200, 300), (7, 506),
+                                      (500, 506), (506, 506), (3, 10), (505, 600)]:
+            self.assertEqual(
+                (yield self.db.logs.getLogLines(201, first_line, last_line)),
+                ''.join(line + '\n' for line in lines[first_line:last_line + 1]))
+
+    def test_getLogLines_line_offsets_raw(self):
+        return self.do_test_getLogLines_line_offsets('raw')
+
+    def test_getLogLines_line_offsets_gz(self):
+        return self.do_test_getLogLines_line_offsets('gz')
+
+    @defer.inlineCallbacks
+    def test_getLogLines_line_offsets_compressLog(self):
+        yield self.insertTestData(self.backgroundData + self.testLogLines)
+        yield self.db.logs.compressLog(201, force=True)
+
+        def thd(conn):
+            res = conn.execute(sa.select([self.db.model.logchunks.c.line_offsets]))
+            rows = res.fetchall()
+            res.close()
+            return rows
+        self.assertEqual((yield self.db.pool.do(thd)),
+                         [(struct.pack('<6I', 10, 217, 226, 227, 237, 250),)])
+        yield self.checkTestLogLines()
 
     @defer.inlineCallbacks
     def test_raw_compress_big_chunk(self):
@@ -397,7 +514,10 @@ class RealTests(Tests):
             'first_line': 7,
             'last_line': 7,
             'content': unicode2bytes(line),
-            'compressed': 0})
+            'compressed': 0,
+            'line_offsets': None,
+            'content_key': None,
+            'content_length': None})
 
     @defer.inlineCallbacks
     def test_gz_compress_big_chunk(self):
@@ -421,7 +541,10 @@ class RealTests(Tests):
             'first_line': 7,
             'last_line': 7,
             'content': zlib.compress(unicode2bytes(line), 9),
-            'compressed': 1})
+            'compressed': 1,
+            'line_offsets': None,
+            'content_key': None,
+            'content_length': None})
 
     @defer.inlineCallbacks
     def test_bz2_compress_big_chunk(self):
@@ -445,7 +568,10 @@ class RealTests(Tests):
             'first_line': 7,
             'last_line': 7,
             'content': bz2.compress(unicode2bytes(line), 9),
-            'compressed': 2})
+            'compressed': 2,
+            'line_offsets': None,
+            'content_key': None,
+            'content_length': None})
 
     @defer.inlineCallbacks
     def test_lz4_compress_big_chunk(self):
@@ -473,7 +599,91 @@ class RealTests(Tests):
             'first_line': 7,
             'last_line': 7,
             'content': logs.dumps_lz4(line.encode('utf-8')),
-            'compressed': 3})
+            'compressed': 3,
+            'line_offsets': None,
+            'content_key': None,
+            'content_length': None})
+
+    @defer.inlineCallbacks
+    def test_zstd_compress_big_chunk(self):
+        try:
+            import zstandard  # noqa pylint: disable=unused-import,import-outside-toplevel
+        except ImportError as e:
+            raise unittest.SkipTest("zstandard not installed, skip the test") from e
+
+        yield self.insertTestData(self.backgroundData + self.testLogLines)
+        line = 'xy' * 10000
+        self.db.master.config.logCompressionMethod = "zstd"
+        self.assertEqual(
+            (yield self.db.logs.appendLog(201, line + '\n')),
+            (7, 7))
+
+        def thd(conn):
+            res = conn.execute(self.db.model.logchunks.select(
+                whereclause=self.db.model.logchunks.c.first_line > 6))
+            row = res.fetchone()
+            res.close()
+            return dict(row)
+        newRow = yield self.db.pool.do(thd)
+        self.assertEqual(newRow, {
+            'logid': 201,
+            'first_line': 7,
+            'last_line': 7,
+            'content': logs.dumps_zstd(line.encode('utf-8')),
+            'compressed': 4,
+            'line_offsets': None,
+            'content_key': None,
+            'content_length': None})
+
+    @defer.inlineCallbacks
+    def test_zstd_dictionary(self):
+        try:
+            import zstandard  # noqa pylint: disable=import-outside-toplevel
+        except ImportError as e:
+            raise unittest.SkipTest("zstandard not installed, skip the test") from e
+
+        # a few logs of the same builder, with similar content
+        rows = []
+        lines = {}
+        for logid in range(300, 310):
+            rows.append(fakedb.Log(id=logid, stepid=101, name='log%d' % logid,
+                                   slug='log%d' % logid, complete=1, num_lines=100, type='s'))
+            lines[logid] = ['building target %d of %d in /build/dir/lib%d/file%d.c' %
+                            (i, logid, i % 7, i * logid) for i in range(100)]
+            for i in range(0, 100, 10):
+                rows.append(fakedb.LogChunk(logid=logid, first_line=i, last_line=i + 9,
+                                            compressed=0,
+                                            content='\n'.join(lines[logid][i:i + 10])))
+        yield self.insertTestData(self.backgroundData + rows)
+        self.db.master.config.logCompressionMethod = "zstd"
+        self.patch(self.db.logs, 'ZSTD_DICTIONARY_SIZE', 4096)
+
+        yield self.db.logs.compressLog(309)
+
+        def thd(conn):
+            tbl = self.db.model.logchunk_dictionaries
+            dictionaries = conn.execute(sa.select([tbl.c.id, tbl.c.builderid])).fetchall()
+            tbl = self.db.model.logchunks
+            chunks = conn.execute(sa.select([tbl.c.content, tbl.c.compressed])
+                                  .where(tbl.c.logid == 309)).fetchall()
+            return dictionaries, chunks
+        dictionaries, chunks = yield self.db.pool.do(thd)
+        self.assertEqual(len(dictionaries), 1)
+        self.assertEqual(dictionaries[0].builderid, 88)
+        self.assertEqual(len(chunks), 1)
+        self.assertEqual(chunks[0].compressed, 4)
+        self.assertEqual(zstandard.get_frame_parameters(chunks[0].content).dict_id,
+                         dictionaries[0].id)
+
+        # new chunks are compressed with the dictionary too
+        yield self.db.logs.appendLog(308, 'more of the same\n')
+
+        # another connector, without cached dictionaries, can read the chunks
+        self.db.logs = logs.LogsConnectorComponent(self.db)
+        self.assertEqual((yield self.db.logs.getLogLines(309, 0, 99)),
+                         '\n'.join(lines[309]) + '\n')
+        self.assertEqual((yield self.db.logs.getLogLines(308, 100, 100)),
+                         'more of the same\n')
 
     @defer.inlineCallbacks
     def do_addLogLines_huge_log(self, NUM_CHUNKS=3000, chunk=('xy' * 70 + '\n') * 3):
@@ -518,6 +728,180 @@ class RealTests(Tests):
     def test_addLogLines_huge_log_lots_snowmans(self):
         return self.do_addLogLines_huge_log(NUM_CHUNKS=3000, chunk='\N{SNOWMAN}\n' * 50)
 
+    @defer.inlineCallbacks
+    def test_compactLog_recompress(self):
+        line = 'xy' * 10000
+        yield self.insertTestData(self.backgroundData + [
+            fakedb.Log(id=201, stepid=101, name='stdio', slug='stdio',
+                       complete=1, num_lines=1, type='s'),
+            fakedb.LogChunk(logid=201, first_line=0, last_line=0, compressed=1,
+                            content=zlib.compress(unicode2bytes(line), 9)),
+        ])
+        self.db.master.config.logCompressionMethod = "bz2"
+        # a single chunk is left alone by compressLog ...
+        self.assertEqual((yield self.db.logs.compressLog(201)), 0)
+        # ... but recompressed by compactLog
+        rewritten, saved = yield self.db.logs.compactLog(201)
+        self.assertEqual(rewritten, len(zlib.compress(unicode2bytes(line), 9)))
+        self.assertEqual(saved, rewritten - len(bz2.compress(unicode2bytes(line), 9)))
+
+        def thd(conn):
+            res = conn.execute(self.db.model.logchunks.select())
+            rows = [dict(row) for row in res.fetchall()]
+            res.close()
+            return rows
+
+        self.assertEqual((yield self.db.pool.do(thd)), [{
+            'logid': 201,
+            'first_line': 0,
+            'last_line': 0,
+            'content': bz2.compress(unicode2bytes(line), 9),
+            'compressed': 2,
+            'line_offsets': None,
+            'content_key': None,
+            'content_length': None}])
+        self.assertEqual((yield self.db.logs.getLogLines(201, 0, 0)), line + '\n')
+        # once done, there is nothing left to do
+        self.assertEqual((yield self.db.logs.compactLog(201)), (0, 0))
+
+    @defer.inlineCallbacks
+    def test_compactLog_gathers_chunks(self):
+        yield self.insertTestData(self.backgroundData + self.testLogLines)
+        rewritten, saved = yield self.db.logs.compactLog(201)
+        self.assertNotEqual(rewritten, 0)
+        yield self.checkTestLogLines()
+        self.assertEqual((yield self.db.logs.compactLog(201)), (0, 0))
+
+    def getNewChunks(self):
+        def thd(conn):
+            tbl = self.db.model.logchunks
+            res = conn.execute(sa.select([tbl.c.first_line, tbl.c.last_line, tbl.c.content],
+                                         whereclause=tbl.c.first_line > 6))
+            rows = [tuple(row) for row in res.fetchall()]
+            res.close()
+            return rows
+        return self.db.pool.do(thd)
+
+    @defer.inlineCallbacks
+    def test_appendLog_write_behind(self):
+        yield self.insertTestData(self.backgroundData + self.testLogLines)
+        self.db.master.config.logCompressionMethod = "raw"
+        self.db.master.config.logFlushLatency = 1
+        self.assertEqual((yield self.db.logs.appendLog(201, 'abc\n')), (7, 7))
+        self.assertEqual((yield self.db.logs.appendLog(201, 'def\nghi\n')), (8, 9))
+        self.assertEqual((yield self.getNewChunks()), [])
+        self.assertEqual((yield self.db.logs.getLog(201))['num_lines'], 10)
+
+        self.reactor.advance(1)
+        yield self.db.logs.flushAppendBuffers()
+        self.assertEqual((yield self.getNewChunks()), [(7, 9, b'abc\ndef\nghi')])
+
+        self.assertEqual((yield self.db.logs.appendLog(201, 'jkl\n')), (10, 10))
+        yield self.db.logs.finishLog(201)
+        self.assertEqual((yield self.getNewChunks()),
+                         [(7, 9, b'abc\ndef\nghi'), (10, 10, b'jkl')])
+        logdict = yield self.db.logs.getLog(201)
+        self.assertEqual((logdict['num_lines'], logdict['complete']), (11, True))
+
+    @defer.inlineCallbacks
+    def test_appendLog_write_behind_read(self):
+        yield self.insertTestData(self.backgroundData + self.testLogLines)
+        self.db.master.config.logFlushLatency = 1
+        yield self.db.logs.appendLog(201, 'abc\n')
+        yield self.db.logs.appendLog(201, 'def\n')
+        # reading the log writes the buffered lines first
+        self.assertEqual((yield self.db.logs.getLogLines(201, 6, 8)),
+                         'yet another line\nabc\ndef\n')
+        self.assertEqual((yield self.getNewChunks()), [(7, 8, b'abc\ndef')])
+
+    @defer.inlineCallbacks
+    def test_appendLog_write_behind_size(self):
+        yield self.insertTestData(self.backgroundData + self.testLogLines)
+        self.db.master.config.logCompressionMethod = "raw"
+        self.db.master.config.logFlushLatency = 10
+        line = 'x' * 1000
+        for i in range(66):
+            yield self.db.logs.appendLog(201, line + '\n')
+        # a chunk worth of content is written right away
+        chunks = yield self.getNewChunks()
+        self.assertEqual([c[:2] for c in chunks], [(7, 71), (72, 72)])
+        self.assertEqual(self.reactor.getDelayedCalls(), [])
+
+    @defer.inlineCallbacks
+    def test_appendLog_write_behind_failed_flush(self):
+        yield self.insertTestData(self.backgroundData + self.testLogLines)
+        self.db.master.config.logCompressionMethod = "raw"
+        self.db.master.config.logFlushLatency = 1
+        thdSplitAndAppendChunk = self.db.logs.thdSplitAndAppendChunk
+
+        def failOnce(**kwargs):
+            self.db.logs.thdSplitAndAppendChunk = thdSplitAndAppendChunk
+            raise RuntimeError('oh noes')
+        self.db.logs.thdSplitAndAppendChunk = failOnce
+        self.assertEqual((yield self.db.logs.appendLog(201, 'abc\n')), (7, 7))
+        with self.assertRaises(RuntimeError):
+            yield self.db.logs.flushAppendBuffers()
+        self.assertEqual(len(self.flushLoggedErrors(RuntimeError)), 1)
+        self.assertEqual((yield self.getNewChunks()), [])
+
+        # the content which could not be written is kept, and written with
+        # the next appends at the line numbers given for it
+        self.assertEqual((yield self.db.logs.appendLog(201, 'def\n')), (8, 8))
+        yield self.db.logs.finishLog(201)
+        self.assertEqual((yield self.getNewChunks()), [(7, 8, b'abc\ndef')])
+        self.assertEqual((yield self.db.logs.getLogLines(201, 7, 8)), 'abc\ndef\n')
+
+    @defer.inlineCallbacks
+    def test_appendLog_write_behind_missing_log(self):
+        self.db.master.config.logFlushLatency = 1
+        self.assertEqual((yield self.db.logs.appendLog(201, 'abc\n')), None)
+
+    @defer.inlineCallbacks
+    def test_logStorage(self):
+        yield self.insertTestData(self.backgroundData + self.testLogLines)
+        basedir = os.path.abspath(self.mktemp())
+        self.db.master.config.logStorage = logstorage.FilesystemLogStorage(basedir)
+        self.db.master.config.logCompressionMethod = "raw"
+
+        def storedFiles():
+            return sorted(name for _, _, files in os.walk(basedir) for name in files)
+
+        lines = ['line %d' % i for i in range(100)]
+        yield self.db.logs.appendLog(201, '\n'.join(lines) + '\n')
+
+        def thd(conn):
+            tbl = self.db.model.logchunks
+            res = conn.execute(sa.select([tbl.c.content, tbl.c.content_key,
+                                          tbl.c.content_length],
+                                         whereclause=tbl.c.first_line > 6))
+            rows = [tuple(row) for row in res.fetchall()]
+            res.close()
+            return rows
+        content = '\n'.join(lines).encode('utf-8')
+        key = '201-7-' + hashlib.sha1(content).hexdigest()
+        self.assertEqual((yield self.db.pool.do(thd)), [(None, key, len(content))])
+        self.assertEqual(storedFiles(), [key])
+
+        # lines are read from both the database and the log storage
+        lines = ['line zero', 'line 1' + 'x' * 200, 'line TWO', '', 'line 2**2',
+                 'another line', 'yet another line'] + lines
+        for first_line, last_line in [(10, 20), (5, 8), (0, 106)]:
+            self.assertEqual(
+                (yield self.db.logs.getLogLines(201, first_line, last_line)),
+                ''.join(line + '\n' for line in lines[first_line:last_line + 1]))
+
+        # compressing the log replaces the stored content
+        self.db.master.config.logCompressionMethod = "gz"
+        yield self.db.logs.compressLog(201, force=True)
+        self.assertEqual(len(storedFiles()), 1)
+        self.assertNotEqual(storedFiles(), [key])
+        self.assertEqual((yield self.db.logs.getLogLines(201, 0, 106)),
+                         ''.join(line + '\n' for line in lines))
+
+        # and deleting old logs deletes it
+        yield self.db.logs.deleteOldLogChunks(self.TIMESTAMP_STEP101 + 1)
+        self.assertEqual(storedFiles(), [])
+
     @defer.inlineCallbacks
     def test_compressLog_non_existing_log(self):
         yield self.db.logs.compressLog(201)
@@ -571,6 +955,121 @@ class RealTests(Tests):
             lines = yield self.db.logs.getLogLines(logid, 0, logdict['num_lines'])
             self.assertEqual(lines, '')
 
+    @defer.inlineCallbacks
+    def setUpSearch(self):
+        self.db.master.config.logSearchIndex = True
+        yield self.insertTestData(self.backgroundData + [
+            fakedb.Builder(id=89, name='b2'),
+            fakedb.BuildRequest(id=42, buildsetid=20, builderid=89),
+            fakedb.Build(id=31, buildrequestid=42, number=1, masterid=88,
+                         builderid=89, workerid=47),
+            fakedb.Step(id=103, buildid=31, number=1, name='one',
+                        started_at=self.TIMESTAMP_STEP102),
+            fakedb.Log(id=201, stepid=101, name='stdio', slug='stdio', type='s'),
+            fakedb.Log(id=202, stepid=102, name='stdio', slug='stdio', type='s'),
+            fakedb.Log(id=203, stepid=103, name='report', slug='report', type='t'),
+        ])
+        yield self.db.logs.appendLog(201, 'hsetup_tests\noFAIL: test_foo (a.b)\n')
+        yield self.db.logs.appendLog(202, 'ofail: test_foo\nofailed test_bar\n')
+        yield self.db.logs.appendLog(203, 'FAIL: test_foo in b2\n')
+        yield self.db.logs.finishLog(201)
+        yield self.db.logs.finishLog(202)
+        yield self.db.logs.finishLog(203)
+
+    def test_searchLogs_replica_read(self):
+        self.assertIn('LogsConnectorComponent.searchLogs', base.replica_reads)
+
+    @defer.inlineCallbacks
+    def test_searchLogs(self):
+        yield self.setUpSearch()
+        results = yield self.db.logs.searchLogs('fail: test_foo')
+        self.assertEqual([(r['logid'], r['line'], r['content']) for r in results], [
+            (203, 0, 'FAIL: test_foo in b2'),
+            (202, 0, 'ofail: test_foo'),
+            (201, 1, 'oFAIL: test_foo (a.b)'),
+        ])
+        self.assertEqual(results[0]['stepid'], 103)
+        self.assertEqual(results[0]['buildid'], 31)
+        self.assertEqual(results[0]['builderid'], 89)
+        self.assertEqual(results[0]['started_at'], epoch2datetime(self.TIMESTAMP_STEP102))
+
+    @defer.inlineCallbacks
+    def test_searchLogs_filters(self):
+        yield self.setUpSearch()
+        results = yield self.db.logs.searchLogs('test_foo', builderid=88)
+        self.assertEqual([r['logid'] for r in results], [202, 201])
+        results = yield self.db.logs.searchLogs('test_foo',
+                                                min_started_at=self.TIMESTAMP_STEP102)
+        self.assertEqual([r['logid'] for r in results], [203, 202])
+        results = yield self.db.logs.searchLogs('test_foo',
+                                                max_started_at=self.TIMESTAMP_STEP101)
+        self.assertEqual([r['logid'] for r in results], [201])
+        results = yield self.db.logs.searchLogs('test_foo', limit=2)
+        self.assertEqual([r['logid'] for r in results], [203, 202])
+
+    @defer.inlineCallbacks
+    def test_searchLogs_stdio_stream(self):
+        yield self.setUpSearch()
+        # the stream of a stdio line is not part of its content
+        results = yield self.db.logs.searchLogs('hsetup')
+        self.assertEqual(results, [])
+        results = yield self.db.logs.searchLogs('setup_tests')
+        self.assertEqual([(r['logid'], r['line']) for r in results], [(201, 0)])
+
+    @defer.inlineCallbacks
+    def test_searchLogs_substring_checked(self):
+        yield self.setUpSearch()
+        # all the terms are in line 1 of log 202, but not as a substring
+        results = yield self.db.logs.searchLogs('test_bar failed')
+        self.assertEqual(results, [])
+
+    @defer.inlineCallbacks
+    def test_searchLogs_truncated_terms(self):
+        yield self.setUpSearch()
+        self.patch(self.db.logs, 'MAX_SEARCH_TERMS_PER_CHUNK', 3)
+        # the last chunk of log 202 has more than 3 terms, and is scanned by
+        # every search although its terms are not indexed
+        yield self.db.logs.appendLog(202, 'oone two three four\nofive six\n')
+        yield self.db.logs.flushAppendBuffers()
+        results = yield self.db.logs.searchLogs('six')
+        self.assertEqual([(r['logid'], r['line']) for r in results], [(202, 3)])
+        results = yield self.db.logs.searchLogs('test_foo')
+        self.assertEqual([r['logid'] for r in results], [203, 202, 201])
+
+        def thdGetTerms(conn):
+            tbl = self.db.model.log_search_terms
+            q = sa.select([tbl.c.term]).where((tbl.c.logid == 202) & (tbl.c.first_line == 2))
+            return [row.term for row in conn.execute(q).fetchall()]
+        terms = yield self.db.pool.do(thdGetTerms)
+        self.assertEqual(terms, [self.db.logs.TRUNCATED_SEARCH_TERMS])
+
+    def test_searchLogs_no_terms(self):
+        with self.assertRaises(ValueError):
+            self.db.logs.searchLogs('a b')
+
+    @defer.inlineCallbacks
+    def test_searchLogs_not_indexed(self):
+        yield self.setUpSearch()
+        self.db.master.config.logSearchIndex = False
+        yield self.db.logs.appendLog(202, 'onot_indexed\n')
+        yield self.db.logs.flushAppendBuffers()
+        results = yield self.db.logs.searchLogs('not_indexed')
+        self.assertEqual(results, [])
+
+    @defer.inlineCallbacks
+    def test_deleteOldLogChunks_search_terms(self):
+        yield self.setUpSearch()
+        yield self.db.logs.deleteOldLogChunks(self.TIMESTAMP_STEP101 + 1)
+        results = yield self.db.logs.searchLogs('test_foo')
+        self.assertEqual([r['logid'] for r in results], [203, 202])
+
+        def thdCountTerms(conn):
+            tbl = self.db.model.log_search_terms
+            q = sa.select([tbl.c.logid]).where(tbl.c.logid == 201)
+            return len(conn.execute(q).fetchall())
+        count = yield self.db.pool.do(thdCountTerms)
+        self.assertEqual(count, 0)
+
 
 class TestFakeDB(unittest.TestCase, connector_component.FakeConnectorComponentMixin, Tests):
 
@@ -586,11 +1085,13 @@ class TestRealDB(unittest.TestCase,
     @defer.inlineCallbacks
     def setUp(self):
         yield self.setUpConnectorComponent(
-            table_names=['logs', 'logchunks', 'steps', 'builds', 'builders',
+            table_names=['logs', 'logchunks', 'logchunk_dictionaries', 'log_search_terms',
+                         'steps', 'builds', 'builders',
                          'masters', 'buildrequests', 'buildsets',
                          'workers'])
 
         self.db.logs = logs.LogsConnectorComponent(self.db)
+        self.db.retention = retention.RetentionConnectorComponent(self.db)
 
     def tearDown(self):
         return self.tearDownConnectorComponent()
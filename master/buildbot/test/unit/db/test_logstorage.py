@@ -0,0 +1,104 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import os
+
+from twisted.trial import unittest
+
+from buildbot.db import logstorage
+from buildbot.test.util import config
+
+try:
+    from moto import mock_s3
+    assert mock_s3
+    import boto3
+    assert boto3
+except ImportError:
+    boto3 = None
+
+
+class LogStorageTests:
+
+    def test_put_get(self):
+        self.storage.thdPut('1-0-abc', b'hello\nworld')
+        self.assertEqual(self.storage.thdGet('1-0-abc'), b'hello\nworld')
+
+    def test_put_overwrite(self):
+        self.storage.thdPut('1-0-abc', b'hello')
+        self.storage.thdPut('1-0-abc', b'world')
+        self.assertEqual(self.storage.thdGet('1-0-abc'), b'world')
+
+    def test_get_range(self):
+        self.storage.thdPut('1-0-abc', b'hello\nworld')
+        self.assertEqual(self.storage.thdGet('1-0-abc', 6), b'world')
+        self.assertEqual(self.storage.thdGet('1-0-abc', 0, 5), b'hello')
+        self.assertEqual(self.storage.thdGet('1-0-abc', 3, 8), b'lo\nwo')
+        self.assertEqual(self.storage.thdGet('1-0-abc', 3, 3), b'')
+
+    def test_get_missing(self):
+        with self.assertRaises(KeyError):
+            self.storage.thdGet('1-0-abc')
+
+    def test_delete(self):
+        self.storage.thdPut('1-0-abc', b'hello')
+        self.storage.thdPut('1-1-def', b'world')
+        self.storage.thdDelete(['1-0-abc', '1-2-missing'])
+        with self.assertRaises(KeyError):
+            self.storage.thdGet('1-0-abc')
+        self.assertEqual(self.storage.thdGet('1-1-def'), b'world')
+
+
+class TestFilesystemLogStorage(LogStorageTests, unittest.TestCase,
+                               config.ConfigErrorsMixin):
+
+    def setUp(self):
+        self.basedir = os.path.abspath(self.mktemp())
+        self.storage = logstorage.FilesystemLogStorage(self.basedir)
+
+    def test_sharding(self):
+        self.storage.thdPut('1-0-abc', b'hello')
+        # sha1('1-0-abc') starts with 'b2ff'
+        path = os.path.join(self.basedir, 'b2', 'ff', '1-0-abc')
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), b'hello')
+
+    def test_no_sharding(self):
+        self.storage = logstorage.FilesystemLogStorage(self.basedir, shardLevels=0)
+        self.storage.thdPut('1-0-abc', b'hello')
+        self.assertEqual(os.listdir(self.basedir), ['1-0-abc'])
+
+    def test_bad_shardLevels(self):
+        with self.assertRaisesConfigError("shardLevels must be an int between 0 and 8"):
+            logstorage.FilesystemLogStorage(self.basedir, shardLevels=9)
+
+
+class TestS3LogStorage(LogStorageTests, unittest.TestCase):
+
+    # the S3 API is served by moto's in-process stand-in server
+    def setUp(self):
+        if boto3 is None:
+            raise unittest.SkipTest("boto3 or moto is not installed")
+        self.mock = mock_s3()
+        self.mock.start()
+        self.addCleanup(self.mock.stop)
+        self.storage = logstorage.S3LogStorage(
+            'logs', prefix='buildbot/', region='us-east-1',
+            identifier='key', secret_identifier='secret')
+        self.storage.client.create_bucket(Bucket='logs')
+
+    def test_prefix(self):
+        self.storage.thdPut('1-0-abc', b'hello')
+        res = self.storage.client.list_objects(Bucket='logs')
+        self.assertEqual([o['Key'] for o in res['Contents']], ['buildbot/1-0-abc'])
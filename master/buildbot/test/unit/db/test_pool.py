@@ -19,10 +19,14 @@ import time
 
 import sqlalchemy as sa
 
+import mock
+
 from twisted.internet import defer
 from twisted.internet import reactor
 from twisted.trial import unittest
 
+from buildbot.data import exceptions
+from buildbot.db import base
 from buildbot.db import pool
 from buildbot.test.util import db
 from buildbot.util import sautils
@@ -77,6 +81,15 @@ class Basic(unittest.TestCase):
         return self.expect_failure(self.pool.do(raise_something), RuntimeError,
                                    expect_logged_error=True)
 
+    @defer.inlineCallbacks
+    def test_do_invalid_query(self):
+        def raise_invalid_query(conn):
+            raise exceptions.InvalidQueryError("cannot paginate with a cursor")
+        with self.assertRaises(exceptions.InvalidQueryError):
+            yield self.pool.do(raise_invalid_query)
+        # the caller made the query invalid, this is not a database error
+        self.assertEqual(self.flushLoggedErrors(), [])
+
     @defer.inlineCallbacks
     def test_do_with_engine(self):
         def add(engine, addend1, addend2):
@@ -108,6 +121,154 @@ class Basic(unittest.TestCase):
             engine.execute("INSERT INTO tmp values ( 1 )")
         yield self.pool.do_with_engine(insert_into_table)
 
+    @defer.inlineCallbacks
+    def test_do_stats(self):
+        def add(conn, addend1, addend2):
+            rp = conn.execute("SELECT %d + %d" % (addend1, addend2))
+            return rp.scalar()
+        # with a single thread, the second call has to wait for the first one
+        yield defer.gatherResults([self.pool.do(add, 10, 11), self.pool.do(add, 1, 2)])
+
+        stats = self.pool.stats.sites['Basic.test_do_stats']
+        self.assertEqual(stats.duration.count, 2)
+        self.assertEqual(stats.wait.count, 2)
+        self.assertEqual(stats.failures, 0)
+        self.assertEqual(stats.saturated, 1)
+        self.assertEqual(self.pool.stats.in_flight, 0)
+        self.assertEqual(self.pool.stats.peak_in_flight, 2)
+        self.assertEqual(self.pool.stats.saturated_calls, 1)
+
+    @defer.inlineCallbacks
+    def test_do_stats_failure(self):
+        def raise_something(conn):
+            raise RuntimeError("oh noes")
+        yield self.expect_failure(self.pool.do(raise_something), RuntimeError,
+                                  expect_logged_error=True)
+        stats = self.pool.stats.sites['Basic.test_do_stats_failure']
+        self.assertEqual(stats.duration.count, 1)
+        self.assertEqual(stats.failures, 1)
+        self.assertEqual(self.pool.stats.in_flight, 0)
+
+
+class ReplicaComponent:
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    @base.replica_read
+    def getEngine(self):
+        def thd(conn):
+            return conn.engine
+        return self.pool.do(thd)
+
+    def getEngineFromPrimary(self):
+        def thd(conn):
+            return conn.engine
+        return self.pool.do(thd)
+
+
+class Replica(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = sa.create_engine('sqlite://')
+        self.engine.optimal_thread_pool_size = 1
+        self.pool = pool.DBThreadPool(self.engine, reactor=reactor)
+        self.replica_engine = sa.create_engine('sqlite://')
+        self.replica_engine.optimal_thread_pool_size = 1
+        self.pool.replica = pool.DBThreadPool(self.replica_engine, reactor=reactor)
+        self.component = ReplicaComponent(self.pool)
+
+    @defer.inlineCallbacks
+    def tearDown(self):
+        yield self.pool.shutdown()
+        yield self.pool.replica.shutdown()
+
+    @defer.inlineCallbacks
+    def test_replica_read(self):
+        self.pool.replica_usable = True
+        engine = yield self.component.getEngine()
+        self.assertIs(engine, self.replica_engine)
+        self.assertIn('ReplicaComponent.getEngine', self.pool.replica.stats.sites)
+
+    @defer.inlineCallbacks
+    def test_replica_read_lagging(self):
+        engine = yield self.component.getEngine()
+        self.assertIs(engine, self.engine)
+
+    @defer.inlineCallbacks
+    def test_unmarked_read(self):
+        self.pool.replica_usable = True
+        engine = yield self.component.getEngineFromPrimary()
+        self.assertIs(engine, self.engine)
+
+
+class FakeConnectorComponent:
+
+    def getThing(self):
+        def thd(conn):
+            pass
+        return thd
+
+    def thdGetThing(self, conn):
+        pass
+
+
+class QueryStats(unittest.TestCase):
+
+    def test_call_site(self):
+        comp = FakeConnectorComponent()
+        self.assertEqual(pool.call_site(comp.getThing()), 'FakeConnectorComponent.getThing')
+        self.assertEqual(pool.call_site(comp.thdGetThing), 'FakeConnectorComponent.thdGetThing')
+
+    def test_histogram(self):
+        histogram = pool.Histogram()
+        for value in [0.0005] * 90 + [0.003] * 8 + [0.7, 30]:
+            histogram.add(value)
+        self.assertEqual(histogram.count, 100)
+        self.assertEqual(histogram.max, 30)
+        self.assertEqual(histogram.buckets, [90, 0, 8, 0, 0, 0, 0, 0, 0, 1, 0, 0, 0, 1])
+        self.assertEqual(histogram.percentile(0.5), 0.001)
+        self.assertEqual(histogram.percentile(0.95), 0.005)
+        self.assertEqual(histogram.percentile(0.99), 1)
+        self.assertEqual(histogram.percentile(1), 30)
+
+    def test_histogram_percentile_capped_by_max(self):
+        histogram = pool.Histogram()
+        histogram.add(0.15)
+        self.assertEqual(histogram.percentile(0.5), 0.15)
+
+    def test_record_and_log_metrics(self):
+        def thd(conn):
+            pass
+        stats = pool.QueryStats(pool_size=1)
+        timings = stats.submit()
+        saturated = stats.submit()
+        self.assertEqual((stats.in_flight, stats.peak_in_flight, stats.saturated_calls),
+                         (2, 2, 1))
+        timings[0:3] = 10, 10.5, 11.5
+        stats.record(thd, timings, failed=False)
+        saturated[0:3] = 10, 11.5, 12.5
+        stats.record(thd, saturated, failed=True)
+
+        site = stats.sites['QueryStats.test_record_and_log_metrics']
+        self.assertEqual((site.duration.count, site.failures, site.saturated), (2, 1, 1))
+        self.assertEqual(site.duration.total, 2)
+        self.assertEqual(site.wait.total, 2)
+
+        with mock.patch('buildbot.process.metrics.MetricTimeEvent.log') as timeLog, \
+                mock.patch('buildbot.process.metrics.MetricCountEvent.log') as countLog:
+            stats.logMetrics()
+            self.assertEqual(timeLog.call_args_list, [
+                mock.call('DBThreadPool.QueryStats.test_record_and_log_metrics', 1.0),
+                mock.call('DBThreadPool.queue_wait', 1.0),
+            ])
+            self.assertIn(mock.call('DBThreadPool.queries', 2), countLog.call_args_list)
+
+            # only the calls since the last log are summarized
+            timeLog.reset_mock()
+            stats.logMetrics()
+            self.assertEqual(timeLog.call_args_list, [])
+
 
 class Stress(unittest.TestCase):
 
@@ -0,0 +1,189 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import sqlalchemy as sa
+
+from twisted.internet import defer
+from twisted.trial import unittest
+
+from buildbot.db import logs
+from buildbot.db import retention
+from buildbot.test import fakedb
+from buildbot.test.util import connector_component
+
+
+class TestRetentionConnectorComponent(connector_component.ConnectorComponentMixin,
+                                      unittest.TestCase):
+
+    backgroundData = [
+        fakedb.Worker(id=47, name='linux'),
+        fakedb.Builder(id=88, name='b1'),
+        fakedb.Master(id=88),
+        fakedb.SourceStamp(id=234),
+        fakedb.Buildset(id=20, complete=1, complete_at=100),
+        fakedb.BuildsetProperty(buildsetid=20),
+        fakedb.BuildsetSourceStamp(buildsetid=20, sourcestampid=234),
+        fakedb.BuildRequest(id=41, buildsetid=20, builderid=88, complete=1),
+        fakedb.BuildRequestClaim(brid=41, masterid=88, claimed_at=50),
+        fakedb.Buildset(id=21, complete=1, complete_at=300),
+        fakedb.BuildRequest(id=42, buildsetid=21, builderid=88, complete=1),
+        fakedb.Build(id=30, buildrequestid=41, number=1, masterid=88,
+                     builderid=88, workerid=47, complete_at=100),
+        fakedb.Build(id=31, buildrequestid=42, number=2, masterid=88,
+                     builderid=88, workerid=47, complete_at=300),
+        fakedb.BuildProperty(buildid=30),
+        fakedb.BuildData(buildid=30, name='data', value=b'x' * 10, source='test'),
+        fakedb.Step(id=101, buildid=30, number=1, name='one', started_at=100),
+        fakedb.Step(id=102, buildid=31, number=1, name='one', started_at=300),
+        fakedb.Log(id=201, stepid=101, name='stdio', slug='stdio', type='s'),
+        fakedb.LogChunk(logid=201, first_line=0, last_line=0, content='abc\n'),
+        fakedb.LogChunk(logid=201, first_line=1, last_line=1, content='defgh\n'),
+        fakedb.Log(id=202, stepid=102, name='stdio', slug='stdio', type='s'),
+        fakedb.LogChunk(logid=202, first_line=0, last_line=0, content='ijk\n'),
+        fakedb.TestResultSet(id=13, builderid=88, buildid=30, stepid=101,
+                             category='cat', value_unit='ms', complete=1),
+        fakedb.TestResult(id=14, builderid=88, test_result_setid=13, value='1'),
+    ]
+
+    # inserted once the builds exist, for the foreign key on parent_buildid
+    childBuildsetData = [
+        fakedb.Buildset(id=22, parent_buildid=30),
+    ]
+
+    @defer.inlineCallbacks
+    def setUp(self):
+        yield self.setUpConnectorComponent(
+            table_names=['changes', 'change_files', 'change_properties', 'change_users',
+                         'scheduler_changes', 'schedulers', 'users', 'patches',
+                         'sourcestamps', 'buildsets', 'buildset_properties',
+                         'buildset_sourcestamps', 'buildrequests', 'buildrequest_claims',
+                         'builds', 'build_properties', 'build_data', 'builders', 'masters',
+                         'workers', 'steps', 'logs', 'logchunks', 'logchunk_dictionaries',
+                         'log_search_terms', 'test_result_sets', 'test_results',
+                         'test_names', 'test_code_paths'])
+
+        self.db.logs = logs.LogsConnectorComponent(self.db)
+        self.db.retention = retention.RetentionConnectorComponent(self.db)
+
+    def tearDown(self):
+        return self.tearDownConnectorComponent()
+
+    @defer.inlineCallbacks
+    def insertBackgroundData(self):
+        yield self.insertTestData(self.backgroundData)
+        yield self.insertTestData(self.childBuildsetData)
+
+    def getIds(self, table_name, column='id'):
+        def thd(conn):
+            tbl = self.db.model.metadata.tables[table_name]
+            q = sa.select([tbl.c[column]]).order_by(tbl.c[column])
+            return [row[0] for row in conn.execute(q).fetchall()]
+        return self.db.pool.do(thd)
+
+    @defer.inlineCallbacks
+    def test_pruneChanges(self):
+        yield self.insertTestData([
+            fakedb.SourceStamp(id=29),
+            fakedb.Scheduler(id=5),
+        ] + [fakedb.Change(changeid=n, sourcestampid=29) for n in range(1, 8)] + [
+            fakedb.ChangeFile(changeid=2, filename='a.c'),
+            fakedb.SchedulerChange(schedulerid=5, changeid=3),
+        ])
+        res = yield self.db.retention.pruneChanges(2, limit=3)
+        self.assertEqual(res, dict(last_id=3, bytes=0, rows={
+            'changes': 3, 'change_files': 1, 'scheduler_changes': 1}))
+        res = yield self.db.retention.pruneChanges(2, after_id=3, limit=3)
+        self.assertEqual(res, dict(last_id=5, bytes=0, rows={'changes': 2}))
+        res = yield self.db.retention.pruneChanges(2, after_id=5, limit=3)
+        self.assertEqual(res['last_id'], None)
+        self.assertEqual((yield self.getIds('changes', 'changeid')), [6, 7])
+
+    @defer.inlineCallbacks
+    def test_subscribeToPrunes(self):
+        yield self.insertTestData([
+            fakedb.SourceStamp(id=29),
+        ] + [fakedb.Change(changeid=n, sourcestampid=29) for n in range(1, 4)])
+        pruned = []
+        self.db.retention.subscribeToPrunes(pruned.append)
+        yield self.db.retention.pruneChanges(2)
+        yield self.db.retention.pruneChanges(2, after_id=1)
+        # only the batches which pruned rows are delivered
+        self.assertEqual(pruned, [{'changes': 1}])
+
+    @defer.inlineCallbacks
+    def test_pruneChanges_below_horizon(self):
+        yield self.insertTestData([
+            fakedb.SourceStamp(id=29),
+            fakedb.Change(changeid=1, sourcestampid=29),
+        ])
+        res = yield self.db.retention.pruneChanges(1)
+        self.assertEqual(res, dict(last_id=None, bytes=0, rows={}))
+
+    @defer.inlineCallbacks
+    def test_pruneLogChunks(self):
+        yield self.insertBackgroundData()
+        res = yield self.db.retention.pruneLogChunks(200)
+        self.assertEqual(res, dict(last_id=201, bytes=10, rows={'logs': 1, 'logchunks': 2}))
+        logdict = yield self.db.logs.getLog(201)
+        self.assertEqual(logdict['type'], 'd')
+        self.assertEqual((yield self.getIds('logchunks', 'logid')), [202])
+
+        # the deleted logs are skipped
+        res = yield self.db.retention.pruneLogChunks(200)
+        self.assertEqual(res['last_id'], None)
+
+    @defer.inlineCallbacks
+    def test_pruneLogChunks_batches(self):
+        yield self.insertBackgroundData()
+        res = yield self.db.retention.pruneLogChunks(400, limit=1)
+        self.assertEqual(res['last_id'], 201)
+        res = yield self.db.retention.pruneLogChunks(400, after_id=201, limit=1)
+        self.assertEqual(res, dict(last_id=202, bytes=4, rows={'logs': 1, 'logchunks': 1}))
+        res = yield self.db.retention.pruneLogChunks(400, after_id=202, limit=1)
+        self.assertEqual(res['last_id'], None)
+
+    @defer.inlineCallbacks
+    def test_pruneBuilds(self):
+        yield self.insertBackgroundData()
+        res = yield self.db.retention.pruneBuilds(200)
+        self.assertEqual(res, dict(last_id=30, bytes=20, rows={
+            'builds': 1, 'build_properties': 1, 'build_data': 1, 'steps': 1,
+            'logs': 1, 'logchunks': 2, 'test_result_sets': 1, 'test_results': 1}))
+        self.assertEqual((yield self.getIds('builds')), [31])
+        self.assertEqual((yield self.getIds('steps')), [102])
+        self.assertEqual((yield self.getIds('logs')), [202])
+        self.assertEqual((yield self.getIds('test_results')), [])
+        buildset = yield self.db.pool.do(lambda conn: conn.execute(
+            self.db.model.buildsets.select().where(self.db.model.buildsets.c.id == 22)).fetchone())
+        self.assertEqual(buildset.parent_buildid, None)
+
+        res = yield self.db.retention.pruneBuilds(200, after_id=30)
+        self.assertEqual(res['last_id'], None)
+
+    @defer.inlineCallbacks
+    def test_pruneBuildsets(self):
+        yield self.insertBackgroundData()
+        # the builds of buildset 20 are still there
+        res = yield self.db.retention.pruneBuildsets(400)
+        self.assertEqual(res['last_id'], None)
+
+        yield self.db.retention.pruneBuilds(200)
+        res = yield self.db.retention.pruneBuildsets(400)
+        self.assertEqual(res, dict(last_id=20, bytes=0, rows={
+            'buildsets': 1, 'buildset_properties': 1, 'buildset_sourcestamps': 1,
+            'buildrequests': 1, 'buildrequest_claims': 1}))
+        # buildset 21 is kept with its build, and buildset 22 is not complete
+        self.assertEqual((yield self.getIds('buildsets')), [21, 22])
+        self.assertEqual((yield self.getIds('buildrequests')), [42])
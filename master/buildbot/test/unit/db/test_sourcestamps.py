@@ -356,6 +356,34 @@ class Tests(interfaces.InterfaceTests):
                      'ssid': 236}]
         return self.do_test_getSourceStampsForBuild(rows, 50, expected)
 
+    def test_signature_getSourceStampsForBuildsets(self):
+        @self.assertArgSpecMatches(self.db.sourcestamps.getSourceStampsForBuildsets)
+        def getSourceStampsForBuildsets(self, bsids):
+            pass
+
+    @defer.inlineCallbacks
+    def test_getSourceStampsForBuildsets(self):
+        yield self.insertTestData([
+            fakedb.SourceStamp(id=234, codebase='A', created_at=CREATED_AT,
+                               revision="aaa"),
+            fakedb.SourceStamp(id=235, codebase='B', created_at=CREATED_AT,
+                               revision="bbb"),
+            fakedb.Buildset(id=30, reason='foo', submitted_at=1300305712),
+            fakedb.BuildsetSourceStamp(sourcestampid=234, buildsetid=30),
+            fakedb.BuildsetSourceStamp(sourcestampid=235, buildsetid=30),
+            fakedb.Buildset(id=31, reason='foo', submitted_at=1300305712),
+            fakedb.BuildsetSourceStamp(sourcestampid=234, buildsetid=31),
+            # not asked for
+            fakedb.Buildset(id=32, reason='foo', submitted_at=1300305712),
+            fakedb.BuildsetSourceStamp(sourcestampid=235, buildsetid=32),
+        ])
+        sourcestamps = yield self.db.sourcestamps.getSourceStampsForBuildsets([30, 31, 33])
+
+        self.assertEqual(sorted(sourcestamps), [30, 31])
+        self.assertEqual(sorted(ss['ssid'] for ss in sourcestamps[30]), [234, 235])
+        self.assertEqual([ss['ssid'] for ss in sourcestamps[31]], [234])
+        self.assertEqual(sourcestamps[31][0]['revision'], 'aaa')
+
 
 class RealTests(Tests):
 
@@ -19,6 +19,7 @@ import time
 from twisted.internet import defer
 from twisted.trial import unittest
 
+from buildbot.db import base
 from buildbot.db import steps
 from buildbot.test import fakedb
 from buildbot.test.util import connector_component
@@ -298,6 +299,10 @@ class Tests(interfaces.InterfaceTests):
 
 class RealTests(Tests):
 
+    def test_getSteps_not_replica_read(self):
+        # the reporters read the steps of the builds which just finished
+        self.assertNotIn('StepsConnectorComponent.getSteps', base.replica_reads)
+
     # the fake connector doesn't deal with this edge case
     @defer.inlineCallbacks
     def test_addStep_getStep_name_collisions_too_long(self):
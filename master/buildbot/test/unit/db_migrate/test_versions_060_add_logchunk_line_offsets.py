@@ -0,0 +1,79 @@
+# This file is part of Buildbot. Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import sqlalchemy as sa
+
+from twisted.trial import unittest
+
+from buildbot.test.util import migration
+from buildbot.util import sautils
+
+
+class Migration(migration.MigrateTestMixin, unittest.TestCase):
+
+    def setUp(self):
+        return self.setUpMigrateTest()
+
+    def tearDown(self):
+        return self.tearDownMigrateTest()
+
+    def test_migration(self):
+        def setup_thd(conn):
+            metadata = sa.MetaData()
+            metadata.bind = conn
+
+            logs = sautils.Table(
+                'logs', metadata,
+                sa.Column('id', sa.Integer, primary_key=True),
+                # ...
+            )
+            logs.create()
+
+            logchunks = sautils.Table(
+                'logchunks', metadata,
+                sa.Column('logid', sa.Integer,
+                          sa.ForeignKey('logs.id', ondelete='CASCADE'),
+                          nullable=False),
+                sa.Column('first_line', sa.Integer, nullable=False),
+                sa.Column('last_line', sa.Integer, nullable=False),
+                sa.Column('content', sa.LargeBinary(65536)),
+                sa.Column('compressed', sa.SmallInteger, nullable=False),
+            )
+            logchunks.create()
+
+            conn.execute(logs.insert(), [{'id': 3}])
+            conn.execute(logchunks.insert(), [
+                {'logid': 3, 'first_line': 0, 'last_line': 1,
+                 'content': b'line0\nline1', 'compressed': 0}])
+
+        def verify_thd(conn):
+            metadata = sa.MetaData()
+            metadata.bind = conn
+
+            logchunks = sautils.Table('logchunks', metadata, autoload=True)
+
+            q = sa.select([
+                logchunks.c.logid,
+                logchunks.c.first_line,
+                logchunks.c.last_line,
+                logchunks.c.content,
+                logchunks.c.compressed,
+                logchunks.c.line_offsets,
+            ])
+            self.assertEqual(conn.execute(q).fetchall(), [
+                (3, 0, 1, b'line0\nline1', 0, None)
+            ])
+
+        return self.do_test_migration(59, 60, setup_thd, verify_thd)
@@ -515,6 +515,28 @@ class TestGetOldestRequestTime(TestReactorMixin, BuilderMixin,
         rqtime = yield self.bldr.getOldestRequestTime()
         self.assertEqual(rqtime, None)
 
+    @defer.inlineCallbacks
+    def test_getOldestRequestTimes(self):
+        builders = []
+        for name in ['bldr1', 'bldr2', 'foo@bar']:
+            yield self.makeBuilder(name=name)
+            builders.append(self.bldr)
+        rqtimes = yield builder.getOldestRequestTimes(self.master, builders)
+        self.assertEqual(rqtimes, {'bldr1': epoch2datetime(1000),
+                                   'bldr2': None,
+                                   'foo@bar': epoch2datetime(2800)})
+
+    @defer.inlineCallbacks
+    def test_getPrioritiesAndOldestRequestTimes(self):
+        builders = []
+        for name in ['bldr1', 'bldr2', 'foo@bar']:
+            yield self.makeBuilder(name=name)
+            builders.append(self.bldr)
+        rv = yield builder.getPrioritiesAndOldestRequestTimes(self.master, builders)
+        self.assertEqual(rv, {'bldr1': (0, epoch2datetime(1000)),
+                              'bldr2': (None, None),
+                              'foo@bar': (0, epoch2datetime(2800))})
+
 
 class TestGetNewestCompleteTime(TestReactorMixin, BuilderMixin, unittest.TestCase):
 
@@ -286,6 +286,59 @@ class TestBuildRequestCollapser(TestReactorMixin, unittest.TestCase):
         yield self.do_request_collapse(rows, [22], [])
         yield self.do_request_collapse(rows, [21], [20])
 
+    @defer.inlineCallbacks
+    def test_collapseRequests_collapse_default_same_buildset_with_patch(self):
+        rows = [
+            fakedb.Builder(id=77, name='A'),
+        ]
+        rows += self.makeBuildRequestRows(21, 121, None, 221, 'C', patchid=123)
+        rows += self.makeBuildRequestRows(20, 120, None, 220, 'C', patchid=124)
+        rows += [
+            fakedb.BuildRequest(id=19, buildsetid=121, builderid=77,
+                                priority=13, submitted_at=1300305712, results=-1),
+        ]
+        self.bldr.getCollapseRequestsFn = lambda: Builder._defaultCollapseRequestFn
+        yield self.do_request_collapse(rows, [21], [19])
+
+    @defer.inlineCallbacks
+    def test_collapseRequests_collapse_default_query_count(self):
+        rows = [
+            fakedb.Builder(id=77, name='A'),
+        ]
+        rows += self.makeBuildRequestRows(21, 121, 321, 221, 'C')
+        for i in range(10):
+            rows += self.makeBuildRequestRows(30 + i, 130 + i, 330 + i, 230 + i, 'C')
+        self.bldr.getCollapseRequestsFn = lambda: Builder._defaultCollapseRequestFn
+
+        calls = []
+        get = self.master.data.get
+
+        def countingGet(path, filters=None, **kwargs):
+            calls.append(path)
+            return get(path, filters=filters, **kwargs)
+        self.patch(self.master.data, 'get', countingGet)
+        yield self.do_request_collapse(rows, [21], list(range(30, 40)))
+        # the new request, its builder and its unclaimed requests
+        self.assertEqual(len(calls), 3)
+
+    @defer.inlineCallbacks
+    def test_collapseRequests_custom_within_codebases(self):
+        called = []
+
+        def collapseRequests_fn(master, builder, brdict1, brdict2):
+            called.append(brdict2['buildrequestid'])
+            return True
+
+        rows = [
+            fakedb.Builder(id=77, name='A'),
+        ]
+        rows += self.makeBuildRequestRows(21, 121, None, 221, 'C', 'br1')
+        rows += self.makeBuildRequestRows(19, 119, None, 210, 'A')
+        rows += self.makeBuildRequestRows(20, 120, None, 220, 'C', 'br2')
+        self.bldr.getCollapseRequestsFn = lambda: collapseRequests_fn
+        yield self.do_request_collapse(rows, [21], [20])
+        self.assertEqual(called, [20])
+
 
 class TestBuildRequest(TestReactorMixin, unittest.TestCase):
 
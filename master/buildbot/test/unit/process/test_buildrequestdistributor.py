@@ -22,14 +22,15 @@ from twisted.python import failure
 from twisted.trial import unittest
 
 from buildbot import config
+from buildbot import locks
 from buildbot.db import buildrequests
 from buildbot.process import buildrequestdistributor
 from buildbot.process import factory
+from buildbot.process import properties
 from buildbot.test import fakedb
 from buildbot.test.fake import fakemaster
 from buildbot.test.util.misc import TestReactorMixin
 from buildbot.test.util.warnings import assertProducesWarning
-from buildbot.util import epoch2datetime
 from buildbot.util.eventual import fireEventually
 from buildbot.warnings import DeprecatedApiWarning
 
@@ -259,22 +260,120 @@ class Test(TestBRDBase):
         self.assertEqual(self.maybeStartBuildsOnBuilder_calls, ['bldr1'])
         self.checkAllCleanedUp()
 
+    def useSlow_maybeStartBuildsOnBuilder(self, workernames):
+        # sets up a "maybeStartBuildsOnBuilder" which takes a second, and
+        # keeps track of the builders run concurrently
+        self.maybeStartBuildsOnBuilder_calls = []
+        self.running = []
+        self.max_running = 0
+        self.started_with = {}
+        self.addBuilders(list(workernames))
+        for name, bldr in self.builders.items():
+            bldr.config.workernames = workernames[name]
+            bldr.config.locks = []
+
+        def maybeStartBuildsOnBuilder(bldr):
+            self.maybeStartBuildsOnBuilder_calls.append(bldr.name)
+            self.started_with[bldr.name] = self.running[:]
+            self.running.append(bldr.name)
+            self.max_running = max(self.max_running, len(self.running))
+            d = defer.Deferred()
+
+            def finish():
+                self.running.remove(bldr.name)
+                d.callback(None)
+            self.reactor.callLater(1, finish)
+            return d
+        self.brd._maybeStartBuildsOnBuilder = maybeStartBuildsOnBuilder
+
+    @defer.inlineCallbacks
+    def runConcurrently(self, builders):
+        yield self.brd.maybeStartBuildsOn(builders)
+        self.reactor.pump([1] * 5)
+        yield self.brd._waitForFinish()
+        self.checkAllCleanedUp()
+
+    @defer.inlineCallbacks
+    def test_concurrent_builders(self):
+        self.master.config.builderStartConcurrency = 2
+        self.useSlow_maybeStartBuildsOnBuilder(dict(bldr1=['w1'], bldr2=['w2'], bldr3=['w3']))
+        yield self.runConcurrently(['bldr1', 'bldr2', 'bldr3'])
+        self.assertEqual(self.maybeStartBuildsOnBuilder_calls, ['bldr1', 'bldr2', 'bldr3'])
+        self.assertEqual(self.max_running, 2)
+
+    @defer.inlineCallbacks
+    def test_concurrent_builders_sharing_workers(self):
+        self.master.config.builderStartConcurrency = 3
+        self.useSlow_maybeStartBuildsOnBuilder(
+            dict(bldr1=['w1', 'w2'], bldr2=['w2'], bldr3=['w3']))
+        yield self.runConcurrently(['bldr1', 'bldr2', 'bldr3'])
+        # bldr2 waits for bldr1, but not bldr3
+        self.assertEqual(self.maybeStartBuildsOnBuilder_calls, ['bldr1', 'bldr3', 'bldr2'])
+        self.assertEqual(self.max_running, 2)
+
+    @defer.inlineCallbacks
+    def test_concurrent_builders_sharing_locks(self):
+        self.master.config.builderStartConcurrency = 3
+        self.useSlow_maybeStartBuildsOnBuilder(dict(bldr1=['w1'], bldr2=['w2'], bldr3=['w3']))
+        lock = locks.MasterLock('db')
+        self.builders['bldr1'].config.locks = [lock.access('exclusive')]
+        self.builders['bldr2'].config.locks = [lock]
+        yield self.runConcurrently(['bldr1', 'bldr2', 'bldr3'])
+        self.assertEqual(self.maybeStartBuildsOnBuilder_calls, ['bldr1', 'bldr3', 'bldr2'])
+
+    @defer.inlineCallbacks
+    def test_concurrent_builders_rendered_locks(self):
+        self.master.config.builderStartConcurrency = 3
+        self.useSlow_maybeStartBuildsOnBuilder(dict(bldr1=['w1'], bldr2=['w2'], bldr3=['w3']))
+        # the locks are not known until the build starts
+        self.builders['bldr2'].config.locks = properties.Property('locks')
+        yield self.runConcurrently(['bldr1', 'bldr2', 'bldr3'])
+        self.assertEqual(self.maybeStartBuildsOnBuilder_calls, ['bldr1', 'bldr3', 'bldr2'])
+        self.assertEqual(self.started_with['bldr2'], [])
+
+    @defer.inlineCallbacks
+    def test_concurrent_builders_new_pending(self):
+        self.master.config.builderStartConcurrency = 2
+        self.useSlow_maybeStartBuildsOnBuilder(dict(bldr1=['w1'], bldr2=['w2']))
+        yield self.brd.maybeStartBuildsOn(['bldr1'])
+        # a builder which becomes pending takes the free slot at once
+        yield self.brd.maybeStartBuildsOn(['bldr2'])
+        self.assertEqual(self.running, ['bldr1', 'bldr2'])
+        yield self.runConcurrently([])
+
+    @defer.inlineCallbacks
+    def test_concurrent_builders_metrics(self):
+        self.master.config.builderStartConcurrency = 2
+        self.useSlow_maybeStartBuildsOnBuilder(dict(bldr1=['w1'], bldr2=['w2'], bldr3=['w3']))
+        with mock.patch('buildbot.process.metrics.MetricCountEvent.log') as countLog:
+            yield self.runConcurrently(['bldr1', 'bldr2', 'bldr3'])
+        self.assertIn(mock.call('BuildRequestDistributor.pending_builders', 1, absolute=True),
+                      countLog.call_args_list)
+        self.assertIn(mock.call('BuildRequestDistributor.active_builders', 2, absolute=True),
+                      countLog.call_args_list)
+        self.assertEqual(countLog.call_args_list.count(
+            mock.call('BuildRequestDistributor.processed_builders', 1)), 3)
+
     @defer.inlineCallbacks
     def do_test_sortBuilders(self, prioritizeBuilders, oldestRequestTimes,
-                             expected, returnDeferred=False):
+                             expected, returnDeferred=False, priorities=None):
         self.useMock_maybeStartBuildsOnBuilder()
         self.addBuilders(list(oldestRequestTimes))
         self.master.config.prioritizeBuilders = prioritizeBuilders
 
-        def mklambda(t):  # work around variable-binding issues
-            if returnDeferred:
-                return lambda: defer.succeed(t)
-            return lambda: t
+        def mklambda(builderid):  # work around variable-binding issues
+            return lambda: defer.succeed(builderid)
 
+        rows = self.base_rows[:]
         for n, t in oldestRequestTimes.items():
+            builderid = self.builders[n].getBuilderId()
+            if returnDeferred:
+                self.builders[n].getBuilderId = mklambda(builderid)
             if t is not None:
-                t = epoch2datetime(t)
-            self.builders[n].getOldestRequestTime = mklambda(t)
+                priority = (priorities or {}).get(n, 0)
+                rows.append(fakedb.BuildRequest(buildsetid=11, builderid=builderid,
+                                                submitted_at=t, priority=priority))
+        yield self.master.db.insertTestData(rows)
 
         result = yield self.brd._sortBuilders(list(oldestRequestTimes))
 
@@ -298,6 +397,30 @@ class Test(TestBRDBase):
                                              bldr1=777, bldr2=None, bldr3=888),
                                          ['bldr1', 'bldr3', 'bldr2'])
 
+    def test_sortBuilders_default_priority(self):
+        return self.do_test_sortBuilders(None,  # use the default sort
+                                         dict(bldr1=777, bldr2=999, bldr3=888,
+                                              bldr4=None),
+                                         ['bldr2', 'bldr3', 'bldr1', 'bldr4'],
+                                         priorities=dict(bldr2=10, bldr3=5))
+
+    @defer.inlineCallbacks
+    def test_sortBuilders_default_single_query(self):
+        calls = []
+        getPrioritiesAndOldestRequestTimes = \
+            self.master.db.buildrequests.getPrioritiesAndOldestRequestTimes
+
+        def countingGetPrioritiesAndOldestRequestTimes(builderids):
+            calls.append(builderids)
+            return getPrioritiesAndOldestRequestTimes(builderids)
+        self.patch(self.master.db.buildrequests, 'getPrioritiesAndOldestRequestTimes',
+                   countingGetPrioritiesAndOldestRequestTimes)
+        yield self.do_test_sortBuilders(None,  # use the default sort
+                                        dict(bldr1=777, bldr2=999, bldr3=888),
+                                        ['bldr1', 'bldr3', 'bldr2'])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(calls[0]), 3)
+
     def test_sortBuilders_custom(self):
         def prioritizeBuilders(master, builders):
             self.assertIdentical(master, self.master)
@@ -573,6 +696,44 @@ class TestMaybeStartBuilds(TestBRDBase):
                                                      exp_builds=[('test-worker2', [10]),
                                                      ('test-worker1', [11])])
 
+    @defer.inlineCallbacks
+    def test_unlimited_sorted_by_priority(self):
+        self.bldr.config.nextWorker = nth_worker(-1)
+        self.addWorkers({'test-worker1': 1, 'test-worker2': 1, 'test-worker3': 1})
+        rows = self.base_rows + [
+            fakedb.BuildRequest(id=10, buildsetid=11, builderid=77,
+                                submitted_at=130000),
+            fakedb.BuildRequest(id=11, buildsetid=11, builderid=77,
+                                submitted_at=135000),
+            fakedb.BuildRequest(id=12, buildsetid=11, builderid=77,
+                                priority=5, submitted_at=140000),
+        ]
+        yield self.do_test_maybeStartBuildsOnBuilder(rows=rows, exp_claims=[10, 11, 12],
+                                                     exp_builds=[('test-worker3', [12]),
+                                                                 ('test-worker2', [10]),
+                                                                 ('test-worker1', [11])])
+
+    @defer.inlineCallbacks
+    def test_fetchUnclaimedBrdicts_sorted_by_priority(self):
+        yield self.master.db.insertTestData(self.base_rows + [
+            fakedb.BuildRequest(id=10, buildsetid=11, builderid=77,
+                                submitted_at=130000),
+            fakedb.BuildRequest(id=11, buildsetid=11, builderid=77,
+                                submitted_at=135000),
+            fakedb.BuildRequest(id=12, buildsetid=11, builderid=77,
+                                priority=5, submitted_at=140000),
+        ])
+        bc = self.brd.createBuildChooser(self.bldr, self.master)
+        brdicts = yield bc._fetchUnclaimedBrdicts()
+        # custom build choosers use the list of the requests, the ones to
+        # start first coming first
+        self.assertEqual([brdict['buildrequestid'] for brdict in brdicts], [12, 10, 11])
+        self.assertIs(bc.unclaimedBrdicts, brdicts)
+
+        bc._removeBuildRequest((yield bc._getBuildRequestForBrdict(brdicts[0])))
+        self.assertEqual([brdict['buildrequestid'] for brdict in bc.unclaimedBrdicts],
+                         [10, 11])
+
     @defer.inlineCallbacks
     def test_bldr_maybeStartBuild_fails_always(self):
         self.bldr.config.nextWorker = nth_worker(-1)
@@ -0,0 +1,179 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import json
+
+from twisted.internet import defer
+from twisted.trial import unittest
+
+from buildbot.process import buildrequestindex
+from buildbot.test import fakedb
+from buildbot.test.fake import fakemaster
+from buildbot.test.util.misc import TestReactorMixin
+from buildbot.util import epoch2datetime
+from buildbot.util import toJson
+
+
+def brdict(brid, submitted_at, priority=0, claimed=False, complete=False):
+    return dict(buildrequestid=brid, builderid=77, priority=priority,
+                submitted_at=epoch2datetime(submitted_at), claimed=claimed,
+                complete=complete)
+
+
+class BuilderQueue(unittest.TestCase):
+
+    def test_order(self):
+        queue = buildrequestindex.BuilderQueue(
+            [brdict(1, 300), brdict(2, 100), brdict(3, 200, priority=5)], 0)
+        queue.add(brdict(4, 50))
+        queue.add(brdict(5, 150, priority=5))
+        self.assertEqual([br['buildrequestid'] for br in queue.getBrdicts()], [5, 3, 4, 2, 1])
+
+    def test_add_replaces(self):
+        queue = buildrequestindex.BuilderQueue([brdict(1, 100), brdict(2, 200)], 0)
+        queue.add(brdict(1, 100, priority=1))
+        self.assertEqual([br['buildrequestid'] for br in queue.getBrdicts()], [1, 2])
+        self.assertEqual(len(queue.keys), 2)
+
+    def test_remove(self):
+        queue = buildrequestindex.BuilderQueue([brdict(1, 100), brdict(2, 100)], 0)
+        queue.remove(1)
+        queue.remove(3)
+        self.assertEqual(queue.getBrdicts(), [brdict(2, 100)])
+
+
+class UnclaimedBuildRequestIndex(TestReactorMixin, unittest.TestCase):
+
+    @defer.inlineCallbacks
+    def setUp(self):
+        self.setUpTestReactor()
+        self.master = fakemaster.make_master(self, wantData=True)
+        self.master.mq.verifyMessages = False
+        yield self.master.db.insertTestData([
+            fakedb.Builder(id=77, name='A'),
+            fakedb.SourceStamp(id=21),
+            fakedb.Buildset(id=11, reason='because'),
+            fakedb.BuildsetSourceStamp(sourcestampid=21, buildsetid=11),
+            fakedb.BuildRequest(id=10, buildsetid=11, builderid=77, submitted_at=200),
+            fakedb.BuildRequest(id=11, buildsetid=11, builderid=77, submitted_at=100),
+            fakedb.BuildRequest(id=12, buildsetid=11, builderid=77, submitted_at=300,
+                                complete=1),
+        ])
+        self.index = buildrequestindex.UnclaimedBuildRequestIndex()
+        yield self.index.setServiceParent(self.master)
+        yield self.index.startService()
+
+    @defer.inlineCallbacks
+    def assertUnclaimed(self, brids):
+        brdicts = yield self.index.getUnclaimedBrdicts(77)
+        self.assertEqual([br['buildrequestid'] for br in brdicts], brids)
+
+    def countQueries(self):
+        calls = []
+        get = self.master.data.get
+
+        def countingGet(path, filters=None, **kwargs):
+            calls.append(path)
+            return get(path, filters=filters, **kwargs)
+        self.patch(self.master.data, 'get', countingGet)
+        return calls
+
+    @defer.inlineCallbacks
+    def test_loaded_once(self):
+        calls = self.countQueries()
+        yield self.assertUnclaimed([11, 10])
+        yield self.assertUnclaimed([11, 10])
+        self.assertEqual(calls, [('builders', 77, 'buildrequests')])
+
+    @defer.inlineCallbacks
+    def test_events(self):
+        yield self.assertUnclaimed([11, 10])
+        calls = self.countQueries()
+        self.master.mq.callConsumer(('buildrequests', '13', 'new'), brdict(13, 150))
+        self.master.mq.callConsumer(('buildrequests', '11', 'claimed'),
+                                    brdict(11, 100, claimed=True))
+        yield self.assertUnclaimed([13, 10])
+        self.master.mq.callConsumer(('buildrequests', '11', 'unclaimed'), brdict(11, 100))
+        self.master.mq.callConsumer(('buildrequests', '13', 'complete'),
+                                    brdict(13, 150, claimed=True, complete=True))
+        yield self.assertUnclaimed([11, 10])
+        self.assertEqual(calls, [])
+
+    @defer.inlineCallbacks
+    def test_events_through_json(self):
+        # as delivered by the wamp mq, with the times as epochs
+        def jsonified(msg):
+            return json.loads(json.dumps(msg, default=toJson))
+        yield self.assertUnclaimed([11, 10])
+        self.master.mq.callConsumer(('buildrequests', '13', 'new'), jsonified(brdict(13, 150)))
+        self.master.mq.callConsumer(('buildrequests', '14', 'new'), jsonified(brdict(14, 100)))
+        brdicts = yield self.index.getUnclaimedBrdicts(77)
+        self.assertEqual([br['buildrequestid'] for br in brdicts], [11, 14, 13, 10])
+        self.assertEqual(brdicts[2]['submitted_at'], epoch2datetime(150))
+
+    @defer.inlineCallbacks
+    def test_events_of_other_builders_ignored(self):
+        msg = brdict(13, 150)
+        msg['builderid'] = 78
+        self.master.mq.callConsumer(('buildrequests', '13', 'new'), msg)
+        yield self.assertUnclaimed([11, 10])
+        self.assertNotIn(78, self.index.queues)
+
+    @defer.inlineCallbacks
+    def test_events_during_load(self):
+        d = defer.Deferred()
+        self.patch(self.master.data, 'get', lambda path, filters=None: d)
+        loaded = self.index.getUnclaimedBrdicts(77)
+        # the query may or may not see these changes
+        self.master.mq.callConsumer(('buildrequests', '11', 'claimed'),
+                                    brdict(11, 100, claimed=True))
+        self.master.mq.callConsumer(('buildrequests', '13', 'new'), brdict(13, 150))
+        d.callback([brdict(10, 200), brdict(11, 100)])
+        brdicts = yield loaded
+        self.assertEqual([br['buildrequestid'] for br in brdicts], [13, 10])
+        self.assertEqual(self.index.loading, {})
+
+    @defer.inlineCallbacks
+    def test_reconciled(self):
+        yield self.assertUnclaimed([11, 10])
+        # a request which came without an event
+        yield self.master.db.insertTestData([
+            fakedb.BuildRequest(id=13, buildsetid=11, builderid=77, submitted_at=150),
+        ])
+        yield self.assertUnclaimed([11, 10])
+        self.reactor.advance(self.index.RECONCILE_INTERVAL + 1)
+        yield self.assertUnclaimed([11, 13, 10])
+
+    @defer.inlineCallbacks
+    def test_removeBuildRequests(self):
+        yield self.assertUnclaimed([11, 10])
+        self.index.removeBuildRequests(77, [11])
+        self.index.removeBuildRequests(78, [10])
+        yield self.assertUnclaimed([10])
+
+    @defer.inlineCallbacks
+    def test_invalidate(self):
+        yield self.assertUnclaimed([11, 10])
+        calls = self.countQueries()
+        self.index.invalidate(77)
+        yield self.assertUnclaimed([11, 10])
+        self.assertEqual(len(calls), 1)
+
+    @defer.inlineCallbacks
+    def test_stopService(self):
+        yield self.assertUnclaimed([11, 10])
+        yield self.index.stopService()
+        self.assertEqual(self.master.mq.qrefs, [])
+        self.assertEqual(self.index.queues, {})
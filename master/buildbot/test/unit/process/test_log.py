@@ -20,6 +20,7 @@ from twisted.internet import reactor
 from twisted.trial import unittest
 
 from buildbot.process import log
+from buildbot.process import logcompactor
 from buildbot.test.fake import fakemaster
 from buildbot.test.fake import logfile as fakelogfile
 from buildbot.test.util import interfaces
@@ -78,6 +79,23 @@ class Tests(TestReactorMixin, unittest.TestCase):
             'name': 'testlog',
         })
 
+    @defer.inlineCallbacks
+    def test_finish_compresses(self):
+        self.master.data.updates.compressLog = mock.Mock(
+            return_value=defer.succeed(None))
+        _log = yield self.makeLog('t')
+        yield _log.finish()
+        self.master.data.updates.compressLog.assert_called_once_with(_log.logid)
+
+    @defer.inlineCallbacks
+    def test_finish_leaves_compression_to_compactor(self):
+        self.master.config.services['LogCompactor'] = logcompactor.LogCompactor()
+        self.master.data.updates.compressLog = mock.Mock(
+            return_value=defer.succeed(None))
+        _log = yield self.makeLog('t')
+        yield _log.finish()
+        self.assertFalse(self.master.data.updates.compressLog.called)
+
     @defer.inlineCallbacks
     def test_updates_different_encoding(self):
         _log = yield self.makeLog('t', logEncoding='latin-1')
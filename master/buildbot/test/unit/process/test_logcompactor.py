@@ -0,0 +1,152 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import mock
+
+from twisted.internet import defer
+from twisted.trial import unittest
+
+from buildbot.process import logcompactor
+from buildbot.test import fakedb
+from buildbot.test.fake import fakemaster
+from buildbot.test.util import config
+from buildbot.test.util.misc import TestReactorMixin
+
+
+class TestLogCompactor(TestReactorMixin, unittest.TestCase, config.ConfigErrorsMixin):
+
+    @defer.inlineCallbacks
+    def setUp(self):
+        self.setUpTestReactor()
+        self.master = fakemaster.make_master(self, wantDb=True)
+        self.master.db.insertTestData([
+            fakedb.Log(id=1, stepid=1, complete=1, slug='l1'),
+            fakedb.Log(id=2, stepid=1, complete=0, slug='l2'),
+            fakedb.Log(id=3, stepid=1, complete=1, slug='l3', type='d'),
+            fakedb.Log(id=4, stepid=1, complete=1, slug='l4'),
+        ])
+        self.compacted = []
+
+        def compactLog(logid):
+            self.compacted.append(logid)
+            return defer.succeed((2048, 1024))
+        self.master.db.logs.compactLog = compactLog
+        yield self.master.startService()
+        self.addCleanup(self.master.stopService)
+
+    @defer.inlineCallbacks
+    def makeCompactor(self, **kwargs):
+        compactor = logcompactor.LogCompactor(**kwargs)
+        yield compactor.setServiceParent(self.master)
+        return compactor
+
+    def assertState(self, **kwargs):
+        objectid = self.master.db.state.objects[('LogCompactor', 'LogCompactor')]
+        self.master.db.state.assertState(objectid, **kwargs)
+
+    def test_bad_config(self):
+        with self.assertRaisesConfigError("bytesPerSecond must be a positive integer"):
+            logcompactor.LogCompactor(bytesPerSecond=0)
+        with self.assertRaisesConfigError("batchSize must be a positive integer"):
+            logcompactor.LogCompactor(batchSize='10')
+        with self.assertRaisesConfigError("pollInterval must be a positive number"):
+            logcompactor.LogCompactor(pollInterval=-1)
+        with self.assertRaisesConfigError("maxPending must be a non-negative integer"):
+            logcompactor.LogCompactor(maxPending=-1)
+
+    @defer.inlineCallbacks
+    def test_compacts_finished_logs_throttled(self):
+        yield self.makeCompactor(bytesPerSecond=1024, pollInterval=60)
+        self.assertEqual(self.compacted, [1])
+        # 2048 bytes at 1024 bytes per second
+        self.reactor.advance(2)
+        self.assertEqual(self.compacted, [1, 4])
+        self.reactor.advance(2)
+        self.assertState(last_logid=4, pending_logids=[2])
+
+        # log 2 gets finished, and is compacted on next poll
+        self.master.db.logs.logs[2]['complete'] = 1
+        self.reactor.advance(59)
+        self.assertEqual(self.compacted, [1, 4])
+        self.reactor.advance(1)
+        self.assertEqual(self.compacted, [1, 4, 2])
+        self.reactor.advance(2)
+        self.assertState(last_logid=4, pending_logids=[])
+
+    @defer.inlineCallbacks
+    def test_resumes_from_state(self):
+        self.master.db.state.fakeState('LogCompactor', 'LogCompactor',
+                                       last_logid=1, pending_logids=[])
+        yield self.makeCompactor()
+        self.reactor.advance(1)
+        self.assertEqual(self.compacted, [4])
+
+    @defer.inlineCallbacks
+    def test_batches(self):
+        yield self.makeCompactor(batchSize=1, bytesPerSecond=1024)
+        self.assertEqual(self.compacted, [1])
+        self.reactor.advance(2)
+        # log 2 is not finished, so it is remembered for later
+        self.assertEqual(self.compacted, [1, 4])
+        self.assertState(last_logid=2, pending_logids=[2])
+        self.reactor.advance(2)
+        self.assertState(last_logid=4, pending_logids=[2])
+
+    @defer.inlineCallbacks
+    def test_pending_logs_are_capped(self):
+        self.master.db.insertTestData([
+            fakedb.Log(id=5, stepid=1, complete=0, slug='l5'),
+            fakedb.Log(id=6, stepid=1, complete=0, slug='l6'),
+        ])
+        yield self.makeCompactor(maxPending=2, bytesPerSecond=1024)
+        self.assertEqual(self.compacted, [1])
+        self.reactor.advance(2)
+        self.assertEqual(self.compacted, [1, 4])
+        self.reactor.advance(2)
+        # the oldest unfinished log is forgotten
+        self.assertState(last_logid=6, pending_logids=[5, 6])
+
+    @defer.inlineCallbacks
+    def test_deleted_pending_logs_are_forgotten(self):
+        self.master.db.state.fakeState('LogCompactor', 'LogCompactor',
+                                       last_logid=4, pending_logids=[2, 10])
+        getLogsCompletion = mock.Mock(wraps=self.master.db.logs.getLogsCompletion)
+        self.master.db.logs.getLogsCompletion = getLogsCompletion
+        yield self.makeCompactor()
+        self.assertEqual(self.compacted, [])
+        self.assertState(last_logid=4, pending_logids=[2])
+        # the pending logs are looked up at once
+        self.assertEqual(getLogsCompletion.call_count, 1)
+
+    @defer.inlineCallbacks
+    def test_stop_while_throttled(self):
+        compactor = yield self.makeCompactor(bytesPerSecond=1)
+        self.assertEqual(self.compacted, [1])
+        yield compactor.disownServiceParent()
+        self.assertEqual(self.compacted, [1])
+        self.assertFalse(self.reactor.getDelayedCalls())
+        self.assertState(last_logid=1)
+
+    @defer.inlineCallbacks
+    def test_error_is_logged(self):
+        self.master.db.logs.compactLog = mock.Mock(
+            return_value=defer.fail(RuntimeError('oh noes')))
+        yield self.makeCompactor()
+        self.assertEqual(len(self.flushLoggedErrors(RuntimeError)), 1)
+
+    def test_isLogCompactorConfigured(self):
+        self.assertFalse(logcompactor.isLogCompactorConfigured(self.master.config))
+        self.master.config.services['LogCompactor'] = logcompactor.LogCompactor()
+        self.assertTrue(logcompactor.isLogCompactorConfigured(self.master.config))
@@ -0,0 +1,136 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import datetime
+
+import mock
+
+from twisted.internet import defer
+from twisted.trial import unittest
+
+from buildbot.process import retention
+from buildbot.test.fake import fakemaster
+from buildbot.test.util import config
+from buildbot.test.util.misc import TestReactorMixin
+
+
+class TestRetentionPruner(TestReactorMixin, unittest.TestCase, config.ConfigErrorsMixin):
+
+    @defer.inlineCallbacks
+    def setUp(self):
+        self.setUpTestReactor()
+        self.reactor.advance(10000)
+        self.master = fakemaster.make_master(self, wantDb=True)
+        self.master.db.retention = mock.Mock()
+        self.calls = []
+        self.fail_kind = None
+        # each kind has three items to prune, with ids 1 to 3
+        for kind, method in (('changes', 'pruneChanges'), ('logs', 'pruneLogChunks'),
+                             ('builds', 'pruneBuilds'), ('buildsets', 'pruneBuildsets')):
+            setattr(self.master.db.retention, method, self.makePrune(kind))
+        yield self.master.startService()
+        self.addCleanup(self.master.stopService)
+
+    def makePrune(self, kind):
+        def prune(horizon, after_id, limit):
+            self.calls.append((kind, horizon, after_id, limit))
+            ids = [i for i in (1, 2, 3) if i > after_id][:limit]
+            if self.fail_kind == kind:
+                return defer.fail(RuntimeError('oh noes'))
+            return defer.succeed(dict(last_id=ids[-1] if ids else None,
+                                      rows={kind: len(ids)}, bytes=100 * len(ids)))
+        return prune
+
+    @defer.inlineCallbacks
+    def makePruner(self, **kwargs):
+        pruner = retention.RetentionPruner(**kwargs)
+        yield pruner.setServiceParent(self.master)
+        return pruner
+
+    def assertState(self, **kwargs):
+        objectid = self.master.db.state.objects[('RetentionPruner', 'RetentionPruner')]
+        self.master.db.state.assertState(objectid, **kwargs)
+
+    def test_bad_config(self):
+        with self.assertRaisesConfigError("at least one horizon must be set"):
+            retention.RetentionPruner()
+        with self.assertRaisesConfigError("changeHorizon must be a positive integer"):
+            retention.RetentionPruner(changeHorizon=0)
+        with self.assertRaisesConfigError("buildHorizon must be a timedelta"):
+            retention.RetentionPruner(buildHorizon=3600)
+        with self.assertRaisesConfigError("batchSize must be a positive integer"):
+            retention.RetentionPruner(changeHorizon=10, batchSize='10')
+        with self.assertRaisesConfigError("rowsPerSecond must be a positive integer"):
+            retention.RetentionPruner(changeHorizon=10, rowsPerSecond=0)
+        with self.assertRaisesConfigError("pollInterval must be a positive number"):
+            retention.RetentionPruner(changeHorizon=10, pollInterval=-1)
+
+    @defer.inlineCallbacks
+    def test_prunes_throttled(self):
+        yield self.makePruner(changeHorizon=10, logHorizon=datetime.timedelta(seconds=1000),
+                              batchSize=2, rowsPerSecond=1, pollInterval=60)
+        self.assertEqual(self.calls, [('logs', 9000, 0, 2)])
+        # 2 rows at 1 row per second
+        self.reactor.advance(2)
+        self.assertEqual(self.calls[1:], [('changes', 10, 0, 2)])
+        self.reactor.advance(2)
+        self.assertEqual(self.calls[2:], [('logs', 9004, 2, 2)])
+        self.assertState(cursors={'logs': 3, 'changes': 2})
+        self.reactor.advance(1)
+        self.assertEqual(self.calls[3:], [('changes', 10, 2, 2)])
+        self.reactor.advance(1)
+        self.assertEqual(self.calls[4:], [('logs', 9006, 3, 2), ('changes', 10, 3, 2)])
+        self.assertState(cursors={})
+
+        # the next pass starts from the beginning
+        self.reactor.advance(59)
+        self.assertEqual(len(self.calls), 6)
+        self.reactor.advance(1)
+        self.assertEqual(self.calls[6:], [('logs', 9066, 0, 2)])
+
+    @defer.inlineCallbacks
+    def test_report(self):
+        pruner = yield self.makePruner(buildHorizon=datetime.timedelta(seconds=1000),
+                                       buildsetHorizon=datetime.timedelta(seconds=1000),
+                                       rowsPerSecond=1)
+        self.assertEqual(pruner.rowsDeleted, {'builds': 3})
+        self.reactor.advance(3)
+        self.assertEqual(pruner.rowsDeleted, {'builds': 3, 'buildsets': 3})
+        self.assertEqual(pruner.bytesReclaimed, 600)
+        # the counts are logged and reset once the pass is over
+        self.reactor.advance(3)
+        self.assertEqual(pruner.rowsDeleted, {})
+        self.assertEqual(pruner.bytesReclaimed, 0)
+
+    @defer.inlineCallbacks
+    def test_resumes_from_state(self):
+        self.master.db.state.fakeState('RetentionPruner', 'RetentionPruner',
+                                       cursors={'changes': 2})
+        yield self.makePruner(changeHorizon=10)
+        self.assertEqual(self.calls, [('changes', 10, 2, 100)])
+
+    @defer.inlineCallbacks
+    def test_stop_while_throttled(self):
+        pruner = yield self.makePruner(changeHorizon=10, rowsPerSecond=1)
+        yield pruner.disownServiceParent()
+        self.assertEqual(self.calls, [('changes', 10, 0, 100)])
+        self.assertFalse(self.reactor.getDelayedCalls())
+        self.assertState(cursors={'changes': 3})
+
+    @defer.inlineCallbacks
+    def test_error_is_logged(self):
+        self.fail_kind = 'changes'
+        yield self.makePruner(changeHorizon=10)
+        self.assertEqual(len(self.flushLoggedErrors(RuntimeError)), 1)
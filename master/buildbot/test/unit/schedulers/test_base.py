@@ -44,7 +44,7 @@ class BaseScheduler(scheduler.SchedulerMixin, TestReactorMixin,
         self.tearDownScheduler()
 
     def makeScheduler(self, name='testsched', builderNames=None,
-                      properties=None, codebases=None):
+                      properties=None, codebases=None, priority=0):
         if builderNames is None:
             builderNames = ['a', 'b']
         if properties is None:
@@ -63,7 +63,8 @@ class BaseScheduler(scheduler.SchedulerMixin, TestReactorMixin,
 
         sched = self.attachScheduler(
             base.BaseScheduler(name=name, builderNames=builderNames,
-                               properties=properties, codebases=codebases),
+                               properties=properties, codebases=codebases,
+                               priority=priority),
             self.OBJECTID, self.SCHEDULERID)
         self.master.data.updates.addBuildset = mock.Mock(
             name='data.addBuildset',
@@ -102,6 +103,10 @@ class BaseScheduler(scheduler.SchedulerMixin, TestReactorMixin,
         with self.assertRaises(config.ConfigErrors):
             self.makeScheduler(codebases=codebases)
 
+    def test_constructor_priority_invalid(self):
+        with self.assertRaises(config.ConfigErrors):
+            self.makeScheduler(priority='high')
+
     @defer.inlineCallbacks
     def test_getCodebaseDict(self):
         sched = self.makeScheduler(
@@ -395,6 +400,7 @@ class BaseScheduler(scheduler.SchedulerMixin, TestReactorMixin,
             waited_for=False,
             builderids=[1],
             external_idstring=None,
+            priority=0,
             properties={
                 'scheduler': ('n', 'Scheduler'),
             },
@@ -415,6 +421,7 @@ class BaseScheduler(scheduler.SchedulerMixin, TestReactorMixin,
             waited_for=False,
             builderids=[1],
             external_idstring=None,
+            priority=0,
             properties={
                 'scheduler': ('n', 'Scheduler'),
             },
@@ -438,6 +445,7 @@ class BaseScheduler(scheduler.SchedulerMixin, TestReactorMixin,
             waited_for=False,
             builderids=[1],
             external_idstring=None,
+            priority=0,
             properties={
                 'virtual_builder_name': ("myproject-dev1", "Scheduler"),
                 'scheduler': ('n', 'Scheduler'),
@@ -468,6 +476,7 @@ class BaseScheduler(scheduler.SchedulerMixin, TestReactorMixin,
             waited_for=False,
             builderids=[1, 2],
             external_idstring=None,
+            priority=0,
             properties={
                 'scheduler': ('n', 'Scheduler'),
             },
@@ -514,6 +523,7 @@ class BaseScheduler(scheduler.SchedulerMixin, TestReactorMixin,
             waited_for=True,
             builderids=[1, 2],
             external_idstring=None,
+            priority=0,
             reason='power',
             scheduler='n',
             properties={
@@ -539,6 +549,7 @@ class BaseScheduler(scheduler.SchedulerMixin, TestReactorMixin,
             waited_for=False,
             builderids=[1],
             external_idstring=None,
+            priority=0,
             reason='whynot',
             scheduler='n',
             properties={
@@ -559,6 +570,7 @@ class BaseScheduler(scheduler.SchedulerMixin, TestReactorMixin,
             waited_for=True,
             builderids=[2, 3],
             external_idstring=None,
+            priority=0,
             reason='whynot',
             scheduler='n',
             properties={
@@ -578,6 +590,7 @@ class BaseScheduler(scheduler.SchedulerMixin, TestReactorMixin,
             waited_for=False,
             builderids=[1],
             external_idstring=None,
+            priority=0,
             properties={
                 'xxx': ('yyy', 'TEST'),
                 'scheduler': ('n', 'Scheduler')},
@@ -604,6 +617,7 @@ class BaseScheduler(scheduler.SchedulerMixin, TestReactorMixin,
             waited_for=False,
             builderids=[1, 2],
             external_idstring=None,
+            priority=0,
             properties={
                 'scheduler': ('testsched', 'Scheduler'),
                 'color': ('pink', 'Change')},
@@ -641,6 +655,7 @@ class BaseScheduler(scheduler.SchedulerMixin, TestReactorMixin,
             waited_for=False,
             builderids=[3],
             external_idstring=None,
+            priority=0,
             properties={
                 'scheduler': ('n', 'Scheduler')},
             reason='whynot',
@@ -655,6 +670,7 @@ class BaseScheduler(scheduler.SchedulerMixin, TestReactorMixin,
             waited_for=False,
             builderids=[1, 2],
             external_idstring=None,
+            priority=0,
             properties={
                 'scheduler': ('n', 'Scheduler')},
             reason='because',
@@ -684,6 +700,7 @@ class BaseScheduler(scheduler.SchedulerMixin, TestReactorMixin,
             waited_for=False,
             builderids=[1, 2, 3],
             external_idstring=None,
+            priority=0,
             properties={
                 'scheduler': ('n', 'Scheduler'),
                 'extra_builder': ('c', 'Change')},
@@ -691,6 +708,66 @@ class BaseScheduler(scheduler.SchedulerMixin, TestReactorMixin,
             scheduler='n',
             sourcestamps=[98])
 
+    @defer.inlineCallbacks
+    def test_addBuildsetForSourceStamps_priority(self):
+        sched = self.makeScheduler(name='n', builderNames=['b'], priority=10)
+        self.db.insertTestData([
+            fakedb.SourceStamp(id=91),
+        ])
+        yield sched.addBuildsetForSourceStamps(reason='whynot', waited_for=False,
+                                               sourcestamps=[91])
+        self.master.data.updates.addBuildset.assert_called_with(
+            waited_for=False,
+            builderids=[1],
+            external_idstring=None,
+            priority=10,
+            properties={
+                'scheduler': ('n', 'Scheduler')},
+            reason='whynot',
+            scheduler='n',
+            sourcestamps=[91])
+
+        # the priority given by the caller wins over the scheduler's one
+        yield sched.addBuildsetForSourceStamps(reason='whynot', waited_for=False,
+                                               sourcestamps=[91], priority=20)
+        self.assertEqual(
+            self.master.data.updates.addBuildset.call_args[1]['priority'], 20)
+
+    @defer.inlineCallbacks
+    def test_addBuildsetForSourceStamps_renderable_priority(self):
+        @properties.renderer
+        def priority(props):
+            return 30 if props.getProperty('urgent') else 0
+        sched = self.makeScheduler(name='n', builderNames=['b'],
+                                   properties={'urgent': True}, priority=priority)
+        self.db.insertTestData([
+            fakedb.SourceStamp(id=91),
+        ])
+        yield sched.addBuildsetForSourceStamps(reason='whynot', waited_for=False,
+                                               sourcestamps=[91])
+        self.assertEqual(
+            self.master.data.updates.addBuildset.call_args[1]['priority'], 30)
+
+    @defer.inlineCallbacks
+    def test_addBuildsetForSourceStamps_priority_string(self):
+        # as given by a StringParameter of a force scheduler
+        sched = self.makeScheduler(name='n', builderNames=['b'],
+                                   priority=properties.Property('prio'))
+        self.db.insertTestData([
+            fakedb.SourceStamp(id=91),
+        ])
+        yield sched.addBuildsetForSourceStamps(reason='whynot', waited_for=False,
+                                               sourcestamps=[91],
+                                               properties=properties.Properties(prio='7'))
+        self.assertEqual(
+            self.master.data.updates.addBuildset.call_args[1]['priority'], 7)
+
+        with self.assertRaises(ValueError):
+            yield sched.addBuildsetForSourceStamps(
+                reason='whynot', waited_for=False, sourcestamps=[91],
+                properties=properties.Properties(prio='high'))
+        self.assertEqual(self.master.data.updates.addBuildset.call_count, 1)
+
     def test_signature_addBuildsetForChanges(self):
         sched = self.makeScheduler(builderNames=['xxx'])
 
@@ -713,7 +790,7 @@ class BaseScheduler(scheduler.SchedulerMixin, TestReactorMixin,
         )
         def addBuildsetForSourceStamps(self, waited_for=False, sourcestamps=None,
                                        reason='', external_idstring=None, properties=None,
-                                       builderNames=None, **kw):
+                                       builderNames=None, priority=None, **kw):
             pass
 
     def test_signature_addBuildsetForSourceStampsWithDefaults(self):
@@ -36,6 +36,13 @@ try:
 except ImportError:
     hasLz4 = False
 
+try:
+    import zstandard
+    [zstandard]
+    hasZstd = True
+except ImportError:
+    hasZstd = False
+
 
 def mkconfig(**kwargs):
     config = dict(quiet=False, basedir=os.path.abspath('basedir'), force=True)
@@ -136,8 +143,8 @@ class TestCleanupDbRealDb(db.RealDatabaseWithConnectorMixin, TestCleanupDb):
         yield super().setUp()
 
         table_names = [
-            'logs', 'logchunks', 'steps', 'builds', 'builders',
-            'masters', 'buildrequests', 'buildsets', 'workers'
+            'logs', 'logchunks', 'logchunk_dictionaries', 'log_search_terms', 'steps', 'builds',
+            'builders', 'masters', 'buildrequests', 'buildsets', 'workers'
         ]
 
         self.master = fakemaster.make_master(self, wantRealReactor=True)
@@ -164,6 +171,9 @@ class TestCleanupDbRealDb(db.RealDatabaseWithConnectorMixin, TestCleanupDb):
                 # ok.. lz4 is not installed, don't fail
                 lengths["lz4"] = 40
                 continue
+            if mode == "zstd" and not hasZstd:
+                lengths["zstd"] = 20
+                continue
             # create a master.cfg with different compression method
             self.createMasterCfg("c['logCompressionMethod'] = '{}'".format(mode))
             res = yield cleanupdb._cleanupDatabase(mkconfig(basedir='basedir'))
@@ -183,4 +193,4 @@ class TestCleanupDbRealDb(db.RealDatabaseWithConnectorMixin, TestCleanupDb):
             lengths[mode] = yield self.master.db.pool.do(thd)
 
         self.assertDictAlmostEqual(
-            lengths, {'raw': 5999, 'bz2': 44, 'lz4': 40, 'gz': 31})
+            lengths, {'raw': 5999, 'bz2': 44, 'lz4': 40, 'gz': 31, 'zstd': 20})
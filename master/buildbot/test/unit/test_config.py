@@ -35,6 +35,7 @@ from buildbot import locks
 from buildbot import revlinks
 from buildbot import worker
 from buildbot.changes import base as changes_base
+from buildbot.db import logstorage
 from buildbot.process import factory
 from buildbot.process import properties
 from buildbot.schedulers import base as schedulers_base
@@ -61,10 +62,14 @@ global_defaults = dict(
     logCompressionMethod='gz',
     logEncoding='utf-8',
     logMaxTailSize=None,
+    logFlushLatency=0,
+    logStorage=None,
+    logSearchIndex=False,
     logMaxSize=None,
     properties=properties.Properties(),
     collapseRequests=None,
     prioritizeBuilders=None,
+    builderStartConcurrency=1,
     protocols={},
     multiMaster=False,
     manhole=None,
@@ -512,7 +517,7 @@ class MasterConfig_loaders(ConfigErrorsMixin, unittest.TestCase):
         self.cfg.load_global(self.filename,
                              dict(logCompressionMethod='foo'))
         self.assertConfigError(
-            self.errors, "c['logCompressionMethod'] must be 'raw', 'bz2', 'gz' or 'lz4'")
+            self.errors, "c['logCompressionMethod'] must be 'raw', 'bz2', 'gz', 'lz4' or 'zstd'")
 
     def test_load_global_codebaseGenerator(self):
         func = lambda _: "dummy"
@@ -526,9 +531,40 @@ class MasterConfig_loaders(ConfigErrorsMixin, unittest.TestCase):
                                "codebaseGenerator must be a callable "
                                "accepting a dict and returning a str")
 
+    def test_load_global_builderStartConcurrency(self):
+        self.do_test_load_global(dict(builderStartConcurrency=8), builderStartConcurrency=8)
+
+    def test_load_global_builderStartConcurrency_invalid(self):
+        self.cfg.load_global(self.filename, dict(builderStartConcurrency=0))
+        self.assertConfigError(self.errors,
+                               "c['builderStartConcurrency'] must be a positive integer")
+
     def test_load_global_logMaxSize(self):
         self.do_test_load_global(dict(logMaxSize=123), logMaxSize=123)
 
+    def test_load_global_logFlushLatency(self):
+        self.do_test_load_global(dict(logFlushLatency=0.5), logFlushLatency=0.5)
+
+    def test_load_global_logFlushLatency_invalid(self):
+        self.cfg.load_global(self.filename, dict(logFlushLatency=-1))
+        self.assertConfigError(self.errors,
+                               "c['logFlushLatency'] must be a positive number of seconds, or 0")
+
+    def test_load_global_logStorage(self):
+        storage = logstorage.FilesystemLogStorage('logs')
+        self.do_test_load_global(dict(logStorage=storage), logStorage=storage)
+
+    def test_load_global_logStorage_invalid(self):
+        self.cfg.load_global(self.filename, dict(logStorage='logs'))
+        self.assertConfigError(self.errors, "c['logStorage'] must be a LogStorage instance")
+
+    def test_load_global_logSearchIndex(self):
+        self.do_test_load_global(dict(logSearchIndex=True), logSearchIndex=True)
+
+    def test_load_global_logSearchIndex_invalid(self):
+        self.cfg.load_global(self.filename, dict(logSearchIndex='yes'))
+        self.assertConfigError(self.errors, "c['logSearchIndex'] must be a boolean")
+
     def test_load_global_logMaxTailSize(self):
         self.do_test_load_global(dict(logMaxTailSize=123), logMaxTailSize=123)
 
@@ -643,6 +679,25 @@ class MasterConfig_loaders(ConfigErrorsMixin, unittest.TestCase):
                              dict(db=dict(db_url='abcd', db_poll_interval=10)))
         self.assertResults(db=dict(db_url='abcd'))
 
+    def test_load_db_read_url(self):
+        self.cfg.load_db(self.filename,
+                         dict(db=dict(db_url='abcd', db_read_url='efgh')))
+        self.assertResults(db=dict(db_url='abcd', db_read_url='efgh', db_read_max_lag=10))
+
+    def test_load_db_read_max_lag(self):
+        self.cfg.load_db(self.filename,
+                         dict(db=dict(db_url='abcd', db_read_url='efgh', db_read_max_lag=2)))
+        self.assertResults(db=dict(db_url='abcd', db_read_url='efgh', db_read_max_lag=2))
+
+    def test_load_db_read_max_lag_invalid(self):
+        self.cfg.load_db(self.filename,
+                         dict(db=dict(db_url='abcd', db_read_url='efgh', db_read_max_lag=0)))
+        self.assertConfigError(self.errors, "must be a positive number")
+
+    def test_load_db_read_max_lag_without_read_url(self):
+        self.cfg.load_db(self.filename, dict(db=dict(db_url='abcd', db_read_max_lag=2)))
+        self.assertConfigError(self.errors, "requires c['db']['db_read_url']")
+
     def test_load_db_unk_keys(self):
         with assertProducesWarning(
                 DeprecatedApiWarning,
@@ -989,6 +1044,28 @@ class MasterConfig_loaders(ConfigErrorsMixin, unittest.TestCase):
         self.assertConfigError(
             self.errors, 'Invalid www["cookie_expiration_time"]')
 
+    def test_load_www_ws_max_queue_bytes(self):
+        self.cfg.load_www(
+            self.filename, {'www': dict(ws_max_queue_bytes=1024)})
+        self.assertEqual(self.cfg.www['ws_max_queue_bytes'], 1024)
+
+    def test_load_www_ws_max_queue_bytes_invalid(self):
+        self.cfg.load_www(
+            self.filename, {'www': dict(ws_max_queue_bytes='1M')})
+        self.assertConfigError(
+            self.errors, 'Invalid www["ws_max_queue_bytes"]')
+
+    def test_load_www_rest_cache_bytes(self):
+        self.cfg.load_www(
+            self.filename, {'www': dict(rest_cache_bytes=0)})
+        self.assertEqual(self.cfg.www['rest_cache_bytes'], 0)
+
+    def test_load_www_rest_cache_bytes_invalid(self):
+        self.cfg.load_www(
+            self.filename, {'www': dict(rest_cache_bytes=-1)})
+        self.assertConfigError(
+            self.errors, 'Invalid www["rest_cache_bytes"]')
+
     def test_load_www_unknown(self):
         self.cfg.load_www(self.filename,
                           dict(www=dict(foo="bar")))
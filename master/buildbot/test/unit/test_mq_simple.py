@@ -58,6 +58,26 @@ class SimpleMQ(TestReactorMixin, unittest.TestCase):
         # topic
         callback.assert_called_with(('a', 'b'), 'foo')
 
+    @defer.inlineCallbacks
+    def test_forward_data_in_consuming_order(self):
+        calls = []
+        yield self.mq.startConsuming(lambda *args: calls.append('wildcard'), ('a', None))
+        yield self.mq.startConsuming(lambda *args: calls.append('exact'), ('a', 'b'))
+        yield self.mq.startConsuming(lambda *args: calls.append('other'), ('a', 'c'))
+        yield self.mq.produce(('a', 'b'), 'foo')
+        self.assertEqual(calls, ['wildcard', 'exact'])
+
+    @defer.inlineCallbacks
+    def test_stop_consuming(self):
+        callback = mock.Mock()
+        qref = yield self.mq.startConsuming(callback, ('a', None))
+        qref.stopConsuming()
+        # stopping twice is harmless
+        qref.stopConsuming()
+        yield self.mq.produce(('a', 'b'), 'foo')
+        self.assertFalse(callback.called)
+        self.assertEqual(len(self.mq.qrefs), 0)
+
     @defer.inlineCallbacks
     def test_waits_for_called_callback(self):
         def callback(_, __):
@@ -93,3 +93,31 @@ class Matcher(unittest.TestCase):
         self.m[('abc', 'efg')] = 3
         self.assertEqual(self.m[('abc', 'def')], (2, {}))
         self.assertEqual(self.m[('abc', 'efg')], (3, {}))
+
+    def test_first_registered_wins(self):
+        self.m[('A', ':a')] = 'var'
+        self.m[('A', 'x')] = 'literal'
+        self.m[('B', 'x')] = 'literal'
+        self.m[('B', ':a')] = 'var'
+        self.assertEqual(self.m[('A', 'x')], ('var', dict(a='x')))
+        self.assertEqual(self.m[('B', 'x')], ('literal', {}))
+        self.assertEqual(self.m[('B', 'y')], ('var', dict(a='y')))
+
+    def test_backtracking(self):
+        self.m[('A', 'x', 'B')] = 'literal'
+        self.m[('A', ':a', 'C')] = 'var'
+        self.assertEqual(self.m[('A', 'x', 'C')], ('var', dict(a='x')))
+        with self.assertRaises(KeyError):
+            self.m[('A', 'x', 'D')]
+
+    def test_root(self):
+        self.m[()] = 'root'
+        self.assertEqual(self.m[()], ('root', {}))
+
+    def test_compiled_once(self):
+        self.m[('abc', 'def')] = 2
+        self.m[('abc', 'def')]
+        compiled = []
+        self.patch(self.m, '_compile', lambda: compiled.append(True))
+        self.assertEqual(self.m[('abc', 'def')], (2, {}))
+        self.assertEqual(compiled, [])
@@ -29,3 +29,62 @@ class MatchTuple(tuplematching.TupleMatchingMixin, unittest.TestCase):
                                 'should match' if shouldMatch else "shouldn't match",
                                 repr(filter))
         self.assertEqual(shouldMatch, result, msg)
+
+
+class TupleIndexMatching(tuplematching.TupleMatchingMixin, unittest.TestCase):
+
+    # called by the TupleMatchingMixin methods
+
+    def do_test_match(self, routingKey, shouldMatch, filter):
+        index = tuplematch.TupleIndex()
+        index.add(filter, 'value')
+        result = index.match(routingKey) == ['value']
+        msg = '{} {} {}'.format(repr(routingKey),
+                                'should match' if shouldMatch else "shouldn't match",
+                                repr(filter))
+        self.assertEqual(shouldMatch, result, msg)
+
+
+class TupleIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = tuplematch.TupleIndex()
+        self.index.add(('a', None, 'c'), 1)
+        self.index.add(('a', 'b', None), 2)
+        self.index.add(('a', 'b', 'c'), 3)
+        self.index.add((None, None, None), 4)
+        self.index.add(('a', 'b'), 5)
+
+    def test_match_in_insertion_order(self):
+        self.assertEqual(self.index.match(('a', 'b', 'c')), [1, 2, 3, 4])
+        self.assertEqual(self.index.match(('a', 'x', 'c')), [1, 4])
+        self.assertEqual(self.index.match(('a', 'b')), [5])
+        self.assertEqual(self.index.match(('a',)), [])
+
+    def test_add_twice(self):
+        self.index.add(('a', 'b', 'c'), 3)
+        self.assertEqual(len(self.index), 5)
+        self.assertEqual(self.index.match(('a', 'b', 'c')), [1, 2, 3, 4])
+
+    def test_remove(self):
+        self.assertTrue(self.index.remove(('a', 'b', None), 2))
+        self.assertTrue(self.index.remove(('a', 'b'), 5))
+        self.assertEqual(len(self.index), 3)
+        self.assertEqual(self.index.match(('a', 'b', 'c')), [1, 3, 4])
+        self.assertEqual(self.index.match(('a', 'b')), [])
+        # the empty branches are pruned
+        self.assertNotIn(2, self.index._roots)
+
+    def test_remove_missing(self):
+        self.assertFalse(self.index.remove(('a', 'b', None), 3))
+        self.assertFalse(self.index.remove(('x', 'b', None), 2))
+        self.assertFalse(self.index.remove(('a', 'b', 'c', 'd'), 2))
+        self.assertEqual(len(self.index), 5)
+
+    def test_remove_all(self):
+        for filter, value in [(('a', None, 'c'), 1), (('a', 'b', None), 2),
+                              (('a', 'b', 'c'), 3), ((None, None, None), 4),
+                              (('a', 'b'), 5)]:
+            self.index.remove(filter, value)
+        self.assertEqual(len(self.index), 0)
+        self.assertEqual(self.index._roots, {})
@@ -0,0 +1,145 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import mock
+
+from twisted.internet import defer
+from twisted.trial import unittest
+
+from buildbot.test.fake import fakemaster
+from buildbot.test.util.misc import TestReactorMixin
+from buildbot.www import fanout
+
+
+class FanoutHub(TestReactorMixin, unittest.TestCase):
+
+    def setUp(self):
+        self.setUpTestReactor()
+        self.master = fakemaster.make_master(self, wantMq=True)
+        self.master.mq.verifyMessages = False
+        self.hub = fanout.FanoutHub(self.master)
+        self.encoded = []
+
+    def collect(self, got):
+        return lambda key, data: got.append(data)
+
+    def encode(self, key, message):
+        data = '/'.join(key) + ':' + message
+        self.encoded.append(data)
+        return data
+
+    def encodeUpper(self, key, message):
+        return self.encode(key, message).upper()
+
+    @defer.inlineCallbacks
+    def test_shared_subscription(self):
+        got1, got2 = [], []
+        yield self.hub.startConsuming(self.collect(got1), ('builds', None, 'new'), self.encode)
+        yield self.hub.startConsuming(self.collect(got2), ('builds', None, 'new'), self.encode)
+        self.assertEqual(len(self.master.mq.qrefs), 1)
+
+        self.master.mq.callConsumer(('builds', '1', 'new'), 'msg')
+        self.assertEqual(got1, ['builds/1/new:msg'])
+        # encoded once, and the same data is given to both consumers
+        self.assertEqual(len(self.encoded), 1)
+        self.assertIs(got1[0], got2[0])
+
+    @defer.inlineCallbacks
+    def test_encoded_once_per_format(self):
+        got1, got2, got3 = [], [], []
+        yield self.hub.startConsuming(self.collect(got1), ('builds', None, 'new'), self.encode)
+        yield self.hub.startConsuming(self.collect(got2), ('builds', None, 'new'), self.encodeUpper)
+        yield self.hub.startConsuming(self.collect(got3), ('builds', None, 'new'), self.encodeUpper)
+
+        self.master.mq.callConsumer(('builds', '1', 'new'), 'msg')
+        self.assertEqual(got1, ['builds/1/new:msg'])
+        self.assertEqual(got2, ['BUILDS/1/NEW:MSG'])
+        self.assertIs(got2[0], got3[0])
+        self.assertEqual(len(self.encoded), 2)
+
+    @defer.inlineCallbacks
+    def test_distinct_filters(self):
+        got1, got2 = [], []
+        yield self.hub.startConsuming(self.collect(got1), ('builds', None, 'new'), self.encode)
+        yield self.hub.startConsuming(self.collect(got2), ('builds', '1', 'new'), self.encode)
+        self.assertEqual(len(self.master.mq.qrefs), 2)
+
+        self.master.mq.callConsumer(('builds', '2', 'new'), 'msg')
+        self.assertEqual(got1, ['builds/2/new:msg'])
+        self.assertEqual(got2, [])
+
+    @defer.inlineCallbacks
+    def test_stopConsuming(self):
+        got1, got2 = [], []
+        consumer1 = yield self.hub.startConsuming(self.collect(got1), ('builds', None, 'new'),
+                                                  self.encode)
+        consumer2 = yield self.hub.startConsuming(self.collect(got2), ('builds', None, 'new'),
+                                                  self.encode)
+        consumer1.stopConsuming()
+        # stopping twice is harmless
+        consumer1.stopConsuming()
+        self.master.mq.callConsumer(('builds', '1', 'new'), 'msg')
+        self.assertEqual(got1, [])
+        self.assertEqual(got2, ['builds/1/new:msg'])
+
+        # the MQ subscription is stopped with its last consumer
+        consumer2.stopConsuming()
+        self.assertEqual(self.master.mq.qrefs, [])
+        self.assertEqual(self.hub.subscriptions, {})
+
+    @defer.inlineCallbacks
+    def test_stopConsuming_from_callback(self):
+        got = []
+        consumers = []
+
+        def stopOther(key, data):
+            consumers[1].stopConsuming()
+        consumers.append((yield self.hub.startConsuming(stopOther, ('builds', None, 'new'),
+                                                        self.encode)))
+        consumers.append((yield self.hub.startConsuming(self.collect(got), ('builds', None, 'new'),
+                                                        self.encode)))
+        self.master.mq.callConsumer(('builds', '1', 'new'), 'msg')
+        self.assertEqual(got, [])
+
+    @defer.inlineCallbacks
+    def test_callback_error(self):
+        got = []
+        yield self.hub.startConsuming(mock.Mock(side_effect=RuntimeError('oh noes')),
+                                      ('builds', None, 'new'), self.encode)
+        yield self.hub.startConsuming(self.collect(got), ('builds', None, 'new'), self.encode)
+        self.master.mq.callConsumer(('builds', '1', 'new'), 'msg')
+        self.assertEqual(got, ['builds/1/new:msg'])
+        self.assertEqual(len(self.flushLoggedErrors(RuntimeError)), 1)
+
+    @defer.inlineCallbacks
+    def test_start_while_starting(self):
+        d = defer.Deferred()
+        self.master.mq.startConsuming = mock.Mock(return_value=d)
+        d1 = self.hub.startConsuming(mock.Mock(), ('builds', None, 'new'), self.encode)
+        d2 = self.hub.startConsuming(mock.Mock(), ('builds', None, 'new'), self.encode)
+        self.assertFalse(d1.called)
+        d.callback(mock.Mock())
+        consumer1 = yield d1
+        consumer2 = yield d2
+        self.assertEqual(self.master.mq.startConsuming.call_count, 1)
+        self.assertIs(consumer1.subscription, consumer2.subscription)
+
+    @defer.inlineCallbacks
+    def test_start_failure(self):
+        self.master.mq.startConsuming = mock.Mock(
+            return_value=defer.fail(RuntimeError('oh noes')))
+        with self.assertRaises(RuntimeError):
+            yield self.hub.startConsuming(mock.Mock(), ('builds', None, 'new'), self.encode)
+        self.assertEqual(self.hub.subscriptions, {})
@@ -15,12 +15,14 @@
 
 import json
 import re
+from io import StringIO
 
 import mock
 
 from twisted.internet import defer
 from twisted.trial import unittest
 
+from buildbot.data import types
 from buildbot.test.fake import endpoint
 from buildbot.test.util import www
 from buildbot.test.util.misc import TestReactorMixin
@@ -57,6 +59,14 @@ class RestRootResource(TestReactorMixin, www.WwwTestMixin, unittest.TestCase):
         versions.append(b'latest')
         self.assertEqual(sorted(rsrc.listNames()), sorted(versions))
 
+    def test_invalidateCaches(self):
+        master = self.make_master(url='h:/a/b/')
+        rsrc = rest.RestRootResource(master)
+        v2 = rsrc.getChildWithDefault(b'v2', None)
+        v2.cache.invalidateAll = mock.Mock()
+        rsrc.invalidateCaches()
+        v2.cache.invalidateAll.assert_called_once_with()
+
     def test_versions_limited(self):
         master = self.make_master(url='h:/a/b/')
         master.config.www['rest_minimum_version'] = 2
@@ -338,6 +348,24 @@ class V2RootResource_REST(TestReactorMixin, www.WwwTestMixin,
             responseCode=200,
             headers={b"content-disposition": [b'attachment; filename=test.txt']})
 
+    @defer.inlineCallbacks
+    def test_raw_stream(self):
+        yield self.render_resource(self.rsrc, b'/rawstreamtest')
+        self.assertRequest(
+            content=b"value\nvalue2\n",
+            contentType=b'text/test; charset=utf-8',
+            responseCode=200,
+            headers={b"content-disposition": [b'attachment; filename=test.txt']})
+        self.assertIdentical(self.request.producer, None)
+
+    @defer.inlineCallbacks
+    def test_raw_stream_head(self):
+        yield self.render_resource(self.rsrc, b'/rawstreamtest', method=b'HEAD')
+        self.assertRequest(
+            content=b"",
+            contentType=b'text/test; charset=utf-8',
+            responseCode=200)
+
     @defer.inlineCallbacks
     def test_api_head(self):
         get = yield self.render_resource(self.rsrc, b'/test', method=b'GET')
@@ -346,6 +374,231 @@ class V2RootResource_REST(TestReactorMixin, www.WwwTestMixin,
         self.assertEqual(int(self.request.headers[b'content-length'][0]),
                          len(get))
 
+    def countGets(self):
+        calls = []
+        get = endpoint.TestsEndpoint.get
+
+        def countingGet(ep, resultSpec, kwargs):
+            calls.append(kwargs)
+            return get(ep, resultSpec, kwargs)
+        self.patch(endpoint.TestsEndpoint, 'get', countingGet)
+        return calls
+
+    @defer.inlineCallbacks
+    def test_api_etag(self):
+        yield self.render_resource(self.rsrc, b'/test')
+        etag = self.request.headers[b'ETag'][0]
+        self.assertEqual(self.request.headers[b'Last-Modified'],
+                         [b'Thu, 01 Jan 1970 00:00:00 GMT'])
+
+        yield self.render_resource(self.rsrc, b'/test',
+                                   extraHeaders={b'if-none-match': etag})
+        self.assertRequest(content=b'', responseCode=304,
+                           headers={b'ETag': [etag]})
+
+        yield self.render_resource(self.rsrc, b'/test',
+                                   extraHeaders={b'if-none-match': b'"other"'})
+        self.assertEqual(self.request.responseCode, 200)
+        self.assertRestCollection(typeName='tests',
+                                  items=list(endpoint.testData.values()),
+                                  total=8)
+
+    @defer.inlineCallbacks
+    def test_api_cache(self):
+        calls = self.countGets()
+        first = yield self.render_resource(self.rsrc, b'/test')
+        second = yield self.render_resource(self.rsrc, b'/test')
+        self.assertEqual(second, first)
+        self.assertEqual(len(calls), 1)
+
+        # each query and format has its own entry
+        yield self.render_resource(self.rsrc, b'/test?limit=2')
+        yield self.render_resource(self.rsrc, b'/test', accept=b'application/json')
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(len(self.rsrc.cache.entries), 3)
+
+    @defer.inlineCallbacks
+    def test_api_cache_invalidated_by_event(self):
+        self.master.mq.verifyMessages = False
+        calls = self.countGets()
+        yield self.render_resource(self.rsrc, b'/test')
+
+        self.reactor.advance(60)
+        self.master.mq.callConsumer(('test', '13', 'update'), {'id': 13})
+        self.assertEqual(len(self.rsrc.cache.entries), 0)
+
+        yield self.render_resource(self.rsrc, b'/test')
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(self.request.headers[b'Last-Modified'],
+                         [b'Thu, 01 Jan 1970 00:01:00 GMT'])
+
+    @defer.inlineCallbacks
+    def test_api_cache_invalidated_by_reconfig(self):
+        calls = self.countGets()
+        yield self.render_resource(self.rsrc, b'/test')
+        self.rsrc.reconfigResource(self.master.config)
+        yield self.render_resource(self.rsrc, b'/test')
+        self.assertEqual(len(calls), 2)
+
+    @defer.inlineCallbacks
+    def test_api_cache_disabled(self):
+        self.master.config.www['rest_cache_bytes'] = 0
+        self.rsrc.reconfigResource(self.master.config)
+        calls = self.countGets()
+        yield self.render_resource(self.rsrc, b'/test')
+        yield self.render_resource(self.rsrc, b'/test')
+        self.assertEqual(len(calls), 2)
+        self.assertIn(b'ETag', self.request.headers)
+        self.assertNotIn(b'Last-Modified', self.request.headers)
+
+    def paginateWithCursor(self):
+        specs = []
+
+        def get(ep, resultSpec, kwargs):
+            specs.append((resultSpec.order, resultSpec.cursor, resultSpec.limit))
+            # as done in the SQL query
+            resultSpec.order = resultSpec.cursor = resultSpec.limit = None
+            resultSpec.nextCursor = [14]
+            return defer.succeed([endpoint.testData[13], endpoint.testData[14]])
+        self.patch(endpoint.TestsEndpoint, 'get', get)
+        self.patch(endpoint.TestsEndpoint, 'cursorField', 'id')
+        return specs
+
+    @defer.inlineCallbacks
+    def test_api_collection_cursor_first_page(self):
+        specs = self.paginateWithCursor()
+        yield self.render_resource(self.rsrc, b'/test?limit=2&cursor=')
+        self.assertEqual(specs, [(('id',), [], 2)])
+        content = json.loads(bytes2unicode(self.request.written))
+        self.assertEqual(content['meta'], {'next_cursor': rest.encodeCursor([14])})
+        self.assertEqual(len(content['tests']), 2)
+
+    @defer.inlineCallbacks
+    def test_api_collection_cursor(self):
+        specs = self.paginateWithCursor()
+        cursor = unicode2bytes(rest.encodeCursor(['ok', 12]))
+        yield self.render_resource(self.rsrc, b'/test?order=-info&limit=2&cursor=' + cursor)
+        self.assertEqual(specs, [(('-info', '-id'), ['ok', 12], 2)])
+
+    @defer.inlineCallbacks
+    def test_api_collection_cursor_invalid(self):
+        self.paginateWithCursor()
+        yield self.render_resource(self.rsrc, b'/test?cursor=notjson')
+        self.assertRestError(message="invalid cursor", responseCode=400)
+
+    @defer.inlineCallbacks
+    def test_api_collection_cursor_and_offset(self):
+        self.paginateWithCursor()
+        yield self.render_resource(self.rsrc, b'/test?cursor=&offset=2')
+        self.assertRestError(message="both an offset and a cursor", responseCode=400)
+
+    @defer.inlineCallbacks
+    def test_api_collection_cursor_not_supported(self):
+        yield self.render_resource(self.rsrc, b'/test?cursor=')
+        self.assertRestError(message="cannot be paginated with a cursor", responseCode=400)
+
+    def streamInPages(self, pageSize):
+        cursors = []
+        items = sorted(endpoint.testData.values(), key=lambda t: t['id'])
+
+        def get(ep, resultSpec, kwargs):
+            cursors.append(resultSpec.cursor)
+            page = [t for t in items if not resultSpec.cursor or t['id'] > resultSpec.cursor[0]]
+            page = page[:resultSpec.limit]
+            # as done in the SQL query
+            if len(page) == resultSpec.limit:
+                resultSpec.nextCursor = [page[-1]['id']]
+            resultSpec.order = resultSpec.cursor = resultSpec.limit = None
+            return defer.succeed(page)
+        self.patch(endpoint.TestsEndpoint, 'get', get)
+        self.patch(endpoint.TestsEndpoint, 'cursorField', 'id')
+        self.patch(self.rsrc, 'STREAM_PAGE_SIZE', pageSize)
+        return cursors
+
+    @defer.inlineCallbacks
+    def test_api_collection_streamed(self):
+        cursors = self.streamInPages(3)
+        yield self.render_resource(self.rsrc, b'/test')
+        self.assertEqual(cursors, [[], [15], [18]])
+        self.assertNotIn(b'ETag', self.request.headers)
+        self.assertIsNone(self.request.producer)
+        self.assertRestCollection(typeName='tests',
+                                  items=list(endpoint.testData.values()),
+                                  total=8)
+        # the pieces add up to the indented JSON of the whole response
+        self.assertTrue(self.request.written.endswith(b'\n  ],\n  "meta": {\n'
+                                                      b'    "total": 8\n  }\n}'))
+
+    @defer.inlineCallbacks
+    def test_api_collection_streamed_reversed_without_cursor(self):
+        self.streamInPages(3)
+        self.patch(endpoint.TestsEndpoint, 'reversedWithoutCursor', True)
+        orders = []
+        get = endpoint.TestsEndpoint.get
+
+        def recordingGet(ep, resultSpec, kwargs):
+            orders.append(resultSpec.order)
+            return get(ep, resultSpec, kwargs)
+        self.patch(endpoint.TestsEndpoint, 'get', recordingGet)
+        # streamed in the order of the unpaginated response
+        yield self.render_resource(self.rsrc, b'/test')
+        self.assertEqual(orders, [('-id',)] * 3)
+        del orders[:]
+        yield self.render_resource(self.rsrc, b'/test?order=-id')
+        self.assertEqual(orders, [('id',)] * 3)
+
+    @defer.inlineCallbacks
+    def test_api_collection_streamed_compact(self):
+        self.streamInPages(3)
+        yield self.render_resource(self.rsrc, b'/test?field=id',
+                                   accept=b'application/json')
+        self.assertEqual(self.request.written,
+                         b'{"tests":[{"id":13},{"id":14},{"id":15},{"id":16},{"id":17},'
+                         b'{"id":18},{"id":19},{"id":20}],"meta":{"total":8}}')
+
+    def skipWithoutMsgpack(self):
+        if types.msgpack is None:
+            raise unittest.SkipTest("msgpack not installed, skip the test")
+
+    @defer.inlineCallbacks
+    def test_api_collection_msgpack(self):
+        self.skipWithoutMsgpack()
+        cursors = self.streamInPages(3)
+        yield self.render_resource(self.rsrc, b'/test?field=id',
+                                   accept=b'application/msgpack, application/json')
+        # not streamed
+        self.assertEqual(cursors, [None])
+        self.assertEqual(self.request.headers[b'content-type'], [b'application/msgpack'])
+        self.assertEqual(types.loadsMsgpack(self.request.written), {
+            'tests': [{'id': i} for i in sorted(endpoint.testData)],
+            'meta': {'total': 8}})
+
+    @defer.inlineCallbacks
+    def test_api_details_msgpack_cached_apart(self):
+        self.skipWithoutMsgpack()
+        yield self.render_resource(self.rsrc, b'/test/13', accept=b'application/json')
+        yield self.render_resource(self.rsrc, b'/test/13', accept=b'application/x-msgpack')
+        self.assertEqual(self.request.headers[b'content-type'], [b'application/x-msgpack'])
+        self.assertEqual(types.loadsMsgpack(self.request.written),
+                         {'tests': [endpoint.testData[13]], 'meta': {}})
+        self.assertEqual(len(self.rsrc.cache.entries), 2)
+
+    @defer.inlineCallbacks
+    def test_api_collection_single_page_not_streamed(self):
+        cursors = self.streamInPages(10)
+        yield self.render_resource(self.rsrc, b'/test')
+        self.assertEqual(cursors, [[]])
+        self.assertIn(b'ETag', self.request.headers)
+        self.assertRestCollection(typeName='tests',
+                                  items=list(endpoint.testData.values()),
+                                  total=8)
+
+    @defer.inlineCallbacks
+    def test_api_collection_limited_not_streamed(self):
+        cursors = self.streamInPages(3)
+        yield self.render_resource(self.rsrc, b'/test?limit=5')
+        self.assertEqual(cursors, [None])
+
     @defer.inlineCallbacks
     def test_api_collection(self):
         yield self.render_resource(self.rsrc, b'/test')
@@ -584,6 +837,11 @@ class V2RootResource_REST(TestReactorMixin, www.WwwTestMixin,
         self.assertRestError(message=r"RuntimeError\('oh noes',?\)", responseCode=500)
         self.assertEqual(len(self.flushLoggedErrors(RuntimeError)), 1)
 
+    @defer.inlineCallbacks
+    def test_api_invalid_query(self):
+        yield self.render_resource(self.rsrc, b'/test/badquery')
+        self.assertRestError(message='bad query', responseCode=400)
+
     def test_decode_result_spec_raise_bad_request_on_bad_property_value(self):
         expected_props = [None, 'test2']
         self.make_request(b'/test')
@@ -898,6 +1156,157 @@ class V2RootResource_JSONRPC2(TestReactorMixin, www.WwwTestMixin,
             responseCode=403)
 
 
+class V2RootResource_Batch(TestReactorMixin, www.WwwTestMixin, unittest.TestCase):
+
+    def setUp(self):
+        self.setUpTestReactor()
+        self.master = self.make_master(url='h:/')
+        self.master.data._scanModule(endpoint)
+        self.rsrc = rest.V2RootResource(self.master)
+        self.rsrc.reconfigResource(self.master.config)
+
+    def render_batch(self, body, content_type=b'application/json'):
+        request = self.make_request(b'/batch', method=b'POST')
+        request.content = StringIO(json.dumps(body))
+        request.input_headers = {b'content-type': content_type}
+        return self.render_resource(self.rsrc, request=request)
+
+    @defer.inlineCallbacks
+    def test_batch(self):
+        yield self.render_batch({'requests': ['test/13', 'test?id__lt=15&field=id']})
+        self.assertEqual(self.request.headers[b'content-type'], [b'application/json'])
+        self.assertEqual(json.loads(bytes2unicode(self.request.written)), {'responses': [
+            {'tests': [endpoint.testData[13]], 'meta': {}},
+            {'tests': [{'id': 13}, {'id': 14}], 'meta': {'total': 2}},
+        ]})
+
+    @defer.inlineCallbacks
+    def test_batch_same_response_as_get(self):
+        yield self.render_resource(self.rsrc, b'/test?order=-id', accept=b'application/json')
+        body = self.request.written
+        yield self.render_batch({'requests': ['test?order=-id']})
+        self.assertEqual(self.request.written, b'{"responses":[' + body + b']}')
+
+    @defer.inlineCallbacks
+    def test_batch_identical_requests_done_once(self):
+        calls = []
+        get = endpoint.TestsEndpoint.get
+
+        def countingGet(ep, resultSpec, kwargs):
+            calls.append(kwargs)
+            return get(ep, resultSpec, kwargs)
+        self.patch(endpoint.TestsEndpoint, 'get', countingGet)
+        # disable the response cache, which would share them too
+        self.rsrc.cache.maxBytes = 0
+        yield self.render_batch({'requests': ['test?limit=1', 'test?limit=1']})
+        self.assertEqual(len(calls), 1)
+        content = json.loads(bytes2unicode(self.request.written))
+        self.assertEqual(content['responses'][0], content['responses'][1])
+
+    @defer.inlineCallbacks
+    def test_batch_errors(self):
+        yield self.render_batch({'requests': ['test/0', 'nosuch', 'test/badquery', 'rawtest',
+                                              'test/13']})
+        self.assertEqual(self.request.responseCode, 200)
+        content = json.loads(bytes2unicode(self.request.written))
+        self.assertEqual(content['responses'][:4], [
+            {'error': 'not found', 'code': 404},
+            {'error': 'Invalid path: nosuch', 'code': 404},
+            {'error': 'bad query', 'code': 400},
+            {'error': 'raw endpoints cannot be batched', 'code': 400},
+        ])
+        self.assertEqual(content['responses'][4]['tests'], [endpoint.testData[13]])
+
+    @defer.inlineCallbacks
+    def test_batch_forbidden(self):
+        def deny(request, ep, action, options):
+            if "13" in ep:
+                raise authz.Forbidden("no no")
+        self.master.www.assertUserAllowed = deny
+        yield self.render_batch({'requests': ['test/13', 'test/14']})
+        content = json.loads(bytes2unicode(self.request.written))
+        self.assertEqual(content['responses'][0], {'error': 'no no', 'code': 403})
+        self.assertEqual(content['responses'][1]['tests'], [endpoint.testData[14]])
+
+    @defer.inlineCallbacks
+    def test_batch_msgpack(self):
+        if types.msgpack is None:
+            raise unittest.SkipTest("msgpack not installed, skip the test")
+        request = self.make_request(b'/batch', method=b'POST')
+        request.content = StringIO(json.dumps({'requests': ['test/13', 'nosuch', 'test/13']}))
+        request.input_headers = {b'content-type': b'application/json',
+                                 b'accept': b'application/msgpack'}
+        yield self.render_resource(self.rsrc, request=request)
+        self.assertEqual(self.request.headers[b'content-type'], [b'application/msgpack'])
+        self.assertEqual(types.loadsMsgpack(self.request.written), {'responses': [
+            {'tests': [endpoint.testData[13]], 'meta': {}},
+            {'error': 'Invalid path: nosuch', 'code': 404},
+            {'tests': [endpoint.testData[13]], 'meta': {}},
+        ]})
+
+    @defer.inlineCallbacks
+    def test_batch_invalid_content_type(self):
+        yield self.render_batch({'requests': []}, content_type=b'text/plain')
+        self.assertEqual(self.request.responseCode, 400)
+
+    @defer.inlineCallbacks
+    def test_batch_invalid(self):
+        yield self.render_batch({'requests': 'test'})
+        self.assertRequest(contentJson={'error': "'requests' must be a list of paths"},
+                           responseCode=400)
+
+    @defer.inlineCallbacks
+    def test_batch_too_big(self):
+        self.patch(self.rsrc, 'MAX_BATCH_SIZE', 1)
+        yield self.render_batch({'requests': ['test/13', 'test/14']})
+        self.assertRequest(contentJson={'error': "at most 1 requests can be batched"},
+                           responseCode=400)
+
+
+class RawStreamProducer(unittest.TestCase):
+
+    def setUp(self):
+        self.request = www.FakeRequest(b'/')
+        self.reads = []
+        self.producer = rest.RawStreamProducer(self.request, self)
+
+    def read(self):
+        d = defer.Deferred()
+        self.reads.append(d)
+        return d
+
+    def test_pause_resume(self):
+        done = self.producer.start()
+        self.assertIdentical(self.request.producer, self.producer)
+        self.producer.pauseProducing()
+        self.reads.pop().callback('one\n')
+        self.assertEqual(self.request.written, b'one\n')
+        # no read happens while paused
+        self.assertEqual(self.reads, [])
+
+        self.producer.resumeProducing()
+        self.reads.pop().callback('two\n')
+        self.reads.pop().callback(None)
+        self.assertEqual(self.request.written, b'one\ntwo\n')
+        self.assertIdentical(self.request.producer, None)
+        self.assertTrue(done.called)
+
+    def test_stop(self):
+        done = self.producer.start()
+        self.producer.stopProducing()
+        self.reads.pop().callback('one\n')
+        self.assertEqual(self.request.written, b'')
+        self.assertEqual(self.reads, [])
+        self.assertIdentical(self.request.producer, None)
+        self.assertTrue(done.called)
+
+    def test_read_fails(self):
+        done = self.producer.start()
+        self.reads.pop().errback(RuntimeError('oh noes'))
+        self.assertIdentical(self.request.producer, None)
+        self.failureResultOf(done, RuntimeError)
+
+
 class ContentTypeParser(unittest.TestCase):
 
     def test_simple(self):
@@ -0,0 +1,100 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+from twisted.internet import defer
+from twisted.trial import unittest
+
+from buildbot.test.fake import fakemaster
+from buildbot.test.util.misc import TestReactorMixin
+from buildbot.www import restcache
+
+
+class FakeResourceType:
+
+    name = 'build'
+    plural = 'builds'
+    eventPaths = ['builders/{builderid}/builds/{number}', 'builds/{buildid}']
+    cacheable = True
+
+
+class ResponseCache(TestReactorMixin, unittest.TestCase):
+
+    def setUp(self):
+        self.setUpTestReactor()
+        self.master = fakemaster.make_master(self, wantMq=True)
+        self.master.mq.verifyMessages = False
+        self.cache = restcache.ResponseCache(self.master, maxBytes=10)
+        self.rtype = FakeResourceType()
+
+    def test_watch_consumes_events(self):
+        self.cache.watch(self.rtype)
+        self.cache.watch(self.rtype)
+        self.assertEqual(sorted(q.filter for q in self.master.mq.qrefs), [
+            ('builders', None, 'builds', None, None),
+            ('builds', None, None),
+        ])
+
+    def test_store_and_get(self):
+        token = self.cache.watch(self.rtype)
+        entry = self.cache.store('k', self.rtype, token, b'abc')
+        self.assertIs(self.cache.get('k'), entry)
+        self.assertEqual(entry.etag, restcache.makeETag(b'abc'))
+        self.assertEqual(self.cache.size, 3)
+
+    def test_invalidate(self):
+        token = self.cache.watch(self.rtype)
+        self.cache.store('k', self.rtype, token, b'abc')
+        self.reactor.advance(5)
+        self.master.mq.callConsumer(('builders', '1', 'builds', '2', 'finished'), {})
+        self.assertIsNone(self.cache.get('k'))
+        self.assertEqual(self.cache.size, 0)
+        self.assertEqual(self.cache.watched['build'].lastModified, 5)
+
+    def test_store_stale(self):
+        token = self.cache.watch(self.rtype)
+        # the data changed while the response was computed
+        self.master.mq.callConsumer(('builds', '2', 'new'), {})
+        entry = self.cache.store('k', self.rtype, token, b'abc')
+        self.assertEqual(entry.body, b'abc')
+        self.assertIsNone(self.cache.get('k'))
+
+    def test_store_before_consuming(self):
+        self.master.mq.startConsuming = lambda callback, filter: defer.Deferred()
+        token = self.cache.watch(self.rtype)
+        self.cache.store('k', self.rtype, token, b'abc')
+        self.assertIsNone(self.cache.get('k'))
+
+    def test_evict_lru(self):
+        token = self.cache.watch(self.rtype)
+        self.cache.store('a', self.rtype, token, b'aaaa')
+        self.cache.store('b', self.rtype, token, b'bbbb')
+        self.cache.get('a')
+        self.cache.store('c', self.rtype, token, b'cccc')
+        self.assertEqual(list(self.cache.entries), ['a', 'c'])
+        self.assertEqual(self.cache.size, 8)
+        self.assertEqual(self.cache.watched['build'].entries, {'a', 'c'})
+
+    def test_too_big(self):
+        token = self.cache.watch(self.rtype)
+        self.cache.store('a', self.rtype, token, b'a' * 11)
+        self.assertEqual(len(self.cache.entries), 0)
+
+    def test_etag_matches(self):
+        etag = b'"abc"'
+        self.assertTrue(restcache.etagMatches(b'"abc"', etag))
+        self.assertTrue(restcache.etagMatches(b'"x", W/"abc"', etag))
+        self.assertTrue(restcache.etagMatches(b'*', etag))
+        self.assertFalse(restcache.etagMatches(b'"abcd"', etag))
+        self.assertFalse(restcache.etagMatches(b'abc', etag))
@@ -151,6 +151,15 @@ class Test(TestReactorMixin, www.WwwTestMixin, unittest.TestCase):
         self.assertIsInstance(root.getChildWithDefault(b'api', req),
                               rest.RestRootResource)
 
+    def test_setupSite_prunes_invalidate_rest_cache(self):
+        self.svc.setupSite(self.makeConfig())
+        self.svc.setupSite(self.makeConfig())
+        invalidateCaches = mock.Mock()
+        self.patch(self.svc.apiResource, 'invalidateCaches', invalidateCaches)
+        self.master.db.retention.fakePrune({'changes': 3})
+        # only the resource of the last site is subscribed
+        invalidateCaches.assert_called_once_with()
+
     def test_setupSiteWithProtectedHook(self):
         checker = InMemoryUsernamePasswordDatabaseDontUse()
         checker.addUser("guest", "password")
@@ -74,6 +74,20 @@ class EventResource(TestReactorMixin, www.WwwTestMixin, unittest.TestCase):
         with self.assertRaises(AssertionError):
             self.assertReceivesChangeNewMessage(request)
 
+    def test_listen_shared(self):
+        self.render_resource(self.sse, b'/listen/changes/*/*')
+        request1 = self.request
+        self.readUUID(request1)
+        self.render_resource(self.sse, b'/listen/changes/*/*')
+        request2 = self.request
+        self.readUUID(request2)
+        self.assertEqual(len(self.master.mq.qrefs), 1)
+        self.master.mq.callConsumer(
+            ("changes", "500", "new"), test_changes.Change.changeEvent)
+        self.assertEqual(request1.written, request2.written)
+        kw = self.readEvent(request1)
+        self.assertEqual(kw[b"event"], b"event")
+
     def test_listen_add_nouuid(self):
         self.render_resource(self.sse, b'/listen')
         request = self.request
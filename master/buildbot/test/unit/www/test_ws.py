@@ -15,10 +15,12 @@
 
 import json
 
+import mock
 from mock import Mock
 
 from twisted.trial import unittest
 
+from buildbot.data import types
 from buildbot.test.util import www
 from buildbot.test.util.misc import TestReactorMixin
 from buildbot.util import bytes2unicode
@@ -92,3 +94,162 @@ class WsResource(TestReactorMixin, www.WwwTestMixin, unittest.TestCase):
             json.dumps(dict(cmd="stopConsuming", path="builds/*/*", _id=2)), False)
         self.assert_called_with_json(self.proto.sendMessage,
             {"msg": "OK", "code": 200, "_id": 2})
+
+    def test_startConsuming_shared(self):
+        proto2 = self.ws._factory.buildProtocol("you")
+        proto2.sendMessage = Mock(spec=proto2.sendMessage)
+        for proto in (self.proto, proto2):
+            proto.onMessage(
+                json.dumps(dict(cmd="startConsuming", path="builds/*/*", _id=1)), False)
+        self.assertEqual(len(self.master.mq.qrefs), 1)
+        self.master.mq.verifyMessages = False
+        self.master.mq.callConsumer(("builds", "1", "new"), {"buildid": 1})
+        self.assert_called_with_json(proto2.sendMessage,
+            {"k": "builds/1/new", "m": {"buildid": 1}})
+        self.assertIs(self.proto.sendMessage.call_args[0][0],
+                      proto2.sendMessage.call_args[0][0])
+
+        # the subscription is kept until both connections are lost
+        self.proto.connectionLost(None)
+        self.assertEqual(len(self.master.mq.qrefs), 1)
+        proto2.connectionLost(None)
+        self.assertEqual(len(self.master.mq.qrefs), 0)
+
+    def startConsumingBuilds(self):
+        self.proto.onMessage(
+            json.dumps(dict(cmd="startConsuming", path="builds/*/*", _id=1)), False)
+        self.master.mq.verifyMessages = False
+        self.proto.sendMessage.reset_mock()
+
+    def test_paused_queues_messages(self):
+        self.startConsumingBuilds()
+        self.proto.pauseProducing()
+        self.master.mq.callConsumer(("builds", "1", "new"), {"buildid": 1})
+        self.proto.onMessage(json.dumps(dict(cmd="ping", _id=2)), False)
+        self.assertFalse(self.proto.sendMessage.called)
+        self.assertEqual(len(self.proto.queue), 2)
+
+        self.proto.resumeProducing()
+        self.assertEqual([json.loads(bytes2unicode(call[0][0]))
+                          for call in self.proto.sendMessage.call_args_list],
+                         [{"k": "builds/1/new", "m": {"buildid": 1}},
+                          {"msg": "pong", "code": 200, "_id": 2}])
+        self.assertEqual(len(self.proto.queue), 0)
+        self.assertEqual(self.proto.queueBytes, 0)
+
+    def test_paused_coalesces_messages(self):
+        self.startConsumingBuilds()
+        self.proto.pauseProducing()
+        self.master.mq.callConsumer(("builds", "1", "update"), {"buildid": 1, "n": 1})
+        self.master.mq.callConsumer(("builds", "2", "update"), {"buildid": 2, "n": 1})
+        self.master.mq.callConsumer(("builds", "1", "update"), {"buildid": 1, "n": 2})
+        self.assertEqual(len(self.proto.queue), 2)
+
+        self.proto.resumeProducing()
+        self.assertEqual([json.loads(bytes2unicode(call[0][0]))
+                          for call in self.proto.sendMessage.call_args_list],
+                         [{"k": "builds/2/update", "m": {"buildid": 2, "n": 1}},
+                          {"k": "builds/1/update", "m": {"buildid": 1, "n": 2}}])
+
+    def test_paused_again_while_flushing(self):
+        self.startConsumingBuilds()
+        self.proto.pauseProducing()
+        self.master.mq.callConsumer(("builds", "1", "new"), {"buildid": 1})
+        self.master.mq.callConsumer(("builds", "2", "new"), {"buildid": 2})
+        self.proto.sendMessage.side_effect = lambda data: self.proto.pauseProducing()
+        self.proto.resumeProducing()
+        self.assertEqual(self.proto.sendMessage.call_count, 1)
+        self.assertEqual(len(self.proto.queue), 1)
+
+    def test_slow_client_dropped(self):
+        self.startConsumingBuilds()
+        self.proto.peer = 'tcp:127.0.0.1:1234'
+        self.proto.sendClose = Mock()
+        self.proto.maxQueueBytes = 100
+        self.proto.pauseProducing()
+        with mock.patch('buildbot.process.metrics.MetricCountEvent.log') as countLog:
+            # the third message goes over the cap
+            for i in range(3):
+                self.master.mq.callConsumer(("builds", str(i), "new"), {"buildid": i})
+            self.assertIn(mock.call('WsProtocol.dropped_clients', 1), countLog.call_args_list)
+            # the queue metrics get back to where they were
+            for name in ('WsProtocol.queued_messages', 'WsProtocol.queued_bytes'):
+                self.assertEqual(sum(call[0][1] for call in countLog.call_args_list
+                                     if call[0][0] == name), 0)
+
+        self.proto.sendClose.assert_called_once_with(
+            code=ws.WsProtocol.CLOSE_RESYNC,
+            reason="too many pending messages, reconnect and reload the data")
+        self.assertEqual(len(self.proto.queue), 0)
+        self.assertEqual(self.master.mq.qrefs, [])
+        self.assertIsNone(self.proto.qrefs)
+
+        # nothing more is sent
+        self.proto.resumeProducing()
+        self.proto.onMessage(json.dumps(dict(cmd="ping", _id=2)), False)
+        self.assertFalse(self.proto.sendMessage.called)
+
+    def test_max_queue_bytes_config(self):
+        self.master.config.www['ws_max_queue_bytes'] = 1000
+        proto = self.ws._factory.buildProtocol("me")
+        self.assertEqual(proto.maxQueueBytes, 1000)
+
+
+class WsResourceMsgpack(TestReactorMixin, www.WwwTestMixin, unittest.TestCase):
+
+    if types.msgpack is None:
+        skip = "msgpack not installed, skip the test"
+
+    def setUp(self):
+        self.setUpTestReactor()
+        self.master = self.make_master(url='h:/a/b/')
+        self.ws = ws.WsResource(self.master)
+        self.proto = self.connect(['msgpack'])
+
+    def connect(self, protocols):
+        proto = self.ws._factory.buildProtocol("me")
+        proto.sendMessage = Mock(spec=proto.sendMessage)
+        proto.subprotocol = proto.onConnect(Mock(protocols=protocols))
+        return proto
+
+    def sentFrame(self, proto):
+        args, kwargs = proto.sendMessage.call_args
+        self.assertEqual(kwargs, {'isBinary': True})
+        return types.loadsMsgpack(args[0])
+
+    def test_onConnect(self):
+        self.assertEqual(self.proto.subprotocol, 'msgpack')
+        self.assertIsNone(self.connect(['other']).subprotocol)
+
+    def test_ping(self):
+        self.proto.onMessage(types.dumpsMsgpack(dict(cmd="ping", _id=1)), True)
+        self.assertEqual(self.sentFrame(self.proto), {"msg": "pong", "code": 200, "_id": 1})
+
+    def test_json_frame(self):
+        # the text frames are still JSON
+        self.proto.onMessage(json.dumps(dict(cmd="ping", _id=1)), False)
+        self.assertEqual(self.sentFrame(self.proto), {"msg": "pong", "code": 200, "_id": 1})
+
+    def test_startConsuming_with_json_client(self):
+        jsonProto = self.connect([])
+        for proto in (self.proto, jsonProto):
+            proto.onMessage(
+                json.dumps(dict(cmd="startConsuming", path="builds/*/*", _id=1)), False)
+        self.assertEqual(len(self.master.mq.qrefs), 1)
+        self.master.mq.verifyMessages = False
+        self.master.mq.callConsumer(("builds", "1", "new"), {"buildid": 1, "data": b'\xfe'})
+        self.assertEqual(self.sentFrame(self.proto),
+                         {"k": "builds/1/new", "m": {"buildid": 1, "data": b'\xfe'}})
+        self.assertEqual(json.loads(bytes2unicode(jsonProto.sendMessage.call_args[0][0])),
+                         {"k": "builds/1/new", "m": {"buildid": 1, "data": None}})
+
+    def test_paused_queues_messages(self):
+        self.proto.onMessage(
+            json.dumps(dict(cmd="startConsuming", path="builds/*/*", _id=1)), False)
+        self.master.mq.verifyMessages = False
+        self.proto.pauseProducing()
+        self.master.mq.callConsumer(("builds", "1", "new"), {"buildid": 1})
+        self.proto.sendMessage.reset_mock()
+        self.proto.resumeProducing()
+        self.assertEqual(self.sentFrame(self.proto),
+                         {"k": "builds/1/new", "m": {"buildid": 1}})
@@ -51,6 +51,7 @@ class FakeRequest:
     method = b'GET'
     path = b'/req.path'
     responseCode = 200
+    producer = None
 
     def __init__(self, path=None):
         self.headers = {}
@@ -119,6 +120,12 @@ class FakeRequest:
     def getSession(self):
         return self.session
 
+    def registerProducer(self, producer, streaming):
+        self.producer = producer
+
+    def unregisterProducer(self):
+        self.producer = None
+
 
 class RequiresWwwMixin:
     # mix this into a TestCase to skip if buildbot-www is not installed
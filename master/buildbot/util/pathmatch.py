@@ -45,38 +45,85 @@ class Matcher:
         if self._dirty:
             self._compile()
 
-        patterns = self._by_length.get(len(path), {})
-        for pattern in patterns:
-            kwargs = {}
-            for pattern_elt, path_elt in zip(pattern, path):
+        match = self._match(self._root, path, 0, {})
+        if match is None:
+            raise KeyError('No match for %r' % (path,))
+        _, value, kwargs = match
+        return value, kwargs
+
+    def _match(self, node, path, i, kwargs):
+        # return the (index, value, kwargs) of the first registered pattern
+        # matching path[i:] from this node, or None
+        if i == len(path):
+            if node.value is None:
+                return None
+            return node.value + (kwargs,)
+
+        path_elt = path[i]
+        best = None
+        child = node.literals.get(path_elt)
+        if child is not None:
+            best = self._match(child, path, i + 1, kwargs)
+        for type_fn, arg_name, child in node.placeholders:
+            # the patterns below can only win if they were registered first
+            if best is not None and child.first > best[0]:
+                continue
+            if type_fn is None:
+                value = path_elt
+            else:
+                try:
+                    value = type_fn(path_elt)
+                except Exception:
+                    continue
+            match = self._match(child, path, i + 1, dict(kwargs, **{arg_name: value}))
+            if match is not None and (best is None or match[0] < best[0]):
+                best = match
+        return best
+
+    def iterPatterns(self):
+        return list(self._patterns.items())
+
+    def _compile(self):
+        # a trie of the pattern elements: each node has the children of its
+        # literal elements, in a dict, and those of its placeholders, which
+        # are tried in turn
+        self._root = _Node()
+        for index, (k, v) in enumerate(self.iterPatterns()):
+            node = self._root
+            node.first = min(node.first, index)
+            for pattern_elt in k:
                 mo = self.path_elt_re.match(pattern_elt)
                 if mo:
                     type_flag, arg_name = mo.groups()
+                    type_fn = None
                     if type_flag:
-                        try:
-                            type_fn = self.type_fns[type_flag]
-                        except Exception:
-                            assert type_flag in self.type_fns, \
-                                    "no such type flag {}".format(type_flag)
-                        try:
-                            path_elt = type_fn(path_elt)
-                        except Exception:
-                            break
-                    kwargs[arg_name] = path_elt
+                        assert type_flag in self.type_fns, \
+                            "no such type flag {}".format(type_flag)
+                        type_fn = self.type_fns[type_flag]
+                    node = node.getPlaceholder(type_fn, arg_name)
                 else:
-                    if pattern_elt != path_elt:
-                        break
-            else:
-                # complete match
-                return patterns[pattern], kwargs
-        else:
-            raise KeyError('No match for %r' % (path,))
+                    node = node.literals.setdefault(pattern_elt, _Node())
+                node.first = min(node.first, index)
+            node.value = (index, v)
+        self._dirty = False
 
-    def iterPatterns(self):
-        return list(self._patterns.items())
 
-    def _compile(self):
-        self._by_length = {}
-        for k, v in self.iterPatterns():
-            length = len(k)
-            self._by_length.setdefault(length, {})[k] = v
+class _Node:
+
+    __slots__ = ['literals', 'placeholders', 'value', 'first']
+
+    def __init__(self):
+        self.literals = {}
+        self.placeholders = []  # (type_fn, arg_name, _Node)
+        # the (index, value) of the pattern ending here
+        self.value = None
+        # the index of the first registered pattern going through this node
+        self.first = float('inf')
+
+    def getPlaceholder(self, type_fn, arg_name):
+        for fn, name, child in self.placeholders:
+            if fn is type_fn and name == arg_name:
+                return child
+        child = _Node()
+        self.placeholders.append((type_fn, arg_name, child))
+        return child
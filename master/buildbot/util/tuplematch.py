@@ -21,3 +21,107 @@ def matchTuple(routingKey, filter):
         if f is not None and f != k:
             return False
     return True
+
+
+class _Node:
+
+    __slots__ = ['children', 'wildcard', 'values']
+
+    def __init__(self):
+        self.children = {}  # element of the key : node
+        self.wildcard = None  # node for the None element
+        self.values = {}  # value : insertion order
+
+    def isEmpty(self):
+        return not (self.children or self.wildcard or self.values)
+
+
+class TupleIndex:
+
+    """
+    An index of values by filter, where a filter is a tuple of strings or None
+    wildcards, as for L{matchTuple}.
+
+    The filters are stored in a trie keyed by the position in the tuple, with
+    a separate branch for the wildcards, so that finding the values whose
+    filter matches a key only visits the branches which can match, instead of
+    testing every filter.
+    """
+
+    def __init__(self):
+        self._roots = {}  # length of the filters : root node
+        self._order = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, filter, value):
+        node = self._roots.get(len(filter))
+        if node is None:
+            node = self._roots[len(filter)] = _Node()
+        for f in filter:
+            if f is None:
+                if node.wildcard is None:
+                    node.wildcard = _Node()
+                node = node.wildcard
+            else:
+                child = node.children.get(f)
+                if child is None:
+                    child = node.children[f] = _Node()
+                node = child
+        if value not in node.values:
+            self._order += 1
+            node.values[value] = self._order
+            self._count += 1
+
+    def remove(self, filter, value):
+        """Remove a value, and return True if it was in the index."""
+        node = self._roots.get(len(filter))
+        path = []
+        for f in filter:
+            if node is None:
+                return False
+            path.append((node, f))
+            node = node.wildcard if f is None else node.children.get(f)
+        if node is None or node.values.pop(value, None) is None:
+            return False
+        self._count -= 1
+
+        # prune the branches which are left empty
+        for parent, f in reversed(path):
+            if not node.isEmpty():
+                break
+            if f is None:
+                parent.wildcard = None
+            else:
+                del parent.children[f]
+            node = parent
+        if node.isEmpty():
+            del self._roots[len(filter)]
+        return True
+
+    def match(self, routingKey):
+        """Return the values whose filter matches the given key, in the order
+        in which they were added."""
+        node = self._roots.get(len(routingKey))
+        if node is None:
+            return []
+        nodes = [node]
+        for k in routingKey:
+            matching = []
+            for node in nodes:
+                child = node.children.get(k)
+                if child is not None:
+                    matching.append(child)
+                if node.wildcard is not None:
+                    matching.append(node.wildcard)
+            if not matching:
+                return []
+            nodes = matching
+
+        if len(nodes) == 1:
+            return list(nodes[0].values)
+        values = [item for node in nodes for item in node.values.items()]
+        values.sort(key=lambda item: item[1])
+        return [value for value, _ in values]
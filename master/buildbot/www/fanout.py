@@ -0,0 +1,123 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+from twisted.internet import defer
+from twisted.python import failure
+from twisted.python import log
+
+from buildbot.util import Notifier
+
+
+class FanoutHub:
+
+    """
+    Share the MQ subscriptions of the websocket and server-sent events
+    clients.
+
+    There is a single MQ consumer per distinct filter, however many clients
+    listen to it.  Each message is encoded once per wire format, by the
+    C{encoder(key, message)} function given by the clients, and the same bytes
+    are given to the C{callback(key, data)} of all the clients which use that
+    format.
+    """
+
+    def __init__(self, master):
+        self.master = master
+        self.subscriptions = {}  # filter : FanoutSubscription
+
+    def startConsuming(self, callback, filter, encoder):
+        """
+        Call C{callback(key, data)} with the routing key and encoded data of
+        the messages matching C{filter}.
+
+        @returns: Deferred firing with an object with a C{stopConsuming}
+        method, like the MQ C{startConsuming}
+        """
+        filter = tuple(filter)
+        subscription = self.subscriptions.get(filter)
+        if subscription is None:
+            subscription = self.subscriptions[filter] = FanoutSubscription(self, filter)
+            try:
+                subscription.start()
+            except Exception:
+                del self.subscriptions[filter]
+                raise
+        return subscription.attach(callback, encoder)
+
+
+class FanoutSubscription:
+
+    def __init__(self, hub, filter):
+        self.hub = hub
+        self.filter = filter
+        self.consumers = {}  # FanoutConsumer : None, in the order they attached
+        self.qref = None
+        self.failure = None
+        self._started = Notifier()
+
+    def start(self):
+        d = self.hub.master.mq.startConsuming(self.onMessage, self.filter)
+        d.addBoth(self._gotQref)
+
+    def _gotQref(self, res):
+        if isinstance(res, failure.Failure):
+            # the next client will try again
+            self.failure = res
+            del self.hub.subscriptions[self.filter]
+        else:
+            self.qref = res
+        self._started.notify(None)
+
+    @defer.inlineCallbacks
+    def attach(self, callback, encoder):
+        if self.qref is None and self.failure is None:
+            yield self._started.wait()
+        if self.failure is not None:
+            self.failure.raiseException()
+        consumer = FanoutConsumer(self, callback, encoder)
+        self.consumers[consumer] = None
+        return consumer
+
+    def detach(self, consumer):
+        if self.consumers.pop(consumer, False) is None and not self.consumers:
+            self.qref.stopConsuming()
+            del self.hub.subscriptions[self.filter]
+
+    def onMessage(self, key, message):
+        encoded = {}
+        for consumer in list(self.consumers):
+            # the consumers may detach from the callbacks of the others
+            if consumer not in self.consumers:
+                continue
+            data = encoded.get(consumer.encoder)
+            if data is None:
+                data = encoded[consumer.encoder] = consumer.encoder(key, message)
+            try:
+                consumer.callback(key, data)
+            except Exception as e:
+                log.err(e, 'while sending {} to a client'.format('/'.join(key)))
+
+
+class FanoutConsumer:
+
+    __slots__ = ['subscription', 'callback', 'encoder']
+
+    def __init__(self, subscription, callback, encoder):
+        self.subscription = subscription
+        self.callback = callback
+        self.encoder = encoder
+
+    def stopConsuming(self):
+        self.subscription.detach(self)
@@ -13,24 +13,32 @@
 #
 # Copyright Buildbot Team Members
 
+import base64
 import cgi
 import datetime
 import fnmatch
 import json
 import re
 from contextlib import contextmanager
+from urllib.parse import parse_qs
+from urllib.parse import unquote as urlunquote
 from urllib.parse import urlparse
 
 from twisted.internet import defer
+from twisted.internet.interfaces import IPushProducer
 from twisted.python import log
 from twisted.web.error import Error
+from twisted.web.http import datetimeToString
+from zope.interface import implementer
 
 from buildbot.data import exceptions
 from buildbot.data import resultspec
+from buildbot.data import types
 from buildbot.util import bytes2unicode
 from buildbot.util import toJson
 from buildbot.util import unicode2bytes
 from buildbot.www import resource
+from buildbot.www import restcache
 from buildbot.www.authz import Forbidden
 
 
@@ -58,6 +66,25 @@ class ContentTypeParser:
 
 URL_ENCODED = b"application/x-www-form-urlencoded"
 JSON_ENCODED = b"application/json"
+MSGPACK_ENCODED = (b"application/msgpack", b"application/x-msgpack")
+
+
+def encodeCursor(values):
+    # cursors are opaque to the clients
+    data = json.dumps(values, separators=(',', ':'))
+    return bytes2unicode(base64.urlsafe_b64encode(unicode2bytes(data)))
+
+
+def decodeCursor(cursor):
+    if not cursor:
+        return []
+    try:
+        values = json.loads(bytes2unicode(base64.urlsafe_b64decode(cursor)))
+    except Exception as e:
+        raise BadRequest('invalid cursor') from e
+    if not isinstance(values, list) or not values:
+        raise BadRequest('invalid cursor')
+    return values
 
 
 class RestRootResource(resource.Resource):
@@ -73,16 +100,23 @@ class RestRootResource(resource.Resource):
 
         min_vers = master.config.www.get('rest_minimum_version', 0)
         latest = max(list(self.version_classes))
+        self.versions = []
         for version, klass in self.version_classes.items():
             if version < min_vers:
                 continue
             child = klass(master)
+            self.versions.append(child)
             child_path = 'v{}'.format(version)
             child_path = unicode2bytes(child_path)
             self.putChild(child_path, child)
             if version == latest:
                 self.putChild(b'latest', child)
 
+    def invalidateCaches(self):
+        # drop the cached responses of all the versions
+        for child in self.versions:
+            child.cache.invalidateAll()
+
     def render(self, request):
         request.setHeader(b"content-type", JSON_ENCODED)
         min_vers = self.master.config.www.get('rest_minimum_version', 0)
@@ -93,6 +127,125 @@ class RestRootResource(resource.Resource):
         return unicode2bytes(data)
 
 
+@implementer(IPushProducer)
+class RawStreamProducer:
+
+    """
+    Write the pieces read from a stream, like the ones of the raw endpoints or
+    a L{CollectionStream}, to a request, one at a time, pausing while the
+    transport has enough buffered data.  At most one piece is held in memory
+    at any time.
+    """
+
+    def __init__(self, request, stream):
+        self.request = request
+        self.stream = stream
+        self.paused = False
+        self.stopped = False
+        self.producing = False
+        self.done = defer.Deferred()
+
+    def start(self):
+        self.request.registerProducer(self, True)
+        self._produce()
+        return self.done
+
+    def pauseProducing(self):
+        self.paused = True
+
+    def resumeProducing(self):
+        self.paused = False
+        self._produce()
+
+    def stopProducing(self):
+        # the client went away
+        self.stopped = True
+        self._produce()
+
+    @defer.inlineCallbacks
+    def _produce(self):
+        if self.producing or self.done.called:
+            return
+        self.producing = True
+        try:
+            while not self.stopped:
+                if self.paused:
+                    return
+                piece = yield self.stream.read()
+                if piece is None:
+                    break
+                if not self.stopped:
+                    self.request.write(unicode2bytes(piece))
+        except Exception:
+            self.request.unregisterProducer()
+            self.done.errback()
+            return
+        finally:
+            self.producing = False
+        self.request.unregisterProducer()
+        self.done.callback(None)
+
+
+class CollectionStream:
+
+    """
+    A stream of the JSON response about a collection, read one page at a
+    time; each page after the first one is fetched by C{getPage(cursor)} when
+    it is read, so that the whole collection is never held in memory.
+
+    The pieces add up to what C{json.dumps} gives for the whole response,
+    except that the meta, which is known only at the end, always comes last.
+    """
+
+    def __init__(self, typeName, page, getPage, compact):
+        self.page = page
+        self.cursor = None
+        self.getPage = getPage
+        self.compact = compact
+        self.total = 0
+        self.finished = False
+        typeName = json.dumps(typeName)
+        if compact:
+            self.prefix = '{' + typeName + ':['
+        else:
+            self.prefix = '{\n  ' + typeName + ': ['
+
+    def dumps(self, data, indent):
+        if self.compact:
+            return json.dumps(data, default=toJson, sort_keys=True, separators=(',', ':'))
+        data = json.dumps(data, default=toJson, sort_keys=True, indent=2)
+        return data.replace('\n', '\n' + indent)
+
+    @defer.inlineCallbacks
+    def read(self):
+        if self.page is None:
+            if self.cursor is None:
+                if self.finished:
+                    return None
+                self.finished = True
+                return unicode2bytes(self.encodeEnd())
+            self.page = yield self.getPage(self.cursor)
+        page, self.page = self.page, None
+        self.cursor = page.nextCursor
+
+        pieces = [self.prefix]
+        self.prefix = ''
+        for item in page.data:
+            if self.total:
+                pieces.append(',')
+            if not self.compact:
+                pieces.append('\n    ')
+            pieces.append(self.dumps(item, '    '))
+            self.total += 1
+        return unicode2bytes(''.join(pieces))
+
+    def encodeEnd(self):
+        meta = self.dumps({'total': self.total}, '  ')
+        if self.compact:
+            return '],"meta":' + meta + '}'
+        return ('\n  ]' if self.total else ']') + ',\n  "meta": ' + meta + '\n}'
+
+
 JSONRPC_CODES = dict(parse_error=-32700,
                      invalid_request=-32600,
                      method_not_found=-32601,
@@ -120,10 +273,24 @@ class V2RootResource(resource.Resource):
     # enable reconfigResource calls
     needsReconfig = True
 
-    @defer.inlineCallbacks
+    # the number of items of the pages in which the big collections are
+    # streamed
+    STREAM_PAGE_SIZE = 1000
+
+    # the maximum number of requests in a batch
+    MAX_BATCH_SIZE = 100
+
+    def __init__(self, master):
+        super().__init__(master)
+        self.cache = restcache.ResponseCache(master)
+
     def getEndpoint(self, request, method, params):
+        return self.getEndpointForPath(request, request.postpath, method, params)
+
+    @defer.inlineCallbacks
+    def getEndpointForPath(self, request, postpath, method, params):
         # note that trailing slashes are not allowed
-        request_postpath = tuple(bytes2unicode(p) for p in request.postpath)
+        request_postpath = tuple(bytes2unicode(p) for p in postpath)
         yield self.master.www.assertUserAllowed(request, request_postpath,
                                                 method, params)
         ret = yield self.master.data.getEndpoint(request_postpath)
@@ -143,6 +310,11 @@ class V2RootResource(resource.Resource):
             writeError(msg or b"invalid control action", errcode=501,
                        jsonrpccode=JSONRPC_CODES["method_not_found"])
             return
+        except exceptions.InvalidQueryError as e:
+            msg = unicode2bytes(e.args[0])
+            writeError(msg or b"invalid query", errcode=400,
+                       jsonrpccode=JSONRPC_CODES["invalid_params"])
+            return
         except BadRequest as e:
             msg = unicode2bytes(e.args[0])
             writeError(msg or b"invalid request", errcode=400,
@@ -248,10 +420,103 @@ class V2RootResource(resource.Resource):
                 data = unicode2bytes(data)
                 request.write(data)
 
+    # batches of GETs
+
+    def decodeBatch(self, request):
+        # as for JSONRPC, only accept the content-type which the forms of
+        # other sites cannot send
+        if ContentTypeParser(request.getHeader(b'content-type')).gettype() != "application/json":
+            raise BadRequest('Invalid content-type (use application/json)')
+
+        try:
+            data = json.loads(bytes2unicode(request.content.read()))
+        except Exception as e:
+            raise BadRequest("JSON parse error: {}".format(str(e))) from e
+
+        paths = data.get('requests') if isinstance(data, dict) else None
+        if not isinstance(paths, list) or not all(isinstance(p, str) for p in paths):
+            raise BadRequest("'requests' must be a list of paths")
+        if len(paths) > self.MAX_BATCH_SIZE:
+            raise BadRequest("at most {} requests can be batched".format(self.MAX_BATCH_SIZE))
+        return paths
+
+    @defer.inlineCallbacks
+    def getBatchResponse(self, request, path, format):
+        errors = []
+
+        def writeError(msg, errcode=404, jsonrpccode=None):
+            errors.append(dict(error=bytes2unicode(msg), code=errcode))
+
+        with self.handleErrors(writeError):
+            path, _, query = path.partition('?')
+            postpath = [unicode2bytes(urlunquote(p)) for p in path.strip('/').split('/')]
+            reqArgs = parse_qs(unicode2bytes(query), 1)
+            ep, kwargs = yield self.getEndpointForPath(request, postpath, 'GET', {})
+            if ep.isRaw:
+                raise BadRequest("raw endpoints cannot be batched")
+            rspec = self.decodeResultSpecArgs(reqArgs, ep)
+
+            # the batched requests share the cached responses of the GETs
+            cacheable = self.cache.isCacheable(ep, rspec)
+            if cacheable:
+                key = self.cacheKey(postpath, reqArgs, format)
+                entry = self.cache.get(key)
+                if entry is not None:
+                    return entry.body
+                token = self.cache.watch(ep.rtype)
+
+            data = yield ep.get(rspec, kwargs)
+            if data is None:
+                raise exceptions.InvalidPathError("not found")
+            data = rspec.apply(data)
+
+            data = self.encodeRestData(ep, data, b'cursor' in reqArgs, format)
+            if cacheable:
+                self.cache.store(key, ep.rtype, token, data)
+            return data
+
+        if format == 'msgpack':
+            return types.dumpsMsgpack(errors[0])
+        return unicode2bytes(json.dumps(errors[0], separators=(',', ':')))
+
+    @defer.inlineCallbacks
+    def renderBatch(self, request):
+        def writeError(msg, errcode=400, jsonrpccode=None):
+            if self.debug:
+                log.msg("batch error: {}".format(msg))
+            request.setResponseCode(errcode)
+            request.setHeader(b'content-type', b'text/plain; charset=utf-8')
+            data = json.dumps(dict(error=bytes2unicode(msg)))
+            request.write(unicode2bytes(data))
+
+        with self.handleErrors(writeError):
+            paths = self.decodeBatch(request)
+            format, contentType = self.getResponseFormat(request)
+            if format == 'text':
+                format, contentType = 'json', JSON_ENCODED
+
+            # the requests are done concurrently, and the identical ones only
+            # once
+            unique = list(dict.fromkeys(paths))
+            bodies = yield defer.gatherResults(
+                [self.getBatchResponse(request, path, format) for path in unique])
+            bodies = dict(zip(unique, bodies))
+
+            request.setHeader(b'content-type', contentType)
+            if format == 'msgpack':
+                # the encoded responses are the items of a MessagePack array
+                packer = types.msgpack.Packer()
+                request.write(packer.pack_map_header(1) + packer.pack('responses') +
+                              packer.pack_array_header(len(paths)) +
+                              b''.join(bodies[p] for p in paths))
+            else:
+                request.write(b'{"responses":[' + b','.join(bodies[p] for p in paths) + b']}')
+
     # JSONAPI support
     def decodeResultSpec(self, request, endpoint):
-        reqArgs = request.args
+        return self.decodeResultSpecArgs(request.args, endpoint)
 
+    def decodeResultSpecArgs(self, reqArgs, endpoint):
         def checkFields(fields, negOk=False):
             for field in fields:
                 k = bytes2unicode(field)
@@ -261,7 +526,7 @@ class V2RootResource(resource.Resource):
                     raise BadRequest("no such field '{}'".format(k))
 
         entityType = endpoint.rtype.entityType
-        limit = offset = order = fields = None
+        limit = offset = order = fields = cursor = None
         filters, properties = [], []
         for arg in reqArgs:
             argStr = bytes2unicode(arg)
@@ -281,6 +546,10 @@ class V2RootResource(resource.Resource):
                     offset = int(reqArgs[arg][0])
                 except Exception as e:
                     raise BadRequest('invalid offset') from e
+            elif arg == b'cursor':
+                if endpoint.cursorField is None:
+                    raise BadRequest("this collection cannot be paginated with a cursor")
+                cursor = decodeCursor(reqArgs[arg][0])
             elif arg == b'property':
                 try:
                     props = []
@@ -335,6 +604,11 @@ class V2RootResource(resource.Resource):
         rspec = resultspec.ResultSpec(fields=fields, limit=limit, offset=offset,
                                       order=order, filters=filters, properties=properties)
 
+        if cursor is not None:
+            if offset is not None:
+                raise BadRequest("cannot paginate with both an offset and a cursor")
+            rspec.paginateWithCursor(cursor, endpoint.cursorField)
+
         # for singular endpoints, only allow fields
         if not endpoint.isCollection:
             if rspec.filters:
@@ -347,8 +621,115 @@ class V2RootResource(resource.Resource):
                           unicode2bytes(data['mime-type']) + b'; charset=utf-8')
         request.setHeader(b"content-disposition",
                           b'attachment; filename=' + unicode2bytes(data['filename']))
+        if 'stream' in data:
+            if request.method == b"HEAD":
+                return defer.succeed(None)
+            return RawStreamProducer(request, data['stream']).start()
         request.write(unicode2bytes(data['raw']))
-        return
+        return defer.succeed(None)
+
+    def getResponseFormat(self, request):
+        # MessagePack is sent only to the clients which ask for it; if the
+        # request accepts text/html or text/plain, the JSON will be rendered
+        # in a readable, multiline format.
+        accept = request.getHeader(b'accept') or b''
+        if types.msgpack is not None:
+            for contentType in MSGPACK_ENCODED:
+                if contentType in accept:
+                    return 'msgpack', contentType
+        if b'application/json' in accept:
+            return 'json', b'application/json; charset=utf-8'
+        return 'text', b'text/plain; charset=utf-8'
+
+    def cacheKey(self, postpath, reqArgs, format):
+        # the path and the query determine the endpoint, its kwargs and the
+        # result spec
+        args = tuple(sorted((k, tuple(v)) for k, v in reqArgs.items()))
+        return (tuple(postpath), args, format)
+
+    def setExpiresHeaders(self, request):
+        if self.cache_seconds:
+            now = datetime.datetime.utcnow()
+            expires = now + datetime.timedelta(seconds=self.cache_seconds)
+            expiresBytes = unicode2bytes(
+                expires.strftime("%a, %d %b %Y %H:%M:%S GMT"))
+            request.setHeader(b"Expires", expiresBytes)
+            request.setHeader(b"Pragma", b"no-cache")
+
+    def writeRestResponse(self, request, body, etag, lastModified=None):
+        # set up caching
+        self.setExpiresHeaders(request)
+        request.setHeader(b"ETag", etag)
+        if lastModified is not None:
+            request.setHeader(b"Last-Modified", datetimeToString(lastModified))
+
+        ifNoneMatch = request.getHeader(b'if-none-match')
+        if ifNoneMatch is not None and restcache.etagMatches(ifNoneMatch, etag):
+            request.setResponseCode(304)
+            return
+
+        if request.method == b"HEAD":
+            request.setHeader(b"content-length", unicode2bytes(str(len(body))))
+        else:
+            request.write(body)
+
+    def isStreamable(self, request, ep, rspec):
+        # the explicit pages are small enough to be sent at once
+        return (ep.isCollection and not ep.isRaw and ep.cursorField is not None and
+                request.method != b"HEAD" and rspec.limit is None and
+                rspec.offset is None and rspec.cursor is None)
+
+    @defer.inlineCallbacks
+    def getStreamPage(self, request, ep, kwargs, cursor):
+        # the endpoints consume their result spec, so each page needs its own
+        rspec = self.decodeResultSpec(request, ep)
+        if ep.reversedWithoutCursor:
+            # stream the items in the order of the unpaginated response
+            rspec.reverseOrder(ep.cursorField)
+        rspec.paginateWithCursor(cursor, ep.cursorField)
+        rspec.limit = self.STREAM_PAGE_SIZE
+        data = yield ep.get(rspec, kwargs)
+        return rspec.apply(data)
+
+    def encodeRestData(self, ep, data, paginatedWithCursor, format):
+        # annotate the result with some metadata
+        meta = {}
+        if ep.isCollection:
+            offset, total = data.offset, data.total
+            if offset is None:
+                offset = 0
+
+            if paginatedWithCursor:
+                # the collection is not counted, the next cursor tells
+                # whether there is more
+                if data.nextCursor is not None:
+                    meta['next_cursor'] = encodeCursor(data.nextCursor)
+            # add total, if known
+            elif total is not None:
+                meta['total'] = total
+
+            # get the real list instance out of the ListResult
+            data = data.data
+        else:
+            data = [data]
+
+        typeName = ep.rtype.plural
+        data = {
+            typeName: data,
+            'meta': meta
+        }
+
+        # filter out blanks if necessary and render the data
+        if format == 'msgpack':
+            return types.dumpsMsgpack(data)
+        if format == 'json':
+            data = json.dumps(data, default=toJson,
+                              sort_keys=True, separators=(',', ':'))
+        else:
+            data = json.dumps(data, default=toJson,
+                              sort_keys=True, indent=2)
+        data = unicode2bytes(data)
+        return data
 
     @defer.inlineCallbacks
     def renderRest(self, request):
@@ -366,79 +747,72 @@ class V2RootResource(resource.Resource):
             ep, kwargs = yield self.getEndpoint(request, bytes2unicode(request.method), {})
 
             rspec = self.decodeResultSpec(request, ep)
-            data = yield ep.get(rspec, kwargs)
-            if data is None:
-                msg = ("not found while getting from {} with "
-                       "arguments {} and {}").format(repr(ep), repr(rspec),
-                                                     str(kwargs))
-                msg = unicode2bytes(msg)
-                writeError(msg, errcode=404)
-                return
 
-            if ep.isRaw:
-                self.encodeRaw(data, request)
+            # set up the content type and formatting options
+            format, contentType = self.getResponseFormat(request)
+
+            cacheable = self.cache.isCacheable(ep, rspec)
+            if cacheable:
+                key = self.cacheKey(request.postpath, request.args, format)
+                entry = self.cache.get(key)
+                if entry is not None:
+                    request.setHeader(b"content-type", contentType)
+                    self.writeRestResponse(request, entry.body, entry.etag,
+                                           entry.lastModified)
+                    return
+                token = self.cache.watch(ep.rtype)
+
+            # the collections with more than one page are streamed, a page
+            # at a time; a MessagePack array starts with its length, so these
+            # responses are not
+            page = None
+            if format != 'msgpack' and self.isStreamable(request, ep, rspec):
+                try:
+                    page = yield self.getStreamPage(request, ep, kwargs, [])
+                except exceptions.InvalidQueryError:
+                    # this query cannot be paginated with a cursor
+                    pass
+            if page is not None and page.nextCursor is not None:
+                request.setHeader(b"content-type", contentType)
+                self.setExpiresHeaders(request)
+                stream = CollectionStream(
+                    ep.rtype.plural, page,
+                    lambda cursor: self.getStreamPage(request, ep, kwargs, cursor),
+                    format == 'json')
+                yield RawStreamProducer(request, stream).start()
                 return
 
-            # post-process any remaining parts of the resultspec
-            data = rspec.apply(data)
-
-            # annotate the result with some metadata
-            meta = {}
-            if ep.isCollection:
-                offset, total = data.offset, data.total
-                if offset is None:
-                    offset = 0
-
-                # add total, if known
-                if total is not None:
-                    meta['total'] = total
-
-                # get the real list instance out of the ListResult
-                data = data.data
-            else:
-                data = [data]
-
-            typeName = ep.rtype.plural
-            data = {
-                typeName: data,
-                'meta': meta
-            }
-
-            # set up the content type and formatting options; if the request
-            # accepts text/html or text/plain, the JSON will be rendered in a
-            # readable, multiline format.
-
-            if b'application/json' in (request.getHeader(b'accept') or b''):
-                compact = True
-                request.setHeader(b"content-type",
-                                  b'application/json; charset=utf-8')
+            if page is not None:
+                data = page
             else:
-                compact = False
-                request.setHeader(b"content-type",
-                                  b'text/plain; charset=utf-8')
-
-            # set up caching
-            if self.cache_seconds:
-                now = datetime.datetime.utcnow()
-                expires = now + datetime.timedelta(seconds=self.cache_seconds)
-                expiresBytes = unicode2bytes(
-                    expires.strftime("%a, %d %b %Y %H:%M:%S GMT"))
-                request.setHeader(b"Expires", expiresBytes)
-                request.setHeader(b"Pragma", b"no-cache")
-
-            # filter out blanks if necessary and render the data
-            if compact:
-                data = json.dumps(data, default=toJson,
-                                  sort_keys=True, separators=(',', ':'))
+                if ep.isRaw:
+                    data = yield ep.stream(rspec, kwargs)
+                else:
+                    data = yield ep.get(rspec, kwargs)
+                if data is None:
+                    msg = ("not found while getting from {} with "
+                           "arguments {} and {}").format(repr(ep), repr(rspec),
+                                                         str(kwargs))
+                    msg = unicode2bytes(msg)
+                    writeError(msg, errcode=404)
+                    return
+
+                if ep.isRaw:
+                    yield self.encodeRaw(data, request)
+                    return
+
+                # post-process any remaining parts of the resultspec
+                data = rspec.apply(data)
+
+            data = self.encodeRestData(ep, data, b'cursor' in request.args, format)
+
+            request.setHeader(b"content-type", contentType)
+            if cacheable:
+                entry = self.cache.store(key, ep.rtype, token, data)
+                self.writeRestResponse(request, entry.body, entry.etag,
+                                       entry.lastModified)
             else:
-                data = json.dumps(data, default=toJson,
-                                  sort_keys=True, indent=2)
-
-            if request.method == b"HEAD":
-                request.setHeader(b"content-length", unicode2bytes(str(len(data))))
-            else:
-                data = unicode2bytes(data)
-                request.write(data)
+                self.writeRestResponse(request, data, restcache.makeETag(data))
 
     def reconfigResource(self, new_config):
         # buildbotURL may contain reverse proxy path, Origin header is just
@@ -454,6 +828,11 @@ class V2RootResource(resource.Resource):
         # and copy some other flags
         self.debug = new_config.www.get('debug')
         self.cache_seconds = new_config.www.get('json_cache_seconds', 0)
+        self.cache.maxBytes = new_config.www.get('rest_cache_bytes',
+                                                 restcache.ResponseCache.MAX_BYTES)
+        # the reconfig can change data which has no events, like the builders
+        # of the workers
+        self.cache.invalidateAll()
 
     def render(self, request):
         def writeError(msg, errcode=400):
@@ -509,8 +888,11 @@ class V2RootResource(resource.Resource):
                 if isPreflight:
                     return b""
 
-        # based on the method, this is either JSONRPC or REST
-        if request.method == b'POST':
+        # based on the method, this is either JSONRPC or REST, unless this is
+        # a batch of GETs
+        if request.method == b'POST' and request.postpath == [b'batch']:
+            res = yield self.renderBatch(request)
+        elif request.method == b'POST':
             res = yield self.renderJsonRpc(request)
         elif request.method in (b'GET', b'HEAD'):
             res = yield self.renderRest(request)
@@ -0,0 +1,175 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import hashlib
+from collections import OrderedDict
+
+from twisted.internet import defer
+from twisted.python import log
+
+from buildbot.process import metrics
+from buildbot.util import unicode2bytes
+
+
+def makeETag(body):
+    return b'"' + unicode2bytes(hashlib.sha1(body).hexdigest()) + b'"'
+
+
+def etagMatches(ifNoneMatch, etag):
+    """
+    Tell whether the value of an C{If-None-Match} header matches C{etag}.
+    The comparison is weak, as required for that header.
+    """
+    for candidate in ifNoneMatch.split(b','):
+        candidate = candidate.strip()
+        if candidate == b'*':
+            return True
+        if candidate.startswith(b'W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+class CacheEntry:
+
+    __slots__ = ['body', 'etag', 'lastModified']
+
+    def __init__(self, body, etag, lastModified):
+        self.body = body
+        self.etag = etag
+        self.lastModified = lastModified
+
+
+class WatchedType:
+
+    """
+    The invalidation state of the cached responses of a resource type.
+    """
+
+    __slots__ = ['entries', 'generation', 'lastModified', 'ready']
+
+    def __init__(self, lastModified):
+        self.entries = set()
+        # incremented on each invalidation, so that a response computed while
+        # the data changed is not stored
+        self.generation = 0
+        self.lastModified = lastModified
+        # set once the MQ subscriptions are active
+        self.ready = False
+
+
+class ResponseCache:
+
+    """
+    Cache the serialized responses of the REST API GETs, until an MQ event
+    tells that the resource type they are about changed.
+
+    Only the resource types marked C{cacheable} are cached: for each type, the
+    cache consumes the events matching its C{eventPathPatterns}, and
+    drops all the responses about that type when one is received.  Entries
+    are evicted in least-recently-used order once their total size goes beyond
+    C{maxBytes}.
+    """
+
+    # default cap of the cached responses, in bytes
+    MAX_BYTES = 32 * 1024 * 1024
+
+    def __init__(self, master, maxBytes=MAX_BYTES):
+        self.master = master
+        self.maxBytes = maxBytes
+        self.entries = OrderedDict()  # key : (rtype name, CacheEntry), LRU first
+        self.size = 0
+        self.watched = {}  # rtype name : WatchedType
+
+    def isCacheable(self, endpoint, resultSpec):
+        # build properties are updated without an event about the build
+        return (self.maxBytes > 0 and not endpoint.isRaw and
+                endpoint.rtype.cacheable and not resultSpec.properties)
+
+    def get(self, key):
+        item = self.entries.get(key)
+        if item is None:
+            metrics.MetricCountEvent.log('ResponseCache.misses', 1)
+            return None
+        self.entries.move_to_end(key)
+        metrics.MetricCountEvent.log('ResponseCache.hits', 1)
+        return item[1]
+
+    def watch(self, rtype):
+        """
+        Start watching the events of C{rtype}, if not done yet.
+
+        @returns: the token to give to L{store} with the response computed
+        from now on
+        """
+        watched = self.watched.get(rtype.name)
+        if watched is None:
+            watched = self.watched[rtype.name] = WatchedType(self.master.reactor.seconds())
+            self._startConsuming(rtype, watched)
+        return watched.generation
+
+    @defer.inlineCallbacks
+    def _startConsuming(self, rtype, watched):
+        def invalidate(key, message):
+            self.invalidate(rtype.name)
+
+        try:
+            for path in rtype.eventPaths:
+                filter = tuple(None if p.startswith('{') else p
+                               for p in path.split('/')) + (None,)
+                yield self.master.mq.startConsuming(invalidate, filter)
+        except Exception:
+            log.err(None, 'while consuming the events of {}'.format(rtype.plural))
+            return
+        watched.ready = True
+
+    def store(self, key, rtype, token, body):
+        """
+        Cache C{body} as the response for C{key}, unless the data of C{rtype}
+        changed since L{watch} returned C{token}.
+
+        @returns: the L{CacheEntry}, cached or not
+        """
+        watched = self.watched[rtype.name]
+        entry = CacheEntry(body, makeETag(body), watched.lastModified)
+        if not watched.ready or watched.generation != token or len(body) > self.maxBytes:
+            return entry
+
+        self._remove(key)
+        self.entries[key] = (rtype.name, entry)
+        watched.entries.add(key)
+        self.size += len(body)
+        while self.size > self.maxBytes:
+            self._remove(next(iter(self.entries)))
+        return entry
+
+    def _remove(self, key):
+        item = self.entries.pop(key, None)
+        if item is not None:
+            name, entry = item
+            self.watched[name].entries.discard(key)
+            self.size -= len(entry.body)
+
+    def invalidate(self, name):
+        watched = self.watched[name]
+        watched.generation += 1
+        watched.lastModified = self.master.reactor.seconds()
+        for key in list(watched.entries):
+            self._remove(key)
+
+    def invalidateAll(self):
+        for name in self.watched:
+            self.invalidate(name)
@@ -40,6 +40,7 @@ from buildbot.www import auth
 from buildbot.www import avatar
 from buildbot.www import change_hook
 from buildbot.www import config as wwwconfig
+from buildbot.www import fanout
 from buildbot.www import rest
 from buildbot.www import sse
 from buildbot.www import ws
@@ -186,6 +187,8 @@ class WWWService(service.ReconfigurableServiceMixin, service.AsyncMultiService):
         self.port = None
         self.port_service = None
         self.site = None
+        self.apiResource = None
+        self._pruneSubscription = None
 
         # load the apps early, in case something goes wrong in Python land
         self.apps = get_plugins('www', None, load_now=True)
@@ -296,13 +299,22 @@ class WWWService(service.ReconfigurableServiceMixin, service.AsyncMultiService):
         root.putChild(b'avatar', avatar.AvatarResource(self.master))
 
         # /api
-        root.putChild(b'api', rest.RestRootResource(self.master))
+        self.apiResource = rest.RestRootResource(self.master)
+        root.putChild(b'api', self.apiResource)
+        # the pruned data has no events to invalidate the cached responses
+        if self._pruneSubscription is not None:
+            self._pruneSubscription.unsubscribe()
+        self._pruneSubscription = self.master.db.retention.subscribeToPrunes(
+            lambda rows: self.apiResource.invalidateCaches())
+
+        # /ws and /sse share their MQ subscriptions
+        hub = fanout.FanoutHub(self.master)
 
         # /ws
-        root.putChild(b'ws', ws.WsResource(self.master))
+        root.putChild(b'ws', ws.WsResource(self.master, hub))
 
         # /sse
-        root.putChild(b'sse', sse.EventResource(self.master))
+        root.putChild(b'sse', sse.EventResource(self.master, hub))
 
         # /change_hook
         resource_obj = change_hook.ChangeHookResource(master=self.master)
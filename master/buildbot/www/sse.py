@@ -24,6 +24,15 @@ from buildbot.data.exceptions import InvalidPathError
 from buildbot.util import bytes2unicode
 from buildbot.util import toJson
 from buildbot.util import unicode2bytes
+from buildbot.www import fanout
+
+
+def encodeEvent(key, message):
+    key = [bytes2unicode(e) for e in key]
+    msg = dict(key=key, message=message)
+    return (b"event: " + b"event" + b"\n" +
+            b"data: " + unicode2bytes(json.dumps(msg, default=toJson)) + b"\n" +
+            b"\n")
 
 
 class Consumer:
@@ -40,14 +49,8 @@ class Consumer:
                 qref.stopConsuming()
             self.qrefs = {}
 
-    def onMessage(self, event, data):
-        request = self.request
-        key = [bytes2unicode(e) for e in event]
-        msg = dict(key=key, message=data)
-        request.write(b"event: " + b"event" + b"\n")
-        request.write(
-            b"data: " + unicode2bytes(json.dumps(msg, default=toJson)) + b"\n")
-        request.write(b"\n")
+    def onMessage(self, key, data):
+        self.request.write(data)
 
     def registerQref(self, path, qref):
         self.qrefs[path] = qref
@@ -56,10 +59,13 @@ class Consumer:
 class EventResource(resource.Resource):
     isLeaf = True
 
-    def __init__(self, master):
+    def __init__(self, master, hub=None):
         super().__init__()
 
+        if hub is None:
+            hub = fanout.FanoutHub(master)
         self.master = master
+        self.hub = hub
         self.consumers = {}
 
     def decodePath(self, path):
@@ -108,9 +114,9 @@ class EventResource(resource.Resource):
                     options[k] = options[k][1]
 
             try:
-                d = self.master.mq.startConsuming(
+                d = self.hub.startConsuming(
                     consumer.onMessage,
-                    tuple([bytes2unicode(p) for p in path]))
+                    tuple([bytes2unicode(p) for p in path]), encodeEvent)
 
                 @d.addCallback
                 def register(qref):
@@ -14,36 +14,155 @@
 # Copyright  Team Members
 
 import json
+from collections import OrderedDict
 
 from autobahn.twisted.resource import WebSocketResource
 from autobahn.twisted.websocket import WebSocketServerFactory
 from autobahn.twisted.websocket import WebSocketServerProtocol
 from twisted.internet import defer
+from twisted.internet import interfaces
 from twisted.python import log
+from zope.interface import implementer
 
+from buildbot.data import types
+from buildbot.process import metrics
 from buildbot.util import bytes2unicode
 from buildbot.util import toJson
 from buildbot.util import unicode2bytes
+from buildbot.www import fanout
 
 
+def encodeMessage(key, message):
+    # protocol is deliberately concise in size
+    return unicode2bytes(json.dumps(dict(k="/".join(key), m=message), default=toJson,
+                                    separators=(',', ':')))
+
+
+def encodeMessageMsgpack(key, message):
+    return types.dumpsMsgpack(dict(k="/".join(key), m=message))
+
+
+@implementer(interfaces.IPushProducer)
 class WsProtocol(WebSocketServerProtocol):
 
-    def __init__(self, master):
+    # default cap of the messages queued for a client which does not read
+    # them fast enough, in bytes
+    MAX_QUEUE_BYTES = 8 * 1024 * 1024
+
+    # close code telling the client to reconnect and reload its data
+    CLOSE_RESYNC = 4000
+
+    # subprotocol of the clients which exchange MessagePack binary frames
+    # rather than JSON text frames
+    MSGPACK_SUBPROTOCOL = 'msgpack'
+
+    def __init__(self, master, hub):
         super().__init__()
         self.master = master
+        self.hub = hub
         self.qrefs = {}
         self.debug = self.master.config.www.get('debug', False)
+        self.maxQueueBytes = self.master.config.www.get('ws_max_queue_bytes',
+                                                        self.MAX_QUEUE_BYTES)
+        self.paused = False
+        self.dropped = False
+        # the messages waiting for the client to catch up, in sending order;
+        # the messages with the same routing key supersede each other, and the
+        # others get a key of their own
+        self.queue = OrderedDict()
+        self.queueBytes = 0
+        self.isBinary = False
+
+    def onConnect(self, request):
+        if types.msgpack is not None and self.MSGPACK_SUBPROTOCOL in request.protocols:
+            self.isBinary = True
+            return self.MSGPACK_SUBPROTOCOL
+        return None
+
+    def connectionMade(self):
+        super().connectionMade()
+        # get paused while the client does not read as fast as we write; the
+        # HTTP channel which served the upgrade request can still be the
+        # producer of the transport
+        self.transport.unregisterProducer()
+        self.transport.registerProducer(self, True)
 
     def sendJsonMessage(self, **msg):
-        return self.sendMessage(unicode2bytes(json.dumps(msg, default=toJson,
-                                                         separators=(',', ':'))))
+        # the messages have the structure of JSON, whatever their encoding
+        if self.isBinary:
+            return self.queueMessage(types.dumpsMsgpack(msg))
+        return self.queueMessage(unicode2bytes(json.dumps(msg, default=toJson,
+                                                          separators=(',', ':'))))
+
+    def writeMessage(self, data):
+        if self.isBinary:
+            return self.sendMessage(data, isBinary=True)
+        return self.sendMessage(data)
+
+    def queueMessage(self, data, key=None):
+        if self.dropped:
+            return None
+        if not self.paused:
+            return self.writeMessage(data)
+
+        if key is None:
+            key = object()
+        else:
+            superseded = self.queue.pop(key, None)
+            if superseded is not None:
+                self._queueChanged(-1, -len(superseded))
+                metrics.MetricCountEvent.log('WsProtocol.coalesced_messages', 1)
+        self.queue[key] = data
+        self._queueChanged(1, len(data))
+
+        if self.queueBytes > self.maxQueueBytes:
+            self.dropSlowClient()
+        return None
+
+    def _queueChanged(self, messages, size):
+        self.queueBytes += size
+        metrics.MetricCountEvent.log('WsProtocol.queued_messages', messages)
+        metrics.MetricCountEvent.log('WsProtocol.queued_bytes', size)
+
+    def _clearQueue(self):
+        if self.queue:
+            self._queueChanged(-len(self.queue), -self.queueBytes)
+        self.queue.clear()
+
+    def dropSlowClient(self):
+        log.msg("websocket client {} is too slow, with {} bytes of messages queued; "
+                "closing the connection".format(self.peer, self.queueBytes))
+        metrics.MetricCountEvent.log('WsProtocol.dropped_clients', 1)
+        self.dropped = True
+        self._clearQueue()
+        self._stopConsumingAll()
+        self.sendClose(code=self.CLOSE_RESYNC,
+                       reason="too many pending messages, reconnect and reload the data")
+
+    # IPushProducer
+
+    def pauseProducing(self):
+        self.paused = True
+
+    def resumeProducing(self):
+        self.paused = False
+        while self.queue and not self.paused:
+            _, data = self.queue.popitem(last=False)
+            self._queueChanged(-1, -len(data))
+            self.writeMessage(data)
+
+    def stopProducing(self):
+        self._clearQueue()
 
     def onMessage(self, frame, isBinary):
         if self.debug:
             log.msg("FRAME {}".format(frame))
         # parse the incoming request
 
-        frame = json.loads(bytes2unicode(frame))
+        if isBinary and self.isBinary:
+            frame = types.loadsMsgpack(frame)
+        else:
+            frame = json.loads(bytes2unicode(frame))
         _id = frame.get("_id")
         if _id is None:
             return self.sendJsonMessage(error="no '_id' in websocket frame", code=400, _id=None)
@@ -88,11 +207,12 @@ class WsProtocol(WebSocketServerProtocol):
             yield self.ack(_id=_id)
             return
 
-        def callback(key, message):
-            # protocol is deliberately concise in size
-            return self.sendJsonMessage(k="/".join(key), m=message)
+        def callback(key, data):
+            return self.queueMessage(data, key)
 
-        qref = yield self.master.mq.startConsuming(callback, self.parsePath(path))
+        # the clients using the same format share the encoded messages
+        encoder = encodeMessageMsgpack if self.isBinary else encodeMessage
+        qref = yield self.hub.startConsuming(callback, self.parsePath(path), encoder)
 
         # race conditions handling
         if self.qrefs is None or path in self.qrefs:
@@ -111,7 +231,7 @@ class WsProtocol(WebSocketServerProtocol):
             return
 
         # only succeed if path has been started
-        if path in self.qrefs:
+        if self.qrefs is not None and path in self.qrefs:
             qref = self.qrefs.pop(path)
             yield qref.stopConsuming()
             yield self.ack(_id=_id)
@@ -122,27 +242,35 @@ class WsProtocol(WebSocketServerProtocol):
     def cmd_ping(self, _id):
         self.sendJsonMessage(msg="pong", code=200, _id=_id)
 
+    def _stopConsumingAll(self):
+        if self.qrefs is not None:
+            for qref in self.qrefs.values():
+                qref.stopConsuming()
+        self.qrefs = None  # to be sure we don't add any more
+
     def connectionLost(self, reason):
         if self.debug:
             log.msg("connection lost", system=self)
-        for qref in self.qrefs.values():
-            qref.stopConsuming()
-        self.qrefs = None  # to be sure we don't add any more
+        self._stopConsumingAll()
+        self._clearQueue()
 
 
 class WsProtocolFactory(WebSocketServerFactory):
 
-    def __init__(self, master):
+    def __init__(self, master, hub):
         super().__init__()
         self.master = master
+        self.hub = hub
 
     def buildProtocol(self, addr):
-        p = WsProtocol(self.master)
+        p = WsProtocol(self.master, self.hub)
         p.factory = self
         return p
 
 
 class WsResource(WebSocketResource):
 
-    def __init__(self, master):
-        super().__init__(WsProtocolFactory(master))
+    def __init__(self, master, hub=None):
+        if hub is None:
+            hub = fanout.FanoutHub(master)
+        super().__init__(WsProtocolFactory(master, hub))
@@ -374,7 +374,9 @@ setup_args = {
             ('buildbot.process.factory', [
                 'BuildFactory', 'GNUAutoconf', 'CPAN', 'Distutils', 'Trial',
                 'BasicBuildFactory', 'QuickBuildFactory', 'BasicSVN']),
+            ('buildbot.process.logcompactor', ['LogCompactor']),
             ('buildbot.process.logobserver', ['LogLineObserver']),
+            ('buildbot.process.retention', ['RetentionPruner']),
             ('buildbot.process.properties', [
                 'FlattenList', 'Interpolate', 'Property', 'Transform',
                 'WithProperties', 'renderer', 'Secret']),
@@ -412,6 +414,8 @@ setup_args = {
                 'GoogleAuth', 'GitHubAuth', 'GitLabAuth', 'BitbucketAuth']),
             ('buildbot.db.dbconfig', [
                 'DbConfig']),
+            ('buildbot.db.logstorage', [
+                'FilesystemLogStorage', 'S3LogStorage']),
             ('buildbot.www.authz', [
                 'Authz', 'fnmatchStrMatcher', 'reStrMatcher']),
             ('buildbot.www.authz.roles', [
@@ -514,6 +518,13 @@ if sys.platform != 'win32':
         'lz4',
     ]
 
+test_deps += [
+    # zstandard required for log compression tests.
+    'zstandard',
+    # msgpack required for the MessagePack responses tests.
+    'msgpack',
+]
+
 setup_args['tests_require'] = test_deps
 
 setup_args['extras_require'] = {